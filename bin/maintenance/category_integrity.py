@@ -26,13 +26,15 @@ It can be added as a periodic cronjob.
 
 import sys
 
+from BTrees.Length import Length
+
 from indico.core.db import DBMgr
 from MaKaC.conference import CategoryManager, ConferenceHolder
 
 
 
 def set_num_conferences(categ, num):
-    categ._numConferences = num
+    categ._numConferences = Length(num)
 
 
 def check_event_number_consistency(root):
@@ -45,16 +47,16 @@ def check_event_number_consistency(root):
     else:
         total = 0
         for scat in root.subcategories.itervalues():
-            total += scat._numConferences
-        if root._numConferences != total:
-            sys.stderr.write("(n) '%s': expected %d, got %d! " % (root.getId(), total, root._numConferences))
+            total += scat.getNumConferences()
+        if root.getNumConferences() != total:
+            sys.stderr.write("(n) '%s': expected %d, got %d! " % (root.getId(), total, root.getNumConferences()))
             set_num_conferences(root, total)
             sys.stderr.write("[FIXED]\n")
             dbi.commit()
 
 
 def check_event_number_leaves(categ, expected, dbi):
-    obtained = categ._numConferences
+    obtained = categ.getNumConferences()
 
     if expected != obtained:
         # something is wrong!
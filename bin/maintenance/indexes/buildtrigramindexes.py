@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+
+from indico.core.db import DBMgr
+from indico.util.benchmark import Benchmark
+from MaKaC.common.indexes import IndexesHolder
+
+
+INDEXES = ('email', 'name', 'surName', 'organisation')
+
+
+def build(dbi):
+    ih = IndexesHolder()
+    for idx_name in INDEXES:
+        print 'Building trigram index for %s...' % idx_name,
+        with Benchmark() as b:
+            ih.getById(idx_name).buildTrigramIndex()
+            dbi.commit()
+        b.print_result()
+
+
+def benchmark(dbi, queries):
+    """Compares the trigram lookup with a full scan of the index keys"""
+    ih = IndexesHolder()
+    for idx_name in INDEXES:
+        idx = ih.getById(idx_name)
+        trigrams = idx._trigrams
+        if trigrams is None:
+            print '%s: no trigram index, build it first' % idx_name
+            continue
+        for query in queries:
+            with Benchmark() as indexed:
+                indexedResult = idx._match(query, cs=0, exact=0, accent_sensitive=False)
+            idx._trigrams = None
+            try:
+                with Benchmark() as scan:
+                    scanResult = idx._match(query, cs=0, exact=0, accent_sensitive=False)
+            finally:
+                idx._trigrams = trigrams
+            same = sorted(indexedResult) == sorted(scanResult)
+            print '%-12s %-20r %6d results  scan: %s  trigram: %s%s' % (
+                idx_name, query, len(scanResult), scan, indexed, '' if same else '  RESULTS DIFFER!')
+    # nothing to keep, the trigram index was only swapped out temporarily
+    dbi.abort()
+
+
+def main():
+    """This script builds the trigram indexes used for substring user searches."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--benchmark', metavar='QUERY', nargs='+',
+                        help='compare the trigram index with a full scan for the given queries instead')
+    args = parser.parse_args()
+
+    dbi = DBMgr.getInstance()
+    dbi.startRequest()
+    if args.benchmark:
+        benchmark(dbi, args.benchmark)
+    else:
+        build(dbi)
+    dbi.endRequest()
+
+
+if __name__ == "__main__":
+    main()
@@ -34,8 +34,9 @@ from indico.core.config import Config
 from indico.core.db import DBMgr
 from indico.core.index import Catalog
 from indico.modules.rb.models.rooms import Room
-from indico.modules.rb.tasks import OccurrenceNotifications
+from indico.modules.rb.tasks import OccurrenceNotifications, OccupancyRollup
 from indico.modules.scheduler.tasks import AlarmTask
+from indico.modules.scheduler.tasks.periodic import FileCacheCleanupTask, MailOutboxDeliveryTask
 from indico.modules.scheduler.tasks.suggestions import CategorySuggestionTask
 from indico.modules.scheduler import Client
 from indico.util import console, i18n
@@ -456,6 +457,79 @@ def updatePluginSettingsNewRB(dbi, prevVersion):
     dbi.commit()
 
 
+@since('1.9')
+def buildUserTrigramIndexes(dbi, prevVersion):
+    """
+    Building trigram indexes for substring user searches
+    """
+    ih = IndexesHolder()
+    for idx_name in ('email', 'name', 'surName', 'organisation'):
+        ih.getById(idx_name).buildTrigramIndex()
+        dbi.commit()
+
+
+@since('1.9')
+def addFileCacheCleanupTask(dbi, prevVersion):
+    """
+    Add FileCacheCleanupTask to scheduler
+    """
+    Client().enqueue(FileCacheCleanupTask(rrule.HOURLY, byminute=30, bysecond=0))
+    dbi.commit()
+
+
+@since('1.9')
+def addOccupancyRollupTask(dbi, prevVersion):
+    """
+    Add OccupancyRollup to scheduler
+    """
+    Client().enqueue(OccupancyRollup(rrule.DAILY, byhour=3, byminute=0, bysecond=0))
+    dbi.commit()
+
+
+@since('1.9')
+def addMailOutboxDeliveryTask(dbi, prevVersion):
+    """
+    Add MailOutboxDeliveryTask to scheduler
+    """
+    Client().enqueue(MailOutboxDeliveryTask(rrule.MINUTELY, bysecond=0))
+    dbi.commit()
+
+
+@since('1.9')
+def buildScheduleIndexes(dbi, prevVersion):
+    """
+    Building the id and day indexes of the timetables
+    """
+    ch = ConferenceHolder()
+    i = 0
+
+    for (__, conf) in console.conferenceHolderIterator(ch, deepness='event'):
+        schedules = [conf.getSchedule()]
+        for session in conf.getSessionList():
+            schedules.append(session.getSchedule())
+            schedules.extend(slot.getSchedule() for slot in session.getSlotList())
+        for sch in schedules:
+            sch.rebuildIndex()
+
+        if i % 10000 == 9999:
+            dbi.commit()
+        i += 1
+    dbi.commit()
+
+
+@since('1.9')
+def convertCategoryCounters(dbi, prevVersion):
+    """
+    Using conflict-resolving event counters and sets in the category index
+    """
+    for categ in CategoryManager().itervalues():
+        categ._getNumConfsCounter()
+    dbi.commit()
+
+    IndexesHolder().getIndex('category').migrate()
+    dbi.commit()
+
+
 def runMigration(prevVersion=parse_version(__version__), specified=[], dry_run=False, run_from=None):
 
     global MIGRATION_TASKS
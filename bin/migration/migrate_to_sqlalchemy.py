@@ -52,6 +52,7 @@ from indico.modules.rb.models.reservation_occurrences import ReservationOccurren
 from indico.modules.rb.models.reservations import RepeatMapping, Reservation
 from indico.modules.rb.models.room_attributes import RoomAttributeAssociation, RoomAttribute
 from indico.modules.rb.models.room_bookable_hours import BookableHours
+from indico.modules.rb.models.room_day_bitmaps import RoomDayBitmap
 from indico.modules.rb.models.equipment import EquipmentType
 from indico.modules.rb.models.room_nonbookable_periods import NonBookablePeriod
 from indico.modules.rb.models.rooms import Room
@@ -537,6 +538,12 @@ def fix_sequences():
     db.session.commit()
 
 
+def build_availability_bitmaps():
+    print cformat('%{white!}building room availability bitmaps')
+    RoomDayBitmap.rebuild()
+    db.session.commit()
+
+
 def find_merged_avatars(main_root):
     print cformat('%{white!}checking for merged avatars')
     avatar_id_map = {}
@@ -555,6 +562,7 @@ def migrate(main_root, rb_root, photo_path, merged_avatars):
     migrate_blockings(rb_root, avatar_id_map)
     migrate_reservations(main_root, rb_root, avatar_id_map)
     fix_sequences()
+    build_availability_bitmaps()
 
 
 def main(main_uri, rb_uri, sqla_uri, photo_path, drop, merged_avatars):
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Compares the bulk operations of the GenericCache backends with doing the
+same operations one key at a time.
+
+For Redis the number of network round trips is counted, for the file
+backend only the time is measured.
+"""
+
+import argparse
+import shutil
+import tempfile
+
+from indico.core.config import Config
+from indico.util.benchmark import Benchmark
+from indico.util.redis import redis
+from MaKaC.common.cache import CacheClient, RedisCacheClient, FileCacheClient
+
+
+class RoundTripCounter(object):
+    """Counts the commands sent to the Redis server.
+
+    A pipeline is sent as a single packed command, so every call is one
+    round trip.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.count = 0
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        counter = self
+        self._orig = redis.Connection.send_packed_command
+
+        def send_packed_command(conn, command):
+            counter.count += 1
+            return counter._orig(conn, command)
+
+        self.count = 0
+        redis.Connection.send_packed_command = send_packed_command
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.enabled:
+            redis.Connection.send_packed_command = self._orig
+
+
+def run(name, client, keys, ttl, countRoundTrips):
+    mapping = dict((key, {'key': key, 'data': range(20)}) for key in keys)
+    operations = [('set_multi', lambda impl: impl.set_multi(client, mapping, ttl)),
+                  ('get_multi', lambda impl: impl.get_multi(client, keys)),
+                  ('delete_multi', lambda impl: impl.delete_multi(client, keys))]
+    for opName, op in operations:
+        for label, impl in (('per key', CacheClient), ('bulk', type(client))):
+            with RoundTripCounter(countRoundTrips) as counter:
+                with Benchmark() as b:
+                    op(impl)
+            trips = ('  %5d round trips' % counter.count) if countRoundTrips else ''
+            print '%-6s %-13s %-8s %s%s' % (name, opName, label, b, trips)
+
+
+def main():
+    """Benchmarks the bulk operations of the cache clients."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--keys', type=int, default=500, help='number of keys per bulk operation')
+    parser.add_argument('--ttl', type=int, default=300, help='TTL used when setting the keys')
+    args = parser.parse_args()
+
+    keys = ['cacheBenchmark.%08d' % i for i in xrange(args.keys)]
+
+    redisURL = Config.getInstance().getRedisCacheURL()
+    if redis and redisURL:
+        run('redis', RedisCacheClient(redisURL), keys, args.ttl, True)
+    else:
+        print 'redis: no RedisCacheURL configured, skipping'
+
+    tmpDir = tempfile.mkdtemp(prefix='indico-cache-benchmark-')
+    try:
+        run('files', FileCacheClient(tmpDir), keys, args.ttl, False)
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == "__main__":
+    main()
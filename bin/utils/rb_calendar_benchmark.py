@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks the bar generation of the room booking calendar with a booking
+wizard-like workload: many rooms, a booking series with flexible days and
+a busy schedule in every room.  No database is needed; rooms and bookings
+are simple stand-ins.
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from indico.modules.rb.models.reservations import RepeatFrequency
+from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.views.calendar import RoomBookingCalendarWidget
+from indico.util.benchmark import Benchmark
+from indico.web.flask.app import make_app
+
+
+class _Room(object):
+    def __init__(self, room_id):
+        self.id = room_id
+        self.full_name = 'Room {}'.format(room_id)
+
+
+class _Reservation(object):
+    def __init__(self, reservation_id, room_id, is_accepted):
+        self.id = reservation_id
+        self.room_id = room_id
+        self.is_accepted = is_accepted
+        self.start_dt = None
+        self.end_dt = None
+
+
+class _Occurrence(object):
+    overlaps = ReservationOccurrence.__dict__['overlaps']
+    get_overlap = ReservationOccurrence.__dict__['get_overlap']
+
+    def __init__(self, start_dt, end_dt, reservation):
+        self.start_dt = start_dt
+        self.end_dt = end_dt
+        self.reservation = reservation
+
+
+def _build_fixture(rooms, weeks, bookings_per_day, pending_ratio, flexible_days):
+    random.seed(0)
+    start_dt = datetime(2014, 6, 2, 10)
+    end_dt = start_dt + timedelta(weeks=weeks, hours=2)
+    room_objs = [_Room(i) for i in xrange(rooms)]
+
+    occurrences = []
+    reservation_id = 0
+    for room in room_objs:
+        for day in xrange(-flexible_days, weeks * 7 + flexible_days + 1):
+            day_start = datetime.combine((start_dt + timedelta(days=day)).date(), datetime.min.time())
+            for _ in xrange(bookings_per_day):
+                reservation_id += 1
+                reservation = _Reservation(reservation_id, room.id, random.random() >= pending_ratio)
+                occ_start = day_start + timedelta(hours=random.randint(7, 19), minutes=random.choice((0, 30)))
+                occ_end = occ_start + timedelta(minutes=random.choice((30, 60, 120)))
+                occurrence = _Occurrence(occ_start, occ_end, reservation)
+                reservation.start_dt, reservation.end_dt = occ_start, occ_end
+                occurrences.append(occurrence)
+
+    candidates = {}
+    for offset in xrange(-flexible_days, flexible_days + 1):
+        series_start = start_dt + timedelta(days=offset)
+        series_end = end_dt + timedelta(days=offset)
+        candidates[series_start, series_end] = ReservationOccurrence.create_series(series_start, series_end,
+                                                                                   (RepeatFrequency.DAY, 1))
+    return room_objs, occurrences, candidates, start_dt, end_dt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--weeks', type=int, default=4, help='length of the daily booking series')
+    parser.add_argument('--bookings-per-day', type=int, default=8, help='existing bookings per room and day')
+    parser.add_argument('--pending-ratio', type=float, default=0.3, help='share of unconfirmed bookings')
+    parser.add_argument('--flexible-days', type=int, default=3)
+    args = parser.parse_args()
+
+    with make_app().test_request_context():
+        rooms, occurrences, candidates, start_dt, end_dt = _build_fixture(args.rooms, args.weeks,
+                                                                          args.bookings_per_day, args.pending_ratio,
+                                                                          args.flexible_days)
+        print '{} rooms, {} occurrences, {} candidates'.format(len(rooms), len(occurrences),
+                                                                sum(map(len, candidates.itervalues())))
+        with Benchmark() as b:
+            calendar = RoomBookingCalendarWidget(occurrences, start_dt, end_dt, candidates=candidates, rooms=rooms,
+                                                 repeat_frequency=RepeatFrequency.DAY, repeat_interval=1,
+                                                 flexible_days=args.flexible_days, show_blockings=False)
+        print 'bars: {} ({} conflicts) in {}s'.format(len(calendar.bars), calendar.conflicts, b)
+
+
+if __name__ == '__main__':
+    main()
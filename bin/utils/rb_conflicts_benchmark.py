@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks the conflict detection of room booking series: the in-memory
+matching of candidate occurrences with existing ones and, if a room is
+given, the query fetching the existing occurrences.
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from itertools import product
+from operator import attrgetter
+
+from sqlalchemy import or_
+
+from indico.modules.rb.models.reservations import Reservation, RepeatFrequency
+from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.models.rooms import Room
+from indico.modules.rb.models.utils import db_dates_overlap
+from indico.util.benchmark import Benchmark
+from indico.util.date_time import iter_overlaps, overlaps
+from indico.web.flask.app import make_app
+
+
+class _Range(object):
+    def __init__(self, start_dt, end_dt):
+        self.start_dt = start_dt
+        self.end_dt = end_dt
+
+
+def _yearly_series(start_dt):
+    # two-hour occurrences every day for a year
+    end_dt = start_dt.replace(year=start_dt.year + 1) + timedelta(hours=2)
+    return ReservationOccurrence.create_series(start_dt, end_dt, (RepeatFrequency.DAY, 1))
+
+
+def _benchmark_matching(start_dt, bookings_per_day):
+    candidates = _yearly_series(start_dt)
+    # a busy room: back-to-back one-hour bookings all day long
+    existing = [_Range(start_dt.replace(hour=8) + timedelta(days=day, hours=hour),
+                       start_dt.replace(hour=9) + timedelta(days=day, hours=hour))
+                for day in xrange(366) for hour in xrange(bookings_per_day)]
+    print '{} candidates, {} existing occurrences'.format(len(candidates), len(existing))
+
+    key = attrgetter('start_dt', 'end_dt')
+    with Benchmark() as nested:
+        nested_count = sum(1 for cand, occ in product(candidates, existing) if overlaps(key(cand), key(occ)))
+    with Benchmark() as sweep:
+        sweep_count = sum(1 for _ in iter_overlaps(candidates, existing, key))
+    print 'nested loop: {} ({} conflicts)'.format(nested, nested_count)
+    print 'sweep:       {} ({} conflicts)'.format(sweep, sweep_count)
+
+
+def _benchmark_query(room, start_dt):
+    candidates = _yearly_series(start_dt)
+    old_criterion = or_(db_dates_overlap(ReservationOccurrence, 'start_dt', occ.start_dt, 'end_dt', occ.end_dt)
+                        for occ in candidates)
+    for name, criterion in (('OR of ranges', old_criterion),
+                            ('range array', ReservationOccurrence.filter_overlap(candidates))):
+        with Benchmark() as b:
+            count = ReservationOccurrence.find(Reservation.room == room, ReservationOccurrence.is_valid, criterion,
+                                               _join=Reservation).count()
+        print '{:<13} {} ({} occurrences)'.format(name + ':', b, count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--room', type=int, help='id of a room to benchmark the conflict query on')
+    parser.add_argument('--start', default=datetime.now().strftime('%Y-%m-%d'),
+                        help='first day of the series (YYYY-MM-DD)')
+    parser.add_argument('--bookings-per-day', type=int, default=10,
+                        help='number of existing bookings per day for the in-memory benchmark')
+    args = parser.parse_args()
+
+    start_dt = datetime.strptime(args.start, '%Y-%m-%d').replace(hour=10)
+    with make_app().app_context():
+        _benchmark_matching(start_dt, args.bookings_per_day)
+        if args.room:
+            _benchmark_query(Room.get(args.room), start_dt)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the number of bytes sent to and received from Redis for the
+sessions of a user browsing Indico, using the old session storage (a
+cPickled dict pickled again by the cache) and the current SessionStore.
+
+A page view either changes the session, marks it as modified without
+changing it, or only reads it; after `--refresh` views the session needs
+to be refreshed.
+"""
+
+import argparse
+import cPickle
+import random
+import uuid
+from datetime import datetime
+
+from indico.web.flask.session import SessionStore
+
+
+def _sampleSession():
+    return {'_avatarId': '12345', '_lang': 'en_GB', '_timezone': 'Europe/Zurich', '_permanent': True,
+            '_csrf_token': str(uuid.uuid4()), '_expires': datetime.now(), '_flashes': []}
+
+
+def _oldValue(session):
+    # what RedisCacheClient used to send: a protocol 0 pickle of a protocol 0 pickle
+    return cPickle.dumps(cPickle.dumps(session))
+
+
+def _newValue(session):
+    data = dict(session)
+    data.pop('_expires', None)
+    payload = SessionStore.serialize(data)
+    value = SessionStore.header.pack(SessionStore.MAGIC, 0) + payload
+    return cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL), SessionStore.get_digest(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--views', type=int, default=10000, help='number of page views')
+    parser.add_argument('--changed', type=float, default=0.02, help='ratio of views changing the session')
+    parser.add_argument('--modified', type=float, default=0.5,
+                        help='ratio of views marking the session as modified without changing it')
+    parser.add_argument('--refresh', type=int, default=2000, help='number of views between two refreshes')
+    args = parser.parse_args()
+
+    random.seed(0)
+    session = _sampleSession()
+    storedDigest = _newValue(session)[1]
+    old = {'read': 0, 'written': 0, 'writes': 0}
+    new = {'read': 0, 'written': 0, 'writes': 0, 'touches': 0}
+    for i in xrange(1, args.views + 1):
+        r = random.random()
+        changed = r < args.changed
+        modified = changed or r < args.changed + args.modified
+        refresh = i % args.refresh == 0
+        if changed:
+            session['_flashes'] = ['Message {0}'.format(i)] if not session['_flashes'] else []
+        oldValue = _oldValue(session)
+        newValue, digest = _newValue(session)
+        old['read'] += len(oldValue)
+        new['read'] += len(newValue)
+        if modified or refresh:
+            old['written'] += len(oldValue)
+            old['writes'] += 1
+            if digest != storedDigest:
+                new['written'] += len(newValue)
+                new['writes'] += 1
+                storedDigest = digest
+            elif refresh:
+                new['touches'] += 1
+
+    for name, stats in (('old', old), ('new', new)):
+        print '{:<4} read: {:.1f} bytes/view, written: {:.1f} bytes/view ({} writes{})'.format(
+            name, stats['read'] / float(args.views), stats['written'] / float(args.views), stats['writes'],
+            ', {} touches'.format(stats['touches']) if 'touches' in stats else '')
+
+
+if __name__ == '__main__':
+    main()
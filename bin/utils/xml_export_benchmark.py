@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks the XML writers by exporting a conference (the full XML export
+and the MARC21 records of the conference and all its contributions) with
+both `XMLGen` and `StreamingXMLGen` and checks they produce the same XML.
+"""
+
+import argparse
+import os
+
+from indico.core.db import DBMgr
+from indico.util.benchmark import Benchmark
+from indico.web.flask.app import make_app
+from MaKaC.accessControl import AccessWrapper
+from MaKaC.common.output import outputGenerator
+from MaKaC.common.xmlGen import XMLGen, StreamingXMLGen
+from MaKaC.conference import ConferenceHolder
+
+
+# the public export methods render into a temporary StreamingXMLGen, so the
+# uncached ones are used to make sure everything goes through the writer
+# being benchmarked
+
+def _exportFull(conf, xg):
+    outputGenerator(AccessWrapper(), xg)._confToXML(conf, None, useSchedule=False, out=xg)
+
+
+def _exportMarc(conf, xg):
+    outgen = outputGenerator(AccessWrapper(), xg)
+    xg.openTag('collection')
+    outgen._confToXMLMarc21(conf, out=xg)
+    for cont in conf.getContributionList():
+        outgen._contribToXMLMarc21(cont, out=xg)
+        for subCont in cont.getSubContributionList():
+            outgen._subContribToXMLMarc21(subCont, out=xg)
+    xg.closeTag('collection')
+
+
+def _benchmark(conf, name, export, repeat):
+    results = {}
+    for cls in (XMLGen, StreamingXMLGen):
+        best = None
+        for i in xrange(repeat):
+            xg = cls()
+            with Benchmark() as b:
+                export(conf, xg)
+                xml = xg.getXml()
+            best = b if best is None or float(b) < float(best) else best
+        results[cls.__name__] = xml
+        print '{:<6} {:<16} {} ({} bytes)'.format(name, cls.__name__ + ':', best, len(xml))
+    if results['XMLGen'] != results['StreamingXMLGen']:
+        print 'WARNING: the writers generated different XML'
+
+
+def _benchmarkStream(conf):
+    with open(os.devnull, 'w') as f:
+        with Benchmark() as b:
+            xg = StreamingXMLGen(stream=f)
+            _exportFull(conf, xg)
+            xg.flush()
+    print '{:<6} {:<16} {}'.format('full', 'to /dev/null:', b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('conference', help='id of the conference to export (ideally a large one)')
+    parser.add_argument('--repeat', type=int, default=3, help='number of exports per writer (the best one is shown)')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.test_request_context():
+        DBMgr.getInstance().startRequest()
+        try:
+            conf = ConferenceHolder().getById(args.conference)
+            print '{} contributions'.format(len(conf.getContributionList()))
+            _benchmark(conf, 'full', _exportFull, args.repeat)
+            _benchmark(conf, 'marc21', _exportMarc, args.repeat)
+            _benchmarkStream(conf)
+        finally:
+            DBMgr.getInstance().endRequest(False)
+
+
+if __name__ == '__main__':
+    main()
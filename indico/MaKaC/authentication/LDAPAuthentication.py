@@ -60,6 +60,7 @@ try:
 except:
     pass
 
+from contextlib import contextmanager
 from urlparse import urlparse
 
 # dependency libs
@@ -348,8 +349,25 @@ class LDAPConnector(object):
             connector = cls()
             connector.open()
             connector.login()
+            if ContextManager.get('ldap.reuseConnector', False):
+                ContextManager.set('ldap.connector', connector)
         return connector
 
+    @classmethod
+    @contextmanager
+    def reusedConnection(cls):
+        """
+        Makes `getInstance` reuse a single connection in the current thread
+        and closes it when the block ends.  Meant for threads which are not
+        request threads, whose connections are not closed by `RequestListener`
+        """
+        ContextManager.set('ldap.reuseConnector', True)
+        try:
+            yield
+        finally:
+            ContextManager.delete('ldap.reuseConnector', silent=True)
+            cls.destroy()
+
     @classmethod
     def destroy(cls):
         connector = ContextManager.get('ldap.connector', default=None)
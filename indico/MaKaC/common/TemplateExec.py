@@ -20,10 +20,13 @@
 from flask import session, g, request, render_template
 from flask import current_app as app
 import pkg_resources
+import os
 import os.path
 import re
 import posixpath
+import threading
 from indico.core.config import Config
+from indico.core.logger import Logger
 from MaKaC.common.utils import formatDateTime, formatDate, formatTime
 from MaKaC.user import Avatar
 from mako.lookup import TemplateLookup
@@ -52,6 +55,18 @@ FILTER_IMPORTS = [
 
 
 class IndicoTemplateLookup(TemplateLookup):
+    """Template lookup which also knows about plugin templates.
+
+    In production mode (no `filesystem_checks`) all the core and plugin
+    templates are loaded the first time a template is requested, so the
+    lookups of a running worker are served from memory without checking
+    the template files at all.
+    """
+
+    def __init__(self, *args, **kwargs):
+        TemplateLookup.__init__(self, *args, **kwargs)
+        self._preloaded = False
+        self._preloadLock = threading.Lock()
 
     def getPluginTPlDir(self, pTypeName, pluginName, tplName):
         pType = PluginsHolder().getPluginType(pTypeName)
@@ -65,6 +80,68 @@ class IndicoTemplateLookup(TemplateLookup):
         return posixpath.normpath(pkg_resources.resource_filename(pType.getModule().__name__, 'tpls/{0}'.format(tplName)))
 
 
+    def _getModuleTPlDir(self, module):
+        return posixpath.normpath(pkg_resources.resource_filename(module.__name__, 'tpls'))
+
+    def _iterTemplateDirs(self):
+        """Yields the template directories together with the prefix of the
+        uris pointing to them (``None`` if the templates are only accessed
+        through their full path)
+        """
+        for dir in self.directories:
+            yield posixpath.normpath(dir), ''
+        for pType in PluginsHolder().getPluginTypes():
+            if pType.getModule() is None:
+                continue
+            yield self._getModuleTPlDir(pType.getModule()), pType.getId() + '/'
+            for plugin in pType.getPluginList(includeNonActive=True):
+                if plugin.getModule() is not None:
+                    yield (self._getModuleTPlDir(plugin.getModule()),
+                           '{0}/{1}/'.format(pType.getId(), plugin.getId()))
+
+    def preload(self):
+        """Loads (compiling them if needed) all the core and plugin templates.
+
+        Every template is available both through its full path and through
+        the uri used to look it up in its template directory.  Returns the
+        number of loaded templates and a list of ``(path, exception)`` for
+        the templates which could not be compiled.
+        """
+        loaded = 0
+        errors = []
+        for dir, prefix in self._iterTemplateDirs():
+            for root, dirs, files in os.walk(dir):
+                for name in sorted(files):
+                    if not name.endswith('.tpl'):
+                        continue
+                    srcfile = posixpath.join(root, name)
+                    uri = prefix + posixpath.relpath(srcfile, dir)
+                    try:
+                        template = self._load(srcfile, uri)
+                    except Exception as e:
+                        errors.append((srcfile, e))
+                        continue
+                    self._collection.setdefault(srcfile, template)
+                    loaded += 1
+        self._preloaded = True
+        return loaded, errors
+
+    def _ensurePreloaded(self):
+        with self._preloadLock:
+            if self._preloaded:
+                return
+            # never try again, missing templates are still loaded on demand
+            self._preloaded = True
+            logger = Logger.get('templates')
+            try:
+                loaded, errors = self.preload()
+            except Exception:
+                logger.exception('Could not preload the templates')
+                return
+            logger.info('Loaded {0} templates'.format(loaded))
+            for srcfile, e in errors:
+                logger.error('Could not compile {0}: {1}'.format(srcfile, e))
+
     def get_template(self, uri, module=None):
         """Return a :class:`.Template` object corresponding to the given
         URL.
@@ -73,6 +150,9 @@ class IndicoTemplateLookup(TemplateLookup):
 
         """
 
+        if not self.filesystem_checks and not self._preloaded:
+            self._ensurePreloaded()
+
         try:
             if self.filesystem_checks:
                 return self._check(uri, self._collection[uri])
@@ -111,7 +191,8 @@ class IndicoTemplateLookup(TemplateLookup):
                 raise exceptions.TopLevelLookupException('Can\'t locate template for uri {0!r}'.format(uri))
 
 
-def _define_lookup():
+def define_lookup():
+    """Creates a template lookup using the current configuration"""
     # TODO: disable_unicode shouldn't be used
     # since unicode is disabled, template waits for
     # byte strings provided by default_filters
@@ -121,12 +202,12 @@ def _define_lookup():
                                 disable_unicode=True,
                                 input_encoding='utf-8',
                                 default_filters=['encode_if_unicode', 'str'],
-                                filesystem_checks=True,
+                                filesystem_checks=not Config.getInstance().getPrecompiledTemplates(),
                                 imports=FILTER_IMPORTS,
                                 cache_enabled=not ContextManager.get('offlineMode'))
 
 
-mako = _define_lookup()
+mako = define_lookup()
 
 
 def render(tplPath, params={}, module=None):
@@ -143,6 +224,22 @@ def render(tplPath, params={}, module=None):
     return template.render(**params)
 
 
+_existingFiles = {}
+
+
+def fileExists(path):
+    """Tells whether a file exists.  With precompiled templates the template
+    files are not supposed to change, so every file is only checked once.
+    """
+    if mako.filesystem_checks:
+        return os.path.exists(path)
+    try:
+        return _existingFiles[path]
+    except KeyError:
+        exists = _existingFiles[path] = os.path.exists(path)
+        return exists
+
+
 def inlineContextHelp(helpContent):
     """
     Allows you to put [?], the context help marker.
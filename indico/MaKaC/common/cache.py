@@ -26,8 +26,10 @@ from MaKaC.common.contextManager import ContextManager
 from indico.util.fs import silentremove
 from indico.util.redis import redis
 
-import hashlib, os, shutil, datetime, time
+import errno, hashlib, os, random, shutil, datetime, time, uuid
+import threading
 import cPickle as pickle
+from collections import Counter, OrderedDict
 from itertools import izip
 
 class CacheStorage(object):
@@ -307,7 +309,51 @@ class _NoneValue(object):
         return None if isinstance(value, cls) else value
 
 
+# Marks a value which has not been loaded from a file cache entry yet
+_NotLoaded = object()
+
+
 class CacheClient(object):
+    def add(self, key, val, ttl=0):
+        """Sets `key` only if it does not exist yet.
+
+        Returns a true value if the key has been set.  Backends which cannot
+        do this atomically fall back to a check followed by a write.
+        """
+        if self.get(key) is not None:
+            return False
+        self.set(key, val, ttl)
+        return True
+
+    def incr(self, key, delta=1):
+        """Increments the integer stored in `key` and returns the new value.
+
+        Missing keys start at 0.  Backends which cannot do this atomically
+        fall back to a read followed by a write.
+        """
+        val = int(self.get(key) or 0) + delta
+        self.set(key, val)
+        return val
+
+    def touch(self, key, ttl=0):
+        """Changes the expiry of `key` without changing its value.
+
+        Returns whether the key exists.  Backends which cannot do this
+        natively fall back to reading and rewriting the value.
+        """
+        val = self.get(key)
+        if val is None:
+            return False
+        self.set(key, val, ttl)
+        return True
+
+    def get_with_ttl(self, key):
+        """Returns the value of `key` and the number of seconds until it
+        expires, which is ``None`` if the backend cannot tell or if it does
+        not expire.
+        """
+        return self.get(key), None
+
     def set_multi(self, mapping, ttl=0):
         for key, val in mapping.iteritems():
             self.set(key, val, ttl)
@@ -324,10 +370,17 @@ class CacheClient(object):
         for key in keys:
             self.delete(key)
 
+    def close(self):
+        """Closes the connections of the client, if it has any"""
+        pass
+
 
 class NullCacheClient(CacheClient):
     """Does nothing"""
 
+    def add(self, key, val, ttl=0):
+        return True
+
     def set(self, key, val, ttl=0):
         pass
 
@@ -347,9 +400,15 @@ class RedisCacheClient(CacheClient):
         self._client = redis.StrictRedis.from_url(url)
         self._client.connection_pool.connection_kwargs['socket_timeout'] = 1
 
+    def close(self):
+        self._client.connection_pool.disconnect()
+
     def _unpickle(self, val):
         if val is None:
             return None
+        elif val.isdigit():
+            # counters are stored as plain numbers so INCR works on them
+            return int(val)
         return pickle.loads(val)
 
     def hash_key(self, key):
@@ -357,35 +416,87 @@ class RedisCacheClient(CacheClient):
         return key
 
     def set_multi(self, mapping, ttl=0):
+        if not mapping:
+            return
         try:
-            self._client.mset(dict((k, pickle.dumps(v)) for k, v in mapping.iteritems()))
             if ttl:
-                for key in mapping:
-                    self._client.expire(key, ttl)
+                # MSET cannot set an expiry, so we send one SETEX per key but in a single round trip
+                pipe = self._client.pipeline(transaction=False)
+                for key, val in mapping.iteritems():
+                    pipe.setex(key, ttl, pickle.dumps(val, pickle.HIGHEST_PROTOCOL))
+                pipe.execute()
+            else:
+                self._client.mset(dict((k, pickle.dumps(v, pickle.HIGHEST_PROTOCOL)) for k, v in mapping.iteritems()))
         except redis.RedisError:
             Logger.get('redisCache').exception('set_multi failed')
 
     def get_multi(self, keys):
+        if not keys:
+            return {}
         try:
             return dict(zip(keys, map(self._unpickle, self._client.mget(keys))))
         except redis.RedisError:
             Logger.get('redisCache').exception('get_multi failed')
+            return {}
 
     def delete_multi(self, keys):
+        if not keys:
+            return
         try:
             self._client.delete(*keys)
         except redis.RedisError:
             Logger.get('redisCache').exception('delete_multi failed')
 
+    def incr(self, key, delta=1):
+        try:
+            try:
+                return self._client.incr(key, delta)
+            except redis.ResponseError:
+                # the key contains a pickled value written before it was used as a counter
+                val = int(self._unpickle(self._client.get(key)) or 0) + delta
+                self._client.set(key, val)
+                return val
+        except redis.RedisError:
+            Logger.get('redisCache').exception('incr failed')
+
+    def add(self, key, val, ttl=0):
+        try:
+            return self._client.set(key, pickle.dumps(val, pickle.HIGHEST_PROTOCOL), ex=(ttl or None), nx=True)
+        except redis.RedisError:
+            Logger.get('redisCache').exception('add failed')
+            return False
+
     def set(self, key, val, ttl=0):
         try:
             if ttl:
-                self._client.setex(key, ttl, pickle.dumps(val))
+                self._client.setex(key, ttl, pickle.dumps(val, pickle.HIGHEST_PROTOCOL))
             else:
-                self._client.set(key, pickle.dumps(val))
+                self._client.set(key, pickle.dumps(val, pickle.HIGHEST_PROTOCOL))
         except redis.RedisError:
             Logger.get('redisCache').exception('set failed')
 
+    def touch(self, key, ttl=0):
+        try:
+            if ttl:
+                return bool(self._client.expire(key, ttl))
+            self._client.persist(key)
+            return bool(self._client.exists(key))
+        except redis.RedisError:
+            Logger.get('redisCache').exception('touch failed')
+            return False
+
+    def get_with_ttl(self, key):
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            val, ttl = pipe.execute()
+        except redis.RedisError:
+            Logger.get('redisCache').exception('get_with_ttl failed')
+            return None, None
+        # keys without expiry have a negative ttl
+        return self._unpickle(val), (ttl if ttl is not None and ttl >= 0 else None)
+
     def get(self, key):
         try:
             return self._unpickle(self._client.get(key))
@@ -403,7 +514,17 @@ class FileCacheClient(CacheClient):
     """File-based cache with a memcached-like API.
 
     Contains only features needed by GenericCache.
+
+    Each entry is a file containing two pickles, the expiry timestamp (or
+    `None`) followed by the value, so expired entries can be recognized
+    without loading their value.  Expired entries are removed by
+    :meth:`evict` and, for the directory of a key, now and then when
+    writing a key.
     """
+
+    # probability of removing the expired entries next to a key after writing it
+    EVICTION_SAMPLE_RATE = 0.001
+
     def __init__(self, dir):
         self._dir = os.path.join(dir, 'generic_cache')
 
@@ -425,58 +546,370 @@ class FileCacheClient(CacheClient):
                     raise
         return os.path.join(dir, filename)
 
-    def set(self, key, val, ttl=0):
+    def _dump(self, f, expiry, val):
+        OSSpecific.lockFile(f, 'LOCK_EX')
         try:
-            f = open(self._getFilePath(key), 'wb')
-            OSSpecific.lockFile(f, 'LOCK_EX')
-            try:
-                expiry = int(time.time()) + ttl if ttl else None
-                data = (expiry, val)
-                pickle.dump(data, f)
-            finally:
-                OSSpecific.lockFile(f, 'LOCK_UN')
-                f.close()
+            pickle.dump(expiry, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(val, f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            OSSpecific.lockFile(f, 'LOCK_UN')
+            f.close()
+
+    def _write(self, path, expiry, val):
+        try:
+            self._dump(open(path, 'wb'), expiry, val)
         except (IOError, OSError):
             Logger.get('FileCache').exception('Error setting value in cache')
             return 0
+        if random.random() < self.EVICTION_SAMPLE_RATE:
+            self._evictExpired(os.path.dirname(path))
         return 1
 
-    def get(self, key):
+    def _loadExpiry(self, f):
+        """Loads the expiry of an entry and returns it together with the
+        value if the entry still uses the old single pickle format.
+        """
+        expiry = pickle.load(f)
+        if isinstance(expiry, tuple):
+            return expiry
+        return expiry, _NotLoaded
+
+    def _readEntry(self, path, now):
+        """Returns the expiry and the value of an entry, or ``(None, None)``
+        if it does not exist or is expired"""
         try:
-            path = self._getFilePath(key, False)
-            if not os.path.exists(path):
-                return None
-
             f = open(path, 'rb')
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                Logger.get('FileCache').exception('Error getting cached value')
+            return None, None
+        try:
             OSSpecific.lockFile(f, 'LOCK_SH')
-            expiry = val = None
             try:
-                expiry, val = pickle.load(f)
+                expiry, val = self._loadExpiry(f)
+                if expiry and now > expiry:
+                    return None, None
+                if val is _NotLoaded:
+                    val = pickle.load(f)
             finally:
                 OSSpecific.lockFile(f, 'LOCK_UN')
                 f.close()
-            if expiry and time.time() > expiry:
-                return None
         except (IOError, OSError):
             Logger.get('FileCache').exception('Error getting cached value')
-            return None
-        except (EOFError, pickle.UnpicklingError):
+            return None, None
+        except (EOFError, ValueError, TypeError, pickle.UnpicklingError):
             Logger.get('FileCache').exception('Cached information seems corrupted. Overwriting it.')
-            return None
+            return None, None
+        return expiry, val
 
-        return val
+    def _read(self, path, now):
+        return self._readEntry(path, now)[1]
+
+    def _readExpiry(self, path):
+        """Returns the expiry of an entry; corrupted entries are considered expired"""
+        try:
+            with open(path, 'rb') as f:
+                return self._loadExpiry(f)[0]
+        except (EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return 0
+
+    def set(self, key, val, ttl=0):
+        expiry = int(time.time()) + ttl if ttl else None
+        return self._write(self._getFilePath(key), expiry, val)
+
+    def set_multi(self, mapping, ttl=0):
+        expiry = int(time.time()) + ttl if ttl else None
+        # keys sharing a directory only need to check/create it once
+        dirs = set()
+        for key, val in mapping.iteritems():
+            path = self._getFilePath(key, False)
+            dir = os.path.dirname(path)
+            if dir not in dirs:
+                self._getFilePath(key)
+                dirs.add(dir)
+            self._write(path, expiry, val)
+
+    def add(self, key, val, ttl=0):
+        """Creates the entry unless it exists and has not expired.
+
+        The entry is written to a temporary file first and then linked
+        into place, so other processes never see it partially written.
+        An existing entry is only replaced while holding its lock, after
+        checking that it is still the same (expired) file.
+        """
+        path = self._getFilePath(key)
+        now = time.time()
+        tmpPath = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        try:
+            self._dump(open(tmpPath, 'wb'), int(now) + ttl if ttl else None, val)
+            try:
+                os.link(tmpPath, path)
+                return 1
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+            return int(self._replaceExpired(path, tmpPath, now, ttl))
+        except (IOError, OSError):
+            Logger.get('FileCache').exception('Error adding value to cache')
+            return 0
+        finally:
+            silentremove(tmpPath)
+
+    def _replaceExpired(self, path, newPath, now, ttl):
+        """Replaces the entry in `path` by `newPath` if it has expired"""
+        try:
+            f = open(path, 'rb')
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            # removed in the meantime
+            try:
+                os.link(newPath, path)
+                return True
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                return False
+        try:
+            OSSpecific.lockFile(f, 'LOCK_EX')
+            st = os.fstat(f.fileno())
+            try:
+                if os.stat(path).st_ino != st.st_ino:
+                    # someone else replaced it while we were waiting for the lock
+                    return False
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                return False
+            try:
+                expiry = self._loadExpiry(f)[0]
+            except (EOFError, ValueError, TypeError, pickle.UnpicklingError):
+                # an unreadable entry may be still being written, only
+                # replace it if it is older than the entry we want to add
+                if not ttl or st.st_mtime + ttl > now:
+                    return False
+            else:
+                if not expiry or now <= expiry:
+                    return False
+            os.rename(newPath, path)
+            return True
+        finally:
+            OSSpecific.lockFile(f, 'LOCK_UN')
+            f.close()
+
+    def get(self, key):
+        return self._read(self._getFilePath(key, False), time.time())
+
+    def get_with_ttl(self, key):
+        now = time.time()
+        expiry, val = self._readEntry(self._getFilePath(key, False), now)
+        if val is None or not expiry:
+            return val, None
+        return val, max(0, int(expiry - now))
+
+    def get_multi(self, keys):
+        now = time.time()
+        values = {}
+        for key in keys:
+            val = self._read(self._getFilePath(key, False), now)
+            if val is not None:
+                values[key] = val
+        return values
 
     def delete(self, key):
-        path = self._getFilePath(key, False)
-        if os.path.exists(path):
-            silentremove(path)
+        silentremove(self._getFilePath(key, False))
         return 1
 
+    def delete_multi(self, keys):
+        for key in keys:
+            silentremove(self._getFilePath(key, False))
+
+    def _iterFiles(self, dir):
+        for path, dirs, files in os.walk(dir):
+            for name in files:
+                # skip the entries being written by add()
+                if not name.endswith('.tmp'):
+                    yield os.path.join(path, name)
+
+    def _removeEmptyDirs(self, dir):
+        for path, dirs, files in os.walk(dir, topdown=False):
+            # `dirs` still lists the subdirectories we just removed
+            if path != dir and not files and not os.listdir(path):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    # someone just wrote a new entry there
+                    pass
+
+    def _evictExpired(self, dir):
+        now = time.time()
+        for path in self._iterFiles(dir):
+            try:
+                expiry = self._readExpiry(path)
+                if expiry is not None and now > expiry:
+                    silentremove(path)
+            except (IOError, OSError):
+                pass
+
+    def getNamespaces(self):
+        if not os.path.isdir(self._dir):
+            return []
+        return sorted(name for name in os.listdir(self._dir) if os.path.isdir(os.path.join(self._dir, name)))
+
+    def getFootprint(self):
+        """Returns the number of entries, expired entries and bytes used by namespace"""
+        now = time.time()
+        footprint = {}
+        for namespace in self.getNamespaces():
+            entries = expired = size = 0
+            for path in self._iterFiles(os.path.join(self._dir, namespace)):
+                try:
+                    size += os.path.getsize(path)
+                    expiry = self._readExpiry(path)
+                except (IOError, OSError):
+                    continue
+                entries += 1
+                if expiry is not None and now > expiry:
+                    expired += 1
+            footprint[namespace] = {'entries': entries, 'expired': expired, 'size': size}
+        return footprint
+
+    def evict(self, maxSize=0, quotas=None):
+        """Removes expired entries and enforces size limits.
+
+        If a namespace uses more than its quota (in bytes) or the whole cache
+        more than `maxSize` bytes, the least recently used entries (according
+        to their access or modification time, whichever is newer) are removed
+        until the limits are respected.
+
+        Returns the number of entries and bytes removed by namespace.
+        """
+        quotas = quotas or {}
+        now = time.time()
+        removed = {}
+        remaining = []
+
+        def _remove(namespace, path, size):
+            silentremove(path)
+            stats = removed.setdefault(namespace, {'entries': 0, 'size': 0})
+            stats['entries'] += 1
+            stats['size'] += size
+
+        for namespace in self.getNamespaces():
+            entries = []
+            for path in self._iterFiles(os.path.join(self._dir, namespace)):
+                try:
+                    st = os.stat(path)
+                    expiry = self._readExpiry(path)
+                    if expiry is not None and now > expiry:
+                        _remove(namespace, path, st.st_size)
+                    else:
+                        entries.append((max(st.st_atime, st.st_mtime), st.st_size, namespace, path))
+                except (IOError, OSError):
+                    continue
+            quota = quotas.get(namespace)
+            if quota:
+                entries.sort()
+                size = sum(entry[1] for entry in entries)
+                while entries and size > quota:
+                    _, entrySize, _, path = entries.pop(0)
+                    _remove(namespace, path, entrySize)
+                    size -= entrySize
+            remaining += entries
+
+        if maxSize:
+            remaining.sort()
+            size = sum(entry[1] for entry in remaining)
+            for _, entrySize, namespace, path in remaining:
+                if size <= maxSize:
+                    break
+                _remove(namespace, path, entrySize)
+                size -= entrySize
+
+        for namespace in self.getNamespaces():
+            self._removeEmptyDirs(os.path.join(self._dir, namespace))
+        return removed
+
+
+class L1Cache(object):
+    """Small per-process LRU cache used in front of the GenericCache backends.
+
+    Values are kept pickled so every lookup returns a fresh copy (callers
+    often modify what they get from the cache) and so the memory used can
+    be bounded.  Entries expire after the TTL given when storing them.
+    """
+
+    MAX_ENTRIES = 2000
+    MAX_SIZE = 32 * 1024 * 1024  # total size of the pickled values in bytes
+    MAX_ENTRY_SIZE = 1024 * 1024  # larger values are not worth keeping in every process
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the value for `key` or `None` if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expiry, data = entry
+            if expiry < time.time():
+                self._size -= len(data)
+                return None
+            # re-insert to mark it as most recently used
+            self._entries[key] = entry
+        return pickle.loads(data)
+
+    def set(self, key, val, ttl):
+        data = pickle.dumps(val, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._discard(key)
+            if len(data) > self.MAX_ENTRY_SIZE:
+                return
+            self._entries[key] = (time.time() + ttl, data)
+            self._size += len(data)
+            while len(self._entries) > self.MAX_ENTRIES or self._size > self.MAX_SIZE:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
 
 class GenericCache(object):
-    def __init__(self, namespace):
+    """Cache with a pluggable backend (memcached, redis, files).
+
+    If `l1TTL` is set, values read from the backend are also kept for up to
+    that many seconds in a process-wide :class:`L1Cache`.  Only use it for
+    namespaces which can tolerate values that are that stale, since writes
+    by other processes do not invalidate it; writes made by this process do.
+    """
+
+    _l1 = L1Cache()
+    _stats = Counter()
+    _statsLock = threading.Lock()
+    STATS_LOG_INTERVAL = 1000
+
+    def __init__(self, namespace, l1TTL=0):
         self._client = None
         self._namespace = namespace
+        self._l1TTL = l1TTL
 
     def __repr__(self):
         return 'GenericCache(%r)' % self._namespace
@@ -505,6 +938,23 @@ class GenericCache(object):
 
         ContextManager.set('GenericCacheClient', self._client)
 
+    @staticmethod
+    def closeClient():
+        """Closes the client shared by the caches of the current thread.
+
+        Threads which are not request threads need to call this before they
+        finish, since their clients are not closed at the end of a request.
+        """
+        client = ContextManager.get('GenericCacheClient', None)
+        if client is None:
+            return
+        ContextManager.delete('GenericCacheClient', silent=True)
+        if hasattr(client, 'disconnect_all'):
+            # memcache.Client
+            client.disconnect_all()
+        else:
+            client.close()
+
     def _hashKey(self, key):
         if hasattr(self._client, 'hash_key'):
             return self._client.hash_key(key)
@@ -523,22 +973,129 @@ class GenericCache(object):
             ts = ts.seconds + (ts.days * 24 * 3600)
         return ts
 
+    def _count(self, l1=0, l2=0, misses=0):
+        with self._statsLock:
+            stats = self._stats
+            stats[(self._namespace, 'l1')] += l1
+            stats[(self._namespace, 'l2')] += l2
+            stats[(self._namespace, 'miss')] += misses
+            total = sum(stats[(self._namespace, kind)] for kind in ('l1', 'l2', 'miss'))
+            l1Hits, l2Hits = stats[(self._namespace, 'l1')], stats[(self._namespace, 'l2')]
+        if total // self.STATS_LOG_INTERVAL != (total - l1 - l2 - misses) // self.STATS_LOG_INTERVAL:
+            Logger.get('GenericCache/%s' % self._namespace).info(
+                'L1 hit ratio: %.1f%%, L2 hit ratio: %.1f%% (%d lookups)' % (
+                    100.0 * l1Hits / total, 100.0 * l2Hits / total, total))
+
+    @classmethod
+    def getStats(cls):
+        """Returns the L1/L2 hits and misses of this process by namespace.
+
+        Only namespaces using the L1 cache are counted.
+        """
+        stats = {}
+        with cls._statsLock:
+            for (namespace, kind), count in cls._stats.iteritems():
+                stats.setdefault(namespace, {'l1': 0, 'l2': 0, 'miss': 0})[kind] = count
+        return stats
+
+    def _invalidateL1(self, realKeys):
+        if self._l1TTL:
+            for realKey in realKeys:
+                self._l1.delete(realKey)
+
     def set(self, key, val, time=0):
         self._connect()
         time = self._processTime(time)
         Logger.get('GenericCache/%s' % self._namespace).debug('SET %r (%d)' % (key, time))
-        self._client.set(self._makeKey(key), _NoneValue.replace(val), time)
+        realKey = self._makeKey(key)
+        self._invalidateL1([realKey])
+        self._client.set(realKey, _NoneValue.replace(val), time)
+
+    def add(self, key, val, time=0):
+        """Sets `key` unless it already exists and returns whether it was set"""
+        self._connect()
+        time = self._processTime(time)
+        Logger.get('GenericCache/%s' % self._namespace).debug('ADD %r (%d)' % (key, time))
+        realKey = self._makeKey(key)
+        self._invalidateL1([realKey])
+        return bool(self._client.add(realKey, _NoneValue.replace(val), time))
+
+    def incr(self, key, delta=1):
+        """Atomically increments the integer stored in `key` (0 if missing)
+        and returns the new value"""
+        self._connect()
+        Logger.get('GenericCache/%s' % self._namespace).debug('INCR %r' % (key,))
+        realKey = self._makeKey(key)
+        self._invalidateL1([realKey])
+        res = self._client.incr(realKey, delta)
+        if res is None:
+            # memcached does not create missing keys; if someone else
+            # created it in the meantime, increment that one instead
+            if self._client.add(realKey, delta):
+                return delta
+            res = self._client.incr(realKey, delta)
+        return res
+
+    def touch(self, key, time=0):
+        """Renews the expiry of `key` without rewriting its value (unless
+        the backend does not support it) and returns whether it exists"""
+        self._connect()
+        time = self._processTime(time)
+        Logger.get('GenericCache/%s' % self._namespace).debug('TOUCH %r (%d)' % (key, time))
+        realKey = self._makeKey(key)
+        if hasattr(self._client, 'touch'):
+            return bool(self._client.touch(realKey, time))
+        # python-memcached versions without TOUCH support
+        val = self._client.get(realKey)
+        if val is None:
+            return False
+        self._client.set(realKey, val, time)
+        return True
+
+    def get_with_ttl(self, key, default=None):
+        """Returns the value of `key` (bypassing the L1 cache) and the
+        number of seconds until it expires (``None`` if unknown)"""
+        self._connect()
+        realKey = self._makeKey(key)
+        if hasattr(self._client, 'get_with_ttl'):
+            res, ttl = self._client.get_with_ttl(realKey)
+        else:
+            res, ttl = self._client.get(realKey), None
+        Logger.get('GenericCache/%s' % self._namespace).debug('GET %r -> %r (ttl: %r)' % (key, res is not None, ttl))
+        if res is None:
+            return default, None
+        return _NoneValue.restore(res), ttl
 
     def set_multi(self, mapping, time=0):
         self._connect()
         time = self._processTime(time)
         mapping = dict(((self._makeKey(key), _NoneValue.replace(val)) for key, val in mapping.iteritems()))
+        self._invalidateL1(mapping)
         self._client.set_multi(mapping, time)
 
-    def get(self, key, default=None):
+    def get(self, key, default=None, bypassL1=False):
+        """Returns the value of `key`.
+
+        With `bypassL1` the value is always read from the backend (and the
+        L1 cache updated with it), e.g. to check whether a value found to be
+        outdated has been refreshed by another process in the meantime.
+        """
         self._connect()
-        res = self._client.get(self._makeKey(key))
+        realKey = self._makeKey(key)
+        if self._l1TTL and not bypassL1:
+            res = self._l1.get(realKey)
+            if res is not None:
+                Logger.get('GenericCache/%s' % self._namespace).debug('GET %r -> L1' % (key,))
+                self._count(l1=1)
+                return _NoneValue.restore(res)
+        res = self._client.get(realKey)
         Logger.get('GenericCache/%s' % self._namespace).debug('GET %r -> %r' % (key, res is not None))
+        if self._l1TTL:
+            if res is None:
+                self._count(misses=1)
+            else:
+                self._count(l2=1)
+                self._l1.set(realKey, res, self._l1TTL)
         if res is None:
             return default
         return _NoneValue.restore(res)
@@ -546,7 +1103,22 @@ class GenericCache(object):
     def get_multi(self, keys, default=None, asdict=True):
         self._connect()
         real_keys = map(self._makeKey, keys)
-        data = self._client.get_multi(real_keys)
+        if self._l1TTL:
+            data = {}
+            for real_key in real_keys:
+                res = self._l1.get(real_key)
+                if res is not None:
+                    data[real_key] = res
+            missing = [real_key for real_key in real_keys if real_key not in data]
+            fetched = self._client.get_multi(missing) if missing else {}
+            for real_key, res in fetched.iteritems():
+                if res is not None:
+                    data[real_key] = res
+                    self._l1.set(real_key, res, self._l1TTL)
+            l2Hits = sum(1 for res in fetched.itervalues() if res is not None)
+            self._count(l1=len(real_keys) - len(missing), l2=l2Hits, misses=len(missing) - l2Hits)
+        else:
+            data = self._client.get_multi(real_keys)
         # Add missing keys
         for real_key in real_keys:
             if real_key not in data:
@@ -561,9 +1133,12 @@ class GenericCache(object):
     def delete(self, key):
         self._connect()
         Logger.get('GenericCache/%s' % self._namespace).debug('DEL %r' % key)
-        self._client.delete(self._makeKey(key))
+        realKey = self._makeKey(key)
+        self._invalidateL1([realKey])
+        self._client.delete(realKey)
 
     def delete_multi(self, keys):
         self._connect()
         keys = map(self._makeKey, keys)
+        self._invalidateL1(keys)
         self._client.delete_multi(keys)
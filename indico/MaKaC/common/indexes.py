@@ -28,7 +28,7 @@ from datetime import datetime, timedelta
 import pytz
 from persistent import Persistent
 from BTrees.IOBTree import IOBTree
-from BTrees.OOBTree import OOBTree, OOSet
+from BTrees.OOBTree import OOBTree, OOSet, OOTreeSet, intersection
 from whoosh.filedb.filestore import FileStorage
 from whoosh.fields import Schema, ID, TEXT, DATETIME
 from whoosh.qparser import QueryParser
@@ -54,13 +54,100 @@ BTREE_MAX_INT = 0x7FFFFFFF
 BTREE_MIN_INT = -0x80000000
 
 
+class TrigramIndex(Persistent):
+    """Maps the trigrams of the accent-folded, lower-case form of words to the
+    words containing them.
+
+    Substring and prefix lookups intersect the posting lists of the trigrams
+    of the searched value instead of scanning all words.  The results are
+    candidates which still have to be checked against the actual criteria,
+    but they are guaranteed to contain every word containing the value.
+    """
+
+    # markers for the beginning and the end of a word; a word is padded with
+    # two end markers so every substring of one or two characters is the
+    # beginning of at least one trigram
+    START = u'\x02'
+    END = u'\x03'
+
+    def __init__(self):
+        self._trigrams = OOBTree()
+
+    @staticmethod
+    def fold(word):
+        if not isinstance(word, unicode):
+            word = word.decode('utf-8', 'replace')
+        return remove_accents(word, reencode=False).lower()
+
+    @staticmethod
+    def _trigramsOf(text):
+        return set(text[i:i + 3].encode('utf-8') for i in xrange(len(text) - 2))
+
+    def _wordTrigrams(self, word):
+        return self._trigramsOf(self.START + self.fold(word) + self.END * 2)
+
+    def index(self, word):
+        for trigram in self._wordTrigrams(word):
+            words = self._trigrams.get(trigram)
+            if words is None:
+                words = self._trigrams[trigram] = OOTreeSet()
+            words.insert(word)
+
+    def unindex(self, word):
+        for trigram in self._wordTrigrams(word):
+            words = self._trigrams.get(trigram)
+            if words is not None and word in words:
+                words.remove(word)
+                if not words:
+                    del self._trigrams[trigram]
+
+    def _withPrefix(self, prefix):
+        # all words having a trigram starting with `prefix`
+        prefix = prefix.encode('utf-8')
+        result = set()
+        for words in self._trigrams.itervalues(prefix, prefix + '\xff'):
+            result.update(words)
+        return result
+
+    def search(self, value, prefix=False):
+        """Returns the words which may contain `value` (or start with it)"""
+        value = self.fold(value)
+        if prefix:
+            value = self.START + value
+        if not value:
+            return set()
+        elif len(value) < 3:
+            return self._withPrefix(value)
+
+        postings = []
+        for trigram in self._trigramsOf(value):
+            words = self._trigrams.get(trigram)
+            if words is None:
+                return set()
+            postings.append(words)
+        # intersect starting with the shortest posting list
+        postings.sort(key=len)
+        result = postings[0]
+        for words in postings[1:]:
+            result = intersection(result, words)
+            if not result:
+                break
+        return set(result)
+
+
 class Index(Persistent):
     _name = ""
+    # whether the index keeps a trigram index of its keys for substring searches
+    _trigramIndexed = False
+    # indexes created before trigram support do not have one until it is built
+    _trigrams = None
 
     def __init__( self, name='' ):
         if name != '':
             self._name = name
         self._words = {}
+        if self._trigramIndexed:
+            self._trigrams = TrigramIndex()
 
     def getLength( self ):
         """ Length of an index.
@@ -84,6 +171,23 @@ class Index(Persistent):
         letters.sort()
         return letters
 
+    def buildTrigramIndex(self):
+        """(Re)builds the trigram index of the keys of this index"""
+        trigrams = TrigramIndex()
+        for key, items in self._words.iteritems():
+            if items:
+                trigrams.index(key)
+        self._trigrams = trigrams
+
+    def _candidateKeys(self, value, prefix=False):
+        """Returns the keys that may match `value`.
+
+        Uses the trigram index if available, otherwise all keys.
+        """
+        if self._trigrams is None:
+            return self._words.iterkeys()
+        return self._trigrams.search(value, prefix=prefix)
+
     def _addItem( self, value, item ):
         if value != "":
             words = self._words
@@ -92,6 +196,8 @@ class Index(Persistent):
                     words[value].append(item)
             else:
                 words[value] = [ item ]
+            if self._trigrams is not None and len(words[value]) == 1:
+                self._trigrams.index(value)
             self.setIndex(words)
 
     def _withdrawItem( self, value, item ):
@@ -99,6 +205,8 @@ class Index(Persistent):
             if item in self._words[value]:
                 words = self._words
                 words[value].remove(item)
+                if self._trigrams is not None and not words[value]:
+                    self._trigrams.unindex(value)
                 self.setIndex(words)
 
     def matchFirstLetter(self, letter, accent_sensitive=True):
@@ -108,7 +216,9 @@ class Index(Persistent):
         if not accent_sensitive:
             cmpLetter = remove_accents(cmpLetter)
 
-        for key in self.getKeys():
+        for key in self._candidateKeys(letter, prefix=True):
+            if key not in self._words:
+                continue
             uletter = key.decode('utf8')[0].lower()
             if not accent_sensitive:
                 uletter = remove_accents(uletter)
@@ -134,8 +244,8 @@ class Index(Persistent):
             if cs == 0:
                 cmpValue = cmpValue.lower()
 
-            for key in self._words.iterkeys():
-                if len(self._words[key]) != 0:
+            for key in self._candidateKeys(value, prefix=False):
+                if key in self._words and len(self._words[key]) != 0:
                     cmpKey = key
                     if not accent_sensitive:
                         cmpKey = remove_accents(cmpKey)
@@ -159,6 +269,7 @@ class Index(Persistent):
 
 class EmailIndex(Index):
     _name = "email"
+    _trigramIndexed = True
 
     def indexUser(self, user):
         for email in user.getEmails():
@@ -172,9 +283,25 @@ class EmailIndex(Index):
         """this match is an approximative case insensitive match"""
         return self._match(email, cs, exact)
 
+    def matchUsers(self, emails):
+        """Exact case insensitive lookup of several emails at once.
+
+        Returns a dict mapping each email that was found to its user ids.
+        Emails are stored in lowercase, so they are looked up directly
+        instead of scanning the index once per email.
+        """
+        result = {}
+        for email in emails:
+            userIds = self._words.get(email.strip().lower())
+            userIds = [userId for userId in userIds or [] if userId != '']
+            if userIds:
+                result[email] = userIds
+        return result
+
 
 class NameIndex(Index):
     _name = "name"
+    _trigramIndexed = True
 
     def indexUser(self, user):
         name = user.getName()
@@ -191,6 +318,7 @@ class NameIndex(Index):
 
 class SurNameIndex(Index):
     _name = "surName"
+    _trigramIndexed = True
 
     def indexUser(self, user):
         surName = user.getSurName()
@@ -207,6 +335,7 @@ class SurNameIndex(Index):
 
 class OrganisationIndex(Index):
     _name = "organisation"
+    _trigramIndexed = True
 
     def indexUser(self, user):
         org = user.getOrganisation()
@@ -261,22 +390,31 @@ class GroupIndex(Index):
 
 
 class CategoryIndex(Persistent):
+    """Index of the ids of the events visible in each category.
+
+    The ids are kept in a `OOTreeSet` per category, so events created at the
+    same time in the same category do not cause conflicts (a list would be
+    rewritten on every change).
+    """
 
     def __init__( self ):
         self._idxCategItem = OOBTree()
 
     def dump(self):
-        return list(self._idxCategItem.items())
+        return [(categid, list(confs)) for categid, confs in self._idxCategItem.items()]
+
+    def _getConfIds(self, categid, create=False):
+        res = self._idxCategItem.get(categid)
+        if isinstance(res, list):
+            # not migrated yet
+            res = self._idxCategItem[categid] = OOTreeSet(res)
+        elif res is None and create:
+            res = self._idxCategItem[categid] = OOTreeSet()
+        return res
 
     def _indexConfById(self, categid, confid):
         # only the more restrictive setup is taken into account
-        categid = str(categid)
-        if self._idxCategItem.has_key(categid):
-            res = self._idxCategItem[categid]
-        else:
-            res = []
-        res.append(confid)
-        self._idxCategItem[categid] = res
+        self._getConfIds(str(categid), create=True).insert(confid)
 
     def unindexConf(self, conf):
         confid = str(conf.getId())
@@ -285,9 +423,7 @@ class CategoryIndex(Persistent):
     def unindexConfById(self, confid):
         for categid in self._idxCategItem.keys():
             if confid in self._idxCategItem[categid]:
-                res = self._idxCategItem[categid]
-                res.remove(confid)
-                self._idxCategItem[categid] = res
+                self._getConfIds(categid).remove(confid)
 
     def reindexCateg(self, categ):
         for subcat in categ.getSubCategoryList():
@@ -312,10 +448,15 @@ class CategoryIndex(Persistent):
     def getItems(self, categid):
         categid = str(categid)
         if self._idxCategItem.has_key(categid):
-            return self._idxCategItem[categid]
+            return list(self._idxCategItem[categid])
         else:
             return []
 
+    def migrate(self):
+        """Converts the lists of ids of older versions to sets"""
+        for categid in list(self._idxCategItem.keys()):
+            self._getConfIds(categid)
+
     def _check(self, dbi=None):
         """
         Performs some sanity checks
@@ -650,7 +791,6 @@ class CalendarDayIndex(Persistent):
 
     def indexConf(self, conf):
         # Note: conf can be any object which has getEndDate() and getStartDate() methods
-        self._idxDay._p_changed = True
         days = (conf.getEndDate().date() - conf.getStartDate().date()).days
         startDate = datetime(conf.getStartDate().year, conf.getStartDate().month, conf.getStartDate().day)
         for day in range(days + 1):
@@ -666,7 +806,6 @@ class CalendarDayIndex(Persistent):
 
     def unindexConf( self, conf):
         # Note: conf can be any object which has getEndDate() and getStartDate() methods
-        self._idxDay._p_changed = True
         days = (conf.getEndDate().date() - conf.getStartDate().date()).days
         startDate = datetime(conf.getStartDate().year, conf.getStartDate().month, conf.getStartDate().day)
         for dayNumber in range(days + 1):
@@ -976,12 +1115,12 @@ class CategoryDateIndex(Persistent):
 
     def _indexConf(self, categid, conf):
         # only the more restrictive setup is taken into account
+        # (the tree is only modified for new categories to avoid conflicts)
         if categid in self._idxCategItem:
             res = self._idxCategItem[categid]
         else:
-            res = CalendarIndex()
+            res = self._idxCategItem[categid] = CalendarIndex()
         res.indexConf(conf)
-        self._idxCategItem[categid] = res
 
     # TOREMOVE?? defined in CategoryDayIndex
     def indexConf(self, conf):
@@ -1051,12 +1190,12 @@ class CategoryDayIndex(CategoryDateIndex):
 
     def _indexConf(self, categid, conf):
         # only the more restrictive setup is taken into account
+        # (the tree is only modified for new categories to avoid conflicts)
         if self._idxCategItem.has_key(categid):
             res = self._idxCategItem[categid]
         else:
-            res = CalendarDayIndex()
+            res = self._idxCategItem[categid] = CalendarDayIndex()
         res.indexConf(conf)
-        self._idxCategItem[categid] = res
 
     def reindexConf(self, conf):
         self.unindexConf(conf)
@@ -1281,6 +1420,9 @@ class TextIndex(IntStringMappedIndex):
 
 class WhooshTextIndex(object):
 
+    # seconds to wait for the write lock held by another writer
+    WRITER_TIMEOUT = 30
+
     def __init__(self, index_name):
 
         if Config.getInstance().getWhooshBackend() == 'redis':
@@ -1310,8 +1452,11 @@ class WhooshTextIndex(object):
         searcher.close()
         return exist_key
 
+    def _writer(self, **kwargs):
+        return self._textIdx.writer(timeout=self.WRITER_TIMEOUT, **kwargs)
+
     def _index(self, obj):
-        with self._textIdx.writer() as writer:
+        with self._writer() as writer:
             writer.add_document(id=obj.getId().decode('utf-8'), content=obj.getTitle().decode('utf-8'))
 
     @run_after_commit
@@ -1323,7 +1468,7 @@ class WhooshTextIndex(object):
     @run_after_commit
     def unindex(self, obj):
         if obj.getId() in self:
-            with self._textIdx.writer() as writer:
+            with self._writer() as writer:
                 writer.delete_by_term("id", obj.getId().decode('utf-8'))
         else:
             Logger.get('indexes.text').error("No such entry {0}".format(obj.getId()))
@@ -1335,18 +1480,18 @@ class WhooshTextIndex(object):
             return [(record["id"], record["content"]) for record in searcher.search(query, limit=limit)]
 
     def clear(self):
-        with self._textIdx.writer() as writer:
+        with self._writer() as writer:
             writer.mergetype = writing.CLEAR
 
     def initialize(self, dbi, list):
-        writer = self._textIdx.writer(limitmb=512)
+        writer = self._writer(limitmb=512)
         i = 0
         for obj in list:
             writer.add_document(id=obj.getId().decode('utf-8'), content=obj.getTitle().decode('utf-8'))
             if i % 20000 == 19999:
                 writer.commit()
                 dbi.sync()
-                writer = self._textIdx.writer(limitmb=512)
+                writer = self._writer(limitmb=512)
             i += 1
         writer.commit(optimize=True)
 
@@ -1357,7 +1502,7 @@ class WhooshConferenceIndex(WhooshTextIndex):
         return Schema(id=ID(unique=True, stored=True), content=TEXT(stored=True), start_date=DATETIME(sortable=True))
 
     def _index(self, obj):
-        with self._textIdx.writer() as writer:
+        with self._writer() as writer:
             writer.add_document(id=obj.getId().decode('utf-8'), content=obj.getTitle().decode('utf-8'),
                                 start_date=obj.getStartDate())
 
@@ -1372,7 +1517,7 @@ class WhooshConferenceIndex(WhooshTextIndex):
         return results
 
     def initialize(self, dbi, list):
-        writer = self._textIdx.writer(limitmb=512)
+        writer = self._writer(limitmb=512)
         i = 0
         for obj in list:
             writer.add_document(id=obj.getId().decode('utf-8'), content=obj.getTitle().decode('utf-8'),
@@ -1380,7 +1525,7 @@ class WhooshConferenceIndex(WhooshTextIndex):
             if i % 20000 == 19999:
                 writer.commit()
                 dbi.sync()
-                writer = self._textIdx.writer(limitmb=512)
+                writer = self._writer(limitmb=512)
             i += 1
         writer.commit(optimize=True)
 
@@ -18,6 +18,9 @@
 ## along with Indico;if not, see <http://www.gnu.org/licenses/>.
 
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.mime.text import MIMEText
@@ -34,8 +37,127 @@ from MaKaC.common.contextManager import ContextManager
 charset.add_charset('utf-8', charset.SHORTEST)
 
 
+class SMTPConnectionPool(object):
+    """Keeps connections to the SMTP server open so they can be reused for
+    several messages.
+
+    At most `size` connections are used at the same time; a connection is
+    closed once it has sent `maxMessages` messages or has been idle for more
+    than `idleTimeout` seconds, since servers tend to drop them anyway.
+    """
+
+    def __init__(self, server, useTLS=False, login=None, password=None, size=2, maxMessages=100, idleTimeout=30):
+        self._server = server
+        self._useTLS = useTLS
+        self._login = login
+        self._password = password
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, messages sent, last use)
+        self._maxMessages = maxMessages
+        self._idleTimeout = idleTimeout
+
+    def _connect(self):
+        server = smtplib.SMTP(*self._server)
+        if self._useTLS:
+            server.ehlo()
+            (code, errormsg) = server.starttls()
+            if code != 220:
+                raise MaKaCError( _("Can't start secure connection to SMTP server: %d, %s")%(code, errormsg))
+        if self._login:
+            (code, errormsg) = server.login(self._login, self._password)
+            if code != 235:
+                raise MaKaCError( _("Can't login on SMTP server: %d, %s")%(code, errormsg))
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, IOError):
+            server.close()
+
+    def _getIdle(self):
+        now = time.time()
+        with self._lock:
+            while self._idle:
+                server, sent, lastUse = self._idle.pop()
+                if now - lastUse < self._idleTimeout:
+                    return server, sent
+                self._close(server)
+        return None, 0
+
+    @contextmanager
+    def connection(self):
+        """Yields an SMTP connection, reusing an idle one if possible.
+
+        The connection is only put back into the pool if no error occurred.
+        """
+        self._slots.acquire()
+        try:
+            server, sent = self._getIdle()
+            if server is None:
+                server = self._connect()
+            try:
+                yield server
+            except:
+                self._close(server)
+                raise
+            sent += 1
+            if sent >= self._maxMessages:
+                self._close(server)
+            else:
+                with self._lock:
+                    self._idle.append((server, sent, time.time()))
+        finally:
+            self._slots.release()
+
+    def hasIdleConnections(self):
+        with self._lock:
+            return bool(self._idle)
+
+    def close(self):
+        """Closes all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, sent, lastUse in idle:
+            self._close(server)
+
+
+class RateLimiter(object):
+    """Makes sure no more than `rate` actions per second are performed"""
+
+    def __init__(self, rate):
+        self._interval = 1.0 / rate if rate else 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+
 class GenericMailer:
 
+    _pool = None
+    _poolLock = threading.Lock()
+
+    @classmethod
+    def getConnectionPool(cls):
+        """Returns the SMTP connection pool shared by the whole process"""
+        with cls._poolLock:
+            if cls._pool is None:
+                cfg = Config.getInstance()
+                cls._pool = SMTPConnectionPool(cfg.getSmtpServer(), cfg.getSmtpUseTLS(), cfg.getSmtpLogin(),
+                                               cfg.getSmtpPassword(), cfg.getSmtpPoolSize())
+            return cls._pool
+
     @classmethod
     def send(cls, notification, skipQueue=False):
         if isinstance(notification, dict):
@@ -47,11 +169,21 @@ class GenericMailer:
         mailData = cls._prepare(notification)
 
         if mailData:
-            if skipQueue or not rh:
+            if not skipQueue and cls._useOutbox():
+                # stored together with the other changes of the transaction
+                # and delivered once it has been committed
+                from indico.modules.outbox import MailOutboxModule
+                MailOutboxModule.getDBInstance().enqueue(mailData)
+            elif skipQueue or not rh:
                 cls._send(mailData)
             else:
                 ContextManager.setdefault('emailQueue', []).append(mailData)
 
+    @staticmethod
+    def _useOutbox():
+        from indico.core.db import DBMgr
+        return Config.getInstance().getMailOutbox() and DBMgr.getInstance().isConnected()
+
     @classmethod
     def flushQueue(cls, send):
         queue = ContextManager.get('emailQueue', None)
@@ -114,30 +246,32 @@ class GenericMailer:
             'fromAddr': fromAddr,
         }
 
-    @staticmethod
-    def _send(msgData):
-        server=smtplib.SMTP(*Config.getInstance().getSmtpServer())
-        if Config.getInstance().getSmtpUseTLS():
-            server.ehlo()
-            (code, errormsg) = server.starttls()
-            if code != 220:
-                raise MaKaCError( _("Can't start secure connection to SMTP server: %d, %s")%(code, errormsg))
-        if Config.getInstance().getSmtpLogin():
-            login = Config.getInstance().getSmtpLogin()
-            password = Config.getInstance().getSmtpPassword()
-            (code, errormsg) = server.login(login, password)
-            if code != 235:
-                raise MaKaCError( _("Can't login on SMTP server: %d, %s")%(code, errormsg))
-
-        # XXX: Does this actually use BCC/CC properly?!
-        to_addrs = set(msgData['toList']) | set(msgData['ccList']) | set(msgData['bccList'])
+    @classmethod
+    def _send(cls, msgData, pool=None):
         try:
-            Logger.get('mail').info("Mailing %s  CC: %s" % (msgData['toList'], msgData['ccList']))
-            server.sendmail(msgData['fromAddr'], to_addrs, msgData['msg'])
+            cls._sendmail(msgData, pool or cls.getConnectionPool())
         except smtplib.SMTPRecipientsRefused,e:
-            server.quit()
             raise MaKaCError("Email address is not valid: %s" % e.recipients)
-        server.quit()
+
+    @staticmethod
+    def _sendmail(msgData, pool):
+        """Sends a prepared e-mail using a connection from `pool`"""
+        # XXX: Does this actually use BCC/CC properly?!
+        to_addrs = set(msgData['toList']) | set(msgData['ccList']) | set(msgData['bccList'])
+        Logger.get('mail').info("Mailing %s  CC: %s" % (msgData['toList'], msgData['ccList']))
+        # an idle connection may have been dropped by the server in the meantime
+        retry = pool.hasIdleConnections()
+        while True:
+            try:
+                with pool.connection() as server:
+                    server.sendmail(msgData['fromAddr'], to_addrs, msgData['msg'])
+                break
+            except smtplib.SMTPServerDisconnected:
+                if not retry:
+                    raise
+                # the other idle connections are most likely dead as well
+                pool.close()
+                retry = False
         Logger.get('mail').info('Mail sent to %s' % msgData['toList'])
 
     @classmethod
@@ -33,7 +33,7 @@ import MaKaC.schedule as schedule
 import MaKaC.webcast as webcast
 import MaKaC.webinterface.urlHandlers as urlHandlers
 from MaKaC.webinterface.linking import RoomLinker
-from xmlGen import XMLGen
+from xmlGen import StreamingXMLGen
 import os
 from math import ceil
 from MaKaC.i18n import _
@@ -84,7 +84,7 @@ class outputGenerator(Observable):
         if XG != None:
             self._XMLGen = XG
         else:
-            self._XMLGen = XMLGen()
+            self._XMLGen = StreamingXMLGen()
         self._config = Config.getInstance()
         self.text = ""
         self.time_XML = 0
@@ -1047,7 +1047,7 @@ class outputGenerator(Observable):
         if obj:
             xml = obj.getContent()
         else:
-            temp = XMLGen(init=False)
+            temp = StreamingXMLGen(init=False)
             self._confToXML(conf,
                             None,
                             includeSession,
@@ -1080,7 +1080,7 @@ class outputGenerator(Observable):
             xml = obj.getContent()
         else:
             # No cache, build the XML
-            temp = XMLGen(init=False)
+            temp = StreamingXMLGen(init=False)
             self._confToXMLMarc21(conf,includeSession,includeContribution,includeMaterial, out=temp)
             xml = temp.getXml()
             # save XML in cache
@@ -1247,7 +1247,7 @@ class outputGenerator(Observable):
             xml = obj.getContent()
         else:
             # No cache, build the XML
-            temp = XMLGen(init=False)
+            temp = StreamingXMLGen(init=False)
             self._contribToXMLMarc21(cont,includeMaterial, out=temp)
             xml = temp.getXml()
             # save XML in cache
@@ -1421,7 +1421,7 @@ class outputGenerator(Observable):
             xml = obj.getContent()
         else:
             # No cache, build the XML
-            temp = XMLGen(init=False)
+            temp = StreamingXMLGen(init=False)
             self._subContribToXMLMarc21(subCont,includeMaterial, out=temp)
             xml = temp.getXml()
             # save XML in cache
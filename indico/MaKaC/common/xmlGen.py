@@ -98,3 +98,109 @@ class XMLGen:
             else:
                 cm.append(chr(c))
         return str(text).translate("".join(cm))
+
+
+# characters which are not allowed in XML documents are replaced with spaces
+_CLEAN_TABLE = ''.join(' ' if c < 0x20 and chr(c) not in '\t\r\n' else chr(c) for c in range(256))
+
+
+class StreamingXMLGen(XMLGen):
+    """
+    Faster drop-in replacement for `XMLGen` producing exactly the same XML.
+
+    The escaping tables are only built once and indentation is written as
+    a single string.  If a `stream` (any object with a `write` method,
+    e.g. a file or a socket wrapped with `makefile`) is given, the XML is
+    written to it in chunks of about `bufferSize` bytes instead of being
+    kept in memory; `getXml` then only flushes the pending data and
+    returns an empty string.
+    """
+
+    def __init__(self, init=True, stream=None, bufferSize=65536):
+        self._stream = stream
+        self._bufferSize = bufferSize
+        self._buffered = 0
+        XMLGen.__init__(self, init=init)
+
+    def _write(self, data):
+        self.xml.append(data)
+        if self._stream is not None:
+            self._buffered += len(data)
+            if self._buffered >= self._bufferSize:
+                self.flush()
+
+    def flush(self):
+        """Writes the pending data to the stream"""
+        if self._stream is not None and self.xml:
+            self._stream.write(''.join(self.xml))
+            del self.xml[:]
+            self._buffered = 0
+
+    def initXml(self):
+        self.xml = []
+        self._write('''<?xml version="1.0" encoding="UTF-8"?>\n''')
+
+    def getXml(self):
+        if self._stream is not None:
+            self.flush()
+            return ''
+        return ''.join(self.xml)
+
+    def escapeString(self, text):
+        try:
+            if type(text) is not str:
+                text = str(text)
+            if self._sourceEncoding != 'utf-8':
+                text = text.decode(self._sourceEncoding).encode('utf-8')
+            else:
+                # valid utf-8 does not need to be re-encoded
+                text.decode('utf-8')
+        except Exception:
+            try:
+                text = text.decode('iso-8859-1').encode('utf-8')
+            except Exception:
+                return ''
+        return text.replace('&', '&amp;').replace('>', '&gt;').replace('<', '&lt;')
+
+    def openTag(self, name, listAttrib=[], single=False):
+        if listAttrib:
+            attrs = ''.join(' %s=%s' % (att[0], saxutils.quoteattr(self.escapeString(att[1])))
+                            for att in listAttrib)
+        else:
+            attrs = ''
+        self._write('%s<%s%s>%s' % (' ' * self.indent, name, attrs, '' if single else '\r\n'))
+        self.indent += 1
+
+    def closeTag(self, name, single=False):
+        self.indent -= 1
+        if single:
+            self._write('</%s>\r\n' % name)
+        else:
+            self._write('%s</%s>\r\n' % (' ' * self.indent, name))
+
+    def writeText(self, text, single=False):
+        if text != "":
+            self._write(self.escapeString(self.cleanText(text)))
+        if not single:
+            self._write('\r\n')
+
+    def writeTag(self, name, value, ListAttrib=[]):
+        # same as openTag/writeText/closeTag, but written at once
+        if ListAttrib:
+            attrs = ''.join(' %s=%s' % (att[0], saxutils.quoteattr(self.escapeString(att[1])))
+                            for att in ListAttrib)
+        else:
+            attrs = ''
+        text = self.escapeString(self.cleanText(value)) if value != "" else ''
+        self._write('%s<%s%s>%s</%s>\r\n' % (' ' * self.indent, name, attrs, text, name))
+
+    def writeComment(self, commentText):
+        self._write('<!-- ')
+        self.writeText(commentText, True)
+        self._write(' -->\r\n')
+
+    def writeXML(self, text):
+        self._write(text)
+
+    def cleanText(self, text):
+        return str(text).translate(_CLEAN_TABLE)
@@ -64,6 +64,7 @@ from pytz import timezone
 from pytz import all_timezones
 
 from persistent import Persistent
+from BTrees.Length import Length
 from BTrees.OOBTree import OOBTree, OOTreeSet
 from BTrees.OIBTree import OIBTree,OISet,union
 import MaKaC
@@ -308,6 +309,9 @@ class CategoryManager(ObjectHolder):
         nameIdx = indexes.IndexesHolder().getIndex('categoryName')
         nameIdx.unindex(category)
         Catalog.getIdx('categ_conf_sd').remove_category(category.getId())
+        attrIdx = Catalog.getIdx('categ_conf_attrs')
+        if attrIdx is not None:
+            attrIdx.remove_category(category.getId())
 
     def _newId(self):
         """
@@ -347,7 +351,7 @@ class Category(CommonObjectBase):
         self.subcategories = {}
         self.materials = {}
         self.conferences = OOTreeSet()
-        self._numConferences = 0
+        self._numConferences = Length()
         self.owner = None
         self._defaultStyle = {"simple_event": "", "meeting": ""}
         self._order = 0
@@ -1013,6 +1017,12 @@ class Category(CommonObjectBase):
         catDateIdx.indexCateg(self)
         catDateAllIdx.indexCateg(self)
 
+        # the events of this category now have different parent categories
+        attrIdx = Catalog.getIdx('categ_conf_attrs')
+        if attrIdx is not None:
+            for conf in self.iterAllConferences():
+                attrIdx.index_obj(conf)
+
         self._notify('moved', oldOwner, newOwner)
 
     def getName(self):
@@ -1090,19 +1100,24 @@ class Category(CommonObjectBase):
     def _incNumConfs(self, num=1):
         """Increases the number of conferences for the current category in a given number.
             WARNING: Only Categories must use this method!!!"""
-        self._numConferences = self.getNumConferences()
-        self._numConferences += num
+        self._getNumConfsCounter().change(num)
         if self.getOwner() is not None:
             self.getOwner()._incNumConfs(num)
 
     def _decNumConfs(self, num=1):
         """Decreases the number of conferences for the current category in a given number.
             WARNING: Only Categories must use this method!!!"""
-        self._numConferences = self.getNumConferences()
-        self._numConferences -= num
+        self._getNumConfsCounter().change(-num)
         if self.getOwner() is not None:
             self.getOwner()._decNumConfs(num)
 
+    def _getNumConfsCounter(self):
+        # categories which were not migrated yet store the number as an integer
+        num = self.getNumConferences()
+        if not isinstance(self._numConferences, Length):
+            self._numConferences = Length(num)
+        return self._numConferences
+
     def _addConference(self, newConf):
         if len(self.subcategories) > 0:
             raise MaKaCError(_("Cannot add event: the current category already contains some sub-categories"), _("Category"))
@@ -1240,7 +1255,7 @@ class Category(CommonObjectBase):
             raise AttributeError("Unknown argument value: '%s'" % which)
 
     def _setNumConferences(self):
-        self._numConferences = 0
+        self._numConferences = Length()
         if self.conferences:
             self._incNumConfs(len(self.conferences))
         else:
@@ -1254,14 +1269,14 @@ class Category(CommonObjectBase):
         #   conferences. However, it will give non accurate results for
         #   conferences within many categories (a conference will be counted
         #   twice in parent categories).
-        #   Besides this approach will generate much more conflict errors. This
-        #   can be reduced by simply isolating the counter in a separate object.
+        #   The counter is kept in a separate `Length` object, which resolves
+        #   conflicts between concurrent changes of the number.
         try:
-            if self._numConferences:
-                pass
+            num = self._numConferences
         except AttributeError:
             self._setNumConferences()
-        return self._numConferences
+            num = self._numConferences
+        return num() if isinstance(num, Length) else num
 
     def _getRepository(self):
         dbRoot = DBMgr.getInstance().getDBConnection().root()
@@ -2378,6 +2393,9 @@ class Conference(CommonObjectBase, Locatable):
         nameIdx.index(self)
 
         Catalog.getIdx('categ_conf_sd').index_obj(self)
+        attrIdx = Catalog.getIdx('categ_conf_attrs')
+        if attrIdx is not None:
+            attrIdx.index_obj(self)
 
     def unindexConf( self ):
         calIdx = indexes.IndexesHolder().getIndex('calendar')
@@ -2390,6 +2408,9 @@ class Conference(CommonObjectBase, Locatable):
         nameIdx.unindex(self)
 
         Catalog.getIdx('categ_conf_sd').unindex_obj(self)
+        attrIdx = Catalog.getIdx('categ_conf_attrs')
+        if attrIdx is not None:
+            attrIdx.unindex_obj(self)
 
     def __generateNewContribTypeId( self ):
         """Returns a new unique identifier for the current conference sessions
@@ -2534,6 +2555,11 @@ class Conference(CommonObjectBase, Locatable):
         if raiseEvent:
             self._notify('infoChanged')
 
+        # e.g. the location or room may have changed
+        attrIdx = Catalog.getIdx('categ_conf_attrs')
+        if attrIdx is not None:
+            attrIdx.reindex_obj(self)
+
         self.cleanCache()
         self._p_changed=1
 
@@ -5866,7 +5892,9 @@ class Session(CommonObjectBase, Locatable):
                not self.getConference().getEnableSessionSlots() and \
                self.getSlotList() != [] and \
                self.getSlotList()[0].getStartDate() != newDate:
-            self.getSlotList()[0].startDate = newDate
+            slot = self.getSlotList()[0]
+            slot.startDate = newDate
+            slot.reindexSchEntries()
 
         if check == 1:
             self._checkInnerSchedule()
@@ -6950,6 +6978,15 @@ class SessionSlot(Persistent, Observable, Fossilizable, Locatable):
                 se = slotEntry.getOwner()
                 se.startDate = se.getStartDate() + diff
         self.getSchedule().reSchedule()
+        self.reindexSchEntries()
+
+    def reindexSchEntries(self):
+        """Updates the position of the slot in the session and conference
+           timetables after its start date has been changed directly
+        """
+        for schEntry in (self.getSessionSchEntry(), self.getConfSchEntry()):
+            if schEntry.getSchedule() is not None:
+                schEntry.getSchedule().reindexEntry(schEntry)
 
     def verifyStartDate(self, sDate,check=2):
         """check parameter:
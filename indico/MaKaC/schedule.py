@@ -20,7 +20,10 @@
 """
 """
 import copy
+from contextlib import contextmanager
 from persistent import Persistent
+from BTrees.IOBTree import IOBTree
+from BTrees.OOBTree import OOBTree
 from datetime import datetime,timedelta
 from MaKaC.common.Counter import Counter
 from MaKaC.errors import MaKaCError, TimingError, ParentTimingError,\
@@ -86,6 +89,8 @@ class TimeSchedule(Schedule, Persistent):
         self._owner=owner
         self._entryGen=Counter()
         self._allowParallel=True
+        self._entriesById=OOBTree()
+        self._dayIndex=IOBTree()
 
     def notifyModification(self):
         self.getOwner().notifyModification()
@@ -192,9 +197,18 @@ class TimeSchedule(Schedule, Persistent):
                 (entry.getEndDate()<self.getStartDate('UTC') or \
                 entry.getEndDate()>self.getEndDate('UTC')):
             raise TimingError( _("Cannot schedule this entry because its end date (%s) is after its parents (%s)")%(entry.getAdjustedEndDate(),self.getAdjustedEndDate()), _("Add Entry"))
-        self._entries.append(entry)
-        entry.setSchedule(self,self._getNewEntryId())
-        self.reSchedule()
+        if self.isIndexed() and self._allowParallel:
+            # the entry list is kept sorted so there is no need to sort it
+            # again (and rebuild the day index) for every single entry
+            self._entries.insert(self._findEntryPosition(self._entries, entry), entry)
+            entry.setSchedule(self,self._getNewEntryId())
+            self._indexEntry(entry)
+        else:
+            self._entries.append(entry)
+            entry.setSchedule(self,self._getNewEntryId())
+            self.reSchedule()
+            if self.isIndexed():
+                self._entriesById[entry.getId()] = entry
         self._cleanCache(entry)
         self._p_changed = 1
 
@@ -213,6 +227,7 @@ class TimeSchedule(Schedule, Persistent):
     def _removeEntry(self,entry):
         self._cleanCache(entry)
         self._entries.remove(entry)
+        self._unindexEntry(entry)
         entry.setSchedule(None,"")
         entry.setStartDate(None)
         entry.delete()
@@ -275,6 +290,10 @@ class TimeSchedule(Schedule, Persistent):
                 pass
         except AttributeError:
             self._allowParallel=True
+        if getattr(self, '_v_deferReSchedule', False):
+            # moveEntriesBelow is shifting several entries; it sorts once
+            # all of them have been moved
+            return
         self._entries.sort(self.cmpEntries)
         lastEntry=None
         for entry in self._entries:
@@ -283,8 +302,163 @@ class TimeSchedule(Schedule, Persistent):
                     if lastEntry.collides(entry):
                         entry.setStartDate(lastEntry.getEndDate())
             lastEntry=entry
+        self._updateDayIndex()
+        self._p_changed = 1
+
+    ####################################
+    # Entry indexes                    #
+    ####################################
+
+    # Next to the sorted entry list, every schedule keeps an id -> entry
+    # BTree and a BTree mapping the ordinal of each UTC day to the sorted
+    # tuple of entries taking place (at least partially) on that day.
+    # Entry dates are changed through their owners, which call synchro() ->
+    # reSchedule() afterwards, so the day index is brought up to date there;
+    # code writing the start date of an owner directly has to call
+    # reindexEntry() instead. Schedules created before the indexes existed have
+    # them built by the migration (rebuildIndex(), which leaves the entry
+    # dates alone) and fall back to scanning the entry list until then.
+
+    def isIndexed(self):
+        return getattr(self, '_dayIndex', None) is not None
+
+    def rebuildIndex(self):
+        """(Re)builds the id and day indexes from the entry list.
+
+        Unlike reSchedule() it never changes the dates of the entries, even
+        if they collide in a schedule which does not allow parallel entries.
+        """
+        self._entriesById = OOBTree()
+        for entry in self._entries:
+            self._entriesById[entry.getId()] = entry
+        if not self.isIndexed():
+            self._dayIndex = IOBTree()
+        self._sortEntries()
+        self._updateDayIndex()
         self._p_changed = 1
 
+    def _sortEntries(self):
+        self._entries.sort(self.cmpEntries)
+
+    @contextmanager
+    def _deferredReSchedule(self):
+        """Sorts the entries (and updates the day index) only once after
+           the dates of several entries have been changed
+        """
+        self._v_deferReSchedule = True
+        try:
+            yield
+        finally:
+            self._v_deferReSchedule = False
+            self.reSchedule()
+
+    def _findEntryPosition(self, entries, entry):
+        """Returns the position where `entry` goes in the sorted `entries`"""
+        lo, hi = 0, len(entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.cmpEntries(entry, entries[mid]) < 0:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _getEntryDays(self, entry):
+        """Returns the ordinals of the UTC days covered by an entry"""
+        sDate = entry.getStartDate()
+        if sDate is None:
+            return []
+        eDate = entry.getEndDate()
+        if eDate is None or eDate < sDate:
+            eDate = sDate
+        utc = timezone('UTC')
+        return range(sDate.astimezone(utc).toordinal(),
+                     eDate.astimezone(utc).toordinal() + 1)
+
+    def _indexEntry(self, entry):
+        if not self.isIndexed():
+            return
+        self._entriesById[entry.getId()] = entry
+        for day in self._getEntryDays(entry):
+            bucket = list(self._dayIndex.get(day, ()))
+            bucket.insert(self._findEntryPosition(bucket, entry), entry)
+            self._dayIndex[day] = tuple(bucket)
+
+    def _unindexEntry(self, entry, moved=False):
+        """Removes an entry from the indexes.  If its dates changed since it
+           was indexed (`moved`), all the days are checked for it.
+        """
+        if not self.isIndexed():
+            return
+        if self._entriesById.get(entry.getId()) is entry:
+            del self._entriesById[entry.getId()]
+        days = [] if moved else [day for day in self._getEntryDays(entry) if entry in self._dayIndex.get(day, ())]
+        if not days:
+            # the entry is not indexed under its current dates
+            days = [day for day, bucket in self._dayIndex.iteritems() if entry in bucket]
+        for day in days:
+            bucket = tuple(e for e in self._dayIndex[day] if e is not entry)
+            if bucket:
+                self._dayIndex[day] = bucket
+            else:
+                del self._dayIndex[day]
+
+    def reindexEntry(self, entry):
+        """Puts an entry whose dates were changed without going through
+           synchro() (e.g. by writing the start date of its owner directly)
+           back at its place in the entry list and the day index
+        """
+        if entry not in self._entries:
+            return
+        self._entries.remove(entry)
+        self._entries.insert(self._findEntryPosition(self._entries, entry), entry)
+        self._unindexEntry(entry, moved=True)
+        self._indexEntry(entry)
+        self._p_changed = 1
+
+    def _updateDayIndex(self):
+        """Brings the day index in line with the (sorted) entry list,
+           only writing the days whose entries changed
+        """
+        if not self.isIndexed():
+            return
+        buckets = {}
+        for entry in self._entries:
+            for day in self._getEntryDays(entry):
+                buckets.setdefault(day, []).append(entry)
+        for day in list(self._dayIndex.keys()):
+            if day not in buckets:
+                del self._dayIndex[day]
+        for day, entries in buckets.iteritems():
+            old = self._dayIndex.get(day)
+            if old is None or len(old) != len(entries) or \
+                    any(e1 is not e2 for e1, e2 in zip(old, entries)):
+                self._dayIndex[day] = tuple(entries)
+
+    def _getIndexedEntries(self, firstDay, lastDay):
+        """Returns the sorted entries found in the day index between the two
+           UTC day ordinals (both included)
+        """
+        res = []
+        seen = set()
+        for bucket in self._dayIndex.values(firstDay, lastDay):
+            for entry in bucket:
+                if id(entry) not in seen:
+                    seen.add(id(entry))
+                    res.append(entry)
+        # entries coming from different days need to be merged
+        res.sort(self.cmpEntries)
+        return res
+
+    def _getCandidatesOnDay(self, day):
+        """Returns the sorted entries which may occur on the (tz-aware) day
+        """
+        if not self.isIndexed():
+            return self.getEntries()
+        # a local day overlaps at most the UTC days before and after it
+        ordinal = day.toordinal()
+        return self._getIndexedEntries(ordinal - 1, ordinal + 1)
+
     def calculateEndDate( self ):
         if len(self._entries) == 0:
             return self.getStartDate()
@@ -343,7 +517,7 @@ class TimeSchedule(Schedule, Persistent):
         if not day.tzinfo:
             day = timezone(self.getTimezone()).localize(day)
         tz = day.tzinfo
-        for entry in self.getEntries():
+        for entry in self._getCandidatesOnDay(day):
             if entry.inDay( day ):
                 if entry.getStartDate().astimezone(tz).date() >= day.date():
                     return entry.getStartDate().astimezone(tz)
@@ -364,7 +538,7 @@ class TimeSchedule(Schedule, Persistent):
         if not day.tzinfo:
             day = timezone(self.getTimezone()).localize(day)
         res = []
-        for entry in self.getEntries():
+        for entry in self._getCandidatesOnDay(day):
             if entry.inDay( day ):
                 res.append( entry )
         return res
@@ -373,8 +547,12 @@ class TimeSchedule(Schedule, Persistent):
         """Returns a list containing all the entries which occur whithin the
             specified day. These entries will be ordered descending.
         """
+        entries = self.getEntries()
+        if self.isIndexed() and date.tzinfo:
+            ordinal = date.astimezone(timezone('UTC')).toordinal()
+            entries = self._getIndexedEntries(ordinal, ordinal)
         res = []
-        for entry in self.getEntries():
+        for entry in entries:
             if entry.onDate( date ):
                 res.append( entry )
         return res
@@ -388,6 +566,8 @@ class TimeSchedule(Schedule, Persistent):
         return str(self._entryGen.newCount())
 
     def getEntryById(self,id):
+        if self.isIndexed():
+            return self._entriesById.get(str(id).strip())
         for entry in self.getEntries():
             if entry.getId()==str(id).strip():
                 return entry
@@ -498,16 +678,17 @@ class TimeSchedule(Schedule, Persistent):
         if diff is not None:
             from MaKaC.conference import SessionSlot
             sessionsAlreadyModif=[]
-            for entry in entriesList:
-                if isinstance(entry.getOwner(), SessionSlot):
-                    session=entry.getOwner().getSession()
-                    if session not in sessionsAlreadyModif:
-                        # if the slot is the first in the session schedule
-                        # we also change the session start date
-                        if session.getSchedule().getEntries()[0].getOwner()==entry.getOwner():
-                            session.setStartDate(session.getStartDate()+diff, check=0, moveEntries=0)
-                        sessionsAlreadyModif.append(session)
-                entry.setStartDate(entry.getStartDate()+diff, check=0, moveEntries=1)
+            with self._deferredReSchedule():
+                for entry in entriesList:
+                    if isinstance(entry.getOwner(), SessionSlot):
+                        session=entry.getOwner().getSession()
+                        if session not in sessionsAlreadyModif:
+                            # if the slot is the first in the session schedule
+                            # we also change the session start date
+                            if session.getSchedule().getEntries()[0].getOwner()==entry.getOwner():
+                                session.setStartDate(session.getStartDate()+diff, check=0, moveEntries=0)
+                            sessionsAlreadyModif.append(session)
+                    entry.setStartDate(entry.getStartDate()+diff, check=0, moveEntries=1)
 
 
 class SchEntry(Persistent, Fossilizable):
@@ -710,8 +891,9 @@ class SessionSchedule(TimeSchedule):
         """diff: the difference we have to increase/decrease each entry of the list.
            entriesList: list of entries for applying the diff"""
         if diff is not None:
-            for entry in entriesList:
-                entry.setStartDate(entry.getStartDate()+diff, check=0, moveEntries=1)
+            with self._deferredReSchedule():
+                for entry in entriesList:
+                    entry.setStartDate(entry.getStartDate()+diff, check=0, moveEntries=1)
 
 
 class SlotSchedule(TimeSchedule):
@@ -872,12 +1054,23 @@ class PosterSlotSchedule(SlotSchedule):
         entry.setStartDate(self.getStartDate())
         self._entries.append(entry)
         entry.setSchedule(self,self._getNewEntryId())
+        self._indexEntry(entry)
         self._p_changed = 1
 
     def reSchedule(self):
         for e in self._entries:
             if e.getStartDate() != self.getStartDate():
                 e.setStartDate(self.getStartDate())
+        self._updateDayIndex()
+
+    def _sortEntries(self):
+        # posters are kept in the order in which they were added
+        pass
+
+    def _getIndexedEntries(self, firstDay, lastDay):
+        # all the posters start with the slot and are kept in the order in
+        # which they were added, so there is nothing to gain from the index
+        return self.getEntries()
 
 class SlotSchTypeFactory:
     _sch={"standard":SlotSchedule,"poster":PosterSlotSchedule}
@@ -1477,46 +1670,92 @@ class ScheduleToJson(object):
 
     @staticmethod
     def bump_cache_version(cache, key):
-        vkey = '_version-%s' % key
-        cache.set(vkey, int(cache.get(vkey, 0)) + 1)
+        cache.incr('_version-%s' % key)
+
+    @staticmethod
+    def get_acl_fingerprint(entry):
+        """
+        Returns a string describing what the current user can see of an entry.
+
+        The fossils of entries only depend on the user through the materials
+        they list, so users who can see the same materials share the cached
+        fossils of protected entries.
+        """
+        owner = entry.getOwner()
+        if isinstance(entry, BreakTimeSchEntry) or owner.getAccessController().isFullyPublic():
+            return 'public'
+        getViewableMaterial = getattr(owner, 'getAllViewableMaterialList', None)
+        if getViewableMaterial is None:
+            # no user-dependent data in the fossil
+            return 'all'
+        return 'mat-%s' % ','.join(sorted(mat.getId() for mat in getViewableMaterial()))
 
     @classmethod
-    def obtainFossil(cls, entry, tz, fossilInterface=None, mgmtMode=False, useAttrCache=False):
+    def _get_entry_keys(cls, entries, tz):
+        """Returns the cache keys of the given entries using a single request to the cache"""
+        uids = [entry.getUniqueId() for entry in entries]
+        versions = cls._cacheEntries.get_multi(['_version-%s' % uid for uid in uids])
+        return dict((uid, '%s.%d.%s.%s' % (uid, int(versions['_version-%s' % uid] or 0), tz,
+                                            cls.get_acl_fingerprint(entry)))
+                    for uid, entry in zip(uids, entries))
 
-        if mgmtMode or (not isinstance(entry, BreakTimeSchEntry) and not entry.getOwner().getAccessController().isFullyPublic()):
-        # We check if it is fully public because it could be some material protected
-        # that would create a security hole if we cache it
-            result = entry.fossilize(interfaceArg = fossilInterface, useAttrCache = useAttrCache, tz = tz, convert=True)
-        else:
-            cache_key = cls.get_versioned_key(cls._cacheEntries, entry.getUniqueId(), tz)
+    @classmethod
+    def prefetch_fossils(cls, entries, tz, mgmtMode=False):
+        """
+        Loads the cached fossils of many entries at once.
 
-            result = cls._cacheEntries.get(cache_key) if cls.use_cache else None
+        Returns a dict mapping the unique ids of the entries to a
+        ``(cacheKey, fossil)`` tuple (``fossil`` is ``None`` if it is not
+        cached) which can be passed to :meth:`obtainFossil`.
+        """
+        if mgmtMode or not cls.use_cache or not entries:
+            return {}
+        keys = cls._get_entry_keys(entries, tz)
+        fossils = cls._cacheEntries.get_multi(keys.values())
+        return dict((uid, (key, fossils[key])) for uid, key in keys.iteritems())
 
-            if result is None:
-                result = entry.fossilize(interfaceArg = fossilInterface, useAttrCache = useAttrCache, tz = tz, convert=True)
-                if cls.use_cache:
-                    cls._cacheEntries.set(cache_key, result, timedelta(minutes=5))
+    @classmethod
+    def obtainFossil(cls, entry, tz, fossilInterface=None, mgmtMode=False, useAttrCache=False, prefetched=None):
+
+        if mgmtMode or not cls.use_cache:
+            return entry.fossilize(interfaceArg = fossilInterface, useAttrCache = useAttrCache, tz = tz, convert=True)
+
+        uid = entry.getUniqueId()
+        if prefetched and uid in prefetched:
+            cache_key, result = prefetched[uid]
+        else:
+            cache_key = cls._get_entry_keys([entry], tz)[uid]
+            result = cls._cacheEntries.get(cache_key)
+
+        if result is None:
+            result = entry.fossilize(interfaceArg = fossilInterface, useAttrCache = useAttrCache, tz = tz, convert=True)
+            cls._cacheEntries.set(cache_key, result, timedelta(minutes=5))
 
         return result
 
     @staticmethod
-    def processEntry(obj, tz, aw, mgmtMode = False, useAttrCache = False):
+    def processEntry(obj, tz, aw, mgmtMode = False, useAttrCache = False, prefetched = None):
 
         if mgmtMode:
             if isinstance(obj, BreakTimeSchEntry):
-                entry = ScheduleToJson.obtainFossil(obj, tz, IBreakTimeSchEntryMgmtFossil, mgmtMode, useAttrCache)
+                entry = ScheduleToJson.obtainFossil(obj, tz, IBreakTimeSchEntryMgmtFossil, mgmtMode, useAttrCache,
+                                                    prefetched=prefetched)
             elif isinstance(obj, ContribSchEntry):
-                entry = ScheduleToJson.obtainFossil(obj, tz, IContribSchEntryMgmtFossil, mgmtMode, useAttrCache)
+                entry = ScheduleToJson.obtainFossil(obj, tz, IContribSchEntryMgmtFossil, mgmtMode, useAttrCache,
+                                                    prefetched=prefetched)
             elif isinstance(obj, LinkedTimeSchEntry):
-                entry = ScheduleToJson.obtainFossil(obj, tz, ILinkedTimeSchEntryMgmtFossil, mgmtMode, useAttrCache)
+                entry = ScheduleToJson.obtainFossil(obj, tz, ILinkedTimeSchEntryMgmtFossil, mgmtMode, useAttrCache,
+                                                    prefetched=prefetched)
             else:
-                entry = ScheduleToJson.obtainFossil(obj, tz, None, mgmtMode, useAttrCache)
+                entry = ScheduleToJson.obtainFossil(obj, tz, None, mgmtMode, useAttrCache,
+                                                    prefetched=prefetched)
         else:
             # the fossils used for the display of entries
             # will be taken by default, since they're first
             # in the list of their respective Fossilizable
             # objects
-            entry = ScheduleToJson.obtainFossil(obj, tz, None, mgmtMode, useAttrCache)
+            entry = ScheduleToJson.obtainFossil(obj, tz, None, mgmtMode, useAttrCache,
+                                                prefetched=prefetched)
 
         genId = entry['id']
 
@@ -1531,17 +1770,21 @@ class ScheduleToJson(object):
                 if ScheduleToJson.checkProtection(contrib, aw):
                     if mgmtMode:
                         if isinstance(contrib, ContribSchEntry):
-                            contribData = ScheduleToJson.obtainFossil(contrib, tz, IContribSchEntryMgmtFossil, mgmtMode, useAttrCache)
+                            contribData = ScheduleToJson.obtainFossil(contrib, tz, IContribSchEntryMgmtFossil, mgmtMode, useAttrCache,
+                                                                      prefetched=prefetched)
                         elif isinstance(contrib, BreakTimeSchEntry):
-                            contribData = ScheduleToJson.obtainFossil(contrib, tz, IBreakTimeSchEntryMgmtFossil, mgmtMode, useAttrCache)
+                            contribData = ScheduleToJson.obtainFossil(contrib, tz, IBreakTimeSchEntryMgmtFossil, mgmtMode, useAttrCache,
+                                                                      prefetched=prefetched)
                         else:
-                            contribData = ScheduleToJson.obtainFossil(contrib, tz, None, mgmtMode, useAttrCache)
+                            contribData = ScheduleToJson.obtainFossil(contrib, tz, None, mgmtMode, useAttrCache,
+                                                                      prefetched=prefetched)
                     else:
                         # the fossils used for the display of entries
                         # will be taken by default, since they're first
                         # in the list of their respective Fossilizable
                         # objects
-                        contribData = ScheduleToJson.obtainFossil(contrib, tz, None, mgmtMode, useAttrCache)
+                        contribData = ScheduleToJson.obtainFossil(contrib, tz, None, mgmtMode, useAttrCache,
+                                                                  prefetched=prefetched)
 
                     entries[contribData['id']] = contribData
 
@@ -1603,15 +1846,24 @@ class ScheduleToJson(object):
             for d in dates:
                 scheduleDict[d] = {}
 
+            entries = [obj for obj in schedule.getEntries()
+                       if ScheduleToJson.checkProtection(obj, aw) and
+                       obj.getAdjustedStartDate(tz).strftime("%Y%m%d") in dates]
+
+            # load the cached fossils of all entries (including the contents
+            # of session slots) at once instead of one by one
+            from MaKaC.conference import SessionSlot
+            allEntries = list(entries)
+            for obj in entries:
+                if isinstance(obj, LinkedTimeSchEntry) and isinstance(obj.getOwner(), SessionSlot):
+                    allEntries.extend(obj.getOwner().getSchedule().getEntries())
+            prefetched = cls.prefetch_fossils(allEntries, tz, mgmtMode)
+
             # Filling the day dictionnary with entries
-            for obj in schedule.getEntries():
-
-                if ScheduleToJson.checkProtection(obj, aw):
-                    day = obj.getAdjustedStartDate(tz).strftime("%Y%m%d")
-                    # verify that start date is in dates
-                    if day in dates:
-                        genId, resultData = ScheduleToJson.processEntry(obj, tz, aw, mgmtMode, useAttrCache)
-                        scheduleDict[day][genId] = resultData
+            for obj in entries:
+                day = obj.getAdjustedStartDate(tz).strftime("%Y%m%d")
+                genId, resultData = ScheduleToJson.processEntry(obj, tz, aw, mgmtMode, useAttrCache, prefetched)
+                scheduleDict[day][genId] = resultData
             if cls.use_cache and fullTT and schedule.getOwner().getAccessController().isFullyPublic() and not mgmtMode:
                 cls._cache.set(cls.get_versioned_key(cls._cache, schedule.getOwner().getUniqueId(), tz), scheduleDict,
                                timedelta(minutes=5))
@@ -19,6 +19,8 @@
 
 from collections import OrderedDict
 import operator
+import threading
+import time
 from BTrees.OOBTree import OOTreeSet, union
 
 from persistent import Persistent
@@ -34,6 +36,7 @@ import MaKaC.common.info as info
 from MaKaC.i18n import _
 from MaKaC.authentication.AuthenticationMgr import AuthenticatorMgr
 
+from indico.core.config import Config
 from indico.core.logger import Logger
 from MaKaC.fossils.user import IAvatarFossil, IAvatarAllDetailsFossil,\
                             IGroupFossil, IPersonalInfoFossil, IAvatarMinimalFossil
@@ -1147,6 +1150,102 @@ class AvatarHolder(ObjectHolder):
     counterName = "PRINCIPAL"
     _indexes = [ "email", "name", "surName","organisation", "status" ]
 
+    # how long to wait for a single authenticator (e.g. LDAP) to answer a
+    # search unless its configuration sets a different `searchTimeout`
+    AUTHENTICATOR_TIMEOUT = 10
+    # how long the results of an authenticator search are reused
+    AUTHENTICATOR_CACHE_TTL = 60
+
+    def _searchAuthenticator(self, authenticator, method, args):
+        cache = GenericCache('AuthenticatorSearch')
+        key = '{0}-{1}-{2!r}'.format(authenticator.getId(), method,
+                                     [sorted(arg.iteritems()) if isinstance(arg, dict) else arg for arg in args])
+        matches = cache.get(key)
+        if matches is None:
+            matches = getattr(authenticator, method)(*args) or {}
+            cache.set(key, matches, self.AUTHENTICATOR_CACHE_TTL)
+        return matches
+
+    def _getSearchTimeout(self, authenticator):
+        config = Config.getInstance().getAuthenticatorConfigById(authenticator.getId())
+        return config.get('searchTimeout', self.AUTHENTICATOR_TIMEOUT)
+
+    def _searchAuthenticators(self, method, *args):
+        """Runs the same search on all authenticators concurrently.
+
+        Returns the ``(email, record)`` pairs found, in the order of the
+        authenticator list.  Authenticators which fail or do not answer
+        within their timeout are logged and skipped.
+        """
+        # LDAPAuthentication imports this module
+        from MaKaC.authentication.LDAPAuthentication import LDAPConnector
+
+        authenticators = AuthenticatorMgr().getList()
+        timeouts = [self._getSearchTimeout(authenticator) for authenticator in authenticators]
+        results = [None] * len(authenticators)
+        logger = Logger.get('user.search')
+
+        def _search(i, authenticator):
+            try:
+                # the connections of this thread are not closed at the end of the request
+                with LDAPConnector.reusedConnection():
+                    results[i] = self._searchAuthenticator(authenticator, method, args)
+            except Exception:
+                logger.exception('Searching users in {0} failed'.format(authenticator.getId()))
+            finally:
+                GenericCache.closeClient()
+
+        threads = []
+        for i, authenticator in enumerate(authenticators):
+            thread = threading.Thread(target=_search, args=(i, authenticator),
+                                      name='user-search-{0}'.format(authenticator.getId()))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        start = time.time()
+        for authenticator, thread, timeout in zip(authenticators, threads, timeouts):
+            thread.join(max(0, start + timeout - time.time()))
+            if thread.is_alive():
+                logger.warning('Searching users in {0} timed out'.format(authenticator.getId()))
+
+        matches = []
+        for authenticator, thread, result in zip(authenticators, threads, results):
+            if result and not thread.is_alive():
+                matches.extend(result.iteritems())
+        return matches
+
+    def _mergeAuthenticatorMatches(self, result, matches, criteria=None, exact=0):
+        """Adds the users found by the authenticators to `result`.
+
+        Users who already exist locally are resolved with a single lookup in
+        the email index; the others are represented by temporary avatars.
+        """
+        knownEmails = set(email for av in result.itervalues() for email in av.getEmails())
+        matches = [(email, record) for email, record in matches if email not in knownEmails]
+        localIds = indexes.IndexesHolder().getById('email').matchUsers(set(email for email, _ in matches))
+
+        for email, record in matches:
+            if email in knownEmails:
+                continue
+            av = None
+            for userId in localIds.get(email, []):
+                localAv = self.getById(userId)
+                if localAv.isActivated():
+                    av = localAv
+                    break
+            if av is None:
+                av = Avatar(record)
+                av.setId(record["id"])
+                av.status = record["status"]
+                key = email
+            else:
+                key = av.getEmail()
+            if criteria is None or self._userMatchCriteria(av, criteria, exact):
+                result[key] = av
+                knownEmails.add(email)
+                knownEmails.update(av.getEmails())
+
     def matchFirstLetter(self, index, letter, onlyActivated=True, searchInAuthenticators=True):
         result = {}
         if index not in self._indexes:
@@ -1156,27 +1255,12 @@ class AvatarHolder(ObjectHolder):
         else:
             match = indexes.IndexesHolder().getById(index).matchFirstLetter(letter)
         if match is not None:
-            for userid in match:
-                if self.getById(userid) not in result:
-                    av = self.getById(userid)
-                    if not onlyActivated or av.isActivated():
-                        result[av.getEmail()] = av
+            for userid in set(match):
+                av = self.getById(userid)
+                if not onlyActivated or av.isActivated():
+                    result[av.getEmail()] = av
         if searchInAuthenticators:
-            for authenticator in AuthenticatorMgr().getList():
-                matches = authenticator.matchUserFirstLetter(index, letter)
-                if matches:
-                    for email, record in matches.iteritems():
-                        emailResultList = [av.getEmails() for av in result.values()]
-                        if email not in emailResultList:
-                            userMatched = self.match({'email': email}, exact=1, searchInAuthenticators=False)
-                            if not userMatched:
-                                av = Avatar(record)
-                                av.setId(record["id"])
-                                av.status = record["status"]
-                                result[email] = av
-                            else:
-                                av = userMatched[0]
-                                result[av.getEmail()] = av
+            self._mergeAuthenticatorMatches(result, self._searchAuthenticators('matchUserFirstLetter', index, letter))
         return result.values()
 
     def match(self, criteria, exact=0, onlyActivated=True, searchInAuthenticators=True):
@@ -1196,23 +1280,8 @@ class AvatarHolder(ObjectHolder):
             if not onlyActivated or av.isActivated():
                 result[av.getEmail()]=av
         if searchInAuthenticators:
-            for authenticator in AuthenticatorMgr().getList():
-                matches = authenticator.matchUser(criteria, exact=exact)
-                if matches:
-                    for email, record in matches.iteritems():
-                        emailResultList = [av.getEmails() for av in result.values()]
-                        if not email in emailResultList:
-                            userMatched = self.match({'email': email}, exact=1, searchInAuthenticators=False)
-                            if not userMatched:
-                                av = Avatar(record)
-                                av.setId(record["id"])
-                                av.status = record["status"]
-                                if self._userMatchCriteria(av, criteria, exact):
-                                    result[email] = av
-                            else:
-                                av = userMatched[0]
-                                if self._userMatchCriteria(av, criteria, exact):
-                                    result[av.getEmail()] = av
+            self._mergeAuthenticatorMatches(result, self._searchAuthenticators('matchUser', criteria, exact),
+                                            criteria, exact)
         return result.values()
 
     def _userMatchCriteria(self, av, criteria, exact):
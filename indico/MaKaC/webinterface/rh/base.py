@@ -58,6 +58,7 @@ from MaKaC.webinterface.pages.error import WErrorWSGI
 from MaKaC.webinterface.pages.conferences import WPConferenceModificationClosed
 from indico.core.config import Config
 from indico.core.db import DBMgr
+from indico.core.db.conflicts import ConflictStats, describe_conflict
 from indico.core.logger import Logger
 from indico.util import json
 from indico.core.db.util import flush_after_commit_queue
@@ -548,6 +549,8 @@ class RH(RequestHandlerBase):
         cfg = Config.getInstance()
         forced_conflicts, max_retries, profile = cfg.getForceConflicts(), cfg.getMaxRetries(), cfg.getProfile()
         profile_name, res, textLog = '', '', []
+        endpoint = request.endpoint or self.__class__.__name__
+        conflicts, conflictFailed = [], False
 
         self._startTime = datetime.now()
 
@@ -578,12 +581,16 @@ class RH(RequestHandlerBase):
                         profile_name, res = self._process_retry(params, i, profile, forced_conflicts)
                         transaction.commit()
                         break
-                    except (ConflictError, POSKeyError):
+                    except (ConflictError, POSKeyError) as e:
                         transaction.abort()
                         import traceback
                         # only log conflict if it wasn't forced
                         if i >= forced_conflicts:
-                            Logger.get('requestHandler').warning('Conflict in Database! (Request %s)\n%s' % (request, traceback.format_exc()))
+                            conflicts.append(describe_conflict(e))
+                            Logger.get('requestHandler').warning(
+                                'Conflict in Database on {} (oid {}), attempt {}/{} of {} (Request {})\n{}'.format(
+                                    conflicts[-1][0], conflicts[-1][1], i + 1, max_retries, endpoint, request,
+                                    traceback.format_exc()))
                         raise
                     except ClientDisconnected:
                         transaction.abort()
@@ -592,12 +599,18 @@ class RH(RequestHandlerBase):
             self._process_success()
         except Exception as e:
             transaction.abort()
+            conflictFailed = isinstance(e, (ConflictError, POSKeyError))
             res = self._getMethodByExceptionName(e)(e)
         finally:
             # notify components that the request has finished
             self._notify('requestFinished')
             DBMgr.getInstance().endRequest()
 
+        ConflictStats.record(endpoint, conflicts, conflictFailed)
+        if conflicts:
+            Logger.get('requestHandler').info('{} conflict(s) in {}, {:.3f} conflicts per request'.format(
+                len(conflicts), endpoint, ConflictStats.get_rate(endpoint)))
+
         totalTime = (datetime.now() - self._startTime)
         textLog.append('{} : Request ended'.format(totalTime))
 
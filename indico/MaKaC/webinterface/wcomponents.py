@@ -116,7 +116,7 @@ class WTemplated(OldObservable):
             if template != None :
                 specTpl = "%s.%s.%s" % (tplId, template, extension)
 
-                if os.path.exists(os.path.join(dir,specTpl)):
+                if templateEngine.fileExists(os.path.join(dir,specTpl)):
                     return specTpl
 
 
@@ -181,7 +181,7 @@ class WTemplated(OldObservable):
 
         # include context help info, if it exists
         helpText = None
-        if os.path.exists(self.helpFile):
+        if templateEngine.fileExists(self.helpFile):
             try:
                 fh = open( self.helpFile, "r")
                 helpText = fh.read()
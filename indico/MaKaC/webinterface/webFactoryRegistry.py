@@ -21,6 +21,7 @@ from BTrees import OOBTree
 import MaKaC.webinterface.simple_event as simple_event
 import MaKaC.webinterface.meeting as meeting
 from indico.core.db import DBMgr
+from indico.core.index import Catalog
 
 
 class WebFactoryRegistry:
@@ -56,6 +57,10 @@ class WebFactoryRegistry:
         """Associates a given conference with a certain webfactory
         """
         self._getConfRegistry()[ conference.getId() ] = factory
+        # the event type is part of the category attribute index
+        attrIdx = Catalog.getIdx('categ_conf_attrs')
+        if attrIdx is not None:
+            attrIdx.reindex_obj(conference)
 
     def getFactory( self, conference ):
         """Gives back the webfactory associated with a given conference or None
@@ -0,0 +1,77 @@
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function
+
+from flask_script import Manager
+
+from indico.core.config import Config
+from indico.util.console import cformat, error, success
+from MaKaC.common.cache import FileCacheClient
+
+
+CacheManager = Manager(usage="Manages the file-based cache")
+
+MB = 1024 * 1024
+
+
+def _get_client():
+    config = Config.getInstance()
+    if config.getCacheBackend() != 'files':
+        error("The cache backend is not 'files'")
+        return None
+    return FileCacheClient(config.getXMLCacheDir())
+
+
+def _format_size(size):
+    return '{:.1f} MB'.format(size / float(MB))
+
+
+@CacheManager.command
+def footprint():
+    """Shows the size of the file cache by namespace"""
+    client = _get_client()
+    if client is None:
+        return
+    quotas = Config.getInstance().getFileCacheQuotas()
+    data = client.getFootprint()
+    print(cformat('%{white!}{:<32} {:>9} {:>9} {:>12} {:>12}').format('Namespace', 'Entries', 'Expired', 'Size',
+                                                                      'Quota'))
+    for namespace, stats in sorted(data.iteritems(), key=lambda x: x[1]['size'], reverse=True):
+        quota = quotas.get(namespace)
+        color = '%{red!}' if quota and stats['size'] > quota * MB else '%{reset}'
+        print(cformat(color + '{:<32} {:>9} {:>9} {:>12} {:>12}').format(
+            namespace, stats['entries'], stats['expired'], _format_size(stats['size']),
+            _format_size(quota * MB) if quota else '-'))
+    total = sum(stats['size'] for stats in data.itervalues())
+    max_size = Config.getInstance().getFileCacheMaxSize()
+    print(cformat('%{white!}Total: {} in {} entries (limit: {})').format(
+        _format_size(total), sum(stats['entries'] for stats in data.itervalues()),
+        _format_size(max_size * MB) if max_size else 'none'))
+
+
+@CacheManager.command
+def cleanup():
+    """Removes expired entries and enforces the size limits of the file cache"""
+    client = _get_client()
+    if client is None:
+        return
+    config = Config.getInstance()
+    quotas = dict((namespace, quota * MB) for namespace, quota in config.getFileCacheQuotas().iteritems())
+    removed = client.evict(config.getFileCacheMaxSize() * MB, quotas)
+    for namespace, stats in sorted(removed.iteritems()):
+        print('{:<32} {:>9} entries {:>12}'.format(namespace, stats['entries'], _format_size(stats['size'])))
+    success('Removed {} entries'.format(sum(stats['entries'] for stats in removed.itervalues())))
@@ -19,6 +19,7 @@ from flask_migrate import MigrateCommand as DatabaseManager
 from flask_migrate import stamp
 
 from indico.core.db import db
+from indico.core.db.conflicts import ConflictStats
 from indico.core.db.sqlalchemy.util import get_all_tables
 from indico.util.console import colored, cformat
 
@@ -44,3 +45,21 @@ def prepare():
         return
     print colored('Creating tables', 'green')
     db.create_all()
+
+
+@DatabaseManager.option('--reset', action='store_true', help="Resets the statistics after showing them")
+def conflicts(reset=False):
+    """Shows the ZODB conflicts per endpoint (stored in redis)"""
+    stats = ConflictStats.get_stats()
+    if not stats:
+        print colored('No conflict statistics available', 'yellow')
+    else:
+        print cformat('%{white!}{:<56} {:>9} {:>9} {:>7} {:>7}  {}').format('Endpoint', 'Requests', 'Conflicts',
+                                                                        'Rate', 'Failed', 'Classes')
+        for endpoint, data in sorted(stats.iteritems(), key=lambda x: x[1]['conflicts'], reverse=True):
+            classes = ', '.join('{} ({})'.format(name, count) for name, count in data['classes'].most_common(3))
+            print '{:<56} {:>9} {:>9} {:>7.3f} {:>7}  {}'.format(endpoint, data['requests'], data['conflicts'],
+                                                                data['rate'], data['failed'], classes)
+    if reset:
+        ConflictStats.reset()
+        print colored('Statistics reset', 'green')
@@ -20,9 +20,12 @@ import sys
 from flask_script import Manager
 
 from indico.cli.admin import IndicoAdminManager
+from indico.cli.cache import CacheManager
 from indico.cli.database import DatabaseManager
+from indico.cli.roombooking import RoomBookingManager
 from indico.cli.server import IndicoDevServer
 from indico.cli.shell import IndicoShell
+from indico.cli.templates import TemplatesManager
 from indico.core.db import db
 from indico.core.db.sqlalchemy.migration import migrate
 from indico.web.flask.app import make_app
@@ -36,9 +39,12 @@ def app_factory():
 
 manager = Manager(app_factory, with_default_commands=False)
 manager.add_command('admin', IndicoAdminManager)
+manager.add_command('cache', CacheManager)
 manager.add_command('db', DatabaseManager)
+manager.add_command('rb', RoomBookingManager)
 manager.add_command('runserver', IndicoDevServer())
 manager.add_command('shell', IndicoShell())
+manager.add_command('templates', TemplatesManager)
 
 
 def main():
@@ -0,0 +1,60 @@
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+
+from datetime import datetime
+
+from flask_script import Manager
+
+from indico.core.db import db
+from indico.modules.rb.models.room_day_bitmaps import RoomDayBitmap
+from indico.modules.rb.statistics import get_occupancy_rollup_end, update_occupancy_rollup
+from indico.util.console import cformat, error, success
+
+
+RoomBookingManager = Manager(usage="Manages the room booking module")
+
+
+@RoomBookingManager.command
+def rebuild_bitmaps():
+    """Rebuilds the free/busy bitmaps used for availability searches"""
+    RoomDayBitmap.rebuild()
+    db.session.commit()
+    success('Rebuilt {} room bitmaps'.format(RoomDayBitmap.query.count()))
+
+
+@RoomBookingManager.command
+def check_bitmaps():
+    """Checks the free/busy bitmaps against the bookings"""
+    if not RoomDayBitmap.is_built():
+        error('The bitmaps have not been built yet')
+        return
+    inconsistent = RoomDayBitmap.find_inconsistent()
+    for room_id, day in inconsistent:
+        print(cformat('%{red}room {} on {}').format(room_id, day))
+    if inconsistent:
+        error('{} inconsistent bitmaps, run rebuild_bitmaps to fix them'.format(len(inconsistent)))
+    else:
+        success('All bitmaps are consistent')
+
+
+@RoomBookingManager.option('--since', help='recompute the days starting from this date (YYYY-MM-DD)')
+def rollup_occupancy(since=None):
+    """Builds or extends the daily occupancy rollup used by the statistics"""
+    start_date = datetime.strptime(since, '%Y-%m-%d').date() if since else None
+    update_occupancy_rollup(start_date=start_date)
+    db.session.commit()
+    success('The occupancy rollup now covers the days until {}'.format(get_occupancy_rollup_end()))
@@ -0,0 +1,44 @@
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import print_function
+
+import sys
+
+from flask_script import Command, Manager
+
+from indico.core.db import DBMgr
+from indico.util.console import cformat, error, success
+
+
+TemplatesManager = Manager(usage="Manages the compiled Mako templates")
+
+
+def compile_templates():
+    """Compiles all core and plugin templates and reports the broken ones"""
+    from MaKaC.common.TemplateExec import define_lookup
+    lookup = define_lookup()
+    with DBMgr.getInstance().global_connection():
+        loaded, errors = lookup.preload()
+    for srcfile, e in errors:
+        print(cformat('%{red!}{}%{reset}: {}').format(srcfile, e))
+    if errors:
+        error('{} of {} templates could not be compiled'.format(len(errors), loaded + len(errors)))
+        sys.exit(1)
+    success('Compiled {} templates into {}'.format(loaded, lookup.template_args['module_directory']))
+
+
+TemplatesManager.add_command('compile', Command(compile_templates))
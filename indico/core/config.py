@@ -506,10 +506,15 @@ class Config:
         'WhooshBackend'             : 'files',
         'MemcachedServers'          : [],
         'RedisCacheURL'             : None,
+        'FileCacheMaxSize'          : 0,
+        'FileCacheQuotas'           : {},
         'SmtpServer'                : ('localhost', 25),
         'SmtpLogin'                 : '',
         'SmtpPassword'              : '',
         'SmtpUseTLS'                : 'no',
+        'SmtpPoolSize'              : 2,
+        'SmtpRateLimit'             : 0,
+        'MailOutbox'                : False,
         'SupportEmail'              : 'root@localhost',
         'PublicSupportEmail'        : 'root@localhost',
         'NoReplyEmail'              : 'noreply-root@localhost',
@@ -525,6 +530,7 @@ class Config:
         'ForceConflicts'            : 0,
         'PropagateAllExceptions'    : False,
         'Debug'                     : False,
+        'PrecompiledTemplates'      : False,
         'EmbeddedWebserver'         : False,
         'EmbeddedWebserverBaseURL'  : None,
         'OAuthAccessTokenTTL'       : 10000,
@@ -540,7 +546,9 @@ class Config:
         'Loggers'                   : ['files'],
         'SentryDSN'                 : None,
         'SentryLoggingLevel'        : 'WARNING',
-        'CategoryCleanup'           : {}
+        'CategoryCleanup'           : {},
+        'SchedulerWorkers'          : 8,
+        'SchedulerTaskTypeLimits'   : {}
     }
 
     if sys.platform == 'win32':
@@ -0,0 +1,133 @@
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico; if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Statistics about the database conflicts which made requests retry
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+
+from ZODB.utils import oid_repr
+
+from indico.core.logger import Logger
+from indico.util.redis import client as redis_client, RedisError
+
+
+def describe_conflict(exc):
+    """Returns the ``(class name, oid)`` of the object which caused a
+    `ConflictError` or `POSKeyError`"""
+    oid = getattr(exc, 'oid', None)
+    if oid is None and exc.args and isinstance(exc.args[0], str) and len(exc.args[0]) == 8:
+        # POSKeyError only contains the oid
+        oid = exc.args[0]
+    class_name = getattr(exc, 'class_name', None) or 'unknown'
+    return class_name, oid_repr(oid) if oid is not None else None
+
+
+class ConflictStats(object):
+    """Counts the requests and conflicts per endpoint.
+
+    The counters are kept per process and added to a redis hash every
+    `FLUSH_INTERVAL` seconds (if redis is configured), so the retry rates of
+    all the workers can be compared.
+    """
+
+    FLUSH_INTERVAL = 60
+    REDIS_KEY = 'conflict-stats'
+
+    _lock = threading.Lock()
+    _local = Counter()
+    _pending = Counter()
+    _last_flush = time.time()
+
+    @classmethod
+    def record(cls, endpoint, conflicts, failed=False):
+        """Records a request to `endpoint`.
+
+        :param conflicts: the ``(class name, oid)`` of each conflict which
+                          made the request retry
+        :param failed: whether the request gave up after too many conflicts
+        """
+        fields = ['{}|requests'.format(endpoint)]
+        fields += ['{}|conflicts'.format(endpoint)] * len(conflicts)
+        fields += ['{}|class|{}'.format(endpoint, class_name) for class_name, oid in conflicts]
+        if failed:
+            fields.append('{}|failed'.format(endpoint))
+        with cls._lock:
+            cls._local.update(fields)
+            cls._pending.update(fields)
+            if time.time() - cls._last_flush < cls.FLUSH_INTERVAL:
+                return
+            pending, cls._pending = cls._pending, Counter()
+            cls._last_flush = time.time()
+        cls._flush(pending)
+
+    @classmethod
+    def _flush(cls, pending):
+        if not redis_client:
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for field, count in pending.iteritems():
+                pipe.hincrby(cls.REDIS_KEY, field, count)
+            pipe.execute()
+        except RedisError:
+            Logger.get('redis').exception('Could not store the conflict statistics')
+
+    @staticmethod
+    def _aggregate(fields):
+        stats = defaultdict(lambda: {'requests': 0, 'conflicts': 0, 'failed': 0, 'classes': Counter()})
+        for field, count in fields.iteritems():
+            endpoint, name = field.split('|', 1)
+            if name.startswith('class|'):
+                stats[endpoint]['classes'][name[6:]] += int(count)
+            else:
+                stats[endpoint][name] += int(count)
+        for data in stats.itervalues():
+            data['rate'] = float(data['conflicts']) / data['requests'] if data['requests'] else 0
+        return dict(stats)
+
+    @classmethod
+    def get_rate(cls, endpoint):
+        """Returns the number of conflicts per request for `endpoint` in this process"""
+        with cls._lock:
+            requests = cls._local['{}|requests'.format(endpoint)]
+            return float(cls._local['{}|conflicts'.format(endpoint)]) / requests if requests else 0
+
+    @classmethod
+    def get_stats(cls, local=False):
+        """Returns the requests, conflicts, failed requests, conflicts per
+        request and conflicting classes of each endpoint.
+
+        Unless `local` is set, the statistics of all processes are returned if
+        they are stored in redis.
+        """
+        if not local and redis_client:
+            return cls._aggregate(redis_client.hgetall(cls.REDIS_KEY))
+        with cls._lock:
+            return cls._aggregate(cls._local)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._local.clear()
+            cls._pending.clear()
+        if redis_client:
+            redis_client.delete(cls.REDIS_KEY)
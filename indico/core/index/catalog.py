@@ -19,7 +19,7 @@
 
 from BTrees.OOBTree import OOBTree
 
-from indico.core.index.event import CategoryEventStartDateIndex
+from indico.core.index.event import CategoryEventStartDateIndex, CategoryEventAttributeIndex
 
 from indico.core.db import DBMgr
 from MaKaC.plugins.base import extension_point
@@ -31,6 +31,7 @@ from indico.modules.oauth.components import UserOAuthRequestTokenIndex, UserOAut
 class Catalog(OOBTree):
     _indexMap = {
         'categ_conf_sd': CategoryEventStartDateIndex,
+        'categ_conf_attrs': CategoryEventAttributeIndex,
         'user_oauth_access_token': UserOAuthAccessTokenIndex,
         'user_oauth_request_token': UserOAuthRequestTokenIndex
         }
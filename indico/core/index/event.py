@@ -17,6 +17,9 @@
 ## You should have received a copy of the GNU General Public License
 ## along with Indico;if not, see <http://www.gnu.org/licenses/>.
 
+import fnmatch
+from operator import itemgetter
+
 from indico.core.index.base import IOIndex, Index
 from indico.core.index.adapter import IIndexableByStartDateTime
 from indico.util.date_time import utc_timestamp
@@ -96,3 +99,154 @@ class CategoryEventStartDateIndex(Index):
                     dbi.abort()
 
                 i += 1
+
+
+class CategoryEventAttributeIndex(Index):
+    """
+    Indexes the events of every category (including its parent categories,
+    like the `categoryDateAll` index) by type, location name and room name.
+
+    categId -> attribute -> lower-case value -> confId -> (startTS, endTS)
+
+    Since the event dates are stored next to the ids, an event can be
+    filtered by attribute and date range without loading it.
+    """
+
+    ATTRIBUTES = ('type', 'location', 'room')
+
+    def __init__(self):
+        self._container = OOBTree()
+        # confId -> (categIds, values, startTS, endTS) as they were indexed
+        self._entries = OOBTree()
+
+    @classmethod
+    def _getValues(cls, conf):
+        location = conf.getLocation()
+        room = conf.getRoom()
+        return (conf.getType(),
+                location and location.getName() and location.getName().lower() or None,
+                room and room.getName() and room.getName().lower() or None)
+
+    @classmethod
+    def _getEntry(cls, conf):
+        if not conf.getOwnerList():
+            return None
+        categIds = tuple(categ.getId() for categ in conf.getOwnerPath()) + ('0',)
+        return (categIds, cls._getValues(conf),
+                utc_timestamp(conf.getStartDate()), utc_timestamp(conf.getEndDate()))
+
+    def _getCategory(self, categId, create=False):
+        if categId not in self._container:
+            if not create:
+                return None
+            self._container[categId] = OOBTree([(attr, OOBTree()) for attr in self.ATTRIBUTES])
+        return self._container[categId]
+
+    def index_obj(self, conf):
+        if conf.getId() in self._entries:
+            self.unindex_obj(conf)
+        entry = self._getEntry(conf)
+        if entry is None:
+            return
+        categIds, values, startTS, endTS = entry
+        for categId in categIds:
+            categ = self._getCategory(categId, create=True)
+            for attr, value in zip(self.ATTRIBUTES, values):
+                if value is None:
+                    continue
+                confs = categ[attr].get(value)
+                if confs is None:
+                    confs = categ[attr][value] = OOBTree()
+                confs[conf.getId()] = (startTS, endTS)
+        self._entries[conf.getId()] = entry
+
+    def unindex_obj(self, conf):
+        entry = self._entries.pop(conf.getId(), None)
+        if entry is None:
+            return
+        categIds, values, _, _ = entry
+        for categId in categIds:
+            categ = self._getCategory(categId)
+            if categ is None:
+                continue
+            for attr, value in zip(self.ATTRIBUTES, values):
+                confs = categ[attr].get(value)
+                if confs is not None:
+                    confs.pop(conf.getId(), None)
+                    if not confs:
+                        del categ[attr][value]
+
+    def reindex_obj(self, conf):
+        """
+        Updates the entry of an already indexed event if any of the indexed
+        data changed (e.g. after a modification of its location)
+        """
+        entry = self._entries.get(conf.getId())
+        if entry is not None and entry != self._getEntry(conf):
+            self.index_obj(conf)
+
+    def remove_category(self, categId):
+        if categId in self._container:
+            del self._container[categId]
+
+    def _matchAttribute(self, values, attr, pattern):
+        if attr == 'type':
+            return dict(values.get(pattern, {}).iteritems())
+        pattern = pattern.lower()
+        result = {}
+        for value, confs in values.iteritems():
+            if fnmatch.fnmatch(value, pattern):
+                result.update(confs.iteritems())
+        return result
+
+    def iterateIds(self, categId, fromTS=None, toTS=None, **filters):
+        """
+        Yields the ids of the events in a category overlapping the given
+        time range and matching the given attribute filters (``type`` needs
+        to match exactly, ``location`` and ``room`` are shell-style patterns),
+        ordered by start date.
+        """
+        categ = self._getCategory(categId)
+        if categ is None:
+            return
+        matches = None
+        for attr in self.ATTRIBUTES:
+            if filters.get(attr) is None:
+                continue
+            attrMatches = self._matchAttribute(categ[attr], attr, filters[attr])
+            if matches is None:
+                matches = attrMatches
+            else:
+                matches = dict((confId, dates) for confId, dates in matches.iteritems() if confId in attrMatches)
+        if matches is None:
+            raise ValueError('At least one attribute filter is required')
+        inRange = ((confId, startTS) for confId, (startTS, endTS) in matches.iteritems()
+                   if (fromTS is None or endTS >= fromTS) and (toTS is None or startTS <= toTS))
+        for confId, _ in sorted(inRange, key=itemgetter(1)):
+            yield confId
+
+    def initialize(self, dbi=None):
+        from MaKaC.conference import ConferenceHolder
+
+        for i, conf in enumerate(ConferenceHolder()._getIdx().itervalues()):
+            self.index_obj(conf)
+            if dbi and i % 1000 == 999:
+                dbi.commit()
+        if dbi:
+            dbi.commit()
+
+    def _check(self, dbi=None):
+        from MaKaC.conference import ConferenceHolder
+        confIdx = ConferenceHolder()._getIdx()
+
+        for i, (confId, entry) in enumerate(self._entries.iteritems()):
+            if confId not in confIdx:
+                yield "Conference '%s' not in ConferenceHolder" % confId
+            categIds, values, _, _ = entry
+            for categId in categIds:
+                categ = self._getCategory(categId)
+                for attr, value in zip(self.ATTRIBUTES, values):
+                    if value is not None and (categ is None or confId not in categ[attr].get(value, {})):
+                        yield "[%s] Conference '%s' missing in %s index for '%s'" % (categId, confId, attr, value)
+            if dbi and i % 100 == 99:
+                dbi.abort()
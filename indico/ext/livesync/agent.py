@@ -22,6 +22,9 @@ Module containing the persistent classes that will be stored in the DB
 """
 # standard lib imports
 import datetime
+import Queue
+import threading
+import time
 
 # dependency libs
 import zope.interface
@@ -30,6 +33,7 @@ from persistent import Persistent, mapping
 # indico extpoint imports
 from indico.core.extpoint import Component
 from indico.util.fossilize import IFossil, fossilizes, Fossilizable, conversion
+from indico.util.date_time import nowutc
 
 # plugin imports
 from indico.ext.livesync.struct import SetMultiPointerTrack
@@ -397,43 +401,154 @@ class SyncManager(Persistent):
 class RecordUploader(object):
     """
     Encapsulates record uploading behavior.
+
+    Uploaders implement `_sendBatch`, which is given the metadata generated
+    by the agent for a batch.  Metadata generation needs the database and
+    thus runs in the calling thread, while the upload runs in a separate
+    thread, so the next batch is generated while the previous one is being
+    uploaded.  At most `PIPELINE_DEPTH` generated batches wait for their
+    upload.  Failed uploads are retried `MAX_RETRIES` times, waiting
+    `RETRY_DELAY` seconds the first time and twice as long each time after.
+
+    Uploaders overriding `_uploadBatch` instead run it for one batch after
+    the other.
     """
 
     DEFAULT_BATCH_SIZE, DEFAULT_NUM_SLAVES = 1000, 2
+    PIPELINE_DEPTH = 1
+    MAX_RETRIES = 3
+    RETRY_DELAY = 5
+    # check the size of the ZODB cache every N records
+    CACHE_CHECK_INTERVAL = 100
 
-    def __init__(self, logger, agent, batchSize=DEFAULT_BATCH_SIZE):
+    def __init__(self, logger, agent, batchSize=DEFAULT_BATCH_SIZE, task=None):
         self._logger = logger
         self._agent = agent
         self._batchSize = batchSize
+        self._task = task
 
-    def _uploadBatch(self, batch):
+    def _generateBatch(self, batch):
+        """
+        :param batch: list of records
+
+        Returns the data to upload for a batch
+        """
+        self._logger.info('Generating metadata')
+        data = self._agent._getMetadata(batch, logger=self._logger)
+        self._logger.info('Metadata ready ')
+        return data
+
+    def _sendBatch(self, batch, data):
         """
         :param batch: list of records
+        :param data: the data returned by `_generateBatch`
 
-        To be overloaded by uploaders. Does the actual upload.
+        To be overloaded by uploaders. Does the actual upload and raises an
+        exception if it fails.  It must not access the database since it
+        runs in a separate thread.
         """
         raise Exception("Unimplemented method!")
 
-    def iterateOver(self, iterator, dbi=None):
+    def _uploadBatch(self, batch):
         """
-        Consumes an iterator, uploading the records that are returned
-        `dbi` can be passed, so that the cache is cleared once in a while
+        :param batch: list of records
+
+        Generates and uploads a batch
+        """
+        self._sendBatch(batch, self._generateBatch(batch))
+
+    def _sendBatchWithRetries(self, batch, data):
+        delay = self.RETRY_DELAY
+        for attempt in xrange(self.MAX_RETRIES + 1):
+            try:
+                return self._sendBatch(batch, data)
+            except Exception:
+                if attempt == self.MAX_RETRIES:
+                    raise
+                self._logger.exception('Uploading a batch of %d records failed, retrying in %d s' %
+                                       (len(batch), delay))
+                time.sleep(delay)
+                delay *= 2
+
+    def _trimCache(self, dbi):
+        """
+        Lets ZODB shrink its object cache if it grew too much, which
+        only happens at transaction boundaries
         """
+        cache = dbi.getDBConnCache()
+        if cache.cache_non_ghost_count > 2 * cache.cache_size:
+            dbi.abort()
 
+    def _heartbeat(self):
+        if self._task:
+            self._task.setOnRunningListSince(nowutc())
+
+    def _iterateBatches(self, iterator, dbi=None):
         currentBatch = []
 
         # take operations and choose which records to send
-        for record in iterator:
-            if len(currentBatch) > (self._batchSize - 1):
-                self._uploadBatch(currentBatch)
-                currentBatch = []
-
+        for i, record in enumerate(iterator, 1):
             currentBatch.append(record)
 
-            if dbi:
-                dbi.abort()
+            if len(currentBatch) >= self._batchSize:
+                yield currentBatch
+                currentBatch = []
+
+            if dbi and i % self.CACHE_CHECK_INTERVAL == 0:
+                self._trimCache(dbi)
 
         if currentBatch:
-            self._uploadBatch(currentBatch)
+            yield currentBatch
+
+    def _uploadSequentially(self, iterator, dbi=None):
+        for batch in self._iterateBatches(iterator, dbi):
+            self._uploadBatch(batch)
+            self._heartbeat()
+
+    def _uploadPipelined(self, iterator, dbi=None):
+        batches = Queue.Queue(self.PIPELINE_DEPTH)
+        errors = []
+
+        def _upload():
+            while True:
+                item = batches.get()
+                if item is None:
+                    return
+                elif errors:
+                    # the run failed, skip the remaining batches
+                    continue
+                try:
+                    self._sendBatchWithRetries(*item)
+                except Exception, e:
+                    self._logger.exception('Uploading a batch of %d records failed' % len(item[0]))
+                    errors.append(e)
+
+        uploader = threading.Thread(target=_upload, name='livesync-upload')
+        uploader.daemon = True
+        uploader.start()
+        try:
+            for batch in self._iterateBatches(iterator, dbi):
+                data = self._generateBatch(batch)
+                if errors:
+                    break
+                batches.put((batch, data))
+                self._heartbeat()
+        finally:
+            batches.put(None)
+            uploader.join()
+
+        if errors:
+            raise errors[0]
+
+    def iterateOver(self, iterator, dbi=None):
+        """
+        Consumes an iterator, uploading the records that are returned
+        `dbi` can be passed, so that the cache is cleared once in a while
+        """
+
+        if type(self)._uploadBatch.im_func is not RecordUploader._uploadBatch.im_func:
+            self._uploadSequentially(iterator, dbi)
+        else:
+            self._uploadPipelined(iterator, dbi)
 
         return True
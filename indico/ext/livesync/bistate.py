@@ -19,12 +19,12 @@
 
 # plugin imports
 from indico.ext.livesync.agent import PushSyncAgent
-from indico.ext.livesync.metadata import MARCXMLGenerator
+from indico.ext.livesync.metadata import MARCXMLGenerator, MARCXMLFragmentCache
 
 # legacy indico
 from MaKaC import conference
 from MaKaC.accessControl import AccessWrapper
-from MaKaC.common.xmlGen import XMLGen
+from MaKaC.common.xmlGen import StreamingXMLGen
 
 # some useful constants
 STATUS_DELETED, STATUS_CREATED, STATUS_CHANGED = 1, 2, 4
@@ -161,14 +161,20 @@ class BistateBatchUploaderAgent(PushSyncAgent):
             k /= 2
         return "{0:<40} {1:<20} {2}".format(obj, objId, ' '.join(parts))
 
-    def _getMetadata(self, records, logger=None):
+    def _getMetadata(self, records, logger=None, stream=None):
         """
-        Retrieves the MARCXML metadata for the record
+        Retrieves the MARCXML metadata for the record.  If a `stream` is
+        given, the metadata is written to it and not returned.
         """
-        xg = XMLGen()
+        xg = StreamingXMLGen(init=False, stream=stream)
         mg = MARCXMLGenerator(xg)
         # set the permissions
         mg.setPermissionsOf(self._access)
+        # records are only regenerated if their data or effective ACL changed
+        fragmentCache = MARCXMLFragmentCache()
+        fragmentCache.prefetch([record for record, recId, operation in records
+                                if not operation & STATUS_DELETED and record.getOwner()],
+                               user=self._access)
 
         xg.initXml()
         xg.openTag("collection", [["xmlns", "http://www.loc.gov/MARC21/slim"]])
@@ -180,34 +186,25 @@ class BistateBatchUploaderAgent(PushSyncAgent):
                     mg.generate(recId, overrideCache=True, deleted=True)
                 else:
                     if record.getOwner():
-                        # caching is disabled because ACL changes do not trigger
-                        # notifyModification, and consequently can be classified as a hit
-                        # even if they were changed
-                        # TODO: change overrideCache to False when this problem is solved
-                        mg.generate(record, overrideCache=True, deleted=False)
+                        mg.generate(record, deleted=False, fragmentCache=fragmentCache)
                     else:
                         logger.warning('%s (%s) is marked as non-deleted and has no owner' % \
                                        (record, recId))
             except:
+                # the record is only written once it has been generated
+                # completely, so there is nothing to clean up
                 if logger:
                     logger.exception("Something went wrong while processing '%s' (recId=%s) (owner=%s)! Possible metadata errors." %
                                      (record, recId, record.getOwner()))
-                    # avoid duplicate record
-                self._removeUnfinishedRecord(mg._XMLGen)
 
         xg.closeTag("collection")
+        fragmentCache.flush()
 
-        return xg.getXml()
+        if logger:
+            logger.debug('MARCXML fragments: %d reused, %d generated' % (fragmentCache.hits,
+                                                                         fragmentCache.misses))
 
-    def _removeUnfinishedRecord(self, xg):
-        """
-        gets rid of a remaining '<record>' tag
-        """
-        # remove any line breaks, etc...
-        while not xg.xml[-1].strip():
-            xg.xml.pop()
-        # remove '<record>'
-        xg.xml.pop()
+        return xg.getXml()
 
     def _generateRecords(self, data, lastTS, dbi=None):
         return BistateRecordProcessor.computeRecords(data, self._access, dbi=dbi)
@@ -33,8 +33,6 @@ from lxml import etree
 from indico.ext.livesync.agent import AgentProviderComponent, RecordUploader
 from indico.ext.livesync.bistate import BistateBatchUploaderAgent
 
-from indico.util.date_time import nowutc
-
 
 class CERNSearchUploadAgent(BistateBatchUploaderAgent):
 
@@ -70,37 +68,27 @@ class CERNSearchRecordUploader(RecordUploader):
     """
 
     def __init__(self, logger, agent, url, username, password, task=None):
-        super(CERNSearchRecordUploader, self).__init__(logger, agent)
+        super(CERNSearchRecordUploader, self).__init__(logger, agent, task=task)
         self._url = url
         self._username = username
         self._password = password
-        self._task = task
 
     def _postRequest(self, batch):
 
         pass
 
-    def _uploadBatch(self, batch):
+    def _sendBatch(self, batch, data):
         """
         Uploads a batch to the server
         """
 
         url = "%s/ImportXML" % self._url
 
-        self._logger.debug('getting a batch')
-
-        tstart = time.time()
-        # get a batch
-
-        self._logger.info('Generating metadata')
-        data = self._agent._getMetadata(batch, logger=self._logger)
-        self._logger.info('Metadata ready ')
-
         postData = {
             'xml': data
             }
 
-        tgen = time.time() - tstart
+        tstart = time.time()
 
         req = Request(url)
         # remove line break
@@ -117,25 +105,23 @@ class CERNSearchRecordUploader(RecordUploader):
 
         result_data = result.read()
 
-        tupload = time.time() - (tstart + tgen)
+        tupload = time.time() - tstart
 
-        self._logger.debug('rec %s result: %s' % (batch, result_data))
+        # the records are not formatted here since this must not touch the database
+        self._logger.debug('%d records, result: %s' % (len(batch), result_data))
 
         xmlDoc = etree.fromstring(result_data)
 
         # right now there is nothing else to pay attention to
         booleanResult = etree.tostring(xmlDoc, method="text")
 
-        if self._task:
-            self._task.setOnRunningListSince(nowutc())
-
         if result.code == 200 and booleanResult == 'true':
             self._logger.info('Batch of %d records stored in server'
-                              ' [%f s %f s]' % \
-                              (len(batch), tgen, tupload))
+                              ' [%f s]' % \
+                              (len(batch), tupload))
         else:
-            self._logger.error('Records: %s output: %s '
-                               '(HTTP code %s)' % (batch, result_data, result.code))
+            self._logger.error('Batch of %d records failed, output: %s '
+                               '(HTTP code %s)' % (len(batch), result_data, result.code))
             raise Exception('upload failed')
 
         return True
@@ -171,9 +171,9 @@ class AgentCommand(ConsoleLiveSyncCommand):
         logger.info('Generating metadata...')
 
         with open(fname, 'w') as f:
-            data = agent._getMetadata(batch)
-            logger.info('Writing file %s' % fname)
-            f.write(data)
+            # the metadata is written to the file while being generated
+            agent._getMetadata(batch, stream=f)
+            logger.info('Written file %s' % fname)
 
     def _export(self, args):
         logger = _basicStreamHandler()
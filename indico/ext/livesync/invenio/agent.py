@@ -28,7 +28,6 @@ import time
 from indico.ext.livesync.agent import AgentProviderComponent, RecordUploader
 from indico.ext.livesync.bistate import BistateBatchUploaderAgent
 from indico.ext.livesync.invenio.invenio_connector import InvenioConnector
-from indico.util.date_time import nowutc
 
 
 class InvenioBatchUploaderAgent(BistateBatchUploaderAgent):
@@ -56,49 +55,37 @@ class InvenioRecordUploader(RecordUploader):
     """
 
     def __init__(self, logger, agent, server, task=None):
-        super(InvenioRecordUploader, self).__init__(logger, agent)
+        super(InvenioRecordUploader, self).__init__(logger, agent, task=task)
         self._server = server
-        self._task = task
 
-    def _uploadBatch(self, batch):
+    def _sendBatch(self, batch, data):
         """
         Uploads a batch to the server
         """
 
-        self._logger.debug('getting a batch')
-
         tstart = time.time()
-        # get a batch
-
-        self._logger.info('Generating metadata')
-        data = self._agent._getMetadata(batch, logger=self._logger)
-        self._logger.info('Metadata ready ')
-
-        tgen = time.time() - tstart
         try:
             result = self._server.upload_marcxml(data, "-ir").read()
         except Exception:
             self._logger.exception("Failed uploading records to local invenio server")
             raise
 
-        tupload = time.time() - (tstart + tgen)
-
-        if self._task:
-            self._task.setOnRunningListSince(nowutc())
+        tupload = time.time() - tstart
 
-        self._logger.debug('rec %s result: %s' % (batch, result))
+        # the records are not formatted here since this must not touch the database
+        self._logger.debug('%d records, result: %s' % (len(batch), result))
 
         if isinstance(result, long):
             self._logger.info('Batch of %d records submitted (task %s)'
-                              '[%f s %f s]' % (len(batch), result, tgen, tupload))
+                              '[%f s]' % (len(batch), result, tupload))
 
         elif result.startswith('[INFO]'):
             fpath = result.strip().split(' ')[-1]
             self._logger.info('Batch of %d records stored in server (%s) '
-                              '[%f s %f s]' % \
-                              (len(batch), fpath, tgen, tupload))
+                              '[%f s]' % \
+                              (len(batch), fpath, tupload))
         else:
-            self._logger.error('Records: %s output: %s' % (batch, result))
+            self._logger.error('Batch of %d records failed, output: %s' % (len(batch), result))
             raise Exception('upload failed')
 
         return True
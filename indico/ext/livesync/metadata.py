@@ -17,12 +17,122 @@
 ## You should have received a copy of the GNU General Public License
 ## along with Indico;if not, see <http://www.gnu.org/licenses/>.
 
+import hashlib
+
 from MaKaC import conference
 from indico.core.config import Config
+from indico.util.event import uniqueId
+from MaKaC.common.cache import GenericCache
 from MaKaC.common.output import outputGenerator
+from MaKaC.common.xmlGen import StreamingXMLGen
 from MaKaC import accessControl
 
 
+# bump it whenever the MARCXML generated for a record changes, so fragments
+# produced by an older version are not reused anymore
+FRAGMENT_FORMAT_VERSION = 1
+
+
+def _getModificationDates(obj):
+    """
+    Returns the modification dates of `obj` and of all its owners up to
+    (and including) the conference
+    """
+    dates = []
+    while obj is not None and not isinstance(obj, conference.Category):
+        getModificationDate = getattr(obj, 'getModificationDate', None)
+        dates.append(getModificationDate().isoformat() if getModificationDate else None)
+        obj = obj.getOwner()
+    return dates
+
+
+def _getACLFingerprint(obj):
+    """
+    Returns a representation of the effective ACL of `obj`, i.e. its
+    protection level and everyone who is allowed to access it taking
+    into account the ACLs of its owners
+    """
+    principals = sorted('%s:%s' % (principal.__class__.__name__, principal.getId())
+                        for principal in obj.getRecursiveAllowedToAccessList())
+    return [uniqueId(obj), obj.getAccessProtectionLevel(), principals]
+
+
+def getRecordFingerprint(obj):
+    """
+    Returns a fingerprint of everything the MARCXML of a record depends on.
+
+    Changing the ACL of an object (or of one of its owners) does not call
+    `notifyModification`, so the modification date alone cannot be trusted;
+    the fingerprint therefore also covers the effective ACL of the record
+    and of all its materials and resources.
+    """
+    parts = [FRAGMENT_FORMAT_VERSION, obj.__class__.__name__, uniqueId(obj),
+             _getModificationDates(obj), obj.getCategoriesPath(), _getACLFingerprint(obj)]
+    for mat in obj.getAllMaterialList():
+        parts.append(_getACLFingerprint(mat))
+        for res in mat.getResourceList():
+            parts.append(_getACLFingerprint(res))
+    return hashlib.sha1(repr(parts)).hexdigest()
+
+
+class MARCXMLFragmentCache(object):
+    """
+    Persistent cache holding the MARCXML of single records together with
+    the fingerprint they were generated for.  New fragments are buffered
+    and written with a single request by :meth:`flush`.
+    """
+
+    TTL = 7 * 86400
+
+    def __init__(self, namespace='livesync-marcxml'):
+        self._cache = GenericCache(namespace)
+        # prefetched entries; records missing from the cache are kept as
+        # ``None`` so they are not looked up a second time
+        self._pending = {}
+        self._new = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _makeKey(self, obj, user):
+        return '%s-%s' % (user.getId() if user else 'anonymous', uniqueId(obj))
+
+    def prefetch(self, objs, user=None):
+        """
+        Loads the fragments of many records with a single request to the
+        cache backend
+        """
+        keys = [self._makeKey(obj, user) for obj in objs]
+        entries = self._cache.get_multi(keys)
+        self._pending.update((key, entries.get(key)) for key in keys)
+
+    def get(self, obj, fingerprint, user=None):
+        """
+        Returns the cached MARCXML of `obj` if it was generated for the
+        same fingerprint, otherwise ``None``
+        """
+        key = self._makeKey(obj, user)
+        if key in self._pending:
+            entry = self._pending.pop(key)
+        else:
+            entry = self._cache.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, obj, fingerprint, xml, user=None):
+        self._new[self._makeKey(obj, user)] = (fingerprint, xml)
+
+    def flush(self):
+        """
+        Writes the fragments added since the last call to the cache backend
+        """
+        if self._new:
+            self._cache.set_multi(self._new, self.TTL)
+            self._new = {}
+
+
 class MARCXMLGenerator:
     """
     Generates MARCXML based on Indico DB objects
@@ -41,10 +151,22 @@ class MARCXMLGenerator:
         """
         self._user.setUser(avatar)
 
-    def generate(self, obj, out=None, overrideCache=False, deleted=False):
+    def generate(self, obj, out=None, overrideCache=False, deleted=False, fragmentCache=None):
+        """
+        Generates the MARCXML of a record.  If a `fragmentCache` is given, the
+        record is taken from it as long as its fingerprint did not change and
+        only regenerated (and stored in the cache) otherwise.
+
+        The XML is only written to `out`; joining everything written so far
+        after each record made generating large batches quadratic.
+        """
         if not out:
             out = self._XMLGen
 
+        if fragmentCache is not None and not deleted:
+            out.writeXML(self._generateFragment(obj, fragmentCache))
+            return
+
         if deleted:
             if type(obj) != str:
                 raise AttributeError("Expected int id, got '%s'" % obj)
@@ -69,7 +191,19 @@ class MARCXMLGenerator:
             self.subContToXMLMarc(obj, out=out, overrideCache=overrideCache)
         else:
             raise Exception("unknown object type: %s" % obj.__class__)
-        return out.getXml()
+
+    def _generateFragment(self, obj, fragmentCache):
+        user = self._user.getUser()
+        fingerprint = getRecordFingerprint(obj)
+        xml = fragmentCache.get(obj, fingerprint, user=user)
+        if xml is None:
+            # the record is generated separately so nothing is left in the
+            # output if it fails halfway through
+            temp = StreamingXMLGen(init=False)
+            self.generate(obj, out=temp, overrideCache=True)
+            xml = temp.getXml()
+            fragmentCache.set(obj, fingerprint, xml, user=user)
+        return xml
 
     def confToXMLMarc(self, obj, out=None, overrideCache=False):
         if not out:
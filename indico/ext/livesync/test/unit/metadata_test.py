@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+
+from indico.ext.livesync.metadata import MARCXMLFragmentCache, getRecordFingerprint
+from indico.tests.python.unit.util import IndicoTestCase
+
+
+class PrincipalStub(object):
+    def __init__(self, pid):
+        self._id = pid
+
+    def getId(self):
+        return self._id
+
+
+class ProtectedStub(object):
+    def __init__(self, oid):
+        self._id = oid
+        self.allowed = []
+        self.protection = 0
+
+    def getId(self):
+        return self._id
+
+    def getOwner(self):
+        return None
+
+    def getRecursiveAllowedToAccessList(self):
+        return self.allowed
+
+    def getAccessProtectionLevel(self):
+        return self.protection
+
+
+class MaterialStub(ProtectedStub):
+    def __init__(self, oid):
+        super(MaterialStub, self).__init__(oid)
+        self.resources = []
+
+    def getResourceList(self):
+        return self.resources
+
+
+class RecordStub(ProtectedStub):
+    def __init__(self, oid):
+        super(RecordStub, self).__init__(oid)
+        self.modificationDate = datetime(2014, 5, 1, 12, 0)
+        self.materials = []
+
+    def getModificationDate(self):
+        return self.modificationDate
+
+    def getCategoriesPath(self):
+        return [['0', '1']]
+
+    def getAllMaterialList(self):
+        return self.materials
+
+
+class CacheStub(object):
+    """
+    In-memory stand-in for GenericCache which records the requests made
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.requests = []
+
+    def get(self, key):
+        self.requests.append(('get', key))
+        return self.data.get(key)
+
+    def get_multi(self, keys):
+        self.requests.append(('get_multi', tuple(keys)))
+        return dict((key, self.data.get(key)) for key in keys)
+
+    def set_multi(self, mapping, ttl=0):
+        self.requests.append(('set_multi', tuple(sorted(mapping))))
+        self.data.update(mapping)
+
+
+class TestRecordFingerprint(IndicoTestCase):
+
+    def setUp(self):
+        super(TestRecordFingerprint, self).setUp()
+        self._record = RecordStub('1')
+        self._material = MaterialStub('0')
+        self._resource = ProtectedStub('0')
+        self._material.resources.append(self._resource)
+        self._record.materials.append(self._material)
+
+    def _assertChanged(self, change):
+        fingerprint = getRecordFingerprint(self._record)
+        change()
+        self.assertNotEqual(getRecordFingerprint(self._record), fingerprint)
+
+    def testStable(self):
+        self.assertEqual(getRecordFingerprint(self._record), getRecordFingerprint(self._record))
+        self.assertNotEqual(getRecordFingerprint(self._record), getRecordFingerprint(RecordStub('2')))
+
+    def testModification(self):
+        def _change():
+            self._record.modificationDate = datetime(2014, 5, 2, 12, 0)
+        self._assertChanged(_change)
+
+    def testRecordACL(self):
+        self._assertChanged(lambda: self._record.allowed.append(PrincipalStub('1')))
+
+    def testRecordProtection(self):
+        def _change():
+            self._record.protection = 1
+        self._assertChanged(_change)
+
+    def testResourceACL(self):
+        self._assertChanged(lambda: self._resource.allowed.append(PrincipalStub('1')))
+
+    def testMaterialACL(self):
+        self._material.allowed.append(PrincipalStub('1'))
+        self._assertChanged(lambda: self._material.allowed.append(PrincipalStub('2')))
+
+
+class TestMARCXMLFragmentCache(IndicoTestCase):
+
+    def setUp(self):
+        super(TestMARCXMLFragmentCache, self).setUp()
+        self._fragments = MARCXMLFragmentCache()
+        self._backend = self._fragments._cache = CacheStub()
+        self._records = [RecordStub(str(i)) for i in xrange(3)]
+
+    def testPrefetchedMisses(self):
+        self._fragments.prefetch(self._records)
+        for record in self._records:
+            self.assertEqual(self._fragments.get(record, 'fp'), None)
+        # misses found while prefetching are not requested again
+        self.assertEqual([req for req, keys in self._backend.requests], ['get_multi'])
+        self.assertEqual(self._fragments.misses, 3)
+
+    def testPrefetchedHits(self):
+        self._backend.data['anonymous-0'] = ('fp', '<record/>')
+        self._backend.data['anonymous-1'] = ('old', '<record/>')
+        self._fragments.prefetch(self._records[:2])
+        self.assertEqual(self._fragments.get(self._records[0], 'fp'), '<record/>')
+        self.assertEqual(self._fragments.get(self._records[1], 'fp'), None)
+        # not prefetched
+        self.assertEqual(self._fragments.get(self._records[2], 'fp'), None)
+        self.assertEqual([req for req, keys in self._backend.requests], ['get_multi', 'get'])
+        self.assertEqual((self._fragments.hits, self._fragments.misses), (1, 2))
+
+    def testFlush(self):
+        for record in self._records:
+            self._fragments.set(record, 'fp', '<record id="%s"/>' % record.getId())
+        self.assertEqual(self._backend.requests, [])
+        self._fragments.flush()
+        self._fragments.flush()
+        self.assertEqual(self._backend.requests,
+                         [('set_multi', ('anonymous-0', 'anonymous-1', 'anonymous-2'))])
+        self.assertEqual(self._fragments.get(self._records[1], 'fp'), '<record id="1"/>')
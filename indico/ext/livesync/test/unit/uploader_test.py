@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+from indico.ext.livesync.agent import RecordUploader
+from indico.tests.python.unit.util import IndicoTestCase
+
+
+class UploadFailed(Exception):
+    pass
+
+
+class LoggerStub(object):
+    def __init__(self):
+        self.exceptions = []
+
+    def info(self, msg):
+        pass
+
+    def exception(self, msg):
+        self.exceptions.append(msg)
+
+
+class AgentStub(object):
+    """
+    Generates the metadata of a batch, remembering in which thread it did so
+    """
+    def __init__(self, failAt=None):
+        self.generated = []
+        self.threads = set()
+        self._failAt = failAt
+
+    def _getMetadata(self, batch, logger=None):
+        if self._failAt in batch:
+            raise ValueError('cannot generate record %d' % self._failAt)
+        self.threads.add(threading.current_thread())
+        self.generated.append(list(batch))
+        return 'meta(%s)' % ','.join(map(str, batch))
+
+
+class EndpointStub(object):
+    """
+    A remote service which fails the first `failures[n]` times the n-th
+    batch is sent to it
+    """
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.received = []
+        self.attempts = []
+        self.threads = set()
+        self.block = None
+
+    def send(self, batch, data):
+        self.threads.add(threading.current_thread())
+        if self.block is not None:
+            self.block.wait()
+        n = len(self.received)
+        self.attempts.append(n)
+        if self.failures.get(n):
+            self.failures[n] -= 1
+            raise UploadFailed('batch %d failed' % n)
+        self.received.append((list(batch), data))
+
+
+class UploaderStub(RecordUploader):
+    RETRY_DELAY = 0
+
+    def __init__(self, logger, agent, endpoint, batchSize):
+        super(UploaderStub, self).__init__(logger, agent, batchSize=batchSize)
+        self._endpoint = endpoint
+
+    def _sendBatch(self, batch, data):
+        self._endpoint.send(batch, data)
+
+
+class SequentialUploaderStub(UploaderStub):
+    """
+    An uploader written before `_sendBatch` existed
+    """
+    def _uploadBatch(self, batch):
+        self._endpoint.send(batch, self._generateBatch(batch))
+
+
+class TestPipelinedUploader(IndicoTestCase):
+
+    def setUp(self):
+        super(TestPipelinedUploader, self).setUp()
+        self._logger = LoggerStub()
+
+    def _upload(self, endpoint, agent=None, numRecords=10, batchSize=3, uploaderClass=UploaderStub):
+        self._agent = agent or AgentStub()
+        uploader = uploaderClass(self._logger, self._agent, endpoint, batchSize)
+        return uploader.iterateOver(iter(xrange(numRecords)))
+
+    def _received(self, endpoint):
+        return [record for batch, _ in endpoint.received for record in batch]
+
+    def testOrdering(self):
+        endpoint = EndpointStub()
+        self.assertTrue(self._upload(endpoint))
+        self.assertEqual(endpoint.received, [([0, 1, 2], 'meta(0,1,2)'),
+                                             ([3, 4, 5], 'meta(3,4,5)'),
+                                             ([6, 7, 8], 'meta(6,7,8)'),
+                                             ([9], 'meta(9)')])
+        self.assertEqual(self._logger.exceptions, [])
+
+    def testThreads(self):
+        endpoint = EndpointStub()
+        self._upload(endpoint)
+        # metadata generation needs the database, so it stays in this thread
+        self.assertEqual(self._agent.threads, set([threading.current_thread()]))
+        self.assertEqual(len(endpoint.threads), 1)
+        self.assertNotIn(threading.current_thread(), endpoint.threads)
+        self.assertFalse(any(thread.is_alive() for thread in endpoint.threads))
+
+    def testRetries(self):
+        endpoint = EndpointStub(failures={1: RecordUploader.MAX_RETRIES})
+        self._upload(endpoint)
+        # no record is lost or sent twice and the order is kept
+        self.assertEqual(self._received(endpoint), range(10))
+        self.assertEqual(endpoint.attempts, [0] + [1] * (RecordUploader.MAX_RETRIES + 1) + [2, 3])
+        self.assertEqual(len(self._logger.exceptions), RecordUploader.MAX_RETRIES)
+
+    def testRetryLimit(self):
+        endpoint = EndpointStub(failures={1: RecordUploader.MAX_RETRIES + 1})
+        self.assertRaises(UploadFailed, self._upload, endpoint)
+        self.assertEqual(endpoint.attempts, [0] + [1] * (RecordUploader.MAX_RETRIES + 1))
+        # the batches after the failed one are not sent, so the records the
+        # next run starts from have not been uploaded out of order
+        self.assertEqual(self._received(endpoint), [0, 1, 2])
+        self.assertFalse(any(thread.is_alive() for thread in endpoint.threads))
+
+    def testGenerationFailure(self):
+        endpoint = EndpointStub()
+        self.assertRaises(ValueError, self._upload, endpoint, AgentStub(failAt=7))
+        # the batches generated before the failure have been uploaded
+        self.assertEqual(self._received(endpoint), range(6))
+        self.assertFalse(any(thread.is_alive() for thread in endpoint.threads))
+
+    def testPipelineDepth(self):
+        endpoint = EndpointStub()
+        endpoint.block = threading.Event()
+        agent = AgentStub()
+        thread = threading.Thread(target=self._upload, args=(endpoint, agent, 30, 3))
+        thread.start()
+        try:
+            # one batch being uploaded, `PIPELINE_DEPTH` waiting in the
+            # queue and one generated batch waiting for a free slot
+            expected = RecordUploader.PIPELINE_DEPTH + 2
+            for i in xrange(100):
+                if len(agent.generated) >= expected:
+                    break
+                time.sleep(0.01)
+            time.sleep(0.1)
+            self.assertEqual(len(agent.generated), expected)
+        finally:
+            endpoint.block.set()
+            thread.join()
+        self.assertEqual(self._received(endpoint), range(30))
+
+    def testSequentialUploader(self):
+        endpoint = EndpointStub()
+        self._upload(endpoint, uploaderClass=SequentialUploaderStub)
+        self.assertEqual(self._received(endpoint), range(10))
+        self.assertEqual(endpoint.threads, set([threading.current_thread()]))
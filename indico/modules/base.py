@@ -50,6 +50,7 @@ class ModuleHolder( ObjectHolder ):
         from indico.modules import upcoming
         from indico.modules import scheduler
         from indico.modules import offlineEvents
+        from indico.modules import outbox
 
 
         ModuleHolder._availableModules = {
@@ -57,7 +58,8 @@ class ModuleHolder( ObjectHolder ):
             cssTpls.CssTplsModule.id              : cssTpls.CssTplsModule,
             upcoming.UpcomingEventsModule.id      : upcoming.UpcomingEventsModule,
             scheduler.SchedulerModule.id          : scheduler.SchedulerModule,
-            offlineEvents.OfflineEventsModule.id  : offlineEvents.OfflineEventsModule
+            offlineEvents.OfflineEventsModule.id  : offlineEvents.OfflineEventsModule,
+            outbox.MailOutboxModule.id            : outbox.MailOutboxModule
         }
 
     def _newId( self ):
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+*Mail outbox* module: e-mails waiting to be delivered by the scheduler
+"""
+
+import smtplib
+import socket
+import time
+import uuid
+
+import transaction
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+
+from indico.core.config import Config
+from indico.core.db import DBMgr
+from indico.core.logger import Logger
+from indico.modules import Module
+from MaKaC.common.mail import GenericMailer, RateLimiter
+from MaKaC.errors import MaKaCError
+
+
+class OutboxMessage(Persistent):
+    """
+    An e-mail (as prepared by `GenericMailer`) waiting to be delivered
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.createdOn = time.time()
+        self.attempts = 0
+        self.nextAttempt = self.createdOn
+        self.lastError = None
+
+
+class MailOutboxModule(Module):
+    """
+    Stores the e-mails sent while the mail outbox is enabled, ordered by the
+    time of their next delivery attempt.  Messages which could not be
+    delivered after several attempts are moved to a separate list of failed
+    messages.
+    """
+
+    id = "mail_outbox"
+
+    def __init__(self):
+        self._queue = OOBTree()
+        self._failed = OOBTree()
+
+    def _add(self, msg):
+        # the keys keep the messages ordered by `nextAttempt` and are unique
+        # across processes, so concurrent inserts do not conflict
+        key = '{0:017.6f}.{1}'.format(msg.nextAttempt, uuid.uuid4().hex[:8])
+        self._queue[key] = msg
+        return key
+
+    def enqueue(self, data):
+        return self._add(OutboxMessage(data))
+
+    def getDueMessages(self, now, limit):
+        """Returns up to `limit` ``(key, message)`` tuples of messages which
+        should be delivered now"""
+        res = []
+        for key, msg in self._queue.iteritems():
+            if msg.nextAttempt > now or len(res) >= limit:
+                break
+            res.append((key, msg))
+        return res
+
+    def remove(self, key):
+        self._queue.pop(key, None)
+
+    def postpone(self, key, error, delay):
+        """Moves a message back in the queue so it is retried after `delay`
+        seconds.  Returns its new key."""
+        msg = self._queue.pop(key, None)
+        if msg is not None:
+            msg.attempts += 1
+            msg.lastError = error
+            msg.nextAttempt = time.time() + delay
+            return self._add(msg)
+
+    def fail(self, key, error):
+        msg = self._queue.pop(key, None)
+        if msg is not None:
+            msg.attempts += 1
+            msg.lastError = error
+            self._failed[key] = msg
+
+    def getQueueLength(self):
+        return len(self._queue)
+
+    def getFailedMessages(self):
+        return self._failed.values()
+
+
+class OutboxDelivery(object):
+    """
+    Delivers the messages of the outbox, reusing the SMTP connections of the
+    pool and sending at most `SmtpRateLimit` messages per second.  Messages
+    which could not be sent are retried with an exponential backoff, unless
+    the server rejected them permanently.
+    """
+
+    BATCH_SIZE = 50
+    MAX_ATTEMPTS = 8
+    RETRY_DELAY = 60  # doubled after each failed attempt
+    MAX_RETRY_DELAY = 6 * 3600
+    MAX_COMMIT_ATTEMPTS = 5
+
+    def __init__(self, logger=None, pool=None, rateLimiter=None):
+        self._logger = logger or Logger.get('mail')
+        self._pool = pool or GenericMailer.getConnectionPool()
+        self._rateLimiter = rateLimiter or RateLimiter(Config.getInstance().getSmtpRateLimit())
+
+    @staticmethod
+    def _isPermanent(e):
+        if isinstance(e, smtplib.SMTPRecipientsRefused):
+            return True
+        # a wrong login is a configuration problem which will hopefully be fixed
+        return (isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500 and
+                not isinstance(e, smtplib.SMTPAuthenticationError))
+
+    def _getRetryDelay(self, attempts):
+        return min(self.RETRY_DELAY * 2 ** attempts, self.MAX_RETRY_DELAY)
+
+    def _sendBatch(self, batch):
+        results = []
+        for key, data, attempts in batch:
+            self._rateLimiter.wait()
+            try:
+                GenericMailer._sendmail(data, self._pool)
+            except (smtplib.SMTPException, socket.error, MaKaCError) as e:
+                self._logger.warning('Could not send mail to {0}: {1!r}'.format(data['toList'], e))
+                results.append((key, attempts, e))
+            else:
+                results.append((key, attempts, None))
+        return results
+
+    def _record(self, results):
+        for i, retry in enumerate(transaction.attempts(self.MAX_COMMIT_ATTEMPTS)):
+            with retry:
+                if i > 0:
+                    DBMgr.getInstance().sync()
+                outbox = MailOutboxModule.getDBInstance()
+                for key, attempts, error in results:
+                    if error is None:
+                        outbox.remove(key)
+                    elif self._isPermanent(error) or attempts + 1 >= self.MAX_ATTEMPTS:
+                        outbox.fail(key, repr(error))
+                    else:
+                        outbox.postpone(key, repr(error), self._getRetryDelay(attempts))
+                transaction.commit()
+                break
+
+    def deliver(self, timeLimit=None):
+        """
+        Delivers the due messages until there are none left or `timeLimit`
+        seconds have passed.  Returns the number of sent and failed messages.
+
+        Every batch is committed right after sending it, so messages are not
+        sent again if something fails later.
+        """
+        start = time.time()
+        sent = failed = 0
+        transaction.commit()
+        try:
+            while timeLimit is None or time.time() - start < timeLimit:
+                outbox = MailOutboxModule.getDBInstance()
+                batch = [(key, dict(msg.data), msg.attempts)
+                         for key, msg in outbox.getDueMessages(time.time(), self.BATCH_SIZE)]
+                if not batch:
+                    break
+                results = self._sendBatch(batch)
+                self._record(results)
+                failures = sum(1 for key, attempts, error in results if error is not None)
+                sent += len(results) - failures
+                failed += failures
+        finally:
+            self._pool.close()
+        return sent, failed
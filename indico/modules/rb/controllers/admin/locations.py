@@ -18,7 +18,6 @@
 ## along with Indico.  If not, see <http://www.gnu.org/licenses/>.
 
 from flask import request, flash
-from sqlalchemy import func
 
 from MaKaC.webinterface import urlHandlers
 from indico.core.errors import IndicoError, FormValuesError, NoReportError
@@ -26,11 +25,10 @@ from indico.core.db import db
 from indico.util.i18n import _
 from indico.modules.rb.controllers.admin import RHRoomBookingAdminBase
 from indico.modules.rb.models.locations import Location
-from indico.modules.rb.models.reservations import Reservation
-from indico.modules.rb.models.rooms import Room
 from indico.modules.rb.models.room_attributes import RoomAttribute
 from indico.modules.rb.models.equipment import EquipmentType
-from indico.modules.rb.statistics import calculate_rooms_occupancy, compose_rooms_stats
+from indico.modules.rb.statistics import (calculate_rooms_occupancy, compose_location_room_stats,
+                                         compose_rooms_stats)
 from indico.modules.rb.views.admin.locations import WPRoomBookingAdmin, WPRoomBookingAdminLocation
 from indico.util.string import natural_sort_key
 
@@ -92,16 +90,10 @@ class RHRoomBookingAdminLocation(RHRoomBookingAdminBase):
         rooms = sorted(self._location.rooms, key=lambda r: natural_sort_key(r.full_name))
         kpi = {}
         if self._with_kpi:
-            kpi['occupancy'] = calculate_rooms_occupancy(self._location.rooms.all())
-            kpi['total_rooms'] = self._location.rooms.count()
-            kpi['active_rooms'] = self._location.rooms.filter_by(is_active=True).count()
-            kpi['reservable_rooms'] = self._location.rooms.filter_by(is_reservable=True).count()
-            kpi['reservable_capacity'] = (self._location.rooms.with_entities(func.sum(Room.capacity))
-                                                              .filter_by(is_reservable=True).scalar())
-            kpi['reservable_surface'] = (self._location.rooms.with_entities(func.sum(Room.surface_area))
-                                                             .filter_by(is_reservable=True).scalar())
-            kpi['booking_stats'] = compose_rooms_stats(self._location.rooms.all())
-            kpi['booking_count'] = Reservation.find(Reservation.room_id.in_(r.id for r in self._location.rooms)).count()
+            kpi['occupancy'] = calculate_rooms_occupancy(rooms)
+            kpi.update(compose_location_room_stats(self._location))
+            kpi['booking_stats'] = compose_rooms_stats(rooms)
+            kpi['booking_count'] = kpi['booking_stats']['total']
         return WPRoomBookingAdminLocation(self,
                                           location=self._location,
                                           rooms=rooms,
@@ -19,6 +19,7 @@
 
 from datetime import datetime, time, timedelta, date
 from collections import defaultdict
+from operator import attrgetter
 
 import dateutil
 import transaction
@@ -41,7 +42,7 @@ from indico.modules.rb.views.user.reservations import (WPRoomBookingSearchBookin
                                                        WPRoomBookingNewBookingConfirm,
                                                        WPRoomBookingNewBookingSimple, WPRoomBookingModifyBooking,
                                                        WPRoomBookingBookingDetails)
-from indico.util.date_time import get_datetime_from_request
+from indico.util.date_time import get_datetime_from_request, iter_overlaps
 from indico.util.i18n import _
 from indico.util.string import natural_sort_key
 from indico.web.flask.util import url_for
@@ -280,13 +281,11 @@ class RHRoomBookingNewBookingBase(RHRoomBookingBase):
                                                          (form.repeat_interval.data, form.repeat_interval.data))
         occurrences = ReservationOccurrence.find_overlapping_with(room, candidates, reservation_id).all()
 
-        for cand in candidates:
-            for occ in occurrences:
-                if cand.overlaps(occ):
-                    if occ.reservation.is_accepted:
-                        conflicts[cand].append(occ)
-                    else:
-                        pre_conflicts[cand].append(occ)
+        for cand, occ in iter_overlaps(candidates, occurrences, key=attrgetter('start_dt', 'end_dt')):
+            if occ.reservation.is_accepted:
+                conflicts[cand].append(occ)
+            else:
+                pre_conflicts[cand].append(occ)
 
         return conflicts, pre_conflicts
 
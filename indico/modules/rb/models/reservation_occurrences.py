@@ -27,7 +27,8 @@ from sqlalchemy.sql import cast
 from indico.core.db import db
 from indico.core.errors import IndicoError
 from indico.modules.rb.models.reservation_edit_logs import ReservationEditLog
-from indico.modules.rb.models.utils import proxy_to_reservation_if_single_occurrence, Serializer, db_dates_overlap
+from indico.modules.rb.models.utils import (proxy_to_reservation_if_single_occurrence, Serializer, db_dates_overlap,
+                                            db_dates_overlap_any)
 from indico.util import date_time
 from indico.util.date_time import iterdays, format_date
 from indico.util.string import return_ascii
@@ -149,8 +150,8 @@ class ReservationOccurrence(db.Model, Serializer):
 
     @staticmethod
     def filter_overlap(occurrences):
-        return or_(db_dates_overlap(ReservationOccurrence, 'start_dt', occ.start_dt, 'end_dt', occ.end_dt)
-                   for occ in occurrences)
+        return db_dates_overlap_any(ReservationOccurrence, 'start_dt', 'end_dt',
+                                    [(occ.start_dt, occ.end_dt) for occ in occurrences])
 
     @staticmethod
     def find_overlapping_with(room, occurrences, reservation_id=None):
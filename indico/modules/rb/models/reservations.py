@@ -19,6 +19,7 @@
 
 from collections import defaultdict, OrderedDict
 from datetime import datetime
+from operator import attrgetter
 
 from sqlalchemy import Date, Time
 from sqlalchemy.ext.declarative import declared_attr
@@ -40,7 +41,7 @@ from indico.modules.rb.models.utils import limit_groups, unimplemented, Serializ
 from indico.modules.rb.notifications.reservations import (notify_confirmation, notify_cancellation,
                                                           notify_creation, notify_modification,
                                                           notify_rejection)
-from indico.util.date_time import now_utc, format_date, format_time
+from indico.util.date_time import now_utc, format_date, format_time, iter_overlaps
 from indico.util.i18n import _, N_
 from indico.util.string import return_ascii
 from indico.util.struct.enum import IndicoEnum
@@ -448,11 +449,10 @@ class Reservation(Serializer, db.Model):
         valid_occurrences = self.occurrences.filter(ReservationOccurrence.is_valid).all()
         colliding_occurrences = ReservationOccurrence.find_overlapping_with(self.room, valid_occurrences, self.id).all()
         conflicts = defaultdict(lambda: dict(confirmed=[], pending=[]))
-        for occurrence in valid_occurrences:
-            for colliding in colliding_occurrences:
-                if occurrence.overlaps(colliding):
-                    key = 'confirmed' if colliding.reservation.is_accepted else 'pending'
-                    conflicts[occurrence][key].append(colliding)
+        for occurrence, colliding in iter_overlaps(valid_occurrences, colliding_occurrences,
+                                                   key=attrgetter('start_dt', 'end_dt')):
+            key = 'confirmed' if colliding.reservation.is_accepted else 'pending'
+            conflicts[occurrence][key].append(colliding)
         return conflicts
 
     def create_occurrences(self, skip_conflicts, user):
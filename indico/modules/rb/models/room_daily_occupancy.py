@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Daily per-room rollup of the booked working time, used by the statistics
+"""
+
+from indico.core.db import db
+from indico.util.string import return_ascii
+
+
+class RoomDailyOccupancy(db.Model):
+    __tablename__ = 'room_daily_occupancy'
+    __table_args__ = {'schema': 'roombooking'}
+
+    room_id = db.Column(
+        db.Integer,
+        db.ForeignKey('roombooking.rooms.id', ondelete='CASCADE'),
+        primary_key=True,
+        nullable=False
+    )
+    day = db.Column(
+        db.Date,
+        primary_key=True,
+        nullable=False,
+        index=True
+    )
+    booked_time = db.Column(
+        db.Interval,
+        nullable=False
+    )
+
+    @return_ascii
+    def __repr__(self):
+        return u'<RoomDailyOccupancy({0}, {1}, {2})>'.format(
+            self.room_id,
+            self.day,
+            self.booked_time
+        )
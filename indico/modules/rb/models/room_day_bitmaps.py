@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Materialized free/busy bitmaps of the rooms.
+
+For every room and day with bookings, a bit string with one bit per
+`SLOT_MINUTES` slot of the day tells which slots are (partially) used by
+valid confirmed and unconfirmed occurrences.  Availability searches then
+only need to AND the bitmaps of the searched days with the mask of the
+searched time instead of matching every occurrence against every day.
+
+The bitmaps are updated when a transaction changing occurrences or their
+reservations is committed.  Since occurrences do not have to start and end
+on slot boundaries, each row also records whether its bits are exact; if
+not, a conflicting bit only means the room *may* be booked and the usual
+query is used for it.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import inspect, tuple_
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.event import listens_for
+from sqlalchemy.orm import Session
+
+from indico.core.db import db
+from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.models.reservations import Reservation
+from indico.util.string import return_ascii
+
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+# setting telling whether the bitmaps have been built and can be used
+BUILT_SETTING = 'availability_bitmaps_built'
+
+_EMPTY = '0' * SLOTS_PER_DAY
+# reservation attributes affecting the bitmaps of all its days
+_RESERVATION_ATTRS = ('room_id', 'room', 'is_accepted', 'is_cancelled', 'is_rejected', 'start_dt', 'end_dt',
+                      'repeat_frequency', 'repeat_interval')
+_BATCH_SIZE = 500
+
+
+def get_time_mask(start_dt, end_dt):
+    """Returns the slots touched by a time range within a day.
+
+    :return: a ``(mask, exact)`` tuple; `mask` is an int with one bit per slot
+             and `exact` tells whether the range starts and ends on slot
+             boundaries.
+    """
+    start = start_dt.hour * 60 + start_dt.minute
+    end = end_dt.hour * 60 + end_dt.minute
+    if end_dt.date() > start_dt.date():
+        end = 24 * 60
+    exact = (not start_dt.second and not start_dt.microsecond and not end_dt.second and not end_dt.microsecond and
+             start % SLOT_MINUTES == 0 and end % SLOT_MINUTES == 0)
+    if end_dt.second or end_dt.microsecond:
+        end += 1
+    first = start // SLOT_MINUTES
+    last = -(-end // SLOT_MINUTES)
+    if last <= first:
+        return 0, exact
+    return ((1 << (last - first)) - 1) << first, exact
+
+
+def mask_to_bits(mask):
+    """Converts a slot mask to a bit string with the first slot on the left"""
+    return format(mask, '0{}b'.format(SLOTS_PER_DAY))[::-1]
+
+
+def bits_to_mask(bits):
+    return int(bits[::-1], 2)
+
+
+class RoomDayBitmap(db.Model):
+    __tablename__ = 'room_day_bitmaps'
+    __table_args__ = {'schema': 'roombooking'}
+
+    room_id = db.Column(
+        db.Integer,
+        db.ForeignKey('roombooking.rooms.id', ondelete='CASCADE'),
+        primary_key=True,
+        nullable=False
+    )
+    day = db.Column(
+        db.Date,
+        primary_key=True,
+        nullable=False,
+        index=True
+    )
+    booked = db.Column(
+        BIT(SLOTS_PER_DAY),
+        nullable=False
+    )
+    pre_booked = db.Column(
+        BIT(SLOTS_PER_DAY),
+        nullable=False
+    )
+    is_exact = db.Column(
+        db.Boolean,
+        nullable=False
+    )
+
+    @return_ascii
+    def __repr__(self):
+        return u'<RoomDayBitmap({0}, {1}, {2})>'.format(
+            self.room_id,
+            self.day,
+            'exact' if self.is_exact else 'approximate'
+        )
+
+    @staticmethod
+    def is_built():
+        from indico.modules.rb import settings
+        return bool(settings.get(BUILT_SETTING, False))
+
+    @staticmethod
+    def _compute(rows):
+        """Computes the bitmaps from ``(room_id, start_dt, end_dt, is_accepted)`` rows"""
+        bitmaps = defaultdict(lambda: [0, 0, True])
+        for room_id, start_dt, end_dt, is_accepted in rows:
+            mask, exact = get_time_mask(start_dt, end_dt)
+            entry = bitmaps[room_id, start_dt.date()]
+            entry[0 if is_accepted else 1] |= mask
+            entry[2] &= exact
+        return bitmaps
+
+    @staticmethod
+    def _query_occurrences(*criteria):
+        return (db.session.query(Reservation.room_id, ReservationOccurrence.start_dt, ReservationOccurrence.end_dt,
+                                 Reservation.is_accepted)
+                .join(ReservationOccurrence.reservation)
+                .filter(ReservationOccurrence.is_valid, *criteria))
+
+    @staticmethod
+    def _key_criterion(keys):
+        return tuple_(Reservation.room_id, db.cast(ReservationOccurrence.start_dt, db.Date)).in_(keys)
+
+    @classmethod
+    def _store(cls, bitmaps):
+        rows = [{'room_id': room_id, 'day': day, 'booked': mask_to_bits(booked),
+                 'pre_booked': mask_to_bits(pre_booked), 'is_exact': exact}
+                for (room_id, day), (booked, pre_booked, exact) in bitmaps.iteritems()]
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def refresh(cls, keys):
+        """Recomputes the bitmaps of the given ``(room_id, day)`` pairs"""
+        keys = list(keys)
+        table = cls.__table__
+        for i in xrange(0, len(keys), _BATCH_SIZE):
+            batch = keys[i:i + _BATCH_SIZE]
+            bitmaps = cls._compute(cls._query_occurrences(cls._key_criterion(batch)))
+            db.session.execute(table.delete().where(tuple_(table.c.room_id, table.c.day).in_(batch)))
+            cls._store(bitmaps)
+
+    @classmethod
+    def rebuild(cls):
+        """Rebuilds the bitmaps of all rooms and marks them as usable"""
+        from indico.modules.rb import settings
+        db.session.execute(cls.__table__.delete())
+        cls._store(cls._compute(cls._query_occurrences().yield_per(10000)))
+        settings.set(BUILT_SETTING, True)
+
+    @classmethod
+    def find_inconsistent(cls, start_date=None, end_date=None):
+        """Compares the stored bitmaps with the ones computed from the occurrences.
+
+        :return: the ``(room_id, day)`` pairs whose bitmaps differ
+        """
+        criteria = []
+        bitmap_criteria = []
+        if start_date:
+            criteria.append(ReservationOccurrence.start_dt >= datetime.combine(start_date, time()))
+            bitmap_criteria.append(cls.day >= start_date)
+        if end_date:
+            criteria.append(ReservationOccurrence.start_dt < datetime.combine(end_date + timedelta(days=1), time()))
+            bitmap_criteria.append(cls.day <= end_date)
+        expected = cls._compute(cls._query_occurrences(*criteria))
+        stored = {(b.room_id, b.day): [bits_to_mask(b.booked), bits_to_mask(b.pre_booked), b.is_exact]
+                  for b in cls.find(*bitmap_criteria)}
+        return sorted(key for key in expected.viewkeys() | stored.viewkeys() if expected.get(key) != stored.get(key))
+
+    @classmethod
+    def filter_conflicts(cls, occurrences, include_pre_bookings=True):
+        """Returns criteria for rooms with bookings during the given occurrences.
+
+        :return: ``None`` if the bitmaps cannot be used (not built or the
+                 searched times are not aligned to the slots), otherwise a
+                 ``(conflict, maybe_conflict)`` tuple of criteria matching
+                 rooms which are certainly booked and rooms which may be
+                 booked at the searched times.
+        """
+        from indico.modules.rb.models.rooms import Room
+
+        if not cls.is_built():
+            return None
+        days_by_mask = defaultdict(list)
+        for occurrence in occurrences:
+            mask, exact = get_time_mask(occurrence.start_dt, occurrence.end_dt)
+            if not exact:
+                return None
+            if mask:
+                days_by_mask[mask].append(occurrence.start_dt.date())
+        if not days_by_mask:
+            return None
+
+        bits = cls.booked.op('|')(cls.pre_booked) if include_pre_bookings else cls.booked
+        empty = db.cast(_EMPTY, BIT(SLOTS_PER_DAY))
+        overlap = db.or_(*(cls.day.in_(days) & (bits.op('&')(db.cast(mask_to_bits(mask), BIT(SLOTS_PER_DAY))) != empty)
+                           for mask, days in days_by_mask.iteritems()))
+        conflict = db.exists().where((cls.room_id == Room.id) & cls.is_exact & overlap)
+        maybe_conflict = db.exists().where((cls.room_id == Room.id) & ~cls.is_exact & overlap)
+        return conflict, maybe_conflict
+
+
+def _get_room_ids(reservation):
+    """Returns the ids of the current and previous room of a reservation"""
+    state = inspect(reservation)
+    room_ids = set(state.attrs.room_id.history.sum())
+    # the room may have been changed through the relationship which only updates room_id during the flush
+    room_ids.update(room.id for room in state.attrs.room.history.sum() if room is not None)
+    room_ids.discard(None)
+    return room_ids
+
+
+def _get_changed_days(session):
+    """Returns the ``(room_id, day)`` pairs affected by the pending changes of a session"""
+    keys = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, ReservationOccurrence):
+            if obj.reservation is None:
+                continue
+            room_ids = _get_room_ids(obj.reservation)
+            days = {start_dt.date() for start_dt in inspect(obj).attrs.start_dt.history.sum()}
+            keys.update((room_id, day) for room_id in room_ids for day in days)
+        elif isinstance(obj, Reservation) and obj.id is not None:
+            state = inspect(obj)
+            if obj in session.deleted or any(state.attrs[attr].history.has_changes() for attr in _RESERVATION_ATTRS):
+                days = {day for day, in session.query(db.cast(ReservationOccurrence.start_dt, db.Date))
+                                              .filter(ReservationOccurrence.reservation_id == obj.id)}
+                keys.update((room_id, day) for room_id in _get_room_ids(obj) for day in days)
+    return keys
+
+
+@listens_for(Session, 'before_flush')
+def _collect_changed_days(session, flush_context, instances):
+    with session.no_autoflush:
+        keys = _get_changed_days(session)
+    if keys:
+        session.info.setdefault('rb_changed_days', set()).update(keys)
+
+
+@listens_for(Session, 'before_commit')
+def _update_bitmaps(session):
+    session.flush()
+    keys = session.info.pop('rb_changed_days', None)
+    # until the bitmaps are built there is nothing to keep up to date
+    if keys and RoomDayBitmap.is_built():
+        RoomDayBitmap.refresh(keys)
+
+
+@listens_for(Session, 'after_soft_rollback')
+def _discard_changed_days(session, previous_transaction):
+    session.info.pop('rb_changed_days', None)
@@ -41,6 +41,7 @@ from indico.modules.rb.models.reservation_occurrences import ReservationOccurren
 from indico.modules.rb.models.reservations import Reservation, RepeatMapping
 from indico.modules.rb.models.room_attributes import RoomAttribute, RoomAttributeAssociation
 from indico.modules.rb.models.room_bookable_hours import BookableHours
+from indico.modules.rb.models.room_day_bitmaps import RoomDayBitmap
 from indico.modules.rb.models.equipment import EquipmentType, RoomEquipmentAssociation
 from indico.modules.rb.models.room_nonbookable_periods import NonBookablePeriod
 from indico.modules.rb.models.utils import Serializer, cached, versioned_cache
@@ -462,8 +463,14 @@ class Room(versioned_cache(_cache, 'id'), db.Model, Serializer):
         return db.session.query(db.func.max(Room.capacity)).scalar() or 0
 
     @staticmethod
-    def filter_available(start_dt, end_dt, repetition, include_pre_bookings=True, include_pending_blockings=True):
-        """Returns a SQLAlchemy filter criterion ensuring that the room is available during the given time."""
+    def filter_available(start_dt, end_dt, repetition, include_pre_bookings=True, include_pending_blockings=True,
+                         use_bitmaps=True):
+        """Returns a SQLAlchemy filter criterion ensuring that the room is available during the given time.
+
+        If the free/busy bitmaps of the rooms are available and the searched
+        times are aligned to their slots, they are used to rule out rooms
+        instead of matching all occurrences against the searched series.
+        """
         # Check availability against reservation occurrences
         dummy_occurrences = ReservationOccurrence.create_series(start_dt, end_dt, repetition)
         overlap_criteria = ReservationOccurrence.filter_overlap(dummy_occurrences)
@@ -473,6 +480,13 @@ class Room(versioned_cache(_cache, 'id'), db.Model, Serializer):
         if not include_pre_bookings:
             reservation_criteria.append(Reservation.is_accepted)
         occurrences_filter = Reservation.occurrences.any(and_(*reservation_criteria))
+        bitmap_criteria = None
+        if use_bitmaps:
+            bitmap_criteria = RoomDayBitmap.filter_conflicts(dummy_occurrences, include_pre_bookings)
+        if bitmap_criteria is not None:
+            # only check the occurrences of days whose bitmaps are not exact
+            conflict, maybe_conflict = bitmap_criteria
+            occurrences_filter = conflict | (maybe_conflict & occurrences_filter)
         # Check availability against blockings
         if include_pending_blockings:
             valid_states = (BlockedRoom.State.accepted, BlockedRoom.State.pending)
@@ -23,7 +23,9 @@ from functools import wraps
 
 from dateutil.relativedelta import MO, TU, WE, TH, FR
 from dateutil.rrule import rrule, DAILY
-from sqlalchemy.sql import over, func
+from psycopg2.extras import DateTimeRange
+from sqlalchemy.dialects.postgresql import ARRAY, TSRANGE
+from sqlalchemy.sql import over, func, literal, false
 
 from indico.core.errors import IndicoError
 from indico.core.logger import Logger
@@ -216,3 +218,22 @@ def db_dates_overlap(entity, start_column, start, end_column, end, inclusive=Fal
         return (element_start <= end) & (start <= element_end)
     else:
         return (element_start < end) & (start < element_end)
+
+
+def db_dates_overlap_any(entity, start_column, end_column, ranges):
+    """Returns a criterion matching rows which overlap with any of the given ``(start, end)`` ranges.
+
+    Instead of one OR'ed condition per range, all ranges are sent as a single
+    ``tsrange[]`` parameter and matched with PostgreSQL's range overlap
+    operator.  The bounds of all ranges are checked as well so the indexes
+    on the columns can still be used.
+    """
+    if not ranges:
+        return false()
+    element_start = getattr(entity, start_column)
+    element_end = getattr(entity, end_column)
+    min_start = min(start for start, end in ranges)
+    max_end = max(end for start, end in ranges)
+    ranges_array = literal([DateTimeRange(start, end, '[)') for start, end in ranges], type_=ARRAY(TSRANGE))
+    return ((element_start < max_end) & (min_start < element_end) &
+            func.tsrange(element_start, element_end).op('&&')(func.any(ranges_array)))
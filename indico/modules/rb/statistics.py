@@ -3,13 +3,90 @@ from __future__ import division
 from datetime import date, datetime, timedelta
 
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import func, extract, cast, TIME
+from sqlalchemy import func, extract, cast, case, TIME
 
+from indico.core.db import db
 from indico.core.db.sqlalchemy.custom import greatest, least
 from indico.util.date_time import iterdays
+from indico.modules.rb import settings
 from indico.modules.rb.models.locations import Location
 from indico.modules.rb.models.reservations import Reservation
 from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.models.room_daily_occupancy import RoomDailyOccupancy
+from indico.modules.rb.models.rooms import Room
+
+
+# setting containing the first day which is not covered by the occupancy rollup
+ROLLUP_END_SETTING = 'occupancy_rollup_end'
+# how many days before the end of the rollup are recomputed when extending it
+ROLLUP_REFRESH_DAYS = 7
+
+_RESERVATION_STATES = (('valid', Reservation.is_valid),
+                       ('pending', Reservation.is_pending),
+                       ('cancelled', Reservation.is_cancelled),
+                       ('rejected', Reservation.is_rejected))
+
+
+def _count_if(criterion):
+    return func.count(case([(criterion, 1)]))
+
+
+def _get_booked_time():
+    # Take into account only working hours
+    earliest_time = greatest(cast(ReservationOccurrence.start_dt, TIME), Location.working_time_start)
+    latest_time = least(cast(ReservationOccurrence.end_dt, TIME), Location.working_time_end)
+    return func.sum(latest_time - earliest_time)
+
+
+def _query_booked_time(room_ids, start_date, end_date, *group_by):
+    # Reservations on working days
+    query = (db.session.query(*(group_by + (_get_booked_time(),)))
+             .select_from(ReservationOccurrence)
+             .join(ReservationOccurrence.reservation)
+             .filter(extract('dow', ReservationOccurrence.start_dt) < 5,
+                     ReservationOccurrence.start_dt >= start_date,
+                     ReservationOccurrence.end_dt <= end_date,
+                     ReservationOccurrence.is_valid))
+    if room_ids is not None:
+        query = query.filter(Reservation.room_id.in_(room_ids))
+    if group_by:
+        query = query.group_by(*group_by)
+    return query
+
+
+def get_occupancy_rollup_end():
+    """Returns the first day not covered by the occupancy rollup or ``None``"""
+    rollup_end = settings.get(ROLLUP_END_SETTING)
+    return datetime.strptime(rollup_end, '%Y-%m-%d').date() if rollup_end else None
+
+
+def update_occupancy_rollup(end_date=None, start_date=None):
+    """Stores the daily booked working time of all rooms.
+
+    The days from `start_date` up to, but not including, `end_date` are
+    (re)computed.  By default the rollup is extended up to today, also
+    recomputing the last `ROLLUP_REFRESH_DAYS` days in case past bookings
+    were modified, or built from the first booking if it does not exist yet.
+    """
+    if end_date is None:
+        end_date = date.today()
+    if start_date is None:
+        rollup_end = get_occupancy_rollup_end()
+        if rollup_end is not None:
+            start_date = rollup_end - timedelta(days=ROLLUP_REFRESH_DAYS)
+        else:
+            first = db.session.query(func.min(ReservationOccurrence.start_dt)).scalar()
+            start_date = first.date() if first else end_date
+    if start_date >= end_date:
+        return
+    table = RoomDailyOccupancy.__table__
+    db.session.execute(table.delete().where((table.c.day >= start_date) & (table.c.day < end_date)))
+    day = cast(ReservationOccurrence.start_dt, db.Date)
+    query = _query_booked_time(None, start_date, end_date, Reservation.room_id, day)
+    db.session.execute(table.insert().from_select(['room_id', 'day', 'booked_time'], query.statement))
+    rollup_end = get_occupancy_rollup_end()
+    if rollup_end is None or rollup_end < end_date:
+        settings.set(ROLLUP_END_SETTING, end_date.isoformat())
 
 
 def calculate_rooms_bookable_time(rooms, start_date=None, end_date=None):
@@ -29,18 +106,21 @@ def calculate_rooms_booked_time(rooms, start_date=None, end_date=None):
         end_date = date.today()
     if start_date is None:
         start_date = end_date - relativedelta(months=1)
-    # Reservations on working days
-    reservations = Reservation.find(Reservation.room_id.in_(r.id for r in rooms),
-                                    extract('dow', ReservationOccurrence.start_dt) < 5,
-                                    ReservationOccurrence.start_dt >= start_date,
-                                    ReservationOccurrence.end_dt <= end_date,
-                                    ReservationOccurrence.is_valid,
-                                    _join=ReservationOccurrence)
-    # Take into account only working hours
-    earliest_time = greatest(cast(ReservationOccurrence.start_dt, TIME), Location.working_time_start)
-    latest_time = least(cast(ReservationOccurrence.end_dt, TIME), Location.working_time_end)
-    booked_time = reservations.with_entities(func.sum(latest_time - earliest_time)).scalar()
-    return (booked_time or timedelta()).total_seconds()
+    room_ids = [r.id for r in rooms]
+    booked_time = timedelta()
+    rollup_end = get_occupancy_rollup_end() if type(start_date) is date and type(end_date) is date else None
+    if rollup_end is not None and start_date < rollup_end:
+        # Read the days covered by the rollup and only compute the remaining ones
+        split_date = min(end_date, rollup_end)
+        booked_time += (db.session.query(func.sum(RoomDailyOccupancy.booked_time))
+                        .filter(RoomDailyOccupancy.room_id.in_(room_ids),
+                                RoomDailyOccupancy.day >= start_date,
+                                RoomDailyOccupancy.day < split_date)
+                        .scalar() or timedelta())
+        start_date = split_date
+    if start_date < end_date:
+        booked_time += _query_booked_time(room_ids, start_date, end_date).scalar() or timedelta()
+    return booked_time.total_seconds()
 
 
 def calculate_rooms_occupancy(rooms, start=None, end=None):
@@ -49,19 +129,67 @@ def calculate_rooms_occupancy(rooms, start=None, end=None):
     return booked_time / bookable_time if bookable_time else 0
 
 
+def _query_rooms_stats(rooms, *group_by):
+    # is_archived compares with the current time, so it has to be the same expression in both places
+    is_archived = Reservation.is_archived
+    columns = [_count_if(criterion) for _, criterion in _RESERVATION_STATES] + [func.count()]
+    return (db.session.query(*(group_by + (is_archived,) + tuple(columns)))
+            .filter(Reservation.room_id.in_(r.id for r in rooms))
+            .group_by(*(group_by + (is_archived,))))
+
+
+def _make_stats():
+    return {'active': dict.fromkeys((name for name, _ in _RESERVATION_STATES), 0),
+            'archived': dict.fromkeys((name for name, _ in _RESERVATION_STATES), 0),
+            'total': 0}
+
+
+def _add_stats(stats, row):
+    is_archived = row[0]
+    counts = row[1:]
+    group = stats['archived' if is_archived else 'active']
+    for (name, _), count in zip(_RESERVATION_STATES, counts):
+        group[name] += count
+    stats['total'] += counts[-1]
+
+
 def compose_rooms_stats(rooms):
-    reservations = Reservation.find(Reservation.room_id.in_(r.id for r in rooms))
+    """Returns the number of reservations of the rooms by state.
+
+    All counters are computed by a single query grouping the reservations
+    by whether they are archived.
+    """
+    stats = _make_stats()
+    if rooms:
+        for row in _query_rooms_stats(rooms):
+            _add_stats(stats, row)
+    return stats
+
+
+def compose_rooms_stats_by_room(rooms):
+    """Returns the reservation counters of each room, like `compose_rooms_stats`"""
+    stats = {r.id: _make_stats() for r in rooms}
+    if rooms:
+        for row in _query_rooms_stats(rooms, Reservation.room_id):
+            _add_stats(stats[row[0]], row[1:])
+    return stats
+
+
+def compose_location_room_stats(location):
+    """Returns the room counters of a location using a single query"""
+    total, active, reservable, capacity, surface = (
+        db.session.query(func.count(),
+                         _count_if(Room.is_active),
+                         _count_if(Room.is_reservable),
+                         func.sum(case([(Room.is_reservable, Room.capacity)])),
+                         func.sum(case([(Room.is_reservable, Room.surface_area)])))
+        .filter(Room.location_id == location.id)
+        .one()
+    )
     return {
-        'active': {
-            'valid': reservations.filter(Reservation.is_valid, ~Reservation.is_archived).count(),
-            'pending': reservations.filter(Reservation.is_pending, ~Reservation.is_archived).count(),
-            'cancelled': reservations.filter(Reservation.is_cancelled, ~Reservation.is_archived).count(),
-            'rejected': reservations.filter(Reservation.is_rejected, ~Reservation.is_archived).count(),
-        },
-        'archived': {
-            'valid': reservations.filter(Reservation.is_valid, Reservation.is_archived).count(),
-            'pending': reservations.filter(Reservation.is_pending, Reservation.is_archived).count(),
-            'cancelled': reservations.filter(Reservation.is_cancelled, Reservation.is_archived).count(),
-            'rejected': reservations.filter(Reservation.is_rejected, Reservation.is_archived).count()
-        }
+        'total_rooms': total,
+        'active_rooms': active,
+        'reservable_rooms': reservable,
+        'reservable_capacity': capacity,
+        'reservable_surface': surface
     }
@@ -8,6 +8,7 @@ from indico.modules.rb.models.reservation_occurrences import ReservationOccurren
 from indico.modules.rb.models.reservations import Reservation, RepeatFrequency
 from indico.modules.rb.models.rooms import Room
 from indico.modules.rb.notifications.reservation_occurrences import notify_upcoming_occurrence
+from indico.modules.rb.statistics import update_occupancy_rollup
 from indico.modules.scheduler.tasks.periodic import PeriodicUniqueTask
 
 
@@ -38,3 +39,10 @@ class OccurrenceNotifications(PeriodicUniqueTask):
             if occ.reservation.repeat_frequency == RepeatFrequency.DAY:
                 occ.reservation.occurrences.update({'notification_sent': True})
             notify_upcoming_occurrence(occ)
+
+
+class OccupancyRollup(PeriodicUniqueTask):
+    """Extends the daily room occupancy rollup used by the statistics up to today"""
+
+    def run(self):
+        update_occupancy_rollup()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the bars of `indico.modules.rb.views.calendar.RoomBookingCalendarWidget`
+"""
+
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+
+from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.models.reservations import Reservation
+from indico.modules.rb.views.calendar import Bar, RoomBookingCalendarWidget
+from indico.tests.python.unit.util import IndicoTestCase
+
+
+class _Room(object):
+
+    def __init__(self, id):
+        self.id = id
+        self.full_name = u'Room {0}'.format(id)
+
+
+def _dt(day, hour, minute=0):
+    return datetime.combine(day, time(hour, minute))
+
+
+def _occurrence(room_id, start_dt, end_dt, is_accepted):
+    reservation = Reservation(room_id=room_id, start_dt=start_dt, end_dt=end_dt, is_accepted=is_accepted)
+    return ReservationOccurrence(start_dt=start_dt, end_dt=end_dt, reservation=reservation)
+
+
+def _pairwise_prebooking_bars(occurrences):
+    """Finds the pre-booking overlaps by comparing all pre-bookings of a room"""
+    pending = sorted((o for o in occurrences if not o.reservation.is_accepted), key=lambda o: o.reservation.room_id)
+    bars = []
+    for room_id, room_occurrences in groupby(pending, key=lambda o: o.reservation.room_id):
+        room_occurrences = list(room_occurrences)
+        for idx, o1 in enumerate(room_occurrences):
+            for o2 in room_occurrences[idx+1:]:
+                if o1.overlaps(o2, skip_self=True):
+                    start, end = o1.get_overlap(o2)
+                    bars.append((start, end, Bar.PRECONCURRENT, room_id))
+    return sorted(bars)
+
+
+def _pairwise_conflict_bars(candidates, occurrences):
+    """Finds the conflicts by comparing every candidate with every occurrence"""
+    bars = []
+    conflicts = 0
+    for candidate in (c for cands in candidates.itervalues() for c in cands):
+        for occurrence in occurrences:
+            if candidate.overlaps(occurrence, skip_self=True):
+                start, end = candidate.get_overlap(occurrence)
+                conflicts += occurrence.reservation.is_accepted
+                kind = Bar.CONFLICT if occurrence.reservation.is_accepted else Bar.PRECONFLICT
+                bars.append((start, end, kind, occurrence.reservation.room_id))
+    return sorted(bars), conflicts
+
+
+class TestCalendarBars(IndicoTestCase):
+
+    DAY = date(2014, 6, 2)
+
+    def setUp(self):
+        super(TestCalendarBars, self).setUp()
+        day, next_day = self.DAY, self.DAY + timedelta(days=1)
+        # the pre-bookings of a room are not next to each other
+        self._occurrences = [_occurrence(1, _dt(day, 9), _dt(day, 11), False),
+                             _occurrence(2, _dt(day, 9, 30), _dt(day, 10, 30), False),
+                             _occurrence(1, _dt(day, 10), _dt(day, 12), True),
+                             _occurrence(1, _dt(day, 10), _dt(day, 11, 30), False),
+                             _occurrence(2, _dt(day, 10), _dt(day, 10, 15), False),
+                             _occurrence(1, _dt(day, 13), _dt(day, 14), False),
+                             _occurrence(1, _dt(next_day, 9), _dt(next_day, 10), False),
+                             _occurrence(2, _dt(next_day, 9), _dt(next_day, 10), True)]
+        self._candidates = {
+            (_dt(day, 9, 45), _dt(next_day, 10, 15)): [
+                ReservationOccurrence(start_dt=_dt(day, 9, 45), end_dt=_dt(day, 10, 15)),
+                ReservationOccurrence(start_dt=_dt(next_day, 9, 45), end_dt=_dt(next_day, 10, 15))
+            ],
+            (_dt(day, 15), _dt(day, 16)): [ReservationOccurrence(start_dt=_dt(day, 15), end_dt=_dt(day, 16))]
+        }
+
+    def _widget(self, candidates=None):
+        return RoomBookingCalendarWidget(self._occurrences, _dt(self.DAY, 0), _dt(self.DAY + timedelta(days=1), 23),
+                                         candidates=candidates, rooms=[_Room(1), _Room(2)], show_blockings=False)
+
+    def _bars(self, widget, *kinds):
+        return sorted((bar.start, bar.end, bar.kind, bar.room_id) for bar in widget.bars if bar.kind in kinds)
+
+    def testPrebookingOverlaps(self):
+        bars = self._bars(self._widget(), Bar.PRECONCURRENT)
+        self.assertEqual(bars, _pairwise_prebooking_bars(self._occurrences))
+        self.assertEqual(bars, [(_dt(self.DAY, 10), _dt(self.DAY, 10, 15), Bar.PRECONCURRENT, 2),
+                                (_dt(self.DAY, 10), _dt(self.DAY, 11), Bar.PRECONCURRENT, 1)])
+
+    def testConflicts(self):
+        widget = self._widget(self._candidates)
+        expected_bars, expected_conflicts = _pairwise_conflict_bars(self._candidates, self._occurrences)
+        self.assertEqual(self._bars(widget, Bar.CONFLICT, Bar.PRECONFLICT), expected_bars)
+        self.assertEqual(widget.conflicts, expected_conflicts)
+        self.assertEqual(widget.conflicts, 2)
+        self.assertEqual(len(expected_bars), 7)
+
+    def testNoCandidates(self):
+        widget = self._widget()
+        self.assertEqual(self._bars(widget, Bar.CONFLICT, Bar.PRECONFLICT), [])
+        self.assertEqual(widget.conflicts, 0)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for `indico.modules.rb.models.room_day_bitmaps`
+"""
+
+from datetime import date, datetime, time, timedelta
+
+from indico.core.db import db
+from indico.modules.rb.models import reservations
+from indico.modules.rb.models.reservations import Reservation, RepeatFrequency
+from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.models.room_day_bitmaps import (SLOTS_PER_DAY, RoomDayBitmap, bits_to_mask, get_time_mask,
+                                                       mask_to_bits)
+from indico.modules.rb.models.rooms import Room
+from indico.tests.db.environment import DBTest
+from indico.tests.python.unit.util import IndicoTestCase
+
+
+class TestTimeMask(IndicoTestCase):
+
+    def _slots(self, mask):
+        return [i for i in xrange(SLOTS_PER_DAY) if mask & (1 << i)]
+
+    def testAligned(self):
+        mask, exact = get_time_mask(datetime(2014, 1, 1, 10, 0), datetime(2014, 1, 1, 11, 0))
+        self.assertTrue(exact)
+        self.assertEqual(self._slots(mask), [40, 41, 42, 43])
+
+    def testUnaligned(self):
+        mask, exact = get_time_mask(datetime(2014, 1, 1, 10, 10), datetime(2014, 1, 1, 10, 50))
+        self.assertFalse(exact)
+        self.assertEqual(self._slots(mask), [40, 41, 42, 43])
+        mask, exact = get_time_mask(datetime(2014, 1, 1, 10, 0), datetime(2014, 1, 1, 10, 45, 30))
+        self.assertFalse(exact)
+        self.assertEqual(self._slots(mask), [40, 41, 42, 43])
+
+    def testAdjacentRangesDoNotOverlap(self):
+        first, _ = get_time_mask(datetime(2014, 1, 1, 9, 0), datetime(2014, 1, 1, 10, 0))
+        second, _ = get_time_mask(datetime(2014, 1, 1, 10, 0), datetime(2014, 1, 1, 11, 0))
+        self.assertFalse(first & second)
+
+    def testEndOfDay(self):
+        mask, exact = get_time_mask(datetime(2014, 1, 1, 23, 0), datetime(2014, 1, 2, 0, 0))
+        self.assertTrue(exact)
+        self.assertEqual(self._slots(mask), [92, 93, 94, 95])
+
+    def testEmpty(self):
+        self.assertEqual(get_time_mask(datetime(2014, 1, 1, 10, 0), datetime(2014, 1, 1, 10, 0)), (0, True))
+
+    def testBits(self):
+        mask, _ = get_time_mask(datetime(2014, 1, 1, 0, 0), datetime(2014, 1, 1, 0, 30))
+        bits = mask_to_bits(mask)
+        self.assertEqual(len(bits), SLOTS_PER_DAY)
+        self.assertTrue(bits.startswith('110'))
+        self.assertEqual(bits_to_mask(bits), mask)
+
+
+class _Admin(object):
+    """Stand-in for an avatar who may book any room at any time"""
+
+    def isAdmin(self):
+        return True
+
+    def isRBAdmin(self):
+        return True
+
+    def getFullName(self):
+        return u'Admin'
+
+
+class TestRoomDayBitmaps(DBTest):
+
+    DAY = date(2014, 6, 2)
+    # aligned and unaligned searches, with and without repetition
+    SEARCHES = [(time(8), time(10), (RepeatFrequency.NEVER, 0)),
+                (time(9, 15), time(9, 30), (RepeatFrequency.NEVER, 0)),
+                (time(12), time(14), (RepeatFrequency.DAY, 1)),
+                (time(10, 5), time(10, 20), (RepeatFrequency.DAY, 1)),
+                (time(0), time(23, 45), (RepeatFrequency.WEEK, 1))]
+
+    def setUp(self):
+        super(TestRoomDayBitmaps, self).setUp()
+        self._notify_modification = reservations.notify_modification
+        reservations.notify_modification = lambda reservation, changes: None
+        self._user = _Admin()
+        self._rooms = Room.query.order_by(Room.id).limit(2).all()
+        RoomDayBitmap.rebuild()
+        db.session.commit()
+
+    def tearDown(self):
+        reservations.notify_modification = self._notify_modification
+        super(TestRoomDayBitmaps, self).tearDown()
+
+    def _data(self, start_time, end_time, days=1):
+        return {'start_dt': datetime.combine(self.DAY, start_time),
+                'end_dt': datetime.combine(self.DAY + timedelta(days=days - 1), end_time),
+                'repeat_frequency': RepeatFrequency.DAY if days > 1 else RepeatFrequency.NEVER,
+                'repeat_interval': 1 if days > 1 else 0,
+                'booked_for_id': None,
+                'contact_email': u'',
+                'contact_phone': u'',
+                'booking_reason': u'testing',
+                'used_equipment': [],
+                'needs_assistance': False,
+                'uses_vc': False,
+                'needs_vc_assistance': False}
+
+    def _book(self, room, start_time, end_time, days=1, is_accepted=True):
+        data = self._data(start_time, end_time, days)
+        del data['used_equipment']
+        reservation = Reservation(booked_for_name=u'Admin', is_accepted=is_accepted, **data)
+        reservation.room = room
+        db.session.add(reservation)
+        reservation.create_occurrences(True, self._user)
+        db.session.commit()
+        return reservation
+
+    def _available(self, start_time, end_time, repetition, **kwargs):
+        start_dt = datetime.combine(self.DAY, start_time)
+        end_dt = datetime.combine(self.DAY + timedelta(days=6), end_time)
+        return sorted(r.id for r in Room.find_all(Room.filter_available(start_dt, end_dt, repetition, **kwargs)))
+
+    def _isAvailable(self, room, start_time, end_time):
+        return room.id in self._available(start_time, end_time, (RepeatFrequency.NEVER, 0))
+
+    def _check(self):
+        assert RoomDayBitmap.find_inconsistent() == []
+        for start_time, end_time, repetition in self.SEARCHES:
+            for include_pre_bookings in (True, False):
+                assert (self._available(start_time, end_time, repetition, include_pre_bookings=include_pre_bookings,
+                                        use_bitmaps=True) ==
+                        self._available(start_time, end_time, repetition, include_pre_bookings=include_pre_bookings,
+                                        use_bitmaps=False))
+
+    def testBitmapsUsed(self):
+        occurrences = ReservationOccurrence.create_series(datetime.combine(self.DAY, time(8)),
+                                                          datetime.combine(self.DAY, time(10)),
+                                                          (RepeatFrequency.NEVER, 0))
+        assert RoomDayBitmap.filter_conflicts(occurrences) is not None
+        occurrences[0].end_dt = datetime.combine(self.DAY, time(10, 5))
+        assert RoomDayBitmap.filter_conflicts(occurrences) is None
+
+    def testNewBookings(self):
+        room, other_room = self._rooms
+        self._book(room, time(9), time(11))
+        self._book(room, time(13), time(14), days=3, is_accepted=False)
+        self._book(other_room, time(10, 10), time(10, 50))
+        self._check()
+        assert not self._isAvailable(room, time(8), time(10))
+        assert not self._isAvailable(other_room, time(10), time(10, 15))
+        assert self._isAvailable(other_room, time(9), time(10))
+
+    def testRebuild(self):
+        room, other_room = self._rooms
+        self._book(room, time(9), time(11), days=2)
+        self._book(other_room, time(10, 10), time(10, 50), is_accepted=False)
+        RoomDayBitmap.rebuild()
+        db.session.commit()
+        self._check()
+
+    def testCancel(self):
+        room = self._rooms[0]
+        reservation = self._book(room, time(9), time(11), days=3)
+        reservation.cancel(self._user, silent=True)
+        db.session.commit()
+        self._check()
+        assert self._isAvailable(room, time(9), time(10))
+
+    def testReject(self):
+        room = self._rooms[0]
+        reservation = self._book(room, time(12), time(14), days=2, is_accepted=False)
+        self._check()
+        reservation.reject(self._user, u'testing', silent=True)
+        db.session.commit()
+        self._check()
+        assert room.id in self._available(time(12), time(14), (RepeatFrequency.DAY, 1))
+
+    def testModify(self):
+        room = self._rooms[0]
+        reservation = self._book(room, time(9), time(11), days=2)
+        assert reservation.modify(self._data(time(15), time(16, 30), days=3), self._user)
+        db.session.commit()
+        self._check()
+        assert self._isAvailable(room, time(9), time(11))
+        assert not self._isAvailable(room, time(16), time(17))
+
+    def testChangeRoom(self):
+        room, other_room = self._rooms
+        reservation = self._book(room, time(9), time(11))
+        reservation.room = other_room
+        db.session.commit()
+        self._check()
+        assert self._isAvailable(room, time(9), time(11))
+        assert not self._isAvailable(other_room, time(9), time(11))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+from datetime import date, timedelta
+
+from sqlalchemy import func, extract, cast, TIME
+
+from indico.core.db.sqlalchemy.custom import greatest, least
+from indico.modules.rb.models.locations import Location
+from indico.modules.rb.models.reservations import Reservation
+from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
+from indico.modules.rb.models.room_daily_occupancy import RoomDailyOccupancy
+from indico.modules.rb.models.rooms import Room
+from indico.modules.rb.statistics import (calculate_rooms_booked_time, compose_location_room_stats,
+                                          compose_rooms_stats, compose_rooms_stats_by_room,
+                                          get_occupancy_rollup_end, update_occupancy_rollup)
+from indico.tests.db.environment import DBTest
+
+
+def _count_rooms_stats(rooms):
+    """Counts the reservations of the rooms with one query per counter"""
+    reservations = Reservation.find(Reservation.room_id.in_(r.id for r in rooms))
+    stats = {'total': reservations.count()}
+    for group, archived in (('active', ~Reservation.is_archived), ('archived', Reservation.is_archived)):
+        stats[group] = {
+            'valid': reservations.filter(Reservation.is_valid, archived).count(),
+            'pending': reservations.filter(Reservation.is_pending, archived).count(),
+            'cancelled': reservations.filter(Reservation.is_cancelled, archived).count(),
+            'rejected': reservations.filter(Reservation.is_rejected, archived).count()
+        }
+    return stats
+
+
+def _sum_booked_time(rooms, start_date, end_date):
+    """Sums the booked working time of the rooms from their occurrences"""
+    reservations = Reservation.find(Reservation.room_id.in_(r.id for r in rooms),
+                                    extract('dow', ReservationOccurrence.start_dt) < 5,
+                                    ReservationOccurrence.start_dt >= start_date,
+                                    ReservationOccurrence.end_dt <= end_date,
+                                    ReservationOccurrence.is_valid,
+                                    _join=ReservationOccurrence)
+    earliest_time = greatest(cast(ReservationOccurrence.start_dt, TIME), Location.working_time_start)
+    latest_time = least(cast(ReservationOccurrence.end_dt, TIME), Location.working_time_end)
+    booked_time = reservations.with_entities(func.sum(latest_time - earliest_time)).scalar()
+    return (booked_time or timedelta()).total_seconds()
+
+
+def _sum_or_none(values):
+    """Sums the values like SQL's SUM, which ignores NULLs and is NULL without any values"""
+    values = [v for v in values if v is not None]
+    return sum(values) if values else None
+
+
+class TestStatistics(DBTest):
+
+    PERIODS = [(date(2013, 9, 1), date(2014, 4, 1)),
+               (date(2013, 12, 1), date(2013, 12, 31)),
+               (date(2014, 1, 1), date(2014, 1, 2))]
+
+    def _rooms(self):
+        return Room.query.order_by(Room.id).all()
+
+    def testRoomsStats(self):
+        rooms = self._rooms()
+        assert compose_rooms_stats(rooms) == _count_rooms_stats(rooms)
+        by_room = compose_rooms_stats_by_room(rooms)
+        assert sorted(by_room) == [r.id for r in rooms]
+        for room in rooms:
+            assert compose_rooms_stats([room]) == _count_rooms_stats([room])
+            assert by_room[room.id] == _count_rooms_stats([room])
+
+    def testRoomsStatsWithoutBookings(self):
+        rooms = [r for r in self._rooms() if not r.reservations]
+        assert rooms
+        empty = {'valid': 0, 'pending': 0, 'cancelled': 0, 'rejected': 0}
+        assert compose_rooms_stats(rooms) == {'active': empty, 'archived': empty, 'total': 0}
+        assert compose_rooms_stats([]) == {'active': empty, 'archived': empty, 'total': 0}
+        assert compose_rooms_stats_by_room(rooms) == {r.id: _count_rooms_stats([r]) for r in rooms}
+
+    def testLocationRoomStats(self):
+        for location in Location.query.all():
+            rooms = Room.find_all(location_id=location.id)
+            reservable = [r for r in rooms if r.is_reservable]
+            assert compose_location_room_stats(location) == {
+                'total_rooms': len(rooms),
+                'active_rooms': sum(1 for r in rooms if r.is_active),
+                'reservable_rooms': len(reservable),
+                'reservable_capacity': _sum_or_none(r.capacity for r in reservable),
+                'reservable_surface': _sum_or_none(r.surface_area for r in reservable)
+            }
+
+    def testBookedTimeWithoutRollup(self):
+        rooms = self._rooms()
+        assert get_occupancy_rollup_end() is None
+        for start_date, end_date in self.PERIODS:
+            assert calculate_rooms_booked_time(rooms, start_date, end_date) == \
+                _sum_booked_time(rooms, start_date, end_date)
+
+    def testOccupancyRollup(self):
+        rooms = self._rooms()
+        rollup_end = date(2014, 1, 15)
+        update_occupancy_rollup(rollup_end, date(2013, 9, 1))
+        assert get_occupancy_rollup_end() == rollup_end
+        assert RoomDailyOccupancy.query.count()
+        # periods covered by the rollup completely, partially and not at all
+        periods = self.PERIODS + [(date(2014, 1, 15), date(2014, 3, 1))]
+        for start_date, end_date in periods:
+            for room in rooms:
+                assert calculate_rooms_booked_time([room], start_date, end_date) == \
+                    _sum_booked_time([room], start_date, end_date)
+            assert calculate_rooms_booked_time(rooms, start_date, end_date) == \
+                _sum_booked_time(rooms, start_date, end_date)
+
+    def testOccupancyRollupRefresh(self):
+        rooms = self._rooms()
+        update_occupancy_rollup(date(2014, 1, 15), date(2013, 9, 1))
+        # extending it recomputes the last days and keeps the earlier ones
+        update_occupancy_rollup(date(2014, 2, 1))
+        assert get_occupancy_rollup_end() == date(2014, 2, 1)
+        for start_date, end_date in self.PERIODS:
+            assert calculate_rooms_booked_time(rooms, start_date, end_date) == \
+                _sum_booked_time(rooms, start_date, end_date)
@@ -19,7 +19,6 @@
 
 from collections import defaultdict
 from datetime import timedelta, datetime, time
-from itertools import groupby
 from operator import attrgetter
 
 from flask import session
@@ -29,7 +28,7 @@ from indico.modules.rb.models.utils import Serializer
 from indico.modules.rb.models.blocked_rooms import BlockedRoom
 from indico.modules.rb.models.reservation_occurrences import ReservationOccurrence
 from indico.modules.rb.models.rooms import Room
-from indico.util.date_time import iterdays, format_time
+from indico.util.date_time import iterdays, format_time, iter_overlaps
 from indico.util.i18n import _
 from indico.util.string import natural_sort_key
 from indico.util.struct.iterables import group_list
@@ -206,24 +205,34 @@ class RoomBookingCalendarWidget(object):
                     self.bars.append(bar)
 
     def _produce_prereservation_overlap_bars(self):
-        for _, occurrences in groupby((o for o in self.occurrences if not o.reservation.is_accepted),
-                                      key=lambda o: o.reservation.room_id):
-            occurrences = list(occurrences)
-            for idx, o1 in enumerate(occurrences):
-                for o2 in occurrences[idx+1:]:
-                    if o1.overlaps(o2, skip_self=True):
-                        start, end = o1.get_overlap(o2)
-                        self.bars.append(Bar(start, end, overlapping=True, reservation=o2.reservation,
+        pending = group_list((o for o in self.occurrences if not o.reservation.is_accepted),
+                             key=lambda o: (o.reservation.room_id, o.start_dt.date()),
+                             sort_by=attrgetter('start_dt', 'end_dt'))
+        for _, occurrences in sorted(pending.iteritems()):
+            # sweep over the sorted pre-bookings of a room and day, keeping only those which are still running
+            active = []
+            for occurrence in occurrences:
+                active = [o for o in active if o.end_dt > occurrence.start_dt]
+                for other in active:
+                    if other.overlaps(occurrence, skip_self=True):
+                        start, end = other.get_overlap(occurrence)
+                        self.bars.append(Bar(start, end, overlapping=True, reservation=occurrence.reservation,
                                              kind=Bar.PRECONCURRENT))
+                active.append(occurrence)
 
     def _produce_conflict_bars(self):
-        for candidates in self.candidates.itervalues():
-            for candidate in candidates:
-                for occurrence in self.occurrences:
-                    if candidate.overlaps(occurrence, skip_self=True):
-                        start, end = candidate.get_overlap(occurrence)
-                        self.conflicts += occurrence.reservation.is_accepted
-                        self.bars.append(Bar(start, end, overlapping=True, reservation=occurrence.reservation))
+        # candidates are shown in every room, so they are matched with the occurrences of all rooms
+        occurrences_by_day = group_list(self.occurrences, key=lambda o: o.start_dt.date())
+        candidates_by_day = group_list((c for candidates in self.candidates.itervalues() for c in candidates),
+                                       key=lambda c: c.start_dt.date())
+        for day, candidates in sorted(candidates_by_day.iteritems()):
+            occurrences = occurrences_by_day.get(day)
+            if not occurrences:
+                continue
+            for candidate, occurrence in iter_overlaps(candidates, occurrences, key=attrgetter('start_dt', 'end_dt')):
+                start, end = candidate.get_overlap(occurrence)
+                self.conflicts += occurrence.reservation.is_accepted
+                self.bars.append(Bar(start, end, overlapping=True, reservation=occurrence.reservation))
 
     def _produce_blocking_bars(self):
         for blocked_room in self.blocked_rooms:
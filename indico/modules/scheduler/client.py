@@ -18,6 +18,7 @@
 ## along with Indico;if not, see <http://www.gnu.org/licenses/>.
 
 from indico.modules.scheduler import SchedulerModule, base
+from indico.modules.scheduler.wakeup import wake_scheduler
 from indico.util.date_time import int_timestamp
 
 class Client(object):
@@ -34,24 +35,29 @@ class Client(object):
         super(Client, self).__init__()
         self._schedMod = SchedulerModule.getDBInstance()
 
+    def _spool(self, op, obj):
+        # wake the scheduler up as soon as the instruction is committed
+        wake_scheduler()
+        return self._schedMod.spool(op, obj)
+
     def enqueue(self, task):
         """
         Schedules a task for execution
         """
 
-        return self._schedMod.spool('add', task)
+        return self._spool('add', task)
 
     def dequeue(self, task):
         """
         Schedules a task for deletion
         """
 
-        return self._schedMod.spool('del', task)
+        return self._spool('del', task)
 
     def moveTask(self, task, newDate):
         oldTS = int_timestamp(task.getStartOn())
         task.setStartOn(newDate)
-        return self._schedMod.spool('change', (oldTS, task))
+        return self._spool('change', (oldTS, task))
 
     def shutdown(self, msg=""):
         """
@@ -59,7 +65,7 @@ class Client(object):
         an information message that will be written in the logs
         """
 
-        return self._schedMod.spool('shutdown', msg)
+        return self._spool('shutdown', msg)
 
     def clearSpool(self):
         """
@@ -82,10 +88,15 @@ class Client(object):
           * finished task index;
           * failed task index;
 
-        As well as if the scheduler is running (`state`)
+        As well as if the scheduler is running (`state`) and, while it is
+        running, the status of its worker pool (`pool`): the number of due
+        tasks waiting for a worker, the running tasks by type and how long
+        tasks of each type waited before being started.
         """
 
-        return self._schedMod.getStatus()
+        status = self._schedMod.getStatus()
+        status['pool'] = self._schedMod.getPoolStatus()
+        return status
 
     def getTask(self, tid):
         """
@@ -103,3 +114,4 @@ class Client(object):
         self._schedMod.moveTask(task,
                                 base.TASK_STATUS_FAILED,
                                 base.TASK_STATUS_QUEUED)
+        wake_scheduler()
@@ -71,7 +71,10 @@ class SchedulerApp(object):
 
         logger = logging.getLogger('daemon')
         try:
-            Scheduler(multitask_mode = self.args.mode).run()
+            config = Config.getInstance()
+            Scheduler(multitask_mode=self.args.mode,
+                      max_workers=config.getSchedulerWorkers(),
+                      task_type_limits=config.getSchedulerTaskTypeLimits()).run()
             return_val = 0
         except base.SchedulerQuitException:
             logger.info("Daemon shut down successfully")
@@ -238,6 +241,15 @@ Tasks:
   - Failed:   %(failed)s
   - Finished: %(finished)s
 """ % status
+        pool = status['pool']
+        if pool:
+            print """Workers: %(workers)s/%(max_workers)s
+  - Due tasks waiting for a worker: %(due)s
+""" % pool
+            for typeId, waitTime in sorted(pool['wait_time'].iteritems()):
+                print '  %-40s running: %3d  started: %6d  avg wait: %6.1fs  max wait: %6ds' % (
+                    typeId, pool['running_by_type'].get(typeId, 0), waitTime['count'], waitTime['avg'],
+                    waitTime['max'])
     elif args.field == "spool":
 
         for op, obj in c.getSpool():
@@ -56,6 +56,7 @@ class SchedulerModule(Module):
         self._schedulerStatus = False
         self._hostname = None
         self._pid = None
+        self._poolStatus = None
 
         # Temporary area where all the tasks stay before being
         # added to the waiting list
@@ -246,6 +247,15 @@ class SchedulerModule(Module):
         self._hostname = socket.getfqdn() if status else None
         self._pid = os.getpid() if status else None
 
+    def setPoolStatus(self, status):
+        self._poolStatus = status
+
+    def getPoolStatus(self):
+        """
+        Returns the worker pool status stored by the running scheduler
+        """
+        return getattr(self, '_poolStatus', None)
+
     def addTaskToRunningList(self, task):
 
         logging.getLogger('scheduler').debug(
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import Queue
+from collections import Counter, defaultdict
+
+from indico.modules.scheduler.slave import ProcessWorker, ThreadWorker
+
+
+class WorkerPool(object):
+    """
+    A fixed-size pool of long-lived workers running the tasks of the
+    scheduler.
+
+    At most `max_workers` tasks run at the same time, and for task types
+    listed in `task_type_limits` at most the given number of tasks of this
+    type.  Workers are only started when needed and replaced when they quit
+    (after `worker_max_tasks` tasks) or die.
+    """
+
+    def __init__(self, config, logger, workerClass=None, wakeup=None):
+        self._config = config
+        self._logger = logger
+        self._wakeup = wakeup
+        if workerClass is not None:
+            self._workerClass = workerClass
+        elif config.multitask_mode == 'processes':
+            self._workerClass = ProcessWorker
+        else:
+            self._workerClass = ThreadWorker
+        self._results = self._workerClass.queueClass()
+        self._workerIds = itertools.count()
+        self._workers = {}
+        self._taskCounts = {}
+        self._idle = []
+        # workerId -> (taskId, typeId) of the task it is running
+        self._assigned = {}
+        self._runningTypes = Counter()
+        # typeId -> [number of tasks, total wait time, max wait time]
+        self._waitTimes = defaultdict(lambda: [0, 0, 0])
+
+    def __len__(self):
+        return len(self._assigned)
+
+    def isFull(self):
+        return len(self._assigned) >= self._config.max_workers
+
+    def canRun(self, typeId):
+        """
+        Checks whether a task of the given type may be started now
+        """
+        if self.isFull():
+            return False
+        limit = self._config.task_type_limits.get(typeId)
+        return limit is None or self._runningTypes[typeId] < limit
+
+    def _spawn(self):
+        workerId = next(self._workerIds)
+        worker = self._workerClass(workerId, self._config, self._workerClass.queueClass(), self._results,
+                                   self._wakeup)
+        worker.start()
+        self._workers[workerId] = worker
+        self._taskCounts[workerId] = 0
+        self._logger.debug('Started worker %s' % workerId)
+        return workerId
+
+    def _remove(self, workerId):
+        worker = self._workers.pop(workerId)
+        del self._taskCounts[workerId]
+        worker.join()
+
+    def _getIdleWorker(self):
+        while self._idle:
+            workerId = self._idle.pop()
+            if self._workers[workerId].isAlive():
+                return workerId
+            self._remove(workerId)
+        return self._spawn()
+
+    def submit(self, task, delay):
+        """
+        Runs a task in an idle worker; `delay` is the number of seconds
+        the task has been waiting since it became due
+        """
+        typeId = getattr(task, 'typeId', task.__class__.__name__)
+        workerId = self._getIdleWorker()
+        self._assigned[workerId] = (task.id, typeId)
+        self._taskCounts[workerId] += 1
+        self._runningTypes[typeId] += 1
+        waitTimes = self._waitTimes[typeId]
+        waitTimes[0] += 1
+        waitTimes[1] += delay
+        waitTimes[2] = max(waitTimes[2], delay)
+        self._workers[workerId].inbox.put((task.id, delay))
+
+    def _release(self, workerId):
+        taskId, typeId = self._assigned.pop(workerId)
+        self._runningTypes[typeId] -= 1
+        if self._taskCounts[workerId] >= self._config.worker_max_tasks:
+            # the worker quits after this task
+            self._remove(workerId)
+        else:
+            self._idle.append(workerId)
+        return taskId
+
+    def _drainResults(self):
+        finished = []
+        while True:
+            try:
+                workerId, taskId, result = self._results.get_nowait()
+            except Queue.Empty:
+                return finished
+            if self._assigned.get(workerId, (None,))[0] != taskId:
+                self._logger.warning('Ignoring unexpected result of task %s from worker %s' % (taskId, workerId))
+                continue
+            self._release(workerId)
+            finished.append((taskId, result))
+
+    def collectResults(self):
+        """
+        Returns the ``(taskId, result)`` pairs of the tasks which finished
+        since the last call.  Tasks whose worker died are reported as failed.
+        """
+        finished = self._drainResults()
+        dead = [workerId for workerId in self._assigned if not self._workers[workerId].isAlive()]
+        if dead:
+            # a worker may have sent its last result right before quitting
+            finished += self._drainResults()
+            for workerId in dead:
+                if workerId in self._assigned:
+                    taskId = self._release(workerId)
+                    self._logger.error('Worker %s died while running task %s' % (workerId, taskId))
+                    finished.append((taskId, False))
+        return finished
+
+    def getStatus(self):
+        """
+        Returns the number of workers and running tasks and the time tasks
+        waited before being started, by task type
+        """
+        return {
+            'workers': len(self._workers),
+            'max_workers': self._config.max_workers,
+            'running_by_type': dict((typeId, count) for typeId, count in self._runningTypes.iteritems() if count),
+            'wait_time': dict((typeId, {'count': count, 'avg': float(total) / count, 'max': maxWait})
+                              for typeId, (count, total, maxWait) in self._waitTimes.iteritems())
+        }
+
+    def shutdown(self):
+        """
+        Stops all workers after they finished their current task
+        """
+        for worker in self._workers.itervalues():
+            worker.inbox.put(None)
+        for workerId in self._workers.keys():
+            self._remove(workerId)
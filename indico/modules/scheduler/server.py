@@ -27,8 +27,9 @@ from indico.core.logger import Logger
 
 
 from indico.modules.scheduler import SchedulerModule, base
+from indico.modules.scheduler.pool import WorkerPool
 from indico.modules.scheduler.tasks.periodic import PeriodicTask, TaskOccurrence
-from indico.modules.scheduler.slave import ProcessWorker, ThreadWorker
+from indico.modules.scheduler.wakeup import get_wakeup_channel
 from indico.util.date_time import int_timestamp
 
 
@@ -39,12 +40,15 @@ class Scheduler(object):
     Things have been done in a way that the probability of conflict is minimized, and
     operations are repeated in case one happens.
 
-    The entry point of the process consists of a 'spooler' that periodically takes
-    tasks out of a `conflict-safe` FIFO (spool) and adds them to an ``IOBTree``-based
-    waiting queue. The waiting queue is then checked periodically for the next task,
-    and when the time comes the task is executed.
+    The entry point of the process consists of a 'spooler' that takes tasks out of
+    a `conflict-safe` FIFO (spool) and adds them to an ``IOBTree``-based waiting
+    queue. The scheduler then sleeps until the next task is due or until it is
+    woken up through its wakeup channel by a client or by a worker which finished
+    its task.
 
-    Tasks are executed in different threads.
+    Tasks are executed by a fixed-size pool of long-lived worker threads or
+    processes.  When more tasks are due than can be run at the same time, the
+    ones with the highest `priority` are started first.
 
     The :py:class:`~indico.modules.scheduler.Client` class works as a transparent
     remote proxy for this class.
@@ -60,6 +64,27 @@ class Scheduler(object):
         # time to wait between cycles
         'sleep_interval': 10,
 
+        # time to wait between cycles when tasks are due but cannot be started
+        # because all workers are busy
+        'busy_sleep_interval': 1,
+
+        # maximum number of tasks running at the same time
+        'max_workers': 8,
+
+        # maximum number of tasks of a given type (typeId) running at the same time
+        'task_type_limits': {},
+
+        # number of tasks after which a worker is replaced by a new one
+        'worker_max_tasks': 100,
+
+        # longest time to sleep when the scheduler can be woken up by its clients
+        # (in case a notification gets lost)
+        'max_sleep_interval': 300,
+
+        # channel used to wake up the scheduler (see `indico.modules.scheduler.wakeup`),
+        # by default Redis if available, otherwise polling every `sleep_interval` seconds
+        'wakeup_channel': None,
+
         # AWOL = Absent Without Leave
         # [0.0, 1.0) probability that after a Scheduler tick it will check for AWOL
         # tasks in the runningList the lower the number the lower the number of checks
@@ -83,7 +108,9 @@ class Scheduler(object):
         self._dbi.startRequest()
         self._schedModule = SchedulerModule.getDBInstance()
 
-        self._runningWorkers = {}
+        self._wakeup = self._config.wakeup_channel or get_wakeup_channel(self._config.sleep_interval)
+        self._pool = WorkerPool(self._config, self._logger, wakeup=self._wakeup)
+        self._poolStatus = None
 
     ## DB access - surrounded by commit retry cycle
 
@@ -101,6 +128,10 @@ class Scheduler(object):
 
         return pair
 
+    @base.OperationManager
+    def _db_setPoolStatus(self, status):
+        self._schedModule.setPoolStatus(status)
+
     @base.OperationManager
     def _db_setRunningStatus(self, value):
         self._schedModule.setSchedulerRunningStatus(value)
@@ -281,6 +312,9 @@ class Scheduler(object):
 
             # get the next task in queue
             res = self._schedModule.peekNextWaitingTask()
+            busy = False
+            timeout = self._config.max_sleep_interval
+            due = 0
 
             if res:
                 # it's actually a timestamp, task tuple
@@ -290,25 +324,58 @@ class Scheduler(object):
 
                 # if it's time to execute the task
                 if  (nextTS <= currentTimestamp):
-                    yield nextTS, nextTask
-
-                    # don't sleep, jump back to the beginning of the cycle
-                    continue
+                    # the due tasks are only looked up once per cycle and
+                    # as many of them as possible are started
+                    dueTasks = self._getDueTasks(currentTimestamp)
+                    due = len(dueTasks)
+                    for timestamp, task in dueTasks:
+                        if self._pool.isFull():
+                            break
+                        if self._pool.canRun(getattr(task, 'typeId', task.__class__.__name__)):
+                            yield timestamp, task
+                            due -= 1
+
+                    if due < len(dueTasks):
+                        self._updatePoolStatus(due)
+                        # don't sleep, jump back to the beginning of the cycle
+                        continue
+
+                    # tasks are due, but the workers are busy
+                    busy = True
+                else:
+                    # sleep until the task is due
+                    timeout = min(timeout, nextTS - currentTimestamp)
 
-            # we assume the task cycle has been completed (if there was one)
-            # so, we can just reset the db status (sync)
-            self._readFromDb()
+            self._updatePoolStatus(due)
 
             # we also check AWOL tasks from time to time
             if random.random() < self._config.awol_tasks_check_probability:
                 self._checkAWOLTasks()
 
-            # if we get here, we have nothing else to do...
-            self._sleep('Nothing to do. Sleeping for %d secs...' %
-                        self._config.sleep_interval)
+            if busy:
+                timeout = self._config.busy_sleep_interval
+            elif len(self._pool):
+                # in case the workers cannot wake us up when they are done
+                timeout = min(timeout, self._config.sleep_interval)
 
-            # read from DB again after sleeping
-            self._readFromDb()
+            # if we get here, we have nothing else to do until we are woken
+            # up or the next task is due (the DB is synced at the beginning of
+            # the next cycle)
+            self._sleep('Nothing to do. Sleeping for up to %d secs...' % timeout, timeout)
+
+    def _getDueTasks(self, currentTimestamp):
+        """
+        Returns the ``(timestamp, task)`` tuples of all due tasks, the ones
+        with the highest priority first
+        """
+        dueTasks = []
+        for timestamp, task in self._schedModule.getWaitingQueue():
+            if timestamp > currentTimestamp:
+                break
+            dueTasks.append((timestamp, task))
+        # the sort is stable, so tasks with the same priority keep their order
+        dueTasks.sort(key=lambda entry: -getattr(entry[1], 'priority', 0))
+        return dueTasks
 
     def _checkFinishedTasks(self):
         """
@@ -318,28 +385,27 @@ class Scheduler(object):
 
         self._logger.debug("Checking finished tasks")
 
-        for taskId, thread in self._runningWorkers.items():
+        for taskId, result in self._pool.collectResults():
+            task = self._schedModule._taskIdx[taskId]
 
-            # the thread is dead? good, it's finished
-            if not thread.isAlive():
-                task = self._schedModule._taskIdx[taskId]
+            # let's check if it was successful or not
+            # and write it in the db
 
-                # let's check if it was successful or not
-                # and write it in the db
-
-                if thread.getResult() == True:
-                    self._db_notifyTaskStatus(task, base.TASK_STATUS_FINISHED)
-                elif thread.getResult() == False:
-                    self._db_notifyTaskStatus(task, base.TASK_STATUS_FAILED)
-                else:
-                    # something weird happened
-                    self._logger.warning("task %s finished, but the return value "
-                                         "was %s" %
-                                         (task, thread.getResult()))
+            if result:
+                self._db_notifyTaskStatus(task, base.TASK_STATUS_FINISHED)
+            else:
+                self._db_notifyTaskStatus(task, base.TASK_STATUS_FAILED)
 
-                # delete the entry from the dictionary
-                del self._runningWorkers[taskId]
-                thread.join()
+    def _updatePoolStatus(self, due):
+        """
+        Stores the status of the worker pool and the number of `due` tasks
+        waiting for a worker so clients can see it
+        """
+        status = self._pool.getStatus()
+        status['due'] = due
+        if status != self._poolStatus:
+            self._db_setPoolStatus(status)
+            self._poolStatus = status
 
     def _printStatus(self, mode='debug'):
         """
@@ -384,24 +450,21 @@ class Scheduler(object):
             self._logger.exception('Unexpected error')
             raise
         finally:
+            self._logger.info('Stopping workers')
+            self._pool.shutdown()
+
             self._logger.info('Setting running status as False')
 
             self._db_setRunningStatus(False)
+            self._db_setPoolStatus(None)
 
     def _taskCycle(self, timestamp, curTask):
 
         self._db_setTaskRunning(timestamp, curTask)
 
-        # Start a worker subprocess
-        # Add it to the thread dict
-
-        if self._config.multitask_mode == 'processes':
-            wclass = ProcessWorker
-        else:
-            wclass = ThreadWorker
+        # Hand it over to a worker of the pool
         delay = int_timestamp(self._getCurrentDateTime()) - timestamp
-        self._runningWorkers[curTask.id] = wclass(curTask.id, self._config, delay)
-        self._runningWorkers[curTask.id].start()
+        self._pool.submit(curTask, delay)
 
     def _processSpool(self):
         """
@@ -430,9 +493,10 @@ class Scheduler(object):
                 raise
             pair = self._db_popFromSpool()
 
-    def _sleep(self, msg):
+    def _sleep(self, msg, seconds=None):
         self._logger.debug(msg)
-        base.TimeSource.get().sleep(self._config.sleep_interval)
+        if self._wakeup.wait(self._config.sleep_interval if seconds is None else seconds):
+            self._logger.debug('Woken up')
 
     def _readFromDb(self):
         self._logger.debug('_readFromDb()..')
@@ -22,6 +22,7 @@ import logging
 import multiprocessing
 import threading
 import os
+import Queue
 
 import transaction
 from ZEO.Exceptions import ClientDisconnected
@@ -35,14 +36,26 @@ from indico.core.db.util import flush_after_commit_queue
 
 
 class _Worker(object):
-
-    def __init__(self, taskId, configData, delay):
+    """
+    A long-lived worker which runs the tasks it receives through its
+    inbox, one at a time, and reports their result through the outbox
+    shared by all workers of a pool.
+
+    The database connection and the application are kept between tasks, so
+    tasks run by the same worker benefit from a warm ZODB cache.  The worker
+    quits when it gets ``None`` or after running `worker_max_tasks` tasks.
+    After each task it wakes up the scheduler through `wakeup`, if given.
+    """
+
+    def __init__(self, workerId, configData, inbox, outbox, wakeup=None):
         super(_Worker, self).__init__()
 
-        self._logger = logging.getLogger('worker/%s' % taskId)
-        self._taskId = taskId
+        self._logger = logging.getLogger('worker')
+        self._workerId = workerId
         self._config = configData
-        self._executionDelay = delay
+        self.inbox = inbox
+        self._outbox = outbox
+        self._wakeup = wakeup
 
         # Import it here to avoid circular import
         from indico.web.flask.app import make_app
@@ -51,9 +64,8 @@ class _Worker(object):
     def _prepare(self):
         """
         This acts as a second 'constructor', that is executed in the
-        context of the thread (due to database reasons)
+        context of the thread (due to database reasons) for each task
         """
-        self._prepareDB()
         self._dbi.startRequest()
         self._delayed = False
 
@@ -85,10 +97,17 @@ class _Worker(object):
                 self._task.start(self._executionDelay)
                 transaction.commit()
 
-    def run(self):
+    def _runTask(self, taskId, delay):
+        """
+        Runs a task and returns whether it finished successfully
+        """
+        self._taskId = taskId
+        self._executionDelay = delay
+        self._logger = logging.getLogger('worker/%s' % taskId)
         self._prepare()
         self._logger.info('Running task {}.. (delay: {})'.format(self._task.id, self._executionDelay))
 
+        i = 0
         try:
             for i, retry in enumerate(transaction.attempts(self._config.task_max_tries)):
                 with retry:
@@ -101,7 +120,7 @@ class _Worker(object):
                     except ConflictError:
                         transaction.abort()
                     except ClientDisconnected:
-                        self._logger.warning("Retrying for the {}th time in {} secs..".format(i + 1, seconds))
+                        self._logger.warning("Retrying for the {}th time in {} secs..".format(i + 1, i * 10))
                         transaction.abort()
                         time.sleep(i * 10)
                     except TaskDelayed, e:
@@ -120,39 +139,50 @@ class _Worker(object):
             self._logger.info('{} ended on: {}'.format(self._task, self._task.endedOn))
             # task successfully finished
             if self._task.endedOn:
-                with self._dbi.transaction():
-                    self._setResult(True)
+                result = True
                 if i > (1 + int(self._delayed)):
                     self._logger.warning("{} failed {} times before "
-                                         "finishing correctly".format(self._task, i - int(delayed) - 1))
+                                         "finishing correctly".format(self._task, i - int(self._delayed) - 1))
             # task failed
             else:
-                with self._dbi.transaction():
-                    self._setResult(False)
+                result = False
                 self._logger.error("{} failed too many ({}) times. Aborting its execution..".format(self._task, i))
-                self._logger.info("exiting")
 
             self._dbi.endRequest()
+        return result
+
+    def run(self):
+        self._prepareDB()
+        for _ in xrange(self._config.worker_max_tasks):
+            item = self.inbox.get()
+            if item is None:
+                break
+            taskId, delay = item
+            try:
+                result = self._runTask(taskId, delay)
+            except Exception:
+                logging.getLogger('worker').exception('Could not run task {}'.format(taskId))
+                if self._dbi.isConnected():
+                    self._dbi.endRequest(False)
+                result = False
+            self._outbox.put((self._workerId, taskId, result))
+            if self._wakeup is not None:
+                self._wakeup.notify()
+        logging.getLogger('worker').info('Worker {} exiting'.format(self._workerId))
 
 
 class ThreadWorker(_Worker, threading.Thread):
 
-    def __init__(self, tid, configData, delay):
-        super(ThreadWorker, self).__init__(tid, configData, delay)
-        self._result = 0
-
-    def _setResult(self, res):
-        self._result = res
+    queueClass = Queue.Queue
 
-    def getResult(self):
-        return self._result
+    def __init__(self, workerId, configData, inbox, outbox, wakeup=None):
+        super(ThreadWorker, self).__init__(workerId, configData, inbox, outbox, wakeup)
+        self.daemon = True
 
 
 class ProcessWorker(_Worker, multiprocessing.Process):
 
-    def __init__(self, tid, configData, delay):
-        super(ProcessWorker, self).__init__(tid, configData, delay)
-        self._result = multiprocessing.Value('i', 0)
+    queueClass = multiprocessing.Queue
 
     def _prepareDB(self):
         # since the DBMgr instance will be replicated across objects,
@@ -167,9 +197,3 @@ class ProcessWorker(_Worker, multiprocessing.Process):
 
     def isAlive(self):
         return self.is_alive()
-
-    def _setResult(self, res):
-        self._result.value = res
-
-    def getResult(self):
-        return self._result.value
@@ -70,6 +70,10 @@ class BaseTask(TimedEvent):
     # seconds to consider a task AWOL
     _AWOLThresold = 6000
 
+    # when more tasks are due than workers are available, the ones with the
+    # highest priority are started first
+    priority = 0
+
     def __init__(self, expiryDate=None):
         self.createdOn = self._getCurrentDateTime()
         self.expiryDate = expiryDate
@@ -223,6 +227,10 @@ class OneShotTask(BaseTask):
 class SendMailTask(OneShotTask):
     """
     """
+
+    # e-mails (e.g. alarms) are usually expected at a given time
+    priority = 10
+
     def __init__(self, startDateTime):
         super(SendMailTask, self).__init__(startDateTime)
         self.fromAddr = ""
@@ -197,6 +197,43 @@ class FoundationSyncTask(PeriodicUniqueTask):
         FoundationSync(self.getLogger()).run_all()
 
 
+class FileCacheCleanupTask(PeriodicUniqueTask):
+    """
+    Removes expired entries from the file-based cache and enforces the
+    FileCacheMaxSize and FileCacheQuotas limits
+    """
+
+    def run(self):
+        from indico.core.config import Config
+        from MaKaC.common.cache import FileCacheClient
+
+        config = Config.getInstance()
+        if config.getCacheBackend() != 'files':
+            return
+        mb = 1024 * 1024
+        quotas = dict((namespace, quota * mb) for namespace, quota in config.getFileCacheQuotas().iteritems())
+        removed = FileCacheClient(config.getXMLCacheDir()).evict(config.getFileCacheMaxSize() * mb, quotas)
+        for namespace, stats in sorted(removed.iteritems()):
+            self.getLogger().info('Removed {0} entries ({1} bytes) from {2}'.format(stats['entries'], stats['size'],
+                                                                                  namespace))
+
+
+class MailOutboxDeliveryTask(PeriodicUniqueTask):
+    """
+    Delivers the e-mails waiting in the mail outbox
+    """
+
+    # leave some time for the other tasks if there are lots of e-mails
+    TIME_LIMIT = 300
+
+    def run(self):
+        from indico.modules.outbox import OutboxDelivery
+
+        sent, failed = OutboxDelivery(self.getLogger()).deliver(self.TIME_LIMIT)
+        if sent or failed:
+            self.getLogger().info('Sent {0} e-mails, {1} could not be sent'.format(sent, failed))
+
+
 class SamplePeriodicTask(PeriodicTask):
     def run(self):
         base.TimeSource.get().sleep(1)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Wakeup channels which let clients and workers interrupt the sleep of the
+scheduler instead of waiting for its next poll.
+"""
+
+import logging
+import math
+import threading
+
+import transaction
+
+from indico.core.config import Config
+from indico.modules.scheduler import base
+from indico.util.redis import client as redis_client
+from indico.util.redis import redis, RedisError
+
+
+WAKEUP_KEY = 'scheduler:wakeup'
+
+
+def _push(client, key):
+    with client.pipeline(transaction=False) as pipe:
+        pipe.rpush(key, 1)
+        # nobody needs more than one pending notification
+        pipe.ltrim(key, -1, -1)
+        pipe.execute()
+
+
+class PollingWakeupChannel(object):
+    """
+    Fallback channel which cannot be notified; waiting simply sleeps, but
+    never longer than `pollInterval` seconds
+    """
+
+    def __init__(self, pollInterval):
+        self._pollInterval = pollInterval
+
+    def notify(self):
+        pass
+
+    def wait(self, timeout):
+        base.TimeSource.get().sleep(min(timeout, self._pollInterval))
+        return False
+
+
+class LocalWakeupChannel(object):
+    """
+    Channel for a scheduler running in the same process as its clients and
+    workers, e.g. in tests or with thread workers
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def notify(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return bool(woken)
+
+
+class RedisWakeupChannel(object):
+    """
+    Channel using a Redis list: notifying pushes to it, waiting blocks on it
+    with ``BLPOP``.  Notifications sent while the scheduler is busy are kept,
+    so it does not go to sleep when something happened in the meantime.
+
+    If Redis is not reachable, notifications are lost and waiting falls
+    back to sleeping like `PollingWakeupChannel`, i.e. never longer than
+    `pollInterval` seconds.
+    """
+
+    # longest time ``BLPOP`` blocks; waiting longer than that returns early
+    MAX_WAIT = 300
+    # the socket timeout must be longer than ``BLPOP`` blocks
+    SOCKET_TIMEOUT_MARGIN = 5
+
+    def __init__(self, url, pollInterval, key=WAKEUP_KEY):
+        self._pollInterval = pollInterval
+        self._client = redis.StrictRedis.from_url(url, socket_timeout=self.MAX_WAIT + self.SOCKET_TIMEOUT_MARGIN)
+        self._key = key
+        self._logger = logging.getLogger('scheduler')
+
+    def notify(self):
+        try:
+            _push(self._client, self._key)
+        except RedisError:
+            self._logger.exception('Could not wake up the scheduler')
+
+    def wait(self, timeout):
+        try:
+            # BLPOP only supports whole seconds and 0 means "forever"
+            woken = self._client.blpop(self._key, max(1, min(self.MAX_WAIT, int(math.ceil(timeout))))) is not None
+            # the scheduler syncs after waking up, so earlier notifications are obsolete
+            self._client.delete(self._key)
+        except RedisError:
+            self._logger.exception('Could not wait for a wakeup notification')
+            base.TimeSource.get().sleep(min(timeout, self._pollInterval))
+            return False
+        return woken
+
+
+def get_wakeup_channel(pollInterval):
+    """
+    Returns the channel the scheduler should wait on: the Redis one if Redis
+    is configured, otherwise the polling fallback
+    """
+    url = Config.getInstance().getRedisConnectionURL()
+    if redis and url:
+        return RedisWakeupChannel(url, pollInterval)
+    return PollingWakeupChannel(pollInterval)
+
+
+def _notifyAfterCommit(success):
+    if not success or not redis_client:
+        return
+    try:
+        _push(redis_client, WAKEUP_KEY)
+    except RedisError:
+        logging.getLogger('scheduler').exception('Could not wake up the scheduler')
+
+
+def wake_scheduler():
+    """
+    Wakes up the scheduler once the current transaction has been committed,
+    so it finds the changes it was woken up for
+    """
+    txn = transaction.get()
+    if not any(hook is _notifyAfterCommit for hook, args, kwargs in txn.getAfterCommitHooks()):
+        txn.addAfterCommitHook(_notifyAfterCommit)
@@ -81,7 +81,7 @@ class UpcomingEventsModule(Module):
 
     @property
     def _cache(self):
-        return GenericCache('UpcomingEvents')
+        return GenericCache('UpcomingEvents', l1TTL=30)
 
     def setCacheTTL(self, ttl):
         self._ttl = ttl
@@ -220,7 +220,7 @@ class TestManager(object):
         # re-configure logging and template generator, so that paths are updated
         from MaKaC.common import TemplateExec
         from MaKaC.common.logger import Logger
-        TemplateExec.mako = TemplateExec._define_lookup()
+        TemplateExec.mako = TemplateExec.define_lookup()
         Logger.reset()
 
 
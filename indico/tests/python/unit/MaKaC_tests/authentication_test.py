@@ -19,7 +19,9 @@
 
 from MaKaC.user import Avatar, AvatarHolder, Group, GroupHolder, LoginInfo
 from MaKaC.authentication import AuthenticatorMgr
+from MaKaC.authentication.LDAPAuthentication import LDAPConnector
 from indico.tests.python.unit.util import IndicoTestCase, with_context
+from indico.util.contextManager import ContextManager
 
 
 class TestAuthentication(IndicoTestCase):
@@ -79,3 +81,41 @@ class TestAuthentication(IndicoTestCase):
         for i in xrange(1, 3):
             self.assertEqual(self._authMgr.getAvatar(LoginInfo("fake-%d" % i, "fake-%d" % i)),
                              ah.getById("fake-%d" % i))
+
+
+class _LDAPConnectorStub(LDAPConnector):
+    """A connector which does not connect anywhere"""
+
+    def __init__(self):
+        self.closed = False
+
+    def open(self):
+        pass
+
+    def login(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class TestLDAPConnector(IndicoTestCase):
+
+    def tearDown(self):
+        ContextManager.delete('ldap.connector', silent=True)
+        super(TestLDAPConnector, self).tearDown()
+
+    def testNotReused(self):
+        first = _LDAPConnectorStub.getInstance()
+        self.assertIsNot(_LDAPConnectorStub.getInstance(), first)
+        self.assertIsNone(ContextManager.get('ldap.connector', None))
+
+    def testReusedConnection(self):
+        with _LDAPConnectorStub.reusedConnection():
+            connector = _LDAPConnectorStub.getInstance()
+            self.assertIs(_LDAPConnectorStub.getInstance(), connector)
+            self.assertFalse(connector.closed)
+        self.assertTrue(connector.closed)
+        self.assertIsNone(ContextManager.get('ldap.connector', None))
+        # later connections are not kept anymore
+        self.assertIsNot(_LDAPConnectorStub.getInstance(), _LDAPConnectorStub.getInstance())
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the precompiled template mode of `MaKaC.common.TemplateExec`
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+import time
+
+import mako.exceptions
+
+from indico.tests.python.unit.util import IndicoTestCase
+from MaKaC.common import TemplateExec
+from MaKaC.common.TemplateExec import IndicoTemplateLookup, FILTER_IMPORTS
+
+
+TEMPLATES = {
+    'Layout.tpl': '<html>${ next.body() }</html>',
+    'Page.tpl': ('<%inherit file="Layout.tpl"/>\n'
+                 '<%include file="Item.tpl" args="name=title"/>\n'
+                 '<%include file="${ TPLS }/Item.tpl" args="name=\'absolute\'"/>\n'
+                 '% for item in items:\n'
+                 '${ self.row(item) }\n'
+                 '% endfor\n'
+                 '<%def name="row(item)"><li>${ item | h }</li></%def>'),
+    'Item.tpl': '<%page args="name"/><b>${ name }</b>',
+    'sub/Nested.tpl': '<%include file="../Item.tpl" args="name=\'nested\'"/>'
+}
+
+PARAMS = {
+    'name': 'item',
+    'title': u'Caf\xe9 <&>',
+    'items': ['a < b', u'\xfcber', 3]
+}
+
+
+class _TemplateLookup(IndicoTemplateLookup):
+    """Only knows about the test templates, not about the plugin ones"""
+
+    def _iterTemplateDirs(self):
+        for dir in self.directories:
+            yield dir, ''
+
+
+class TestPrecompiledTemplates(IndicoTestCase):
+
+    def setUp(self):
+        super(TestPrecompiledTemplates, self).setUp()
+        self._tplDir = tempfile.mkdtemp()
+        self._moduleDirs = []
+        for name, source in TEMPLATES.iteritems():
+            path = os.path.join(self._tplDir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(source)
+        self._fileExistsCache = dict(TemplateExec._existingFiles)
+        self._mako = TemplateExec.mako
+
+    def tearDown(self):
+        TemplateExec.mako = self._mako
+        TemplateExec._existingFiles.clear()
+        TemplateExec._existingFiles.update(self._fileExistsCache)
+        shutil.rmtree(self._tplDir)
+        for dir in self._moduleDirs:
+            shutil.rmtree(dir)
+        super(TestPrecompiledTemplates, self).tearDown()
+
+    def _lookup(self, precompiled, moduleDir=None):
+        # the same arguments as the real lookup
+        if moduleDir is None:
+            moduleDir = tempfile.mkdtemp()
+            self._moduleDirs.append(moduleDir)
+        return _TemplateLookup(directories=[self._tplDir],
+                               module_directory=moduleDir,
+                               disable_unicode=True,
+                               input_encoding='utf-8',
+                               default_filters=['encode_if_unicode', 'str'],
+                               filesystem_checks=not precompiled,
+                               imports=FILTER_IMPORTS)
+
+    def _render(self, lookup, uri):
+        return lookup.get_template(uri).render(TPLS=self._tplDir, **PARAMS)
+
+    @contextlib.contextmanager
+    def _countStats(self):
+        """Counts the files checked (`os.path.exists`, `os.path.isfile`,
+        `os.stat`...) while the block runs"""
+        stats = []
+        origStat = os.stat
+
+        def _stat(path, *args):
+            stats.append(path)
+            return origStat(path, *args)
+
+        os.stat = _stat
+        try:
+            yield stats
+        finally:
+            os.stat = origStat
+
+    def testSameOutput(self):
+        checked = self._lookup(False)
+        precompiled = self._lookup(True)
+        for uri in ('Page.tpl', 'Item.tpl', 'sub/Nested.tpl'):
+            self.assertEqual(self._render(precompiled, uri), self._render(checked, uri))
+        self.assertIn('<b>Caf\xc3\xa9 <&></b>', self._render(precompiled, 'Page.tpl'))
+
+    def testPrecompiledModules(self):
+        # what `indico templates compile` does before the workers start
+        moduleDir = tempfile.mkdtemp()
+        self._moduleDirs.append(moduleDir)
+        loaded, errors = self._lookup(True, moduleDir).preload()
+        self.assertEqual((loaded, errors), (len(TEMPLATES), []))
+        self.assertTrue(os.listdir(moduleDir))
+        expected = self._render(self._lookup(False), 'Page.tpl')
+        self.assertEqual(self._render(self._lookup(True, moduleDir), 'Page.tpl'), expected)
+
+    def testNoFilesystemChecks(self):
+        precompiled = self._lookup(True)
+        # the first lookup loads every template; templates included through
+        # a uri which is not normalized are loaded once on demand
+        self._render(precompiled, 'Page.tpl')
+        self._render(precompiled, 'sub/Nested.tpl')
+        with self._countStats() as stats:
+            self._render(precompiled, 'Page.tpl')
+            self._render(precompiled, 'sub/Nested.tpl')
+            precompiled.get_template(os.path.join(self._tplDir, 'Layout.tpl'))
+        self.assertEqual(stats, [])
+
+        # while the normal mode checks the templates on every render
+        checked = self._lookup(False)
+        self._render(checked, 'Page.tpl')
+        with self._countStats() as stats:
+            self._render(checked, 'Page.tpl')
+        self.assertTrue(stats)
+
+    def testModifiedTemplate(self):
+        checked = self._lookup(False)
+        precompiled = self._lookup(True)
+        before = precompiled.get_template('Item.tpl').render(name='x')
+        checked.get_template('Item.tpl')
+        path = os.path.join(self._tplDir, 'Item.tpl')
+        with open(path, 'w') as f:
+            f.write('<i>${ name }</i>')
+        future = time.time() + 10
+        os.utime(path, (future, future))
+        # only the normal mode picks up changes
+        self.assertEqual(checked.get_template('Item.tpl').render(name='x'), '<i>x</i>')
+        self.assertEqual(precompiled.get_template('Item.tpl').render(name='x'), before)
+
+    def testOnDemand(self):
+        precompiled = self._lookup(True)
+        precompiled.get_template('Item.tpl')
+        # templates outside of the template directories are still found
+        otherDir = tempfile.mkdtemp()
+        self._moduleDirs.append(otherDir)
+        path = os.path.join(otherDir, 'Other.tpl')
+        with open(path, 'w') as f:
+            f.write('other')
+        self.assertEqual(precompiled.get_template(path).render(), 'other')
+        self.assertRaises(mako.exceptions.TopLevelLookupException, precompiled.get_template, 'Missing.tpl')
+
+    def testBrokenTemplate(self):
+        with open(os.path.join(self._tplDir, 'Broken.tpl'), 'w') as f:
+            f.write('% for x in y:\n')
+        loaded, errors = self._lookup(True).preload()
+        self.assertEqual(loaded, len(TEMPLATES))
+        self.assertEqual([path for path, e in errors], [os.path.join(self._tplDir, 'Broken.tpl')])
+        # the other templates still work
+        precompiled = self._lookup(True)
+        self.assertEqual(self._render(precompiled, 'Page.tpl'), self._render(self._lookup(False), 'Page.tpl'))
+
+    def testFileExists(self):
+        path = os.path.join(self._tplDir, 'Page.tpl')
+        missing = os.path.join(self._tplDir, 'Page.missing.tpl')
+        TemplateExec.mako = self._lookup(True)
+        TemplateExec._existingFiles.clear()
+        self.assertTrue(TemplateExec.fileExists(path))
+        self.assertFalse(TemplateExec.fileExists(missing))
+        with self._countStats() as stats:
+            self.assertTrue(TemplateExec.fileExists(path))
+            self.assertFalse(TemplateExec.fileExists(missing))
+        self.assertEqual(stats, [])
+
+        TemplateExec.mako = self._lookup(False)
+        with self._countStats() as stats:
+            self.assertTrue(TemplateExec.fileExists(path))
+        self.assertEqual(stats, [path])
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the L1 cache, the file cache eviction and the clients of `MaKaC.common.cache`
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from indico.tests.python.unit.util import IndicoTestCase
+from MaKaC.common.cache import L1Cache, CacheClient, FileCacheClient, RedisCacheClient, GenericCache
+from MaKaC.common.contextManager import ContextManager
+
+
+class TestL1Cache(IndicoTestCase):
+
+    def setUp(self):
+        super(TestL1Cache, self).setUp()
+        self._cache = L1Cache()
+
+    def testCopies(self):
+        self._cache.set('a', {'x': 1}, 10)
+        self._cache.get('a')['x'] = 2
+        self.assertEqual(self._cache.get('a'), {'x': 1})
+
+    def testExpiry(self):
+        self._cache.set('a', 1, -1)
+        self.assertEqual(self._cache.get('a'), None)
+        self.assertEqual(len(self._cache), 0)
+
+    def testLRUEviction(self):
+        self._cache.MAX_ENTRIES = 2
+        self._cache.set('a', 1, 10)
+        self._cache.set('b', 2, 10)
+        self._cache.get('a')
+        self._cache.set('c', 3, 10)
+        self.assertEqual((self._cache.get('a'), self._cache.get('b'), self._cache.get('c')), (1, None, 3))
+
+    def testSizeLimit(self):
+        self._cache.MAX_SIZE = 100
+        self._cache.set('a', 'x' * 60, 10)
+        self._cache.set('b', 'y' * 60, 10)
+        self.assertEqual(self._cache.get('a'), None)
+        self.assertEqual(self._cache.get('b'), 'y' * 60)
+        self._cache.set('c', 'z' * (L1Cache.MAX_ENTRY_SIZE + 1), 10)
+        self.assertEqual(self._cache.get('c'), None)
+
+
+class TestFileCacheEviction(IndicoTestCase):
+
+    def setUp(self):
+        super(TestFileCacheEviction, self).setUp()
+        self._dir = tempfile.mkdtemp()
+        self._client = FileCacheClient(self._dir)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+        super(TestFileCacheEviction, self).tearDown()
+
+    def testExpired(self):
+        self._client.set('ns.aaaaaaaa1', 'x', 100)
+        self._client.set('ns.aaaaaaaa2', 'y', -10)
+        self.assertEqual(self._client.getFootprint()['ns']['expired'], 1)
+        self.assertEqual(self._client.evict()['ns']['entries'], 1)
+        self.assertEqual(self._client.get('ns.aaaaaaaa1'), 'x')
+
+    def testQuota(self):
+        self._client.set('ns.aaaaaaaa1', 'x' * 1000)
+        self._client.set('ns.bbbbbbbb1', 'y' * 1000)
+        self._client.set('other.cccccccc1', 'z' * 1000)
+        old = time.time() - 100
+        os.utime(self._client._getFilePath('ns.aaaaaaaa1'), (old, old))
+        self._client.evict(quotas={'ns': 1500})
+        self.assertEqual(self._client.get('ns.aaaaaaaa1'), None)
+        self.assertEqual(self._client.get('ns.bbbbbbbb1'), 'y' * 1000)
+        self.assertEqual(self._client.get('other.cccccccc1'), 'z' * 1000)
+        self.assertFalse(os.path.exists(os.path.join(self._dir, 'generic_cache', 'ns', 'aaaa')))
+
+    def testMaxSize(self):
+        self._client.set('ns.aaaaaaaa1', 'x' * 1000)
+        self._client.set('other.bbbbbbbb1', 'y' * 1000)
+        old = time.time() - 100
+        os.utime(self._client._getFilePath('other.bbbbbbbb1'), (old, old))
+        removed = self._client.evict(maxSize=1500)
+        self.assertEqual(removed.keys(), ['other'])
+        self.assertEqual(removed['other']['entries'], 1)
+
+    def testTouch(self):
+        self._client.set('ns.aaaaaaaa1', 'x', 10)
+        self.assertTrue(self._client.touch('ns.aaaaaaaa1', 1000))
+        val, ttl = self._client.get_with_ttl('ns.aaaaaaaa1')
+        self.assertEqual(val, 'x')
+        self.assertTrue(990 < ttl <= 1000)
+        self.assertFalse(self._client.touch('ns.bbbbbbbb1', 1000))
+        self._client.set('ns.cccccccc1', 'z')
+        self.assertEqual(self._client.get_with_ttl('ns.cccccccc1'), ('z', None))
+
+
+class _SlowFileCacheClient(FileCacheClient):
+    """Takes some time to write entries, like when writing big values"""
+
+    def _dump(self, f, expiry, val):
+        time.sleep(0.01)
+        super(_SlowFileCacheClient, self)._dump(f, expiry, val)
+
+
+class TestFileCacheAdd(IndicoTestCase):
+
+    def setUp(self):
+        super(TestFileCacheAdd, self).setUp()
+        self._dir = tempfile.mkdtemp()
+        self._client = FileCacheClient(self._dir)
+        self._path = self._client._getFilePath('ns.aaaaaaaa1')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+        super(TestFileCacheAdd, self).tearDown()
+
+    def testAdd(self):
+        self.assertTrue(self._client.add('ns.aaaaaaaa1', 'x', 100))
+        self.assertFalse(self._client.add('ns.aaaaaaaa1', 'y', 100))
+        self.assertEqual(self._client.get('ns.aaaaaaaa1'), 'x')
+        # no temporary files are left behind
+        self.assertEqual(os.listdir(os.path.dirname(self._path)), [os.path.basename(self._path)])
+
+    def testAddExpired(self):
+        self._client.set('ns.aaaaaaaa1', 'x', -10)
+        self.assertTrue(self._client.add('ns.aaaaaaaa1', 'y', 100))
+        self.assertEqual(self._client.get('ns.aaaaaaaa1'), 'y')
+
+    def testAddPartialEntry(self):
+        # an entry which is still being written is not replaced...
+        open(self._path, 'wb').close()
+        self.assertFalse(self._client.add('ns.aaaaaaaa1', 'y', 100))
+        self.assertEqual(os.path.getsize(self._path), 0)
+        # ...unless it is older than the entry we add
+        old = time.time() - 200
+        os.utime(self._path, (old, old))
+        self.assertTrue(self._client.add('ns.aaaaaaaa1', 'y', 100))
+        self.assertEqual(self._client.get('ns.aaaaaaaa1'), 'y')
+
+    def testConcurrentAdd(self):
+        self._client.set('ns.aaaaaaaa1', 'x', -10)
+        start = threading.Event()
+        results = []
+
+        def _add(i):
+            start.wait()
+            # some arrive while the first entry is still being written
+            time.sleep((i % 5) * 0.003)
+            # separate clients like separate processes
+            results.append((_SlowFileCacheClient(self._dir).add('ns.aaaaaaaa1', i, 100), i))
+
+        threads = [threading.Thread(target=_add, args=(i,)) for i in xrange(10)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        winners = [i for added, i in results if added]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(self._client.get('ns.aaaaaaaa1'), winners[0])
+
+    def testEvictionSkipsTemporaryFiles(self):
+        self._client.set('ns.aaaaaaaa1', 'x', -10)
+        tmpPath = self._path + '.0123.tmp'
+        open(tmpPath, 'wb').close()
+        self._client.evict()
+        self.assertTrue(os.path.exists(tmpPath))
+        self.assertFalse(os.path.exists(self._path))
+
+
+class _ClosingClient(CacheClient):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestGenericCacheClient(IndicoTestCase):
+
+    def tearDown(self):
+        ContextManager.delete('GenericCacheClient', silent=True)
+        super(TestGenericCacheClient, self).tearDown()
+
+    def testCloseClient(self):
+        mainClient = _ClosingClient()
+        ContextManager.set('GenericCacheClient', mainClient)
+        threadClients = []
+
+        def _run():
+            client = _ClosingClient()
+            ContextManager.set('GenericCacheClient', client)
+            GenericCache.closeClient()
+            threadClients.append((client, ContextManager.get('GenericCacheClient', None)))
+
+        thread = threading.Thread(target=_run)
+        thread.start()
+        thread.join()
+        (client, remaining), = threadClients
+        self.assertTrue(client.closed)
+        self.assertIsNone(remaining)
+        # the client of the request thread is left alone
+        self.assertFalse(mainClient.closed)
+        self.assertIs(ContextManager.get('GenericCacheClient', None), mainClient)
+
+
+class _MemcacheClient(CacheClient):
+    """Behaves like `memcache.Client`: INCR does not create missing keys"""
+
+    def __init__(self):
+        self._data = {}
+        self.racingAdd = None
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, val, time=0):
+        self._data[key] = val
+        return True
+
+    def add(self, key, val, time=0):
+        if self.racingAdd is not None:
+            # another process creates the key right before we do
+            self._data[key], self.racingAdd = self.racingAdd, None
+        if key in self._data:
+            return False
+        self._data[key] = val
+        return True
+
+    def incr(self, key, delta=1):
+        if key not in self._data:
+            return None
+        self._data[key] = int(self._data[key]) + delta
+        return self._data[key]
+
+
+class _GenericCacheIncrTestCase(IndicoTestCase):
+    """Runs the `GenericCache.incr` tests on the client from `_makeClient`"""
+
+    def setUp(self):
+        super(_GenericCacheIncrTestCase, self).setUp()
+        self._client = self._makeClient()
+        ContextManager.set('GenericCacheClient', self._client)
+        self._cache = GenericCache('incrTest')
+
+    def tearDown(self):
+        ContextManager.delete('GenericCacheClient', silent=True)
+        super(_GenericCacheIncrTestCase, self).tearDown()
+
+    def _incrMissing(self):
+        self.assertEqual(self._cache.incr('counter'), 1)
+        self.assertEqual(self._cache.incr('counter', 5), 6)
+        self.assertEqual(int(self._cache.get('counter')), 6)
+
+    def _incrLegacyValue(self):
+        # counters used to be written with a plain `set`
+        self._cache.set('counter', 5)
+        self.assertEqual(self._cache.incr('counter'), 6)
+        self.assertEqual(int(self._cache.get('counter')), 6)
+        self.assertEqual(self._cache.incr('counter'), 7)
+
+    def _incrInvalidatesL1(self):
+        cache = GenericCache('incrTest', l1TTL=60)
+        cache.set('counter', 1)
+        self.assertEqual(int(cache.get('counter')), 1)
+        cache.incr('counter')
+        self.assertEqual(int(cache.get('counter')), 2)
+
+
+class TestFileCacheIncr(_GenericCacheIncrTestCase):
+
+    def _makeClient(self):
+        self._dir = tempfile.mkdtemp()
+        return FileCacheClient(self._dir)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+        super(TestFileCacheIncr, self).tearDown()
+
+    def testIncrMissing(self):
+        self._incrMissing()
+
+    def testIncrLegacyValue(self):
+        self._incrLegacyValue()
+
+    def testIncrInvalidatesL1(self):
+        self._incrInvalidatesL1()
+
+
+class TestMemcacheIncr(_GenericCacheIncrTestCase):
+
+    def _makeClient(self):
+        return _MemcacheClient()
+
+    def testIncrMissing(self):
+        self._incrMissing()
+
+    def testIncrLegacyValue(self):
+        self._incrLegacyValue()
+
+    def testIncrInvalidatesL1(self):
+        self._incrInvalidatesL1()
+
+    def testIncrConcurrentAdd(self):
+        self._client.racingAdd = 3
+        self.assertEqual(self._cache.incr('counter'), 4)
+        self.assertEqual(self._cache.get('counter'), 4)
+
+
+class TestRedisCacheIncr(_GenericCacheIncrTestCase):
+
+    _requires = ['redis.Redis']
+
+    def _makeClient(self):
+        client = RedisCacheClient.__new__(RedisCacheClient)
+        client._client = self._redis
+        return client
+
+    def tearDown(self):
+        self._redis.flushdb()
+        super(TestRedisCacheIncr, self).tearDown()
+
+    def testIncrMissing(self):
+        self._incrMissing()
+        # INCR works on the stored value directly
+        self.assertEqual(self._redis.get(self._cache._makeKey('counter')), '6')
+
+    def testIncrLegacyValue(self):
+        self._incrLegacyValue()
+        # the pickled value has been replaced by a plain number
+        self.assertEqual(self._redis.get(self._cache._makeKey('counter')), '7')
+        self.assertEqual(self._cache.get('counter'), 7)
+
+    def testIncrInvalidatesL1(self):
+        self._incrInvalidatesL1()
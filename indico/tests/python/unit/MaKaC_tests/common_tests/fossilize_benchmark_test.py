@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compares the compiled fossilization with the original one, which looked
+up the tags of every method for each fossilized object, on a conference
+with many contributions.  Set INDICO_BENCHMARK_TESTS=1 to see the timings.
+"""
+
+import inspect
+import os
+from datetime import datetime, timedelta
+
+from pytz import timezone
+
+from MaKaC import conference
+from MaKaC.common.fossilize import Fossilizable, fossilize
+from MaKaC.fossils.contribution import IContributionWithSpeakersFossil
+from indico.tests.python.unit.util import IndicoTestCase
+from indico.util.benchmark import Benchmark
+
+
+def _fossilizeUncompiled(target, interface, **kwargs):
+    """
+    The fossilization algorithm before fossils were compiled (without the
+    attribute cache and filters, which are not used here)
+    """
+    if isinstance(target, (list, tuple, set)):
+        return [_fossilizeUncompiled(elem, interface, **kwargs) for elem in target]
+    elif not isinstance(target, Fossilizable):
+        return target
+
+    result = {}
+    for methodName in interface.names(all=True):
+        method = interface[methodName]
+        tags = method.getTaggedValueTags()
+        if 'onlyIf' in tags and not kwargs.get(method.getTaggedValue('onlyIf'), False):
+            continue
+        if 'produce' in tags:
+            methodResult = method.getTaggedValue('produce')(target)
+        else:
+            methodResult = getattr(target, methodName)()
+        if 'result' in tags:
+            methodResult = _fossilizeUncompiled(methodResult, method.getTaggedValue('result'), **kwargs)
+        if 'convert' in tags:
+            convertFunction = method.getTaggedValue('convert')
+            converterArgNames = inspect.getargspec(convertFunction)[0]
+            methodResult = convertFunction(methodResult, **dict((name, kwargs[name])
+                                                                for name in converterArgNames
+                                                                if name in kwargs))
+        if 'name' in tags:
+            attrName = method.getTaggedValue('name')
+        else:
+            attrName = Fossilizable._Fossilizable__extractName(methodName)
+        current = result
+        attrList = attrName.split('.')
+        while len(attrList) > 1:
+            current = current.setdefault(attrList.pop(0), {})
+        current[attrList[0]] = methodResult
+
+    fossilName = Fossilizable._Fossilizable__extractFossilName(interface.getName())
+    result['_type'] = target.__class__.__name__
+    result['_fossil'] = fossilName
+    return result
+
+
+class TestFossilizeBenchmark(IndicoTestCase):
+
+    _requires = ['db.DummyUser', 'plugins.Plugins', 'util.RequestEnvironment']
+    _slow = True
+
+    NUM_CONTRIBUTIONS = 500
+
+    def setUp(self):
+        super(TestFossilizeBenchmark, self).setUp()
+
+        with self._context('database'):
+            category = conference.CategoryManager().getById('0')
+            self._conf = category.newConference(self._dummy)
+            self._conf.setTimezone('UTC')
+            sd = datetime(2011, 11, 1, 10, 0, tzinfo=timezone('UTC'))
+            self._conf.setDates(sd, sd + timedelta(days=5))
+            conference.ConferenceHolder().add(self._conf)
+
+            for i in xrange(self.NUM_CONTRIBUTIONS):
+                contrib = conference.Contribution()
+                self._conf.addContribution(contrib)
+                contrib.setTitle('Contribution %d' % i)
+                contrib.setDescription('Description of contribution %d' % i)
+                for j in xrange(3):
+                    speaker = conference.ContributionParticipation()
+                    speaker.setFirstName('First%d' % j)
+                    speaker.setFamilyName('Speaker%d' % i)
+                    speaker.setAffiliation('CERN')
+                    contrib.newSpeaker(speaker)
+
+    def testCompiledFossils(self):
+        "Compiled fossils produce the same result as the uncompiled ones"
+
+        with self._context('database', 'request'):
+            contribs = self._conf.getContributionList()
+            tz = self._conf.getTimezone()
+
+            with Benchmark() as uncompiled:
+                expected = _fossilizeUncompiled(contribs, IContributionWithSpeakersFossil, tz=tz)
+            with Benchmark() as compiled:
+                result = fossilize(contribs, IContributionWithSpeakersFossil, tz=tz)
+
+        self.assertEqual(result, expected)
+        if os.environ.get('INDICO_BENCHMARK_TESTS') == '1':
+            print '\nfossilizing %d contributions: uncompiled %s, compiled %s' % (len(contribs), uncompiled,
+                                                                                compiled)
@@ -20,6 +20,7 @@
 # For now, disable Pylint
 # pylint: disable-all
 
+import threading
 
 from MaKaC.common.fossilize import IFossil, Fossilizable, fossilizes, fossilize, \
     NonFossilizableException, addFossil,\
@@ -349,3 +350,16 @@ class TestFossilize(IndicoTestCase):
         d1 = DerivedClass(10, 50, 'bar')
         self.assertEquals(s1.fossilize(IAttributeFossil), {'_type':'SimpleClass', '_fossil':'attribute', "a": 10, "b": 20, "c":"foo"})
         self.assertEquals(fossilize(d1, IAttributeFossil), {'_type':'DerivedClass', '_fossil':'attribute', "a": 10, "b": 50, "c":"bar"})
+
+    def testFossilizeInNewThread(self):
+        """
+        Fossilizing in a thread which never cleared the cache
+        """
+        s1 = SimpleClass(10, 20, 'foo')
+        results = []
+        thread = threading.Thread(target=lambda: results.append((s1.fossilize(ISimpleFossil2Fossil),
+                                                                 fossilize(s1, IAttributeFossil, useAttrCache=True))))
+        thread.start()
+        thread.join()
+        self.assertEquals(results, [({'_type':'SimpleClass', '_fossil':'simpleFossil2', "a":10, "c":"Foo"},
+                                     {'_type':'SimpleClass', '_fossil':'attribute', "a": 10, "b": 20, "c":"foo"})])
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the trigram lookups of `MaKaC.common.indexes`
+"""
+
+from indico.tests.python.unit.util import IndicoTestCase
+from MaKaC.common.indexes import TrigramIndex, NameIndex, EmailIndex
+
+
+class TestTrigramIndex(IndicoTestCase):
+
+    def setUp(self):
+        super(TestTrigramIndex, self).setUp()
+        self._idx = TrigramIndex()
+        for word in ('Pedro', 'Jos\xc3\xa9', 'Jose Maria', 'Li', 'Alberto'):
+            self._idx.index(word)
+
+    def testSubstring(self):
+        self.assertEqual(self._idx.search('ber'), set(['Alberto']))
+        self.assertEqual(self._idx.search('xyz'), set())
+
+    def testAccentAndCaseFolding(self):
+        self.assertEqual(self._idx.search('JOSE'), set(['Jos\xc3\xa9', 'Jose Maria']))
+        self.assertEqual(self._idx.search('jos\xc3\xa9 m'), set(['Jose Maria']))
+
+    def testShortValues(self):
+        self.assertEqual(self._idx.search('li'), set(['Li']))
+        self.assertEqual(self._idx.search('o'), set(['Pedro', 'Jos\xc3\xa9', 'Jose Maria', 'Alberto']))
+
+    def testPrefix(self):
+        self.assertEqual(self._idx.search('l', prefix=True), set(['Li']))
+        self.assertEqual(self._idx.search('al', prefix=True), set(['Alberto']))
+        self.assertEqual(self._idx.search('ber', prefix=True), set())
+
+    def testUnindex(self):
+        self._idx.unindex('Alberto')
+        self.assertEqual(self._idx.search('ber'), set())
+
+
+class TestTrigramIndexedMatch(IndicoTestCase):
+
+    def setUp(self):
+        super(TestTrigramIndexedMatch, self).setUp()
+        self._idx = NameIndex()
+        for userId, name in enumerate(('Pedro', 'Jos\xc3\xa9', 'Jose', 'Alberto')):
+            self._idx._addItem(name, str(userId))
+
+    def _scan(self, *args, **kwargs):
+        trigrams = self._idx._trigrams
+        self._idx._trigrams = None
+        try:
+            return self._idx._match(*args, **kwargs)
+        finally:
+            self._idx._trigrams = trigrams
+
+    def testSameResultsAsScan(self):
+        for value, kwargs in (('jose', {'cs': 0, 'exact': 0, 'accent_sensitive': False}),
+                              ('Jos\xc3\xa9', {'cs': 1, 'exact': 0, 'accent_sensitive': True}),
+                              ('jose', {'cs': 0, 'exact': 1, 'accent_sensitive': False}),
+                              ('ert', {'cs': 0, 'exact': 0, 'accent_sensitive': False})):
+            self.assertEqual(sorted(self._idx._match(value, **kwargs)), sorted(self._scan(value, **kwargs)))
+
+    def testWithdraw(self):
+        self._idx._withdrawItem('Alberto', '3')
+        self.assertEqual(self._idx._match('ert', cs=0, exact=0, accent_sensitive=False), [])
+
+
+class TestEmailIndex(IndicoTestCase):
+
+    def testMatchUsers(self):
+        idx = EmailIndex()
+        idx._addItem('jdoe@example.com', '1')
+        idx._addItem('jdoe@example.com', '2')
+        idx._addItem('other@example.com', '3')
+        self.assertEqual(idx.matchUsers(['JDoe@example.com', 'unknown@example.com', 'other@example.com']),
+                         {'JDoe@example.com': ['1', '2'], 'other@example.com': ['3']})
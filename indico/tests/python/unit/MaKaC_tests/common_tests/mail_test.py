@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the SMTP connection pool and the rate limiter of `MaKaC.common.mail`
+and for the delivery of the mail outbox
+"""
+
+import asyncore
+import logging
+import smtpd
+import threading
+import time
+
+from indico.core.db import DBMgr
+from indico.modules.outbox import MailOutboxModule, OutboxDelivery
+from indico.tests.python.unit.util import IndicoTestCase
+from MaKaC.common.mail import GenericMailer, SMTPConnectionPool, RateLimiter
+
+
+class _SMTPServer(smtpd.SMTPServer):
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.connections = 0
+        self.messages = []
+        # recipient -> error response to the DATA command
+        self.errors = {}
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        error = self.errors.get(rcpttos[0])
+        if error is None:
+            self.messages.append((mailfrom, sorted(rcpttos), data))
+        return error
+
+
+def _mail(to):
+    return {'toList': [to], 'ccList': [], 'bccList': [], 'fromAddr': 'indico@example.com',
+            'msg': 'Subject: test\r\n\r\nHello'}
+
+
+class _SMTPServerTestCase(IndicoTestCase):
+
+    def setUp(self):
+        super(_SMTPServerTestCase, self).setUp()
+        self._server = _SMTPServer()
+        self._thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.05})
+        self._thread.daemon = True
+        self._thread.start()
+        self._pool = SMTPConnectionPool(self._server.getsockname(), maxMessages=3)
+
+    def tearDown(self):
+        self._pool.close()
+        self._server.close()
+        asyncore.close_all()
+        self._thread.join(1)
+        super(_SMTPServerTestCase, self).tearDown()
+
+
+class TestSMTPConnectionPool(_SMTPServerTestCase):
+
+    def _waitForMessages(self, count):
+        deadline = time.time() + 5
+        while len(self._server.messages) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def testReuse(self):
+        for i in xrange(5):
+            GenericMailer._sendmail(_mail('user%d@example.com' % i), self._pool)
+        self._waitForMessages(5)
+        self.assertEqual([m[1] for m in self._server.messages],
+                         [['user%d@example.com' % i] for i in xrange(5)])
+        # a connection is replaced after sending `maxMessages` messages
+        self.assertEqual(self._server.connections, 2)
+
+    def testClosedConnection(self):
+        GenericMailer._sendmail(_mail('a@example.com'), self._pool)
+        # simulate the server dropping the idle connection
+        for server, sent, lastUse in self._pool._idle:
+            server.close()
+        GenericMailer._sendmail(_mail('b@example.com'), self._pool)
+        self._waitForMessages(2)
+        self.assertEqual(len(self._server.messages), 2)
+        self.assertEqual(self._server.connections, 2)
+
+
+class TestRateLimiter(IndicoTestCase):
+
+    def testRate(self):
+        limiter = RateLimiter(50)
+        start = time.time()
+        for i in xrange(6):
+            limiter.wait()
+        self.assertTrue(time.time() - start >= 0.1)
+
+    def testUnlimited(self):
+        limiter = RateLimiter(0)
+        start = time.time()
+        for i in xrange(1000):
+            limiter.wait()
+        self.assertTrue(time.time() - start < 0.1)
+
+
+class TestOutboxDelivery(_SMTPServerTestCase):
+
+    _requires = ['db.Database']
+
+    def setUp(self):
+        super(TestOutboxDelivery, self).setUp()
+        self._delivery = OutboxDelivery(logging.getLogger('outbox_test'), self._pool, RateLimiter(0))
+        # short delays so retries can be tested without waiting for minutes
+        self._delivery.RETRY_DELAY = 0.5
+        self._delivery.MAX_ATTEMPTS = 3
+
+    def _queue(self):
+        return MailOutboxModule.getDBInstance()._queue.values()
+
+    def testDelivery(self):
+        with self._context('database'):
+            outbox = MailOutboxModule.getDBInstance()
+            for i in xrange(3):
+                outbox.enqueue(_mail('user%d@example.com' % i))
+            self.assertEqual(self._delivery.deliver(), (3, 0))
+            self.assertEqual(outbox.getQueueLength(), 0)
+        self.assertEqual([m[1] for m in self._server.messages],
+                         [['user%d@example.com' % i] for i in xrange(3)])
+
+    def testRecordedOnce(self):
+        with self._context('database'):
+            MailOutboxModule.getDBInstance().enqueue(_mail('user@example.com'))
+            dbi = DBMgr.getInstance()
+            syncs = []
+            dbi.sync = lambda: syncs.append(True)
+            try:
+                self.assertEqual(self._delivery.deliver(), (1, 0))
+            finally:
+                del dbi.sync
+        # the results are not recorded again after a successful commit
+        self.assertEqual(syncs, [])
+
+    def testRetryBackoff(self):
+        self._server.errors['busy@example.com'] = '451 Try again later'
+        with self._context('database'):
+            outbox = MailOutboxModule.getDBInstance()
+            outbox.enqueue(_mail('busy@example.com'))
+            outbox.enqueue(_mail('user@example.com'))
+            for attempt, delay in enumerate([0.5, 1.0], 1):
+                before = time.time()
+                self.assertEqual(self._delivery.deliver(), (int(attempt == 1), 1))
+                msg, = self._queue()
+                self.assertEqual(msg.attempts, attempt)
+                self.assertIn('451', msg.lastError)
+                self.assertTrue(before + delay <= msg.nextAttempt <= time.time() + delay)
+                # not retried before it is due
+                self.assertEqual(self._delivery.deliver(), (0, 0))
+                time.sleep(max(0, msg.nextAttempt - time.time()))
+            # the last attempt moves it to the failed messages
+            self.assertEqual(self._delivery.deliver(), (0, 1))
+            self.assertEqual(outbox.getQueueLength(), 0)
+            msg, = outbox.getFailedMessages()
+            self.assertEqual((msg.data['toList'], msg.attempts), (['busy@example.com'], 3))
+        self.assertEqual(len(self._server.messages), 1)
+
+    def testPermanentFailure(self):
+        self._server.errors['unknown@example.com'] = '550 No such user'
+        with self._context('database'):
+            outbox = MailOutboxModule.getDBInstance()
+            outbox.enqueue(_mail('unknown@example.com'))
+            self.assertEqual(self._delivery.deliver(), (0, 1))
+            self.assertEqual(outbox.getQueueLength(), 0)
+            msg, = outbox.getFailedMessages()
+            self.assertEqual(msg.attempts, 1)
+            self.assertIn('550', msg.lastError)
+
+    def testDueMessages(self):
+        with self._context('database'):
+            outbox = MailOutboxModule.getDBInstance()
+            keys = [outbox.enqueue(_mail('user%d@example.com' % i)) for i in xrange(3)]
+            outbox.postpone(keys[0], 'error', 3600)
+            now = time.time()
+            self.assertEqual([key for key, msg in outbox.getDueMessages(now, 10)], keys[1:])
+            self.assertEqual([key for key, msg in outbox.getDueMessages(now, 1)], keys[1:2])
+            due = outbox.getDueMessages(now + 3600, 10)
+            self.assertEqual([msg.data['toList'] for key, msg in due],
+                             [['user1@example.com'], ['user2@example.com'], ['user0@example.com']])
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+from StringIO import StringIO
+
+from MaKaC.common.xmlGen import XMLGen, StreamingXMLGen
+from indico.tests.python.unit.util import IndicoTestCase
+
+
+def _writeDocument(xg):
+    xg.openTag("collection", [["xmlns", "http://www.loc.gov/MARC21/slim"]])
+    xg.openTag("record")
+    xg.writeTag("title", "Fish & <Chips>")
+    xg.writeTag("author", "Jos\xc3\xa9 Mart\xc3\xadn", [["role", 'chair "main"'], ["id", "a&b"]])
+    xg.writeTag("latin1", "Jos\xe9")
+    xg.writeTag("control", "tab\there\x01bell\x07")
+    xg.writeTag("empty", "")
+    xg.writeTag("number", 42)
+    xg.writeTag("unicode", u"plain")
+    xg.writeComment("a comment")
+    xg.openTag("text")
+    xg.writeText("multi\r\nline")
+    xg.closeTag("text")
+    xg.writeXML("<raw/>")
+    xg.closeTag("record")
+    xg.closeTag("collection")
+
+
+class TestStreamingXMLGen(IndicoTestCase):
+
+    def testSameOutput(self):
+        "StreamingXMLGen produces the same XML as XMLGen"
+
+        for init in (True, False):
+            old, new = XMLGen(init=init), StreamingXMLGen(init=init)
+            _writeDocument(old)
+            _writeDocument(new)
+            self.assertEqual(new.getXml(), old.getXml())
+
+    def testStream(self):
+        "StreamingXMLGen writes the XML to a stream"
+
+        old, stream = XMLGen(), StringIO()
+        new = StreamingXMLGen(stream=stream, bufferSize=16)
+        _writeDocument(old)
+        _writeDocument(new)
+        self.assertEqual(new.getXml(), '')
+        self.assertEqual(stream.getvalue(), old.getXml())
@@ -31,7 +31,9 @@ import os
 from datetime import datetime,timedelta
 from pytz import timezone
 
-from MaKaC.schedule import IndTimeSchEntry
+from indico.tests.python.unit.util import IndicoTestCase
+from MaKaC.schedule import IndTimeSchEntry, BreakTimeSchEntry, ScheduleToJson
+from MaKaC.common.contextManager import ContextManager
 from MaKaC.errors import MaKaCError
 from MaKaC.conference import Conference, Category
 from MaKaC.user import Avatar
@@ -268,3 +270,302 @@ class _Needs_Rewriting_TestTimeSchedule(unittest.TestCase):
         sch.moveDownEntry(entry2)
         self.assert_(entry3.getStartDate()==datetime(2004, 01, 01, 10, 25, tzinfo=timezone('UTC')))
         self.assert_(entry2.getStartDate()==datetime(2004, 01, 01, 10, 55, tzinfo=timezone('UTC')))
+
+
+class _TimetableItem(object):
+    """Stand-in for the owner of a linked entry (a slot, a session...)"""
+
+    def __init__(self, sDate, duration):
+        self.startDate, self.duration = sDate, duration
+
+    def getStartDate(self):
+        return self.startDate
+
+    def setStartDate(self, sDate, check=2, moveEntries=0):
+        self.startDate = sDate
+
+    def getEndDate(self):
+        return self.startDate + self.duration
+
+    def getDuration(self):
+        return self.duration
+
+    def cleanCache(self):
+        pass
+
+
+class _TimetableOwner(_ScheduleOwnerWrapper):
+
+    def getConference(self):
+        return self
+
+    def getTimezone(self):
+        return 'UTC'
+
+    def cleanCache(self):
+        pass
+
+    def notifyModification(self):
+        pass
+
+
+class TestTimeScheduleIndex(IndicoTestCase):
+    """Tests the id and day indexes of TimeSchedule"""
+
+    def setUp(self):
+        super(TestTimeScheduleIndex, self).setUp()
+        from MaKaC.schedule import TimeSchedule
+        self._sch = TimeSchedule(_TimetableOwner(self._date(1, 8), self._date(5, 20)))
+
+    def _date(self, day, hour, tz='UTC'):
+        return timezone(tz).localize(datetime(2014, 5, day, hour, 0))
+
+    def _add(self, day, hour, hours=1):
+        from MaKaC.schedule import LinkedTimeSchEntry
+        entry = LinkedTimeSchEntry(_TimetableItem(self._date(day, hour), timedelta(hours=hours)))
+        self._sch.addEntry(entry)
+        return entry
+
+    def _onDay(self, day, tz='UTC'):
+        return self._sch.getEntriesOnDay(self._date(day, 12, tz))
+
+    def testAdd(self):
+        e3 = self._add(3, 10)
+        e1 = self._add(1, 13)
+        e2 = self._add(1, 9, hours=30)
+        self.assertEqual(self._sch.getEntries(), [e2, e1, e3])
+        self.assertEqual(self._onDay(1), [e2, e1])
+        self.assertEqual(self._onDay(2), [e2])
+        self.assertEqual(self._onDay(3), [e3])
+        self.assertEqual(self._onDay(4), [])
+        # a local day overlapping two UTC days
+        self.assertEqual(self._onDay(2, 'Pacific/Auckland'), [e2, e1])
+
+    def testGetEntryById(self):
+        e1 = self._add(1, 10)
+        e2 = self._add(2, 10)
+        self.assertIs(self._sch.getEntryById(e1.getId()), e1)
+        self.assertIs(self._sch.getEntryById(' %s ' % e2.getId()), e2)
+        self.assertIsNone(self._sch.getEntryById('1234'))
+
+    def testRemove(self):
+        e1 = self._add(1, 10)
+        e2 = self._add(1, 12)
+        self._sch.removeEntry(e1)
+        self.assertEqual(self._sch.getEntries(), [e2])
+        self.assertEqual(self._onDay(1), [e2])
+        self.assertIsNone(self._sch.getEntryById(e1.getId()))
+        self._sch.removeEntry(e2)
+        self.assertEqual(self._onDay(1), [])
+        self.assertEqual(list(self._sch._dayIndex.keys()), [])
+
+    def testMove(self):
+        e1 = self._add(1, 10)
+        e2 = self._add(2, 10)
+        e1.getOwner().setStartDate(self._date(3, 10))
+        e1.synchro()
+        self.assertEqual(self._sch.getEntries(), [e2, e1])
+        self.assertEqual(self._onDay(1), [])
+        self.assertEqual(self._onDay(3), [e1])
+
+    def testReindexDirectWrite(self):
+        e1 = self._add(1, 10)
+        e2 = self._add(1, 12, hours=26)
+        # owners such as session slots sometimes get their date written directly
+        e1.getOwner().startDate = self._date(2, 16)
+        self._sch.reindexEntry(e1)
+        self.assertEqual(self._sch.getEntries(), [e2, e1])
+        self.assertEqual(self._onDay(1), [e2])
+        self.assertEqual(self._onDay(2), [e2, e1])
+        e2.getOwner().startDate = self._date(4, 10)
+        self._sch.reindexEntry(e2)
+        self.assertEqual(self._onDay(1), [])
+        self.assertEqual(self._onDay(2), [e1])
+        self.assertEqual(self._onDay(5), [e2])
+
+    def testMigration(self):
+        e1 = self._add(2, 10)
+        e2 = self._add(1, 10)
+        self._unindex(self._sch)
+        self.assertFalse(self._sch.isIndexed())
+        self.assertIs(self._sch.getEntryById(e1.getId()), e1)
+        self.assertEqual(self._onDay(2), [e1])
+        self._sch.rebuildIndex()
+        self.assertTrue(self._sch.isIndexed())
+        self.assertIs(self._sch.getEntryById(e1.getId()), e1)
+        self.assertEqual(self._onDay(1), [e2])
+        self.assertEqual(self._onDay(2), [e1])
+        self.assertEqual(sorted(self._sch._dayIndex.keys()),
+                         [self._date(1, 0).toordinal(), self._date(2, 0).toordinal()])
+
+    def _unindex(self, sch):
+        # what schedules created before the indexes existed look like
+        del sch._dayIndex
+        del sch._entriesById
+
+    def testMigrationKeepsOverlaps(self):
+        e1 = self._add(1, 10, hours=2)
+        e2 = self._add(1, 11)
+        e3 = self._add(1, 11, hours=3)
+        # reSchedule() only keeps _allowParallel if the (misspelt) attribute
+        # it checks for exists
+        self._sch._allowParalell = self._sch._allowParallel = False
+        self._unindex(self._sch)
+        self._sch.rebuildIndex()
+        # reSchedule() would have moved the colliding entries
+        self.assertEqual([e.getStartDate() for e in (e1, e2, e3)],
+                         [self._date(1, 10), self._date(1, 11), self._date(1, 11)])
+        self.assertEqual(self._onDay(1), [e1, e2, e3])
+        self.assertIs(self._sch.getEntryById(e3.getId()), e3)
+
+    def testMigrationKeepsPosters(self):
+        from MaKaC.schedule import TimeSchedule, PosterSlotSchedule, LinkedTimeSchEntry
+        sch = PosterSlotSchedule(_TimetableOwner(self._date(1, 8), self._date(1, 20)))
+        posters = []
+        for hour in (9, 8, 12):
+            entry = LinkedTimeSchEntry(_TimetableItem(self._date(1, hour), timedelta(hours=1)))
+            TimeSchedule.addEntry(sch, entry)
+            posters.append(entry)
+        sch._entries[:] = posters
+        self._unindex(sch)
+        sch.rebuildIndex()
+        # neither moved to the start of the slot nor reordered
+        self.assertEqual(sch.getEntries(), posters)
+        self.assertEqual([e.getStartDate() for e in posters],
+                         [self._date(1, 9), self._date(1, 8), self._date(1, 12)])
+        self.assertIs(sch.getEntryById(posters[2].getId()), posters[2])
+
+
+class _Material(object):
+
+    def __init__(self, id, allowed=None):
+        self._id, self.allowed = id, allowed
+
+    def getId(self):
+        return self._id
+
+    def canView(self, aw):
+        return self.allowed is None or aw in self.allowed
+
+
+class _AccessController(object):
+
+    def __init__(self, public):
+        self.public = public
+
+    def isFullyPublic(self):
+        return self.public
+
+
+class _ProtectedItem(object):
+    """Stand-in for a contribution with materials protected per user"""
+
+    def __init__(self, materials, public=False):
+        self.materials = materials
+        self.accessController = _AccessController(public)
+
+    def getAccessController(self):
+        return self.accessController
+
+    def getAllViewableMaterialList(self, aw=None):
+        if not aw:
+            aw = ContextManager.get('currentAW')
+        return [mat for mat in self.materials if mat.canView(aw)]
+
+
+class _FingerprintEntry(object):
+
+    def __init__(self, uid, owner):
+        self._uid, self._owner = uid, owner
+
+    def getUniqueId(self):
+        return self._uid
+
+    def getOwner(self):
+        return self._owner
+
+
+class _BreakEntry(BreakTimeSchEntry):
+
+    def __init__(self, owner):
+        BreakTimeSchEntry.__init__(self)
+        self._fingerprintOwner = owner
+
+    def getOwner(self):
+        return self._fingerprintOwner
+
+
+class _VersionCache(object):
+
+    def __init__(self):
+        self.versions = {}
+
+    def get_multi(self, keys):
+        return dict((key, self.versions.get(key)) for key in keys)
+
+
+class TestScheduleToJsonCacheKeys(IndicoTestCase):
+    """Tests that the cached fossils of entries are not shared between users who see different things"""
+
+    def setUp(self):
+        super(TestScheduleToJsonCacheKeys, self).setUp()
+        self._cacheEntries = ScheduleToJson._cacheEntries
+        ScheduleToJson._cacheEntries = _VersionCache()
+        self._slides = _Material('slides', allowed=set(['alice', 'bob']))
+        self._paper = _Material('paper', allowed=set(['bob']))
+        self._poster = _Material('poster')
+        self._item = _ProtectedItem([self._slides, self._paper, self._poster])
+        self._entry = _FingerprintEntry('a1t0', self._item)
+
+    def tearDown(self):
+        ScheduleToJson._cacheEntries = self._cacheEntries
+        ContextManager.delete('currentAW', silent=True)
+        super(TestScheduleToJsonCacheKeys, self).tearDown()
+
+    def _keyFor(self, aw, entry=None):
+        entry = entry or self._entry
+        ContextManager.set('currentAW', aw)
+        return ScheduleToJson._get_entry_keys([entry], 'UTC')[entry.getUniqueId()]
+
+    def testPublic(self):
+        self._item.accessController.public = True
+        self.assertEqual(ScheduleToJson.get_acl_fingerprint(self._entry), 'public')
+        self.assertEqual(self._keyFor('alice'), self._keyFor('carol'))
+        # breaks never contain anything protected
+        self._item.accessController.public = False
+        self.assertEqual(ScheduleToJson.get_acl_fingerprint(_BreakEntry(self._item)), 'public')
+
+    def testWithoutMaterial(self):
+        # owners without materials have nothing user-dependent in their fossils
+        item = _TimetableItem(None, None)
+        item.getAccessController = lambda: _AccessController(False)
+        self.assertEqual(ScheduleToJson.get_acl_fingerprint(_FingerprintEntry('a1t1', item)), 'all')
+
+    def testSameAccessSharesKey(self):
+        ContextManager.set('currentAW', 'alice')
+        self.assertEqual(ScheduleToJson.get_acl_fingerprint(self._entry), 'mat-poster,slides')
+        self._paper.allowed.add('dave')
+        self._slides.allowed.add('dave')
+        self.assertEqual(self._keyFor('bob'), self._keyFor('dave'))
+
+    def testDifferentAccess(self):
+        keys = set(self._keyFor(aw) for aw in ('alice', 'bob', 'carol'))
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(self._keyFor('carol'), 'a1t0.0.UTC.mat-poster')
+
+    def testACLChange(self):
+        before = self._keyFor('alice')
+        self._paper.allowed.add('alice')
+        after = self._keyFor('alice')
+        self.assertNotEqual(before, after)
+        self.assertEqual(after, self._keyFor('bob'))
+        self._slides.allowed.remove('alice')
+        self.assertNotIn(self._keyFor('alice'), (before, after))
+        # making the entry public gives everyone the same key
+        self._item.accessController.public = True
+        self.assertEqual(self._keyFor('alice'), 'a1t0.0.UTC.public')
+
+    def testVersion(self):
+        before = self._keyFor('alice')
+        ScheduleToJson._cacheEntries.versions['_version-a1t0'] = '3'
+        self.assertEqual(self._keyFor('alice'), before.replace('.0.', '.3.', 1))
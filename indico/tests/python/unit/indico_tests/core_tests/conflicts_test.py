@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the conflict statistics and for concurrent event creation
+"""
+
+import sys
+import threading
+
+import transaction
+from ZODB.POSException import ConflictError, POSKeyError
+from ZODB.utils import p64
+
+from indico.core.db import DBMgr
+from indico.core.db.conflicts import ConflictStats, describe_conflict
+from indico.tests.python.unit.util import IndicoTestCase
+from MaKaC.common.indexes import IndexesHolder
+from MaKaC.conference import CategoryManager
+from MaKaC.user import AvatarHolder
+
+
+class TestConflictStats(IndicoTestCase):
+
+    def setUp(self):
+        super(TestConflictStats, self).setUp()
+        ConflictStats.reset()
+
+    def testDescribeConflict(self):
+        self.assertEqual(describe_conflict(ConflictError(oid=p64(42))), ('unknown', '0x2a'))
+        self.assertEqual(describe_conflict(POSKeyError(p64(1))), ('unknown', '0x01'))
+        self.assertEqual(describe_conflict(ConflictError()), ('unknown', None))
+
+    def testStats(self):
+        ConflictStats.record('event.create', [])
+        ConflictStats.record('event.create', [('MaKaC.conference.Category', '0x01')])
+        ConflictStats.record('event.create', [('MaKaC.conference.Category', '0x01')] * 3, failed=True)
+        ConflictStats.record('event.display', [])
+        stats = ConflictStats.get_stats(local=True)
+        self.assertEqual(stats['event.create']['requests'], 3)
+        self.assertEqual(stats['event.create']['conflicts'], 4)
+        self.assertEqual(stats['event.create']['failed'], 1)
+        self.assertEqual(stats['event.create']['classes'], {'MaKaC.conference.Category': 4})
+        self.assertAlmostEqual(ConflictStats.get_rate('event.create'), 4 / 3.0)
+        self.assertEqual(stats['event.display']['rate'], 0)
+
+
+class TestConcurrentEventCreation(IndicoTestCase):
+    """
+    Creates events in the same category from several threads
+    """
+
+    _slow = True
+    _requires = ['db.DummyUser']
+
+    THREADS = 4
+    EVENTS = 10
+
+    def setUp(self):
+        super(TestConcurrentEventCreation, self).setUp()
+        with self._context('database'):
+            categ = CategoryManager().getById('0').newSubCategory(0)
+            self._categId = categ.getId()
+            self._creatorId = self._dummy.getId()
+        self._conflicts = []
+        self._errors = []
+
+    def _createEvents(self):
+        dbi = DBMgr.getInstance()
+        dbi.startRequest()
+        try:
+            for __ in xrange(self.EVENTS):
+                for i, retry in enumerate(transaction.attempts(50)):
+                    with retry:
+                        if i > 0:
+                            dbi.sync()
+                        try:
+                            categ = CategoryManager().getById(self._categId)
+                            categ.newConference(AvatarHolder().getById(self._creatorId))
+                            transaction.commit()
+                            break
+                        except ConflictError as e:
+                            self._conflicts.append(describe_conflict(e))
+                            raise
+        except Exception:
+            # re-raised by the test, otherwise it would only see missing events
+            self._errors.append(sys.exc_info())
+        finally:
+            dbi.endRequest(False)
+
+    def testCreateEvents(self):
+        threads = [threading.Thread(target=self._createEvents) for __ in xrange(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            excType, excValue, tb = self._errors[0]
+            raise excType, excValue, tb
+
+        total = self.THREADS * self.EVENTS
+        with self._context('database', sync=True):
+            categ = CategoryManager().getById(self._categId)
+            confIds = set(conf.getId() for conf in categ.getConferenceList())
+            self.assertEqual(len(confIds), total)
+            self.assertEqual(categ.getNumConferences(), total)
+            self.assertEqual(CategoryManager().getById('0').getNumConferences(), total)
+            self.assertEqual(set(IndexesHolder().getIndex('category').getItems(self._categId)), confIds)
+
+        # neither the category nor its event counters may conflict anymore
+        classes = set(className for className, oid in self._conflicts)
+        self.assertNotIn('MaKaC.conference.Category', classes)
+        self.assertNotIn('BTrees.Length.Length', classes)
@@ -21,10 +21,16 @@
 Tests for `indico.core.index` module
 """
 
+from datetime import datetime
+from pytz import timezone
+
 import zope.interface
 
 from indico.core.index.base import IIIndex, IOIndex, IUniqueIdProvider, \
      ElementNotFoundException, ElementAlreadyInIndexException
+from indico.core.index.catalog import Catalog
+from indico.core.index.event import CategoryEventAttributeIndex
+from indico.util.date_time import utc_timestamp
 
 
 from indico.tests.python.unit.util import IndicoTestCase
@@ -180,3 +186,224 @@ class TestIOIndex(IndicoTestCase):
         self.assertRaises(ElementAlreadyInIndexException,
                           self._idx.index_obj,
                           obj)
+
+
+class _Named(object):
+
+    def __init__(self, name):
+        self._name = name
+
+    def getId(self):
+        return self._name
+
+    getName = getId
+
+
+class DummyEvent(object):
+    """Provides what `CategoryEventAttributeIndex` reads from a conference"""
+
+    def __init__(self, confId, path, day, type='meeting', location=None, room=None):
+        self._id = confId
+        self.path = [_Named(categId) for categId in path]
+        self.startDate = datetime(2014, 5, day, 9, 0, tzinfo=timezone('UTC'))
+        self.endDate = datetime(2014, 5, day, 18, 0, tzinfo=timezone('UTC'))
+        self.type = type
+        self.location = location and _Named(location)
+        self.room = room and _Named(room)
+
+    def getId(self):
+        return self._id
+
+    def getType(self):
+        return self.type
+
+    def getLocation(self):
+        return self.location
+
+    def getRoom(self):
+        return self.room
+
+    def getOwnerList(self):
+        return self.path[:1]
+
+    def getOwnerPath(self):
+        return self.path
+
+    def getStartDate(self):
+        return self.startDate
+
+    def getEndDate(self):
+        return self.endDate
+
+
+class TestCategoryEventAttributeIndex(IndicoTestCase):
+
+    def setUp(self):
+        super(TestCategoryEventAttributeIndex, self).setUp()
+        self._idx = CategoryEventAttributeIndex()
+        self._confs = [DummyEvent('a', ['2', '1'], 3, location='CERN', room='Main Auditorium'),
+                       DummyEvent('b', ['2', '1'], 1, type='lecture', location='cern', room='Council Chamber'),
+                       DummyEvent('c', ['3'], 2, location='Fermilab')]
+        for conf in self._confs:
+            self._idx.index_obj(conf)
+
+    def _ids(self, categId, fromDay=None, toDay=None, **filters):
+        def _ts(day):
+            return day and utc_timestamp(datetime(2014, 5, day, 12, 0, tzinfo=timezone('UTC')))
+        return list(self._idx.iterateIds(categId, _ts(fromDay), _ts(toDay), **filters))
+
+    def testIndexing(self):
+        # the parent categories contain the events of their subcategories
+        self.assertEqual(self._ids('2', location='cern'), ['b', 'a'])
+        self.assertEqual(self._ids('1', location='cern'), ['b', 'a'])
+        self.assertEqual(self._ids('0', location='*'), ['b', 'c', 'a'])
+        self.assertEqual(self._ids('3', location='*'), ['c'])
+        self.assertEqual(self._ids('4', location='*'), [])
+
+    def testFilters(self):
+        self.assertEqual(self._ids('0', type='meeting'), ['c', 'a'])
+        self.assertEqual(self._ids('0', type='Meeting'), [])
+        self.assertEqual(self._ids('0', room='*chamber'), ['b'])
+        self.assertEqual(self._ids('0', location='CERN', type='meeting'), ['a'])
+        self.assertEqual(self._ids('0', location='CERN', room='council*', type='meeting'), [])
+        self.assertRaises(ValueError, self._ids, '0')
+
+    def testDateRange(self):
+        self.assertEqual(self._ids('0', 2, None, location='*'), ['c', 'a'])
+        self.assertEqual(self._ids('0', None, 2, location='*'), ['b', 'c'])
+        self.assertEqual(self._ids('0', 2, 2, location='*'), ['c'])
+        self.assertEqual(self._ids('0', 4, None, location='*'), [])
+
+    def testUnindexing(self):
+        for conf in self._confs:
+            self._idx.unindex_obj(conf)
+        self.assertEqual(self._ids('0', location='*'), [])
+        self.assertEqual(len(self._idx._entries), 0)
+        # no empty value buckets are left behind
+        for categId in ('0', '1', '2', '3'):
+            categ = self._idx._getCategory(categId)
+            self.assertEqual([list(categ[attr].keys()) for attr in self._idx.ATTRIBUTES], [[], [], []])
+        # unindexing something which is not indexed is ignored
+        self._idx.unindex_obj(self._confs[0])
+
+    def testNoOwner(self):
+        conf = DummyEvent('d', [], 1, location='CERN')
+        self._idx.index_obj(conf)
+        self.assertNotIn('d', self._idx._entries)
+        self.assertEqual(self._ids('0', location='cern'), ['b', 'a'])
+
+    def testAttributeChange(self):
+        conf = self._confs[0]
+        conf.location = _Named('Fermilab')
+        conf.room = None
+        conf.startDate = datetime(2014, 5, 1, 8, 0, tzinfo=timezone('UTC'))
+        self._idx.reindex_obj(conf)
+        self.assertEqual(self._ids('1', location='cern'), ['b'])
+        self.assertEqual(self._ids('0', location='fermilab'), ['a', 'c'])
+        self.assertEqual(self._ids('0', room='*'), ['b'])
+        self.assertNotIn('main auditorium', self._idx._getCategory('2')['room'])
+
+    def testReindexUnchanged(self):
+        entry = self._idx._entries['a']
+        self._idx.reindex_obj(self._confs[0])
+        self.assertIs(self._idx._entries['a'], entry)
+        # events which are not indexed are not added by a reindex
+        self._idx.reindex_obj(DummyEvent('d', ['3'], 1, location='CERN'))
+        self.assertNotIn('d', self._idx._entries)
+
+    def testCategoryMove(self):
+        # what `Category.move` does when category 2 is moved from 1 to 3
+        for conf in self._confs[:2]:
+            conf.path = [_Named('2'), _Named('3')]
+            self._idx.index_obj(conf)
+        self.assertEqual(self._ids('1', location='*'), [])
+        self.assertEqual(self._ids('3', location='*'), ['b', 'c', 'a'])
+        self.assertEqual(self._ids('2', location='*'), ['b', 'a'])
+        self.assertEqual(self._ids('0', location='*'), ['b', 'c', 'a'])
+
+    def testRemoveCategory(self):
+        self._idx.unindex_obj(self._confs[2])
+        self._idx.remove_category('3')
+        self.assertIsNone(self._idx._getCategory('3'))
+        self.assertEqual(self._ids('3', location='*'), [])
+        self._idx.remove_category('3')
+        self.assertEqual(self._ids('0', location='*'), ['b', 'a'])
+
+
+class TestCategoryEventAttributeIndexUpkeep(IndicoTestCase):
+    """Checks that the index follows the changes made to real events and categories"""
+
+    _requires = ['db.Database', 'db.DummyUser']
+
+    def setUp(self):
+        super(TestCategoryEventAttributeIndexUpkeep, self).setUp()
+        from MaKaC.conference import CategoryManager
+
+        with self._context('database'):
+            root = CategoryManager().getById('0')
+            self._categ1 = root.newSubCategory(0)
+            self._categ2 = root.newSubCategory(0)
+            self._categ11 = self._categ1.newSubCategory(0)
+            self._conf = self._newConference(self._categ11, 'CERN')
+
+    def _newConference(self, categ, locationName):
+        from MaKaC.conference import CustomLocation
+
+        conf = categ.newConference(self._dummy)
+        conf.setTimezone('UTC')
+        conf.setDates(datetime(2014, 5, 1, 9, 0, tzinfo=timezone('UTC')),
+                      datetime(2014, 5, 1, 18, 0, tzinfo=timezone('UTC')))
+        location = CustomLocation()
+        location.setName(locationName)
+        conf.setLocation(location)
+        return conf
+
+    def _ids(self, categ, **filters):
+        return list(Catalog.getIdx('categ_conf_attrs').iterateIds(categ.getId(), **filters))
+
+    def _check(self):
+        self.assertEqual(list(Catalog.getIdx('categ_conf_attrs')._check()), [])
+
+    def testNewEvent(self):
+        with self._context('database'):
+            confId = self._conf.getId()
+            self.assertEqual(self._ids(self._categ11, location='cern'), [confId])
+            self.assertEqual(self._ids(self._categ1, location='cern'), [confId])
+            self.assertEqual(self._ids(self._categ2, location='cern'), [])
+            self._check()
+
+    def testLocationChange(self):
+        from MaKaC.conference import CustomLocation
+
+        with self._context('database'):
+            location = CustomLocation()
+            location.setName('Fermilab')
+            self._conf.setLocation(location)
+            self.assertEqual(self._ids(self._categ1, location='cern'), [])
+            self.assertEqual(self._ids(self._categ1, location='fermilab'), [self._conf.getId()])
+            self._check()
+
+    def testCategoryMove(self):
+        with self._context('database'):
+            self._categ11.move(self._categ2)
+            self.assertEqual(self._ids(self._categ1, location='cern'), [])
+            self.assertEqual(self._ids(self._categ2, location='cern'), [self._conf.getId()])
+            self.assertEqual(self._ids(self._categ11, location='cern'), [self._conf.getId()])
+            self._check()
+
+    def testEventDeletion(self):
+        with self._context('database'):
+            self._conf.delete()
+            self.assertEqual(self._ids(self._categ1, location='*'), [])
+            self.assertNotIn(self._conf.getId(), Catalog.getIdx('categ_conf_attrs')._entries)
+
+    def testCategoryDeletion(self):
+        with self._context('database'):
+            other = self._newConference(self._categ2, 'CERN')
+            categ11Id = self._categ11.getId()
+            self._categ1.delete(deleteConferences=1)
+            idx = Catalog.getIdx('categ_conf_attrs')
+            self.assertIsNone(idx._getCategory(categ11Id))
+            self.assertIsNone(idx._getCategory(self._categ1.getId()))
+            self.assertEqual(self._ids(self._categ2, location='cern'), [other.getId()])
+            self._check()
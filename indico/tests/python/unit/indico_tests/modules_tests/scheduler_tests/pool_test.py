@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the scheduler worker pool
+"""
+
+import logging
+import Queue
+import threading
+import time
+from datetime import datetime
+
+import pytz
+
+from indico.modules.scheduler import Scheduler
+from indico.modules.scheduler.pool import WorkerPool
+from indico.util.date_time import int_timestamp
+from indico.tests.python.unit.util import IndicoTestCase
+
+
+class DummyConfig(object):
+    multitask_mode = 'threads'
+    max_workers = 2
+    task_type_limits = {'Limited': 1}
+    worker_max_tasks = 2
+
+
+class DummyTask(object):
+    def __init__(self, taskId, typeId='Task', priority=0):
+        self.id = taskId
+        self.typeId = typeId
+        self.priority = priority
+
+
+class DummyWorker(threading.Thread):
+    """
+    Worker which "runs" tasks by waiting for them to be released;
+    tasks with an odd id fail and task 13 kills the worker
+    """
+
+    queueClass = Queue.Queue
+    release = threading.Event()
+
+    def __init__(self, workerId, configData, inbox, outbox, wakeup=None):
+        super(DummyWorker, self).__init__()
+        self.daemon = True
+        self._workerId = workerId
+        self._config = configData
+        self.inbox = inbox
+        self._outbox = outbox
+
+    def isAlive(self):
+        return self.is_alive()
+
+    def run(self):
+        for _ in xrange(self._config.worker_max_tasks):
+            item = self.inbox.get()
+            if item is None:
+                break
+            taskId, delay = item
+            self.release.wait()
+            if taskId == 13:
+                return
+            self._outbox.put((self._workerId, taskId, taskId % 2 == 0))
+
+
+class TestWorkerPool(IndicoTestCase):
+
+    def setUp(self):
+        super(TestWorkerPool, self).setUp()
+        DummyWorker.release.clear()
+        self._pool = WorkerPool(DummyConfig(), logging.getLogger('test'), DummyWorker)
+
+    def tearDown(self):
+        DummyWorker.release.set()
+        self._pool.shutdown()
+        super(TestWorkerPool, self).tearDown()
+
+    def _collect(self, count, timeout=5):
+        results = []
+        deadline = time.time() + timeout
+        while len(results) < count and time.time() < deadline:
+            results += self._pool.collectResults()
+            time.sleep(0.01)
+        return sorted(results)
+
+    def testLimits(self):
+        self.assertTrue(self._pool.canRun('Limited'))
+        self._pool.submit(DummyTask(1, 'Limited'), 0)
+        self.assertFalse(self._pool.canRun('Limited'))
+        self.assertTrue(self._pool.canRun('Task'))
+        self._pool.submit(DummyTask(2), 5)
+        self.assertTrue(self._pool.isFull())
+        self.assertFalse(self._pool.canRun('Task'))
+
+        status = self._pool.getStatus()
+        self.assertEqual(status['running_by_type'], {'Limited': 1, 'Task': 1})
+        self.assertEqual(status['wait_time']['Task'], {'count': 1, 'avg': 5.0, 'max': 5})
+
+        DummyWorker.release.set()
+        self.assertEqual(self._collect(2), [(1, False), (2, True)])
+        self.assertEqual(len(self._pool), 0)
+        self.assertTrue(self._pool.canRun('Limited'))
+
+    def testWorkerReuse(self):
+        DummyWorker.release.set()
+        for taskId in xrange(4):
+            self._pool.submit(DummyTask(taskId * 2), 0)
+            self.assertEqual(self._collect(1), [(taskId * 2, True)])
+        # one worker ran all tasks, being replaced after `worker_max_tasks` of them
+        self.assertEqual(self._pool.getStatus()['workers'], 0)
+        self.assertEqual(next(self._pool._workerIds), 2)
+
+    def testDeadWorker(self):
+        DummyWorker.release.set()
+        self._pool.submit(DummyTask(13), 0)
+        self.assertEqual(self._collect(1), [(13, False)])
+        self.assertEqual(len(self._pool), 0)
+
+
+class DummySchedulerConfig(DummyConfig):
+    sleep_interval = 10
+    busy_sleep_interval = 1
+    max_sleep_interval = 300
+    awol_tasks_check_probability = 0
+
+
+class DummySchedulerModule(object):
+    """
+    Waiting queue counting how many times it is walked
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.walks = 0
+        self.poolStatus = None
+
+    def peekNextWaitingTask(self):
+        return self.entries[0] if self.entries else None
+
+    def getWaitingQueue(self):
+        self.walks += 1
+        return iter(self.entries)
+
+
+class StopScheduler(Exception):
+    pass
+
+
+class TestTaskSelection(IndicoTestCase):
+
+    def setUp(self):
+        super(TestTaskSelection, self).setUp()
+        DummyWorker.release.clear()
+        now = datetime(2014, 5, 1, 12, 0, tzinfo=pytz.utc)
+        self._now = int_timestamp(now)
+        self._module = DummySchedulerModule([])
+
+        self._sched = Scheduler.__new__(Scheduler)
+        self._sched._config = DummySchedulerConfig()
+        self._sched._logger = logging.getLogger('test')
+        self._sched._schedModule = self._module
+        self._sched._pool = WorkerPool(self._sched._config, self._sched._logger, DummyWorker)
+        self._sched._poolStatus = None
+        self._sched._getCurrentDateTime = lambda: now
+        self._sched._readFromDb = self._sched._printStatus = lambda *args, **kwargs: None
+        self._sched._processSpool = self._sched._checkFinishedTasks = lambda: None
+        self._sched._db_setPoolStatus = lambda status: setattr(self._module, 'poolStatus', status)
+
+        def _sleep(msg, seconds=None):
+            raise StopScheduler
+        self._sched._sleep = _sleep
+
+    def tearDown(self):
+        DummyWorker.release.set()
+        self._sched._pool.shutdown()
+        super(TestTaskSelection, self).tearDown()
+
+    def _run(self):
+        started = []
+        try:
+            for timestamp, task in self._sched._iterateTasks():
+                # what the scheduler does when starting a task
+                self._module.entries.remove((timestamp, task))
+                self._sched._pool.submit(task, self._now - timestamp)
+                started.append(task.id)
+        except StopScheduler:
+            pass
+        return started
+
+    def testPriority(self):
+        self._module.entries = [(self._now - 30, DummyTask(1)),
+                                (self._now - 20, DummyTask(2, priority=1)),
+                                (self._now - 10, DummyTask(3, priority=5)),
+                                (self._now + 10, DummyTask(4, priority=10))]
+        self.assertEqual(self._run(), [3, 2])
+        self.assertEqual(self._module.poolStatus['due'], 1)
+
+    def testTypeLimits(self):
+        self._module.entries = [(self._now - 30, DummyTask(1, 'Limited', priority=1)),
+                                (self._now - 20, DummyTask(2, 'Limited', priority=1)),
+                                (self._now - 10, DummyTask(3))]
+        self.assertEqual(self._run(), [1, 3])
+        self.assertEqual(self._module.poolStatus['due'], 1)
+
+    def testSingleWalkPerCycle(self):
+        self._module.entries = [(self._now - i, DummyTask(i)) for i in xrange(50, 0, -1)]
+        self.assertEqual(len(self._run()), DummyConfig.max_workers)
+        # one cycle starting the tasks and one finding the pool full
+        self.assertEqual(self._module.walks, 2)
+        self.assertEqual(self._module.poolStatus['due'], 50 - DummyConfig.max_workers)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the scheduler wakeup channels
+"""
+
+import threading
+import time
+
+import transaction
+
+from indico.modules.scheduler.wakeup import (LocalWakeupChannel, RedisWakeupChannel, wake_scheduler,
+                                             _notifyAfterCommit)
+from indico.tests.python.unit.util import IndicoTestCase
+
+
+class TestWakeup(IndicoTestCase):
+
+    def testLocalChannel(self):
+        channel = LocalWakeupChannel()
+        start = time.time()
+        self.assertFalse(channel.wait(0.1))
+        self.assertTrue(time.time() - start >= 0.1)
+
+        channel.notify()
+        self.assertTrue(channel.wait(10))
+        # the notification has been consumed
+        self.assertFalse(channel.wait(0))
+
+    def testLocalChannelFromThread(self):
+        channel = LocalWakeupChannel()
+        timer = threading.Timer(0.05, channel.notify)
+        timer.start()
+        start = time.time()
+        self.assertTrue(channel.wait(10))
+        self.assertTrue(time.time() - start < 5)
+        timer.join()
+
+    def testRedisChannelUnavailable(self):
+        # nothing listens on that port
+        channel = RedisWakeupChannel('redis://localhost:1/0', 0.1)
+        kwargs = channel._client.connection_pool.connection_kwargs
+        self.assertTrue(kwargs['socket_timeout'] > RedisWakeupChannel.MAX_WAIT)
+        channel.notify()
+        start = time.time()
+        # new tasks are still picked up after the poll interval
+        self.assertFalse(channel.wait(300))
+        elapsed = time.time() - start
+        self.assertTrue(0.1 <= elapsed < 5)
+
+    def testWakeAfterCommit(self):
+        txn = transaction.begin()
+        try:
+            wake_scheduler()
+            wake_scheduler()
+            hooks = [hook for hook, args, kwargs in txn.getAfterCommitHooks()]
+            self.assertEqual(hooks, [_notifyAfterCommit])
+        finally:
+            transaction.abort()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for `indico.util.date_time` module
+"""
+
+import random
+from datetime import datetime, timedelta
+from itertools import product
+
+from indico.tests.python.unit.util import IndicoTestCase
+from indico.util.date_time import iter_overlaps, overlaps
+
+
+def _key(r):
+    return r
+
+
+class TestIterOverlaps(IndicoTestCase):
+
+    def _ranges(self, count):
+        base = datetime(2014, 1, 1)
+        ranges = []
+        for i in xrange(count):
+            start = base + timedelta(hours=random.randint(0, 24 * 30))
+            ranges.append((start, start + timedelta(hours=random.randint(0, 30))))
+        return ranges
+
+    def testSameAsNestedLoop(self):
+        random.seed(42)
+        for inclusive in (False, True):
+            ranges1 = self._ranges(200)
+            ranges2 = self._ranges(300)
+            expected = sorted((r1, r2) for r1, r2 in product(ranges1, ranges2) if overlaps(r1, r2, inclusive))
+            self.assertEqual(sorted(iter_overlaps(ranges1, ranges2, _key, inclusive)), expected)
+
+    def testAdjacent(self):
+        r1 = (datetime(2014, 1, 1, 8), datetime(2014, 1, 1, 10))
+        r2 = (datetime(2014, 1, 1, 10), datetime(2014, 1, 1, 12))
+        self.assertEqual(list(iter_overlaps([r1], [r2], _key)), [])
+        self.assertEqual(list(iter_overlaps([r1], [r2], _key, inclusive=True)), [(r1, r2)])
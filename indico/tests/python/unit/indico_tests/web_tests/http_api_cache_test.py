@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for `indico.web.http_api.cache` module
+"""
+
+import time
+
+from flask import Flask
+
+from indico.tests.python.unit.util import IndicoTestCase
+from indico.web.http_api.cache import HTTPAPICache, CACHE_HIT, CACHE_MISS, CACHE_STALE, CACHE_COALESCED
+from indico.web.flask.util import ResponseUtil
+from indico.web.http_api.handlers import _isNotModified, _makeETag, _setValidatorHeaders
+
+
+class _DictCache(object):
+    """Minimal in-memory stand-in for GenericCache"""
+
+    def __init__(self):
+        self.data = {}
+
+    def add(self, key, val, time=0):
+        if key in self.data:
+            return False
+        self.data[key] = val
+        return True
+
+    def set(self, key, val, time=0):
+        self.data[key] = val
+
+    def get(self, key, default=None, bypassL1=False):
+        return self.data.get(key, default)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class _L1DictCache(object):
+    """Per-process view of a `_DictCache` which keeps the values it read,
+    like the L1 cache of GenericCache"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.l1 = {}
+
+    def set(self, key, val, time=0):
+        self.l1.pop(key, None)
+        self.backend.set(key, val, time)
+
+    def get(self, key, default=None, bypassL1=False):
+        if key not in self.l1 or bypassL1:
+            self.l1[key] = self.backend.get(key)
+        return self.l1[key] if self.l1[key] is not None else default
+
+
+class TestHTTPAPICache(IndicoTestCase):
+
+    def setUp(self):
+        super(TestHTTPAPICache, self).setUp()
+        self._data = _DictCache()
+        self._locks = _DictCache()
+        self._validators = _DictCache()
+        self._caches = [self._makeCache() for _ in xrange(2)]
+
+    def _makeCache(self):
+        cache = HTTPAPICache()
+        cache._cache = self._data
+        cache._locks = self._locks
+        cache._validators = self._validators
+        cache.WAIT_TIMEOUT = 0.2
+        cache.WAIT_INTERVAL = 0.05
+        return cache
+
+    def testMissThenHit(self):
+        first, second = self._caches
+        self.assertEqual(first.lookup('key'), (CACHE_MISS, None))
+        first.store('key', 'result', 60)
+        first.release('key')
+        self.assertEqual(second.lookup('key'), (CACHE_HIT, 'result'))
+
+    def testStaleWhileRefreshing(self):
+        first, second = self._caches
+        self._data.set('key', (time.time() - 1, 'old'))
+        # the first request refreshes the entry, the second one gets the stale value
+        self.assertEqual(first.lookup('key'), (CACHE_MISS, None))
+        self.assertEqual(second.lookup('key'), (CACHE_STALE, 'old'))
+        first.store('key', 'new', 60)
+        first.release('key')
+        self.assertEqual(second.lookup('key'), (CACHE_HIT, 'new'))
+
+    def testStaleInL1(self):
+        first, second = self._caches
+        first._cache = _L1DictCache(self._data)
+        second._cache = _L1DictCache(self._data)
+        self._data.set('key', (time.time() - 1, 'old'))
+        self.assertEqual(first.lookup('key'), (CACHE_MISS, None))
+        self.assertEqual(second.lookup('key'), (CACHE_STALE, 'old'))
+        first.store('key', 'new', 60)
+        first.release('key')
+        # the outdated copy kept by the second worker is not recomputed
+        self.assertEqual(second.lookup('key'), (CACHE_HIT, 'new'))
+        self.assertFalse(self._locks.data)
+
+    def testCoalescedAfterRelease(self):
+        first, second = self._caches
+        self.assertEqual(first.lookup('key'), (CACHE_MISS, None))
+        # simulate the result being stored while the second request waits
+        results = iter([(None, None), (None, None), (time.time() + 60, 'result')])
+        second._load = lambda key: next(results)
+        self.assertEqual(second.lookup('key'), (CACHE_COALESCED, 'result'))
+
+    def testReleaseOnlyOwnLock(self):
+        first, second = self._caches
+        self.assertEqual(first.lookup('key'), (CACHE_MISS, None))
+        # the waiting request gives up without getting the lock
+        self.assertEqual(second.lookup('key'), (CACHE_MISS, None))
+        second.release('key')
+        self.assertFalse(second.acquire('key'))
+        first.release('key')
+        self.assertTrue(second.acquire('key'))
+
+
+class TestHTTPAPIValidators(IndicoTestCase):
+
+    def setUp(self):
+        super(TestHTTPAPIValidators, self).setUp()
+        self._cache = HTTPAPICache()
+        self._cache._cache = _DictCache()
+        self._cache._validators = _DictCache()
+        self._app = Flask('indico')
+
+    def _store(self, results, ts):
+        return self._cache.store('key', (results, {}, ts, True, {}), 60, payload=(results, {}, True, {}))
+
+    def _isNotModified(self, validator, **headers):
+        etag = _makeETag(validator[0], 'json', False, {})
+        with self._app.test_request_context(headers=headers):
+            return _isNotModified(etag, validator[1])
+
+    def testStableValidator(self):
+        validator = self._store(['a', 'b'], 1000)
+        # the same results generated at a later time keep their validator
+        self.assertEqual(self._store(['a', 'b'], 2000), validator)
+        self.assertEqual(self._cache.getValidator('key'), validator)
+
+    def testChangedValidator(self):
+        digest, lastModified = self._store(['a', 'b'], 1000)
+        self._cache._validators.set('key', (digest, lastModified - 100, time.time() + 60))
+        newDigest, newLastModified = self._store(['a', 'c'], 2000)
+        self.assertNotEqual(newDigest, digest)
+        self.assertTrue(newLastModified > lastModified - 100)
+
+    def testNotModified(self):
+        validator = self._store(['a'], 1000)
+        etag = _makeETag(self._store(['a'], 2000)[0], 'json', False, {})
+        self.assertTrue(self._isNotModified(validator, **{'If-None-Match': '"%s"' % etag}))
+        self.assertFalse(self._isNotModified(validator, **{'If-None-Match': '"other"'}))
+        self.assertFalse(self._isNotModified(validator))
+
+    def testWeakETag(self):
+        digest, lastModified = self._store(['a'], 1000)
+        etag = _makeETag(digest, 'json', False, {})
+        responseUtil = ResponseUtil()
+        _setValidatorHeaders(responseUtil, etag, lastModified)
+        self.assertEqual(responseUtil.headers['ETag'], 'W/"%s"' % etag)
+        # clients send back the tag they received
+        self.assertTrue(self._isNotModified((digest, lastModified), **{'If-None-Match': 'W/"%s"' % etag}))
+        self.assertFalse(self._isNotModified((digest, lastModified), **{'If-None-Match': 'W/"other"'}))
+
+    def testNotModifiedSince(self):
+        validator = self._store(['a'], 1000)
+        since = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(validator[1]))
+        self.assertTrue(self._isNotModified(validator, **{'If-Modified-Since': since}))
+        earlier = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(validator[1] - 60))
+        self.assertFalse(self._isNotModified(validator, **{'If-Modified-Since': earlier}))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+Tests for the streamed results and the streaming serializers of the HTTP API
+"""
+
+import json
+from datetime import datetime
+
+import pytz
+from flask import Flask
+
+from indico.tests.python.unit.util import IndicoTestCase
+from indico.web.flask.util import ResponseUtil
+from indico.web.http_api.handlers import _encapsulate, _makeResultHeader, _makeResultTrailer, _streamResponse
+from indico.web.http_api.hooks.base import StreamedResult
+from indico.web.http_api.hooks.event import CategoryEventHook, CategoryEventFetcher
+from indico.web.http_api.metadata import ical
+from indico.web.http_api.metadata.serializer import Serializer
+
+
+def _event(id):
+    return {
+        '_fossil': 'conferenceMetadata',
+        '_type': 'Conference',
+        'id': id,
+        'title': 'Event {0}'.format(id),
+        'startDate': datetime(2014, 5, int(id), 9, 0, tzinfo=pytz.utc),
+        'endDate': datetime(2014, 5, int(id), 18, 0, tzinfo=pytz.utc),
+        'url': 'http://indico.example.com/event/{0}/'.format(id),
+        'location': 'Geneva',
+        'room': '',
+        'description': '<p>Description of <b>{0}</b></p>'.format(id),
+        'speakers': [],
+        'keywords': ['a', 'b/c'],
+    }
+
+
+def _categEvent(id, categId):
+    event = _event(id)
+    event['categoryId'] = categId
+    return event
+
+
+class _CategoryEventHook(CategoryEventHook):
+    """Category export hook which does not need the database"""
+
+    MAX_CACHED_STREAM_RESULTS = 3
+
+    def _getParams(self):
+        self._idList = self._pathParams['idlist'].split('-')
+        self._toDT = None
+        self._limit = self._userLimit = 0
+
+    def export_categ(self, aw):
+        for i in xrange(1, 6):
+            yield _categEvent(str(i), str(i % 2))
+
+
+class _RecordingCache(object):
+
+    def __init__(self):
+        self.stored = []
+        self.released = []
+
+    def store(self, key, obj, ttl, payload=None):
+        self.stored.append(key)
+
+    def release(self, key):
+        self.released.append(key)
+
+
+class TestStreamedSerialization(IndicoTestCase):
+
+    PATH = '/export/categ/2.json'
+    QUERY = 'from=today'
+    TS = 1400000000
+
+    def setUp(self):
+        super(TestStreamedSerialization, self).setUp()
+        # iCal entries contain the time they were generated at
+        self._nowutc = ical.nowutc
+        ical.nowutc = lambda: datetime(2014, 5, 1, 12, 0, tzinfo=pytz.utc)
+
+    def tearDown(self):
+        ical.nowutc = self._nowutc
+        super(TestStreamedSerialization, self).tearDown()
+
+    def _serialize(self, dformat, results, extra):
+        serializer = Serializer.create(dformat, typeMap={})
+        return serializer(_encapsulate(results, self.PATH, self.QUERY, self.TS, extra))
+
+    def _stream(self, dformat, results, extra):
+        serializer = Serializer.create(dformat, typeMap={})
+        header = _makeResultHeader(self.PATH, self.QUERY, self.TS)
+        return ''.join(serializer.stream(header, iter(results),
+                                         lambda: _makeResultTrailer(len(results), extra)))
+
+    def _checkIdentical(self, results, extra=None):
+        for dformat in ('json', 'jsonp', 'xml', 'ics'):
+            self.assertEqual(self._stream(dformat, results, extra), self._serialize(dformat, results, extra),
+                             'streamed {0} output differs'.format(dformat))
+
+    def testResults(self):
+        self._checkIdentical([_event('1'), _event('2'), _event('3')])
+
+    def testExtra(self):
+        self._checkIdentical([_event('1')], {'moreFutureEvents': True, 'eventCategories': [{'id': '2'}]})
+
+    def testEmpty(self):
+        self._checkIdentical([])
+
+    def testXMLRoot(self):
+        data = self._stream('xml', [_event('1')], None)
+        self.assertTrue(data.startswith("<?xml version='1.0' encoding='utf-8'?>\n<httpapiresult>"))
+        self.assertNotIn('<_type>', data)
+
+
+class TestStreamedResult(IndicoTestCase):
+
+    def _streamed(self, count, **kwargs):
+        return StreamedResult(None, None, iter(xrange(count)), **kwargs)
+
+    def testCollected(self):
+        streamed = self._streamed(3, collectLimit=3)
+        self.assertEqual(list(streamed), [0, 1, 2])
+        self.assertEqual(streamed.results, [0, 1, 2])
+
+    def testCollectLimit(self):
+        streamed = self._streamed(4, collectLimit=3)
+        self.assertEqual(list(streamed), [0, 1, 2, 3])
+        # too big to be cached
+        self.assertIsNone(streamed.results)
+        self.assertEqual(streamed.count, 4)
+
+    def testNotCollected(self):
+        streamed = self._streamed(3, collect=False)
+        self.assertEqual(list(streamed), [0, 1, 2])
+        self.assertIsNone(streamed.results)
+
+
+class TestStreamedCategoryExport(IndicoTestCase):
+
+    def setUp(self):
+        super(TestStreamedCategoryExport, self).setUp()
+        self._getCategoryPath = CategoryEventFetcher._getCategoryPath
+        CategoryEventFetcher._getCategoryPath = staticmethod(lambda id, aw: [{'id': id}])
+        self._app = Flask('indico')
+
+    def tearDown(self):
+        CategoryEventFetcher._getCategoryPath = staticmethod(self._getCategoryPath)
+        super(TestStreamedCategoryExport, self).tearDown()
+
+    def testNotCachedAboveLimit(self):
+        hook = _CategoryEventHook({}, 'categ', {'idlist': '0-1'})
+        cache = _RecordingCache()
+        with self._app.test_request_context():
+            streamed = hook.stream(None)
+            self.assertIsInstance(streamed, StreamedResult)
+            response = _streamResponse(Serializer.create('json', typeMap={}), ResponseUtil(), streamed,
+                                       '/export/categ/0-1.json', '', 1400000000, {}, cache, 'key', True,
+                                       lambda: None)
+            data = json.loads(''.join(response.response))
+        self.assertEqual(data['count'], 5)
+        self.assertEqual(len(data['results']), 5)
+        # the extra information only needs the category ids of the events
+        self.assertEqual(sorted(c['categoryId'] for c in data['additionalInfo']['eventCategories']), ['0', '1'])
+        self.assertIsNone(streamed.results)
+        self.assertEqual(cache.stored, [])
+        self.assertEqual(cache.released, ['key'])
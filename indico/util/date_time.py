@@ -183,6 +183,31 @@ def overlaps(range1, range2, inclusive=False):
         return start1 < end2 and start2 < end1
 
 
+def iter_overlaps(items1, items2, key, inclusive=False):
+    """Finds all overlapping pairs between two collections of time ranges.
+
+    Both collections are sorted by their start and swept once, so only the
+    ranges of `items2` which are still running when an item of `items1`
+    starts are compared with it instead of all of them.
+
+    :param key: a function returning the ``(start, end)`` of an item
+    :return: a generator of ``(item1, item2)`` tuples
+    """
+    ranges1 = sorted((key(item) + (i, item) for i, item in enumerate(items1)), key=lambda x: x[:3])
+    ranges2 = sorted((key(item) + (i, item) for i, item in enumerate(items2)), key=lambda x: x[:3])
+    active = []
+    pos = 0
+    for start1, end1, _, item1 in ranges1:
+        # ranges which ended before this one started cannot overlap with any of the following ones either
+        active = [r for r in active if (r[1] >= start1 if inclusive else r[1] > start1)]
+        while pos < len(ranges2) and (ranges2[pos][0] <= end1 if inclusive else ranges2[pos][0] < end1):
+            active.append(ranges2[pos])
+            pos += 1
+        for start2, end2, _, item2 in active:
+            if overlaps((start1, end1), (start2, end2), inclusive):
+                yield item1, item2
+
+
 def get_overlap(range1, range2):
     if not overlaps(range1, range2):
         return None, None
@@ -37,6 +37,13 @@ from itertools import ifilter
 
 _fossil_cache = threading.local()
 
+# compiled fossils (see `Fossilizable._compileFossil`) and default fossils
+# of classes; unlike the attribute cache they never need to be cleared
+_fossil_plans = {}
+_default_interfaces = {}
+# marks objects which are not persistent and thus have no attribute cache
+_noOid = object()
+
 def fossilizes(*classList):
     """
     Simple wrapper around 'implements'
@@ -58,6 +65,8 @@ def addFossil(klazz, fossils):
 
     for fossil in fossils:
         zope.interface.classImplements(klazz, fossil)
+    # the default fossil of the class (or of its subclasses) may have changed
+    _default_interfaces.clear()
 
 
 def clearCache():
@@ -99,8 +108,10 @@ class Fossilizable(object):
         'De-camelcase' the name
         """
 
-        if name in _fossil_cache.methodName:
-            return _fossil_cache.methodName[name]
+        # threads which never cleared the cache have none
+        cache = getattr(_fossil_cache, 'methodName', {})
+        if name in cache:
+            return cache[name]
         else:
             nmatch = cls.__methodNameRE.match(name)
 
@@ -111,7 +122,7 @@ class Fossilizable(object):
             else:
                 group = nmatch.group(1) or nmatch.group(2) or nmatch.group(3)
                 extractedName = group[0:1].lower() + group[1:]
-                _fossil_cache.methodName[name] = extractedName
+                cache[name] = extractedName
                 return extractedName
 
     @classmethod
@@ -122,8 +133,9 @@ class Fossilizable(object):
         IMyObjectBasicFossil -> myObjectBasic
         """
 
-        if name in _fossil_cache.fossilName:
-            fossilName = _fossil_cache.fossilName[name]
+        cache = getattr(_fossil_cache, 'fossilName', {})
+        if name in cache:
+            fossilName = cache[name]
         else:
             fossilNameMatch = Fossilizable.__fossilNameRE.match(name)
             if fossilNameMatch is None:
@@ -134,7 +146,7 @@ class Fossilizable(object):
                 fossilName = fossilNameMatch.group(1)[0].lower() + \
                 fossilNameMatch.group(1)[1:]
 
-                _fossil_cache.fossilName[name] = fossilName
+                cache[name] = fossilName
         return fossilName
 
     @classmethod
@@ -157,17 +169,20 @@ class Fossilizable(object):
 
         if interfaceArg is None:
             # we try to take the 1st interface declared with fossilizes
-            implementedInterfaces = list(
-                i for i in zope.interface.implementedBy(obj.__class__) \
-                if i.extends(IFossil) )
-
-            if not implementedInterfaces:
-                raise NonFossilizableException(
-                    "Object %s of class %s cannot be fossilized,"
-                    "no fossils were declared for it" %
-                    (str(obj), obj.__class__.__name__))
-            else:
-                interface = implementedInterfaces[0]
+            interface = _default_interfaces.get(obj.__class__)
+            if interface is None:
+                implementedInterfaces = list(
+                    i for i in zope.interface.implementedBy(obj.__class__) \
+                    if i.extends(IFossil) )
+
+                if not implementedInterfaces:
+                    raise NonFossilizableException(
+                        "Object %s of class %s cannot be fossilized,"
+                        "no fossils were declared for it" %
+                        (str(obj), obj.__class__.__name__))
+                else:
+                    interface = implementedInterfaces[0]
+                    _default_interfaces[obj.__class__] = interface
 
         elif type(interfaceArg) is dict:
 
@@ -253,6 +268,64 @@ class Fossilizable(object):
         return self.fossilize_obj(self, interfaceArg=interfaceArg, useAttrCache=useAttrCache,
                                   **kwargs)
 
+    @classmethod
+    def _compileFossil(cls, interface):
+        """
+        Compiles a fossil into a ``(fossilName, methods)`` plan, `methods`
+        being a list of ``(methodName, onlyIf, produce, filterName, hasResult,
+        targetInterface, convertFunction, converterArgNames, namedPath,
+        methodPath)`` tuples.  Everything which only depends on the fossil
+        (tags, converter arguments, names of the fossilized attributes) is
+        computed once so fossilizing an object only has to execute it.
+        """
+
+        plan = _fossil_plans.get(interface)
+        if plan is not None:
+            return plan
+
+        fossilName = cls.__extractFossilName(interface.getName())
+        methods = []
+
+        for methodName in interface.names(all=True):
+            method = interface[methodName]
+            tags = method.getTaggedValueTags()
+
+            onlyIf = method.getTaggedValue('onlyIf') if 'onlyIf' in tags else None
+            # Please use 'produce' as little as possible;
+            # there is almost always a more elegant and modular solution!
+            produce = method.getTaggedValue('produce') if 'produce' in tags else None
+            filterName = method.getTaggedValue('filterBy') if 'filterBy' in tags else None
+            hasResult = 'result' in tags
+            targetInterface = method.getTaggedValue('result') if hasResult else None
+
+            if 'convert' in tags:
+                convertFunction = method.getTaggedValue('convert')
+                converterArgNames = tuple(inspect.getargspec(convertFunction)[0])
+            else:
+                convertFunction = None
+                converterArgNames = ()
+
+            # In case the name contains dots, each of the 'domains' but the
+            # last one are translated into nested dictionnaries, so the
+            # names are stored as paths. Attributes keep their own name
+            # unless a 'name' is given.
+            if 'name' in tags:
+                namedPath = tuple(method.getTaggedValue('name').split('.'))
+                methodPath = None
+            else:
+                namedPath = None
+                try:
+                    methodPath = tuple(cls.__extractName(methodName).split('.'))
+                except InvalidFossilException:
+                    # fine as long as it turns out to be an attribute
+                    methodPath = None
+
+            methods.append((methodName, onlyIf, produce, filterName, hasResult, targetInterface,
+                            convertFunction, converterArgNames, namedPath, methodPath))
+
+        plan = _fossil_plans[interface] = (fossilName, methods)
+        return plan
+
     @classmethod
     def fossilize_obj(cls, obj, interfaceArg=None, useAttrCache=False, mapClassType={}, **kwargs):
         """
@@ -266,47 +339,36 @@ class Fossilizable(object):
         """
 
         interface = cls.__obtainInterface(obj, interfaceArg)
-
-        name = interface.getName()
-        fossilName = cls.__extractFossilName(name)
+        fossilName, methods = cls._compileFossil(interface)
 
         result = {}
+        oid = getattr(obj, '_p_oid', _noOid)
+        # the attribute cache only exists in threads which cleared it
+        fossilAttrs = None
+        if useAttrCache or oid is not _noOid:
+            fossilAttrs = getattr(_fossil_cache, 'fossilAttrs', None)
 
-        # cache method names for each interface
-        names = _fossil_cache.fossilInterface.get(interface)
-        if names is None:
-            names = interface.names(all=True)
-            _fossil_cache.fossilInterface[interface] = names
-        ###
+        for (methodName, onlyIf, produce, filterName, hasResult, targetInterface,
+             convertFunction, converterArgNames, namedPath, methodPath) in methods:
 
-        for methodName in names:
+            # If the condition not in the kwargs or the condition False, we do not fossilize the method
+            if onlyIf is not None and not kwargs.get(onlyIf, False):
+                continue
 
-            method = interface[methodName]
-
-            tags = method.getTaggedValueTags()
             isAttribute = False
 
-            if 'onlyIf' in tags:
-                onlyIf = method.getTaggedValue('onlyIf')
-
-                # If the condition not in the kwargs or the condition False, we do not fossilize the method
-                if not kwargs.get(onlyIf, False):
-                    continue
-
             # In some cases it is better to use the attribute cache to
             # speed up the fossilization
             cacheUsed = False
-            if useAttrCache:
+            if useAttrCache and fossilAttrs is not None:
                 try:
-                    methodResult = _fossil_cache.fossilAttrs[obj._p_oid][methodName]
+                    methodResult = fossilAttrs[oid][methodName]
                     cacheUsed = True
                 except KeyError:
                     pass
             if not cacheUsed:
-                # Please use 'produce' as little as possible;
-                # there is almost always a more elegant and modular solution!
-                if 'produce' in tags:
-                    methodResult = method.getTaggedValue('produce')(obj)
+                if produce is not None:
+                    methodResult = produce(obj)
                 else:
                     attr = getattr(obj, methodName)
                     if callable(attr):
@@ -320,13 +382,12 @@ class Fossilizable(object):
                         methodResult = attr
                         isAttribute = True
 
-                if hasattr(obj, "_p_oid"):
-                    _fossil_cache.fossilAttrs.setdefault(obj._p_oid, {})[methodName] = methodResult
+                if oid is not _noOid and fossilAttrs is not None:
+                    fossilAttrs.setdefault(oid, {})[methodName] = methodResult
 
-            if 'filterBy' in tags:
+            if filterName is not None:
                 if 'filters' not in kwargs:
                     raise Exception('No filters defined!')
-                filterName = method.getTaggedValue('filterBy')
 
                 if filterName in kwargs['filters']:
                     filterBy = kwargs['filters'][filterName]
@@ -336,17 +397,12 @@ class Fossilizable(object):
                 filterBy = None
 
             # Result conversion
-            if 'result' in tags:
-                targetInterface = method.getTaggedValue('result')
-                #targetInterface = globals()[targetInterfaceName]
-
+            if hasResult:
                 methodResult = Fossilizable.fossilizeIterable(
                     methodResult, targetInterface, filterBy=filterBy, mapClassType=mapClassType, **kwargs)
 
             # Conversion function
-            if 'convert' in tags:
-                convertFunction = method.getTaggedValue('convert')
-                converterArgNames = inspect.getargspec(convertFunction)[0]
+            if convertFunction is not None:
                 converterArgs = dict((name, kwargs[name])
                                      for name in converterArgNames
                                      if name in kwargs)
@@ -357,34 +413,25 @@ class Fossilizable(object):
                                                                 (obj, interfaceArg, methodName))
                     raise
 
-
             # Re-name the attribute produced by the method
-            if 'name' in tags:
-                attrName = method.getTaggedValue('name')
+            if namedPath is not None:
+                attrPath = namedPath
             elif isAttribute:
-                attrName = methodName
+                attrPath = (methodName,)
+            elif methodPath is not None:
+                attrPath = methodPath
             else:
-                attrName = cls.__extractName(methodName)
-
-            # In case the name contains dots, each of the 'domains' but the
-            # last one are translated into nested dictionnaries. For example,
-            # if we want to re-name an attribute into "foo.bar.tofu", the
-            # corresponding fossilized attribute will be of the form:
-            # {"foo":{"bar":{"tofu": res,...},...},...}
-            # instead of:
-            # {"foo.bar.tofu": res, ...}
+                # raises the InvalidFossilException
+                cls.__extractName(methodName)
 
             current = result
-            attrList = attrName.split('.')
-
-            while len(attrList) > 1:
-                attr = attrList.pop(0)
+            for attr in attrPath[:-1]:
                 if attr not in current:
                     current[attr] = {}
                 current = current[attr]
 
             # For the last attribute level
-            current[attrList[0]] = methodResult
+            current[attrPath[-1]] = methodResult
 
         if "_type" in result or "_fossil" in result:
             raise InvalidFossilException('"_type" or "_fossil"'
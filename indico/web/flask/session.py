@@ -20,7 +20,12 @@
 from __future__ import absolute_import
 
 import cPickle
+import hashlib
+import struct
+import threading
+import time
 import uuid
+from collections import Counter, namedtuple
 from datetime import datetime, timedelta
 from flask import request
 from flask.sessions import SessionInterface, SessionMixin
@@ -28,6 +33,7 @@ from werkzeug.datastructures import CallbackDict
 from werkzeug.utils import cached_property
 
 from indico.core.db import DBMgr
+from indico.core.logger import Logger
 from MaKaC.common.cache import GenericCache
 from MaKaC.common.info import HelperMaKaCInfo
 from MaKaC.user import AvatarHolder
@@ -42,6 +48,10 @@ class BaseSession(CallbackDict, SessionMixin):
         self.sid = sid
         self.new = new
         self.modified = False
+        # digest of the stored data and whether its expiry can be renewed
+        # without rewriting it (set by the session interface)
+        self.stored_digest = None
+        self.renewable = False
         defaults = self._get_defaults()
         if defaults:
             self.update(defaults)
@@ -111,14 +121,99 @@ class IndicoSession(BaseSession):
         self['_timezone'] = tz
 
 
+StoredSession = namedtuple('StoredSession', ('data', 'digest', 'expires', 'renewable'))
+
+
+class SessionStore(object):
+    """Stores the session data in the cache backend.
+
+    The data is pickled once, using the compact binary pickle protocol,
+    and prefixed with a small header containing its expiry timestamp.  The
+    expiry is only needed for backends which cannot tell the remaining
+    lifetime of a key (memcached); for the other ones the expiry of a
+    session can be renewed without rewriting it.  The sessions stored by
+    older versions (a pickled dict) are still loaded.
+    """
+
+    MAGIC = 'S'
+    header = struct.Struct('!cI')
+    LARGE_SESSION_SIZE = 32 * 1024  # sessions larger than this are logged
+
+    _stats = Counter()
+    _statsLock = threading.Lock()
+
+    def __init__(self, namespace='flask-session'):
+        self._cache = GenericCache(namespace)
+        self._logger = Logger.get('session')
+
+    @classmethod
+    def _count(cls, **counts):
+        with cls._statsLock:
+            cls._stats.update(counts)
+
+    @classmethod
+    def get_stats(cls):
+        """Returns the operation and byte counters of this process"""
+        with cls._statsLock:
+            return dict(cls._stats)
+
+    @staticmethod
+    def serialize(data):
+        return cPickle.dumps(data, cPickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def get_digest(payload):
+        return hashlib.sha1(payload).digest()
+
+    def load(self, sid):
+        """Returns the :class:`StoredSession` for `sid` or ``None``"""
+        value, ttl = self._cache.get_with_ttl(sid)
+        if not isinstance(value, str):
+            self._count(misses=1)
+            return None
+        self._count(reads=1, read_bytes=len(value))
+        if value[:1] == self.MAGIC:
+            payload = value[self.header.size:]
+            expires = datetime.fromtimestamp(self.header.unpack_from(value)[1])
+            data = cPickle.loads(payload)
+        else:
+            # stored by an older version, with the expiry inside the data
+            data = cPickle.loads(value)
+            expires = data.pop('_expires', None)
+            payload = self.serialize(data)
+        if ttl is not None:
+            expires = datetime.now() + timedelta(seconds=ttl)
+        return StoredSession(data, self.get_digest(payload), expires, ttl is not None)
+
+    def save(self, sid, payload, ttl):
+        value = self.header.pack(self.MAGIC, int(time.time() + ttl.total_seconds())) + payload
+        if len(value) > self.LARGE_SESSION_SIZE:
+            self._logger.warning('Session {0} is large ({1} bytes)'.format(sid, len(value)))
+        self._cache.set(sid, value, ttl)
+        self._count(writes=1, written_bytes=len(value))
+
+    def renew(self, sid, payload, ttl, renewable):
+        """Renews the expiry of an unchanged session"""
+        if renewable and self._cache.touch(sid, ttl):
+            self._count(touches=1)
+        else:
+            self.save(sid, payload, ttl)
+
+    def skip(self):
+        """Records a modified session which did not need to be written"""
+        self._count(skipped=1)
+
+    def delete(self, sid):
+        self._cache.delete(sid)
+
+
 class IndicoSessionInterface(SessionInterface):
     pickle_based = True
-    serializer = cPickle
     session_class = IndicoSession
     temporary_session_lifetime = timedelta(days=7)
 
     def __init__(self):
-        self.storage = GenericCache('flask-session')
+        self.storage = SessionStore()
 
     def generate_sid(self):
         return str(uuid.uuid4())
@@ -145,10 +240,16 @@ class IndicoSessionInterface(SessionInterface):
         sid = request.cookies.get(app.session_cookie_name)
         if not sid:
             return self.session_class(sid=self.generate_sid(), new=True)
-        data = self.storage.get(sid)
-        if data is not None:
-            return self.session_class(self.serializer.loads(data), sid=sid)
-        return self.session_class(sid=self.generate_sid(), new=True)
+        stored = self.storage.load(sid)
+        if stored is None:
+            return self.session_class(sid=self.generate_sid(), new=True)
+        data = stored.data
+        if stored.expires is not None:
+            data['_expires'] = stored.expires
+        session = self.session_class(data, sid=sid)
+        session.stored_digest = stored.digest
+        session.renewable = stored.renewable
+        return session
 
     def save_session(self, app, session, response):
         domain = self.get_cookie_domain(app)
@@ -169,8 +270,20 @@ class IndicoSessionInterface(SessionInterface):
 
         storage_ttl = self.get_storage_lifetime(app, session)
         cookie_lifetime = self.get_expiration_time(app, session)
-        session['_expires'] = datetime.now() + storage_ttl
 
-        self.storage.set(session.sid, self.serializer.dumps(dict(session)), storage_ttl)
+        # the expiry is stored outside the data so it does not change its digest
+        data = dict(session)
+        data.pop('_expires', None)
+        payload = self.storage.serialize(data)
+        digest = self.storage.get_digest(payload)
+        if digest != session.stored_digest:
+            self.storage.save(session.sid, payload, storage_ttl)
+        elif self.should_refresh_session(app, session):
+            self.storage.renew(session.sid, payload, storage_ttl, session.renewable)
+        else:
+            # modified, but the data is still the same as in the storage
+            self.storage.skip()
+            return
+        session['_expires'] = datetime.now() + storage_ttl
         response.set_cookie(app.session_cookie_name, session.sid, expires=cookie_lifetime, httponly=True,
                             secure=self.get_cookie_secure(app))
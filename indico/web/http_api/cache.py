@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+##
+##
+## This file is part of Indico.
+## Copyright (C) 2002 - 2014 European Organization for Nuclear Research (CERN).
+##
+## Indico is free software; you can redistribute it and/or
+## modify it under the terms of the GNU General Public License as
+## published by the Free Software Foundation; either version 3 of the
+## License, or (at your option) any later version.
+##
+## Indico is distributed in the hope that it will be useful, but
+## WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+## General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with Indico;if not, see <http://www.gnu.org/licenses/>.
+
+"""
+HTTP API - Result cache with request coalescing
+"""
+
+# python stdlib imports
+import cPickle
+import hashlib
+import threading
+import time
+from collections import Counter
+
+# indico legacy imports
+from indico.core.logger import Logger
+from MaKaC.common.cache import GenericCache
+
+
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+CACHE_STALE = 'stale'
+CACHE_COALESCED = 'coalesced'
+
+
+class HTTPAPICache(object):
+    """Cache for HTTP API results which avoids recomputing the same result
+    in several workers at the same time.
+
+    Every entry is stored with a soft expiry (the configured API cache TTL)
+    and kept in the cache for `STALE_TTL` additional seconds.  When a result
+    is missing, only the request which manages to acquire the key's lock
+    computes it while the others wait for it to show up in the cache.  When
+    it is stale, the lock holder refreshes it and everyone else keeps
+    getting the stale result in the meantime.
+
+    The lock is stored in the cache itself so it is shared by all workers
+    using the same cache backend.
+
+    Next to each result a small validator with a digest of the result is
+    stored, which allows answering conditional requests without loading
+    the (possibly huge) result itself.
+    """
+
+    STALE_TTL = 300  # how long a result may be served after its soft expiry
+    LOCK_TTL = 60  # upper limit for computing a result; the lock expires afterwards
+    WAIT_TIMEOUT = 10  # how long to wait for a result computed by someone else
+    WAIT_INTERVAL = 0.1
+    L1_TTL = 5  # how long a result may be reused by the same process without checking the backend
+
+    _stats = Counter()
+    _statsLock = threading.Lock()
+
+    def __init__(self, namespace='HTTPAPI'):
+        self._cache = GenericCache(namespace, l1TTL=self.L1_TTL)
+        self._locks = GenericCache(namespace + '-lock')
+        self._validators = GenericCache(namespace + '-validator')
+        self._logger = Logger.get('httpapi.cache')
+        self._held = set()
+
+    @classmethod
+    def _count(cls, status):
+        with cls._statsLock:
+            cls._stats[status] += 1
+
+    @classmethod
+    def getStats(cls):
+        """Returns the hit/miss/stale/coalesced counters of this process"""
+        with cls._statsLock:
+            return dict((status, cls._stats[status])
+                        for status in (CACHE_HIT, CACHE_MISS, CACHE_STALE, CACHE_COALESCED))
+
+    def _load(self, key, bypassL1=False):
+        entry = self._cache.get(key, bypassL1=bypassL1)
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            # nothing cached or an entry in an outdated format
+            return None, None
+        return entry
+
+    def acquire(self, key):
+        if self._locks.add(key, 1, self.LOCK_TTL):
+            self._held.add(key)
+            return True
+        return False
+
+    def release(self, key):
+        """Releases the lock for `key` if it is held by this instance"""
+        if key in self._held:
+            self._held.discard(key)
+            self._locks.delete(key)
+
+    def lookup(self, key):
+        """Looks up a cached result.
+
+        Returns a ``(status, value)`` tuple.  If `value` is ``None`` the
+        caller usually holds the lock for `key` and is expected to compute the
+        result, pass it to :meth:`store` and call :meth:`release` afterwards
+        (also if computing it failed).  The counters are only updated here,
+        so requests bypassing the cache do not show up in them.
+        """
+        expiry, value = self._load(key)
+        if value is not None and expiry <= time.time():
+            # the copy in the L1 cache may be outdated while another worker
+            # has already refreshed the result
+            expiry, value = self._load(key, bypassL1=True)
+        if value is not None:
+            if expiry > time.time():
+                self._count(CACHE_HIT)
+                return CACHE_HIT, value
+            elif not self.acquire(key):
+                # someone else is already refreshing it
+                self._count(CACHE_STALE)
+                return CACHE_STALE, value
+            self._count(CACHE_MISS)
+            return CACHE_MISS, None
+
+        if self.acquire(key):
+            self._count(CACHE_MISS)
+            return CACHE_MISS, None
+
+        # wait for the worker holding the lock to store the result
+        deadline = time.time() + self.WAIT_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(self.WAIT_INTERVAL)
+            expiry, value = self._load(key)
+            if value is not None:
+                self._count(CACHE_COALESCED)
+                return CACHE_COALESCED, value
+            if self.acquire(key):
+                # the other worker gave up
+                self._count(CACHE_MISS)
+                return CACHE_MISS, None
+
+        self._logger.warning('Timeout waiting for %r to be computed by another worker' % key)
+        self._count(CACHE_MISS)
+        return CACHE_MISS, None
+
+    def getValidator(self, key):
+        """Returns the ``(digest, lastModified)`` of a fresh cached result or ``None``"""
+        validator = self._validators.get(key)
+        if not validator:
+            return None
+        digest, lastModified, expiry = validator
+        if expiry <= time.time():
+            return None
+        return digest, lastModified
+
+    def store(self, key, value, ttl, payload=None):
+        """Stores a result which is considered fresh for `ttl` seconds.
+
+        The validator is computed from `payload`, which defaults to `value`
+        and must not contain anything that changes on every request (such as
+        the time the result was generated at).  Returns its
+        ``(digest, lastModified)`` validator.  The modification time is kept
+        from the previous entry if the payload did not change.
+        """
+        now = time.time()
+        if payload is None:
+            payload = value
+        digest = hashlib.sha1(cPickle.dumps(payload, cPickle.HIGHEST_PROTOCOL)).hexdigest()
+        previous = self._validators.get(key)
+        lastModified = previous[1] if previous and previous[0] == digest else int(now)
+        self._cache.set(key, (now + ttl, value), ttl + self.STALE_TTL)
+        self._validators.set(key, (digest, lastModified, now + ttl), ttl + self.STALE_TTL)
+        return digest, lastModified
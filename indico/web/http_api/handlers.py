@@ -22,20 +22,25 @@ HTTP API - Handlers
 """
 
 # python stdlib imports
+import calendar
 import hashlib
 import hmac
 import posixpath
 import re
 import time
 import urllib
-from flask import request, session
+from collections import OrderedDict
+from flask import request, session, current_app, stream_with_context
 from urlparse import parse_qs
 from ZODB.POSException import ConflictError
 
 # indico imports
 from werkzeug.exceptions import NotFound
+from werkzeug.http import http_date
 from indico.web.http_api import HTTPAPIHook
+from indico.web.http_api.hooks.base import StreamedResult
 from indico.web.http_api.auth import APIKeyHolder
+from indico.web.http_api.cache import HTTPAPICache
 from indico.web.http_api.responses import HTTPAPIResult, HTTPAPIError
 from indico.web.http_api.util import get_query_parameter
 from indico.web.http_api import API_MODE_ONLYKEY, API_MODE_SIGNED, API_MODE_ONLYKEY_SIGNED, API_MODE_ALL_SIGNED
@@ -53,7 +58,6 @@ from indico.core.logger import Logger
 from MaKaC.common.fossilize import fossilize, clearCache
 from MaKaC.accessControl import AccessWrapper
 from MaKaC.common.info import HelperMaKaCInfo
-from MaKaC.common.cache import GenericCache
 from MaKaC.authentication.LDAPAuthentication import LDAPConnector
 
 
@@ -133,6 +137,109 @@ def buildAW(ak, onlyPublic=False):
     return aw
 
 
+def _makeETag(digest, dformat, pretty, serializerArgs):
+    """Builds the entity tag of a response from the digest of the cached result"""
+    return hashlib.sha1('%s|%s|%s|%r' % (digest, dformat, pretty, sorted(serializerArgs.iteritems()))).hexdigest()
+
+
+def _setValidatorHeaders(responseUtil, etag, lastModified):
+    # weak since the same results may be serialized slightly differently; werkzeug's
+    # quote_etag uses a lowercase prefix, but it is case-sensitive
+    responseUtil.headers['ETag'] = 'W/"%s"' % etag
+    responseUtil.headers['Last-Modified'] = http_date(lastModified)
+
+
+def _isNotModified(etag, lastModified):
+    """Checks the conditional headers of the request against a validator"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since:
+        return lastModified <= calendar.timegm(request.if_modified_since.utctimetuple())
+    return False
+
+
+def _endRequest(dbi, ak, error, path, query, onlyPublic):
+    if ak and error is None:
+        # Commit only if there was an API key and no error
+        for _retry in xrange(10):
+            dbi.sync()
+            normPath, normQuery = normalizeQuery(path, query, remove=('signature', 'timestamp'), separate=True)
+            ak.used(request.remote_addr, normPath, normQuery, not onlyPublic)
+            try:
+                dbi.endRequest(True)
+            except ConflictError:
+                pass  # retry
+            else:
+                break
+    else:
+        # No need to commit stuff if we didn't use an API key
+        # (nothing was written)
+        dbi.endRequest(False)
+
+    LDAPConnector.destroy()
+
+
+def _makeResultHeader(path, query, ts):
+    """Returns the fields of an encapsulated result which precede the results"""
+    header = fossilize(HTTPAPIResult([], path, query, ts), IHTTPAPIExportResultFossil)
+    for field in ('_fossil', 'results', 'count', 'additionalInfo'):
+        header.pop(field, None)
+    return header
+
+
+def _makeResultTrailer(count, extra):
+    """Returns the fields of an encapsulated result which follow the results"""
+    return OrderedDict([('count', count), ('additionalInfo', extra or {})])
+
+
+def _encapsulate(results, path, query, ts, extra):
+    """Encapsulates the results of an export.
+
+    The fields are in the same order as in a streamed response, so both are
+    serialized identically.
+    """
+    result = OrderedDict(_makeResultHeader(path, query, ts))
+    result['results'] = results
+    result.update(_makeResultTrailer(len(results), extra))
+    return result
+
+
+def _streamResponse(serializer, responseUtil, streamed, path, query, ts, typeMap, cache, cacheKey, addToCache,
+                    endRequest):
+    """Creates a response which serializes the results while they are being fetched.
+
+    The database connection is kept open until the last chunk has been sent
+    and the result is only written to the cache if it was fully generated and
+    not too big to be kept in memory.
+    """
+    header = _makeResultHeader(path, query, ts)
+
+    def _trailer():
+        return _makeResultTrailer(streamed.count, streamed.extra)
+
+    def _generate():
+        try:
+            for chunk in serializer.stream(header, streamed, _trailer):
+                yield chunk
+            if addToCache and streamed.results is not None:
+                ttl = HelperMaKaCInfo.getMaKaCInfoInstance().getAPICacheTTL()
+                payload = (streamed.results, streamed.extra, streamed.complete, typeMap)
+                cache.store(cacheKey, (streamed.results, streamed.extra, ts, streamed.complete, typeMap), ttl,
+                            payload=payload)
+        except Exception:
+            Logger.get('httpapi').exception('Streaming error in request %s?%s' % (path, query))
+            raise
+        finally:
+            cache.release(cacheKey)
+            endRequest()
+
+    serializer.set_headers(responseUtil)
+    response = current_app.response_class(stream_with_context(_generate()), status=responseUtil.status,
+                                          headers=responseUtil.headers)
+    response.content_type = responseUtil.content_type
+    return response
+
+
 def handler(prefix, path):
     path = posixpath.join('/', prefix, path)
     ContextManager.destroy()
@@ -158,6 +265,7 @@ def handler(prefix, path):
     pretty = get_query_parameter(queryParams, ['p', 'pretty'], 'no') == 'yes'
     onlyPublic = get_query_parameter(queryParams, ['op', 'onlypublic'], 'no') == 'yes'
     onlyAuthed = get_query_parameter(queryParams, ['oa', 'onlyauthed'], 'no') == 'yes'
+    stream = get_query_parameter(queryParams, ['s', 'stream'], 'no') == 'yes'
     oauthToken = 'oauth_token' in queryParams
     # Check if OAuth data is supplied in the Authorization header
     if not oauthToken and request.headers.get('Authorization') is not None:
@@ -172,7 +280,13 @@ def handler(prefix, path):
     if request.method == 'POST' or hook.NO_CACHE:
         noCache = True
 
-    ak = error = result = None
+    serializerClass = Serializer.registry.get(dformat)
+    # pretty-printed results are not streamed since they would be indented differently
+    if request.method == 'POST' or pretty or not serializerClass or not serializerClass.streamable:
+        stream = False
+
+    ak = error = result = streamed = cache = cacheKey = validator = None
+    notModified = False
     ts = int(time.time())
     typeMap = {}
     responseUtil = ResponseUtil()
@@ -198,10 +312,11 @@ def handler(prefix, path):
             if ak and aw.getUser() is None:
                 cacheKey = normalizeQuery(path, query,
                                           remove=('_', 'ak', 'apiKey', 'signature', 'timestamp', 'nc', 'nocache',
-                                                  'oa', 'onlyauthed'))
+                                                  'oa', 'onlyauthed', 's', 'stream'))
             else:
                 cacheKey = normalizeQuery(path, query,
-                                          remove=('_', 'signature', 'timestamp', 'nc', 'nocache', 'oa', 'onlyauthed'))
+                                          remove=('_', 'signature', 'timestamp', 'nc', 'nocache', 'oa', 'onlyauthed',
+                                                  's', 'stream'))
                 if signature:
                     # in case the request was signed, store the result under a different key
                     cacheKey = 'signed_' + cacheKey
@@ -217,31 +332,48 @@ def handler(prefix, path):
             userPrefix = 'user-' + used_session.user.getId() + '_'
             cacheKey = userPrefix + normalizeQuery(path, query,
                                                    remove=('_', 'nc', 'nocache', 'ca', 'cookieauth', 'oa', 'onlyauthed',
-                                                           'csrftoken'))
+                                                           'csrftoken', 's', 'stream'))
 
         # Bail out if the user requires authentication but is not authenticated
         if onlyAuthed and not aw.getUser():
             raise HTTPAPIError('Not authenticated', 403)
 
         addToCache = not hook.NO_CACHE
-        cache = GenericCache('HTTPAPI')
+        cache = HTTPAPICache()
         cacheKey = RE_REMOVE_EXTENSION.sub('', cacheKey)
-        if not noCache:
-            obj = cache.get(cacheKey)
+        if not noCache and (request.if_none_match or request.if_modified_since):
+            # Check the validator first so we don't need to load the result if it did not change
+            validator = cache.getValidator(cacheKey)
+            if validator:
+                etag = _makeETag(validator[0], dformat, pretty, hook.serializer_args)
+                notModified = _isNotModified(etag, validator[1])
+        if not noCache and not notModified:
+            cacheStatus, obj = cache.lookup(cacheKey)
+            responseUtil.headers['X-Indico-Cache'] = cacheStatus
             if obj is not None:
                 result, extra, ts, complete, typeMap = obj
                 addToCache = False
-        if result is None:
+                validator = cache.getValidator(cacheKey)
+        if result is None and not notModified:
             ContextManager.set("currentAW", aw)
-            # Perform the actual exporting
-            res = hook(aw)
-            if isinstance(res, tuple) and len(res) == 4:
-                result, extra, complete, typeMap = res
-            else:
-                result, extra, complete, typeMap = res, {}, True, {}
+            res = None
+            if stream:
+                # Fetch the results lazily; they are serialized (and cached) while being sent
+                res = hook.stream(aw, collect=addToCache)
+                if isinstance(res, StreamedResult):
+                    streamed, res = res, None
+            if streamed is None:
+                if res is None:
+                    # Perform the actual exporting
+                    res = hook(aw)
+                if isinstance(res, tuple) and len(res) == 4:
+                    result, extra, complete, typeMap = res
+                else:
+                    result, extra, complete, typeMap = res, {}, True, {}
         if result is not None and addToCache:
             ttl = HelperMaKaCInfo.getMaKaCInfoInstance().getAPICacheTTL()
-            cache.set(cacheKey, (result, extra, ts, complete, typeMap), ttl)
+            validator = cache.store(cacheKey, (result, extra, ts, complete, typeMap), ttl,
+                                    payload=(result, extra, complete, typeMap))
     except HTTPAPIError, e:
         error = e
         if e.getCode():
@@ -252,29 +384,29 @@ def handler(prefix, path):
         error = e
         if e.getCode():
             responseUtil.status = e.getCode()
-
-    if result is None and error is None:
+    finally:
+        # a streamed result is only cached once it has been sent completely
+        if cache is not None and (streamed is None or error is not None):
+            cache.release(cacheKey)
+
+    if notModified and error is None:
+        _endRequest(dbi, ak, None, path, query, onlyPublic)
+        _setValidatorHeaders(responseUtil, _makeETag(validator[0], dformat, pretty, hook.serializer_args),
+                             validator[1])
+        responseUtil.status = 304
+        return responseUtil.make_empty()
+    elif result is None and streamed is None and error is None:
         # TODO: usage page
         raise NotFound
     else:
-        if ak and error is None:
-            # Commit only if there was an API key and no error
-            for _retry in xrange(10):
-                dbi.sync()
-                normPath, normQuery = normalizeQuery(path, query, remove=('signature', 'timestamp'), separate=True)
-                ak.used(request.remote_addr, normPath, normQuery, not onlyPublic)
-                try:
-                    dbi.endRequest(True)
-                except ConflictError:
-                    pass  # retry
-                else:
-                    break
-        else:
-            # No need to commit stuff if we didn't use an API key
-            # (nothing was written)
-            dbi.endRequest(False)
+        if streamed is not None and error is None:
+            typeMap = hook.SERIALIZER_TYPE_MAP
+            serializer = Serializer.create(dformat, pretty=pretty, typeMap=typeMap, **hook.serializer_args)
+            endRequest = lambda: _endRequest(dbi, ak, None, path, query, onlyPublic)
+            return _streamResponse(serializer, responseUtil, streamed, path, query, ts, typeMap, cache, cacheKey,
+                                   addToCache, endRequest)
 
-        LDAPConnector.destroy()
+        _endRequest(dbi, ak, error, path, query, onlyPublic)
 
         # Log successful POST api requests
         if error is None and request.method == 'POST':
@@ -290,9 +422,14 @@ def handler(prefix, path):
 
             result = fossilize(error)
         else:
+            if validator:
+                etag = _makeETag(validator[0], dformat, pretty, hook.serializer_args)
+                _setValidatorHeaders(responseUtil, etag, validator[1])
+                if _isNotModified(etag, validator[1]):
+                    responseUtil.status = 304
+                    return responseUtil.make_empty()
             if serializer.encapsulate:
-                result = fossilize(HTTPAPIResult(result, path, query, ts, complete, extra), IHTTPAPIExportResultFossil)
-                del result['_fossil']
+                result = _encapsulate(result, path, query, ts, extra)
 
         try:
             data = serializer(result)
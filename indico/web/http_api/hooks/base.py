@@ -73,6 +73,7 @@ class HTTPAPIHook(object):
     COMMIT = False  # commit database changes
     HTTP_POST = False  # require (and allow) HTTP POST
     NO_CACHE = False
+    MAX_CACHED_STREAM_RESULTS = 1000  # streamed results with more records are not kept in memory for caching
 
     @classmethod
     def parseRequest(cls, path, queryParams):
@@ -182,14 +183,32 @@ class HTTPAPIHook(object):
             complete = (self._limit == self._userLimit)
         return resultList, complete
 
-    def _perform(self, aw, func, extra_func):
+    def _getExtraFuncs(self, method_name):
+        """Returns the function providing the extra information of an export
+        method and the one reducing each result to what it needs.
+
+        The extra function of `export_foo` is `export_foo_extra(aw, items)`.
+        If `export_foo_extra_item(result)` exists, `items` contains its return
+        value for each result instead of the results themselves, so streamed
+        exports do not need to keep all results in memory.
+        """
+        return (getattr(self, method_name + '_extra', None),
+                getattr(self, method_name + '_extra_item', None))
+
+    def _perform(self, aw, func, extra_func, extra_item=None):
         self._getParams()
         if not self._hasAccess(aw):
             raise HTTPAPIError('Access to this resource is restricted.', 403)
         resultList, complete = self._performCall(func, aw)
-        extra = extra_func(aw, resultList) if extra_func else None
+        extra = self._makeExtra(aw, extra_func, extra_item, resultList)
         return resultList, complete, extra
 
+    @staticmethod
+    def _makeExtra(aw, extra_func, extra_item, resultList):
+        if not extra_func:
+            return None
+        return extra_func(aw, map(extra_item, resultList) if extra_item else resultList)
+
     def __call__(self, aw):
         """Perform the actual exporting"""
         if self.HTTP_POST != (request.method == 'POST'):
@@ -199,12 +218,12 @@ class HTTPAPIHook(object):
 
         method_name = self._getMethodName()
         func = getattr(self, method_name, None)
-        extra_func = getattr(self, method_name + '_extra', None)
+        extra_func, extra_item = self._getExtraFuncs(method_name)
         if not func:
             raise NotImplementedError(method_name)
 
         if not self.COMMIT:
-            resultList, complete, extra = self._perform(aw, func, extra_func)
+            resultList, complete, extra = self._perform(aw, func, extra_func, extra_item)
         else:
             dbi = DBMgr.getInstance()
             try:
@@ -216,7 +235,7 @@ class HTTPAPIHook(object):
                         GenericMailer.flushQueue(False)
                         dbi.sync()
                         try:
-                            resultList, complete, extra = self._perform(aw, func, extra_func)
+                            resultList, complete, extra = self._perform(aw, func, extra_func, extra_item)
                             transaction.commit()
                             flush_after_commit_queue(True)
                             GenericMailer.flushQueue(True)
@@ -234,6 +253,107 @@ class HTTPAPIHook(object):
 
         return resultList, extra, complete, self.SERIALIZER_TYPE_MAP
 
+    def stream(self, aw, collect=True):
+        """Perform the exporting lazily.
+
+        Returns a `StreamedResult` which fetches the results while it is being
+        iterated or `None` if the hook cannot be streamed, in which case it needs
+        to be called normally.  If the export method does not return a generator,
+        the result it returned is used as is and returned like `__call__` does,
+        so the export does not run twice.
+
+        With `collect` the results are kept for caching, but only up to
+        `MAX_CACHED_STREAM_RESULTS` of them.
+        """
+        if self.COMMIT or self.HTTP_POST or request.method == 'POST':
+            return None
+        if not self.GUEST_ALLOWED and not aw.getUser():
+            raise HTTPAPIError('Guest access to this resource is forbidden.', 403)
+
+        method_name = self._getMethodName()
+        func = getattr(self, method_name, None)
+        extra_func, extra_item = self._getExtraFuncs(method_name)
+        if not func:
+            raise NotImplementedError(method_name)
+
+        self._getParams()
+        if not self._hasAccess(aw):
+            raise HTTPAPIError('Access to this resource is restricted.', 403)
+        complete = True
+        try:
+            res = func(aw)
+        except LimitExceededException:
+            res = []
+            complete = (self._limit == self._userLimit)
+        if isinstance(res, GeneratorType):
+            return StreamedResult(self, aw, res, extra_func, extra_item, collect=collect,
+                                  collectLimit=self.MAX_CACHED_STREAM_RESULTS)
+        extra = self._makeExtra(aw, extra_func, extra_item, res)
+        return res, extra, complete, self.SERIALIZER_TYPE_MAP
+
+
+class StreamedResult(object):
+    """Wraps the result generator of a hook so it can be serialized while
+    the results are still being fetched.
+
+    The fossils are kept in `results` if `collect` is set (needed for caching),
+    otherwise they are discarded as soon as they have been serialized.  If
+    there are more than `collectLimit` of them, the collected ones are dropped
+    as well and `results` becomes `None`.  The extra information is computed
+    from what `extra_item` returns for each fossil, or from all the fossils if
+    there is no such function.
+    """
+
+    def __init__(self, hook, aw, iterator, extra_func=None, extra_item=None, collect=True, collectLimit=None):
+        self._hook = hook
+        self._aw = aw
+        self._iterator = iterator
+        self._extra_func = extra_func
+        self._extra_item = extra_item
+        self._extraItems = [] if extra_func else None
+        self._collectLimit = collectLimit
+        self.results = [] if collect else None
+        self.complete = True
+        self.count = 0
+        self._exhausted = False
+        self._extra = None
+        # Fetch the first result right away so errors such as invalid
+        # arguments are raised before we start sending a response
+        self._first = self._next()
+
+    def _next(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self._exhausted = True
+        except LimitExceededException:
+            self._exhausted = True
+            self.complete = (self._hook._limit == self._hook._userLimit)
+        return None
+
+    def __iter__(self):
+        obj = self._first
+        self._first = None
+        while not self._exhausted:
+            if self.results is not None:
+                if self._collectLimit is not None and len(self.results) >= self._collectLimit:
+                    self.results = None
+                else:
+                    self.results.append(obj)
+            if self._extraItems is not None:
+                self._extraItems.append(self._extra_item(obj) if self._extra_item else obj)
+            self.count += 1
+            yield obj
+            obj = self._next()
+
+    @property
+    def extra(self):
+        if not self._exhausted:
+            raise RuntimeError('Extra information is only available after all results have been fetched')
+        if self._extra is None and self._extra_func:
+            self._extra = self._extra_func(self._aw, self._extraItems)
+        return self._extra
+
 
 class DataFetcher(object):
 
@@ -26,7 +26,8 @@ import pytz
 from datetime import datetime
 
 # indico imports
-from indico.util.date_time import iterdays
+from indico.core.index import Catalog
+from indico.util.date_time import iterdays, utc_timestamp
 from indico.util.fossilize import fossilize
 
 from indico.web.http_api.fossils import IConferenceMetadataWithContribsFossil, IConferenceMetadataFossil, \
@@ -121,8 +122,11 @@ class CategoryEventHook(HTTPAPIHook):
             idList += [c.getId() for c in aw.getUser().getLinkTo('category', 'favorite')]
         return expInt.category(idList)
 
-    def export_categ_extra(self, aw, resultList):
-        ids = set((event['categoryId'] for event in resultList))
+    def export_categ_extra_item(self, event):
+        return event['categoryId']
+
+    def export_categ_extra(self, aw, categIds):
+        ids = set(categIds)
         return {
             'eventCategories': CategoryEventFetcher.getCategoryPath(ids, aw),
             "moreFutureEvents": False if not self._toDT else
@@ -215,11 +219,30 @@ class CategoryEventFetcher(IteratedDataFetcher):
                          canModify=obj.canModify(self._aw),
                          mapClassType={'AcceptedContribution': 'Contribution'})
 
-    def category(self, idlist):
-        idx = IndexesHolder().getById('categoryDateAll')
+    def _iterateFiltered(self, attrIdx, idlist):
+        """
+        Uses the category attribute index to find the events matching the
+        type/location/room filters within the requested time range, so only
+        the matching events are loaded from the database.
+        """
+        ch = ConferenceHolder()
+        fromTS = utc_timestamp(self._fromDT) if self._fromDT else None
+        toTS = utc_timestamp(self._toDT) if self._toDT else None
+        for catId in idlist:
+            for confId in attrIdx.iterateIds(catId, fromTS, toTS, type=self._eventType,
+                                             location=self._location, room=self._room):
+                conf = ch.getById(confId, True)
+                if conf is not None:
+                    yield conf
 
+    def category(self, idlist):
         filter = None
         if self._room or self._location or self._eventType:
+            attrIdx = Catalog.getIdx('categ_conf_attrs')
+            if attrIdx is not None:
+                return self._process(self._iterateFiltered(attrIdx, idlist))
+
+            # the index has not been built yet
             def filter(obj):
                 if self._eventType and obj.getType() != self._eventType:
                     return False
@@ -233,6 +256,7 @@ class CategoryEventFetcher(IteratedDataFetcher):
                         return False
                 return True
 
+        idx = IndexesHolder().getById('categoryDateAll')
         iters = itertools.chain(*(idx.iterateObjectsIn(catId, self._fromDT, self._toDT) for catId in idlist))
         return self._process(iters, filter)
 
@@ -109,6 +109,7 @@ def serialize_session(cal, fossil, now, fid=None):
 class ICalSerializer(Serializer):
 
     schemaless = False
+    streamable = True
     _mime = 'text/calendar'
 
     _mappers = {
@@ -124,21 +125,44 @@ class ICalSerializer(Serializer):
     def register_mapper(cls, fossil, func):
         cls._mappers[fossil] = func
 
+    def _mapperFor(self, fossil):
+        if '_fossil' in fossil:
+            return ICalSerializer._mappers.get(fossil['_fossil'])
+        else:
+            return self._extra_args.get('ical_serializer')
+
+    @staticmethod
+    def _createCalendar():
+        cal = ical.Calendar()
+        cal.add('version', '2.0')
+        cal.add('prodid', '-//CERN//INDICO//EN')
+        return cal
+
     def _execute(self, fossils):
         results = fossils['results']
         if type(results) != list:
             results = [results]
 
-        cal = ical.Calendar()
-        cal.add('version', '2.0')
-        cal.add('prodid', '-//CERN//INDICO//EN')
+        cal = self._createCalendar()
         now = nowutc()
         for fossil in results:
-            if '_fossil' in fossil:
-                mapper = ICalSerializer._mappers.get(fossil['_fossil'])
-            else:
-                mapper = self._extra_args.get('ical_serializer')
+            mapper = self._mapperFor(fossil)
             if mapper:
                 mapper(cal, fossil, now)
 
         return cal.to_ical()
+
+    def _stream(self, header, results, trailer):
+        # Serialize the calendar envelope once and emit the components of
+        # each result in between its opening and closing lines
+        envelope = self._createCalendar().to_ical()
+        end = envelope.index('END:VCALENDAR')
+        yield envelope[:end]
+        now = nowutc()
+        for fossil in results:
+            mapper = self._mapperFor(fossil)
+            if mapper:
+                cal = ical.Calendar()
+                mapper(cal, fossil, now)
+                yield ''.join(component.to_ical() for component in cal.subcomponents)
+        yield envelope[end:]
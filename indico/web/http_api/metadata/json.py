@@ -34,9 +34,23 @@ class JSONSerializer(Serializer):
     """
 
     _mime = 'application/json'
+    streamable = True
 
     def _execute(self, fossil):
         return json.dumps(fossil, pretty=self.pretty)
 
+    def _dumpFields(self, fields):
+        return ', '.join('%s: %s' % (json.dumps(k), json.dumps(v, pretty=self.pretty)) for k, v in fields.iteritems())
+
+    def _stream(self, header, results, trailer):
+        # the fragments are dumped directly since subclasses such as JSONP wrap the output of _execute
+        yield '{%s, "results": [' % self._dumpFields(header)
+        first = True
+        for fossil in results:
+            data = json.dumps(fossil, pretty=self.pretty)
+            yield (data if first else ', ' + data)
+            first = False
+        yield '], %s}' % self._dumpFields(trailer())
+
 
 Serializer.register('json', JSONSerializer)
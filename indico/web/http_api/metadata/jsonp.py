@@ -35,3 +35,9 @@ class JSONPSerializer(JSONSerializer):
         return "// fetched from Indico\n%s(%s);" % \
                (self._prefix,
                 super(JSONPSerializer, self)._execute(results))
+
+    def _stream(self, header, results, trailer):
+        yield "// fetched from Indico\n%s(" % self._prefix
+        for chunk in super(JSONPSerializer, self)._stream(header, results, trailer):
+            yield chunk
+        yield ");"
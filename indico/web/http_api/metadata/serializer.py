@@ -23,6 +23,7 @@ class Serializer(object):
 
     schemaless = True
     encapsulate = True
+    streamable = False
 
     registry = {}
 
@@ -64,6 +65,19 @@ class Serializer(object):
         self._data = self._execute(obj, *args, **kwargs)
         return self._data
 
+    def stream(self, header, results, trailer):
+        """
+        Serializes an encapsulated result incrementally, yielding chunks of output.
+
+        `header` is a dict with the fields that are known before fetching any
+        result, `results` an iterable of fossils and `trailer` a callable
+        returning the fields that are only known once `results` is exhausted
+        (e.g. the number of records).
+        """
+        if not self.streamable:
+            raise NotImplementedError('Serializer %s does not support streaming' % type(self).__name__)
+        return self._stream(header, results, trailer)
+
 
 from indico.web.http_api.metadata.json import JSONSerializer
 from indico.web.http_api.metadata.xml import XMLSerializer
@@ -17,9 +17,12 @@
 ## You should have received a copy of the GNU General Public License
 ## along with Indico;if not, see <http://www.gnu.org/licenses/>.
 
+# python stdlib imports
+from collections import OrderedDict
+from datetime import datetime
+
 # external library imports
 from lxml import etree
-from datetime import datetime
 
 # module imports
 from indico.web.http_api.metadata.serializer import Serializer
@@ -33,6 +36,7 @@ class XMLSerializer(Serializer):
     """
 
     _mime = 'text/xml'
+    streamable = True
 
     def __init__(self, pretty=False, **kwargs):
         self._typeMap = kwargs.pop('typeMap', {})
@@ -69,32 +73,41 @@ class XMLSerializer(Serializer):
 
         for k, v in fossil.iteritems():
             if k not in ['_fossil', '_type', 'id']:
-                elem = etree.SubElement(felement, k)
-                if isinstance(v, (list, tuple)):
-                    onlyDicts = all(type(subv) == dict for subv in v)
-                    if onlyDicts:
-                        for subv in v:
-                            elem.append(self._xmlForFossil(subv))
-                    else:
-                        for subv in v:
-                            if type(subv) == dict:
-                                elem.append(self._xmlForFossil(subv))
-                            else:
-                                subelem = etree.SubElement(elem, 'item')
-                                subelem.text = self._convert(subv)
-                elif isinstance(v, dict):
-                    elem.append(self._xmlForFossil(v))
-                else:
-                    txt = self._convert(v)
-                    try:
-                        elem.text = txt
-                    except Exception:
-                        Logger.get('xmlSerializer').exception('Setting XML text value failed (id: {}, value {!r})'
-                                                              .format(id, txt))
-
+                self._xmlForField(felement, k, v, id)
 
         return felement
 
+    def _xmlForField(self, felement, k, v, id=None):
+        elem = etree.SubElement(felement, k)
+        if isinstance(v, (list, tuple)):
+            onlyDicts = all(type(subv) == dict for subv in v)
+            if onlyDicts:
+                for subv in v:
+                    elem.append(self._xmlForFossil(subv))
+            else:
+                for subv in v:
+                    if type(subv) == dict:
+                        elem.append(self._xmlForFossil(subv))
+                    else:
+                        subelem = etree.SubElement(elem, 'item')
+                        subelem.text = self._convert(subv)
+        elif isinstance(v, dict):
+            elem.append(self._xmlForFossil(v))
+        else:
+            txt = self._convert(v)
+            try:
+                elem.text = txt
+            except Exception:
+                Logger.get('xmlSerializer').exception('Setting XML text value failed (id: {}, value {!r})'
+                                                      .format(id, txt))
+        return elem
+
+    def _xmlForFields(self, fields):
+        parent = etree.Element('fields')
+        for k, v in fields.iteritems():
+            self._xmlForField(parent, k, v)
+        return ''.join(etree.tostring(elem, pretty_print=self.pretty, encoding='utf-8') for elem in parent)
+
     def _execute(self, fossil, xml_declaration=True):
         if type(fossil) == list:
             # collection of fossils
@@ -108,5 +121,22 @@ class XMLSerializer(Serializer):
         return etree.tostring(result, pretty_print=self.pretty,
                               xml_declaration=xml_declaration, encoding='utf-8')
 
+    def _stream(self, header, results, trailer):
+        # same output as `_execute` for the complete (non-pretty) result
+        header = OrderedDict(header)
+        typeName = header.pop('_type')
+        typeName = self._typeMap.get(typeName, typeName).lower()
+        yield "<?xml version='1.0' encoding='utf-8'?>\n<%s>" % typeName
+        yield self._xmlForFields(header)
+        empty = True
+        for fossil in results:
+            if empty:
+                yield '<results>'
+                empty = False
+            yield etree.tostring(self._xmlForFossil(fossil), pretty_print=self.pretty, encoding='utf-8')
+        yield '<results/>' if empty else '</results>'
+        yield self._xmlForFields(trailer())
+        yield '</%s>' % typeName
+
 
 Serializer.register('xml', XMLSerializer)
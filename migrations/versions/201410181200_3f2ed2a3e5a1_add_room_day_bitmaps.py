@@ -0,0 +1,34 @@
+"""Add room day bitmaps
+
+Revision ID: 3f2ed2a3e5a1
+Revises: None
+Create Date: 2014-10-18 12:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2ed2a3e5a1'
+down_revision = None
+
+
+def upgrade():
+    op.create_table('room_day_bitmaps',
+                    sa.Column('room_id', sa.Integer(), nullable=False),
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('booked', postgresql.BIT(96), nullable=False),
+                    sa.Column('pre_booked', postgresql.BIT(96), nullable=False),
+                    sa.Column('is_exact', sa.Boolean(), nullable=False),
+                    sa.ForeignKeyConstraint(['room_id'], ['roombooking.rooms.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('room_id', 'day'),
+                    schema='roombooking')
+    op.create_index('ix_room_day_bitmaps_day', 'room_day_bitmaps', ['day'], unique=False,
+                    schema='roombooking')
+
+
+def downgrade():
+    op.drop_index('ix_room_day_bitmaps_day', table_name='room_day_bitmaps', schema='roombooking')
+    op.drop_table('room_day_bitmaps', schema='roombooking')
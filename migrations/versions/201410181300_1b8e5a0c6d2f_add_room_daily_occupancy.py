@@ -0,0 +1,31 @@
+"""Add room daily occupancy
+
+Revision ID: 1b8e5a0c6d2f
+Revises: 3f2ed2a3e5a1
+Create Date: 2014-10-18 13:00:00.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1b8e5a0c6d2f'
+down_revision = '3f2ed2a3e5a1'
+
+
+def upgrade():
+    op.create_table('room_daily_occupancy',
+                    sa.Column('room_id', sa.Integer(), nullable=False),
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('booked_time', sa.Interval(), nullable=False),
+                    sa.ForeignKeyConstraint(['room_id'], ['roombooking.rooms.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('room_id', 'day'),
+                    schema='roombooking')
+    op.create_index('ix_room_daily_occupancy_day', 'room_daily_occupancy', ['day'], unique=False,
+                    schema='roombooking')
+
+
+def downgrade():
+    op.drop_index('ix_room_daily_occupancy_day', table_name='room_daily_occupancy', schema='roombooking')
+    op.drop_table('room_daily_occupancy', schema='roombooking')